@@ -12,15 +12,21 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import TYPE_CHECKING, Optional
-
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Optional
+
+from dogpile.cache.api import NO_VALUE
+from dogpile.cache.proxy import ProxyBackend
 from dogpile.cache.region import CacheRegion
 
 from rucio.common.client import is_client
-from rucio.common.config import config_get
+from rucio.common.config import config_get, config_get_bool, config_get_int
 
 if TYPE_CHECKING:
-    from collections.abc import Callable
+    from collections.abc import Callable, Mapping, Sequence
 
 
 CACHE_URL = config_get('cache', 'url', False, '127.0.0.1:11211', check_config_table=False)
@@ -42,24 +48,147 @@ finally:
     if _mc_client:
         _mc_client.close()
 
+ENABLE_LOCAL_CACHING = not is_client() and config_get_bool('cache', 'enable_local_cache', False, True, check_config_table=False)
+LOCAL_CACHE_EXPIRATION_TIME = 60
+
+
+class LocalLRUProxy(ProxyBackend):
+    """
+    Bounded, TTL-aware, process-local LRU tier placed in front of the proxied backend.
+
+    Values are kept pickled, so callers get independent copies of the cached objects,
+    like they would when reading them from memcached.
+    """
+    def __init__(self, name: str, max_size: int, expiration_time: int):
+        super().__init__()
+        self.name = name
+        self.max_size = max_size
+        self.expiration_time = expiration_time
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._metrics = None
+        try:
+            from rucio.core.monitor import MetricManager
+            self._metrics = MetricManager(module=__name__)
+        except ImportError:
+            pass
+
+    def _count(self, event: str, delta: int = 1) -> None:
+        if self._metrics:
+            self._metrics.counter('local.{region}.{event}', documentation='Local cache events').labels(region=self.name, event=event).inc(delta)
+
+    def _get_local(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    return pickle.loads(value)  # noqa: S301
+                del self._entries[key]
+        return NO_VALUE
+
+    def _set_local(self, key: str, value: Any) -> None:
+        if value is NO_VALUE:
+            return
+        serialized = pickle.dumps(value)
+        evicted = 0
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.expiration_time, serialized)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                evicted += 1
+            size = len(self._entries)
+        if evicted:
+            self._count('evictions', evicted)
+        if self._metrics:
+            self._metrics.gauge('local.{region}.size', documentation='Number of entries in the local cache').labels(region=self.name).set(size)
+
+    def _delete_local(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get(self, key):
+        value = self._get_local(key)
+        if value is not NO_VALUE:
+            self._count('hits')
+            return value
+        self._count('misses')
+        value = self.proxied.get(key)
+        self._set_local(key, value)
+        return value
+
+    def get_multi(self, keys: "Sequence[str]"):
+        values = [self._get_local(key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is NO_VALUE]
+        self._count('hits', len(keys) - len(missing))
+        if missing:
+            self._count('misses', len(missing))
+            for i, value in zip(missing, self.proxied.get_multi([keys[i] for i in missing])):
+                self._set_local(keys[i], value)
+                values[i] = value
+        return values
+
+    def set(self, key, value):
+        self.proxied.set(key, value)
+        self._set_local(key, value)
+
+    def set_multi(self, mapping: "Mapping[str, Any]"):
+        self.proxied.set_multi(mapping)
+        for key, value in mapping.items():
+            self._set_local(key, value)
+
+    def delete(self, key):
+        self._delete_local(key)
+        self.proxied.delete(key)
+
+    def delete_multi(self, keys: "Sequence[str]"):
+        for key in keys:
+            self._delete_local(key)
+        self.proxied.delete_multi(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
 
 class MemcacheRegion(CacheRegion):
     """
     Subclass of CacheRegion.
     It uses pymemcache as backend if ENABLE_CACHING is True,
     otherwise it it configured to null.
+
+    If local_cache_size is set, a process-local LRU tier holding at most
+    local_cache_size entries for local_expiration_time seconds is placed in
+    front of the backend (also when memcached is not available). For named
+    regions, the size can be overridden with the `local_cache_size_<name>`
+    option of the `cache` section.
     """
     def __init__(
             self,
             expiration_time: int,
             function_key_generator: Optional['Callable'] = None,
-            memcached_expire_time: Optional[int] = None
+            memcached_expire_time: Optional[int] = None,
+            name: Optional[str] = None,
+            local_cache_size: Optional[int] = None,
+            local_expiration_time: Optional[int] = None,
     ):
         if function_key_generator:
-            super().__init__(function_key_generator=function_key_generator)
+            super().__init__(name=name, function_key_generator=function_key_generator)
         else:
-            super().__init__()
+            super().__init__(name=name)
+        self.local_cache = None
         self._configure_region(expiration_time, memcached_expire_time)
+        if ENABLE_LOCAL_CACHING and name:
+            local_cache_size = config_get_int('cache', 'local_cache_size_%s' % name, False, local_cache_size, check_config_table=False)
+        if ENABLE_LOCAL_CACHING and local_cache_size:
+            self.local_cache = LocalLRUProxy(
+                name=name or 'default',
+                max_size=local_cache_size,
+                expiration_time=min(local_expiration_time or LOCAL_CACHE_EXPIRATION_TIME, expiration_time),
+            )
+            self.wrap(self.local_cache)
 
     def _configure_region(
             self,
@@ -136,11 +136,11 @@ def isplaintext(filename: "GenericPath") -> bool:
     return mimetype(filename).split(';')[0] == 'text/plain'
 
 
-def smart_open(filename: "GenericPath") -> Optional[Union["TextIO", gzip.GzipFile]]:
+def smart_open(filename: "GenericPath") -> Optional["TextIO"]:
     '''
-    Returns an open file object if `filename` is plain text, else assumes
-    it is a bzip2 compressed file and returns a file-like object to
-    handle it.
+    Returns an open file object if `filename` is plain text, else if it
+    is a gzip or bzip2 compressed file returns a text file-like object to
+    handle it. Returns None for other formats.
     '''
     f = None
     if isplaintext(filename):
@@ -148,7 +148,7 @@ def smart_open(filename: "GenericPath") -> Optional[Union["TextIO", gzip.GzipFil
     else:
         file_type = mimetype(filename)
         if file_type.find('gzip') > -1:
-            f = gzip.GzipFile(filename, 'rt')
+            f = gzip.open(filename, 'rt')
         elif file_type.find('bzip2') > -1:
             f = bz2.open(filename, 'rt')
         else:
@@ -12,15 +12,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import concurrent.futures
 import datetime
-import logging
+import gzip
+import heapq
+import itertools
+import multiprocessing
 import os
 import re
+import shutil
 import subprocess
 import tempfile
 
 from rucio.common import dumper
 from rucio.common.dumper import DUMPS_CACHE_DIR, data_models, error, path_parsing
+from rucio.common.utils import chunks
+
+SORT_CHUNK_SIZE = 500000
+MAX_OPEN_RUNS = 64
 
 subcommands = ['consistency', 'consistency-manual']
 
@@ -34,8 +43,7 @@ class Consistency(data_models.DataModel):
     @classmethod
     def dump(cls, subcommand, ddm_endpoint, storage_dump, prev_date_fname=None, next_date_fname=None,
              prev_date=None, next_date=None, sort_rucio_replica_dumps=True, date=None,
-             cache_dir=DUMPS_CACHE_DIR):
-        logger = logging.getLogger('auditor.consistency')
+             cache_dir=DUMPS_CACHE_DIR, sort_chunk_size=SORT_CHUNK_SIZE, sort_workers=1):
         if subcommand == 'consistency':
             prev_date_fname = data_models.Replica.download(
                 ddm_endpoint, prev_date, cache_dir=cache_dir)
@@ -79,80 +87,27 @@ class Consistency(data_models.DataModel):
             return '/'.join(relative)
 
         if sort_rucio_replica_dumps:
-            prev_date_fname_sorted = gnu_sort(
-                parse_and_filter_file(prev_date_fname, parser=parser, cache_dir=cache_dir),
-                delimiter=',',
-                fieldspec='1',
-                cache_dir=cache_dir,
-            )
-
-            next_date_fname_sorted = gnu_sort(
-                parse_and_filter_file(next_date_fname, parser=parser, cache_dir=cache_dir),
-                delimiter=',',
-                fieldspec='1',
-                cache_dir=cache_dir,
-            )
+            prevf = external_sort(prev_date_fname, parser=parser, chunk_size=sort_chunk_size, max_workers=sort_workers, cache_dir=cache_dir)
+            nextf = external_sort(next_date_fname, parser=parser, chunk_size=sort_chunk_size, max_workers=sort_workers, cache_dir=cache_dir)
         else:
-            prev_date_fname_sorted = parse_and_filter_file(
-                prev_date_fname,
-                parser=parser,
-                cache_dir=cache_dir,
-            )
-            next_date_fname_sorted = parse_and_filter_file(
-                next_date_fname,
-                parser=parser,
-                cache_dir=cache_dir,
-            )
-
-        standard_name_re = r'(ddmendpoint_{0}_\d{{2}}-\d{{2}}-\d{{4}}_[0-9a-f]{{40}})$'.format(ddm_endpoint)
-        standard_name_match = re.search(standard_name_re, storage_dump)
-        if standard_name_match is not None:
-            # If the original filename was generated using the expected format,
-            # just use the name as prefix for the parsed file.
-            sd_prefix = standard_name_match.group(0)
-        elif date is not None:
-            # Otherwise try to use the date information and DDMEndpoint name to
-            # have a meaningful filename.
-            sd_prefix = 'ddmendpoint_{0}_{1}'.format(
-                ddm_endpoint,
-                date.strftime('%d-%m-%Y'),
-            )
-        else:
-            # As last resort use only the DDMEndpoint name, but this is error
-            # prone as old dumps may interfere with the checks.
-            sd_prefix = 'ddmendpoint_{0}_unknown_date'.format(
-                ddm_endpoint,
-            )
-            logger.warning(
-                'Using basic and error prune naming for RSE dump as no date '
-                'information was provided, %s dump will be named %s',
-                ddm_endpoint,
-                sd_prefix,
-            )
+            prevf = parse_and_filter_lines(prev_date_fname, parser=parser)
+            nextf = parse_and_filter_lines(next_date_fname, parser=parser)
+        sdump = external_sort(storage_dump, parser=strip_storage_dump, chunk_size=sort_chunk_size, max_workers=sort_workers, cache_dir=cache_dir)
 
-        storage_dump_fname_sorted = gnu_sort(
-            parse_and_filter_file(
-                storage_dump,
-                parser=strip_storage_dump,
-                prefix=sd_prefix,
-                cache_dir=cache_dir,
-            ),
-            prefix=sd_prefix,
-            cache_dir=cache_dir,
-        )
-
-        with open(prev_date_fname_sorted) as prevf:
-            with open(next_date_fname_sorted) as nextf:
-                with open(storage_dump_fname_sorted) as sdump:
-                    for path, where, status in compare3(prevf, sdump, nextf):
-                        prevstatus, nextstatus = status
+        try:
+            for path, where, status in compare3(prevf, sdump, nextf):
+                prevstatus, nextstatus = status
 
-                        if where[0] and not where[1] and where[2]:
-                            if prevstatus == 'A' and nextstatus == 'A':
-                                yield cls('LOST', path)
+                if where[0] and not where[1] and where[2]:
+                    if prevstatus == 'A' and nextstatus == 'A':
+                        yield cls('LOST', path)
 
-                        if not where[0] and where[1] and not where[2]:
-                            yield cls('DARK', path)
+                if not where[0] and where[1] and not where[2]:
+                    yield cls('DARK', path)
+        finally:
+            # Remove the sorted runs even if the results are not fully consumed
+            for lines in (prevf, sdump, nextf):
+                lines.close()
 
 
 def _try_to_advance(it, default=None):
@@ -332,6 +287,157 @@ def gnu_sort(file_path, prefix=None, delimiter=None, fieldspec=None, cache_dir=D
     return sorted_path
 
 
+def parse_and_filter_lines(file_path, parser=lambda s: s.rstrip('\n'), filter_=lambda s: s):
+    '''
+    Generator yielding, for each line of `file_path` for which the `filter_`
+    function returns True, the line parsed with the `parser` function.
+
+    Like `parse_and_filter_file` but without writing the parsed lines to a
+    file. The file may be plain text, gzip or bzip2 compressed.
+    '''
+    input_ = dumper.smart_open(file_path)
+    if input_ is None:
+        return
+
+    with input_:
+        for line in input_:
+            if filter_(line):
+                yield parser(line)
+
+
+def _write_run(lines, run_path):
+    '''
+    Writes the sorted `lines` to the gzip compressed file `run_path`, one
+    per line.
+    '''
+    # The runs are read only once, fast compression is enough
+    with gzip.open(run_path, 'wb', compresslevel=1) as run:
+        for block in chunks(lines, 10000):
+            block.append('')
+            run.write('\n'.join(block).encode('utf-8', 'surrogateescape'))
+    return run_path
+
+
+def _write_sorted_run(lines, run_path):
+    lines.sort()
+    return _write_run(lines, run_path)
+
+
+def _read_sorted_run(run_path, block_size=2 ** 20):
+    '''
+    Generator yielding the lines of a run. The run is read and decoded by
+    blocks, which is much faster than iterating over a gzip file.
+    '''
+    with gzip.open(run_path, 'rb') as run:
+        rest = b''
+        for block in iter(lambda: run.read(block_size), b''):
+            lines, end_of_line, rest = (rest + block).rpartition(b'\n')
+            if end_of_line:
+                yield from lines.decode('utf-8', 'surrogateescape').split('\n')
+
+
+def _write_sorted_runs(chunks_, run_dir, max_workers=1):
+    '''
+    Writes each of the chunks of lines as a sorted run in `run_dir`, in
+    `max_workers` worker processes if greater than one. At most
+    `max_workers` chunks are waiting to be sorted at any time.
+
+    :returns: The paths of the runs.
+    '''
+    run_paths = (os.path.join(run_dir, 'run_{0:06d}.gz'.format(i)) for i in itertools.count())
+
+    if max_workers <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        return [_write_sorted_run(chunk, run_path) for chunk, run_path in zip(chunks_, run_paths)]
+
+    futures = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('fork')) as executor:
+        pending = set()
+        for chunk, run_path in zip(chunks_, run_paths):
+            if len(pending) >= max_workers:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            future = executor.submit(_write_sorted_run, chunk, run_path)
+            pending.add(future)
+            futures.append(future)
+        return [future.result() for future in futures]
+
+
+def _merge_sorted_runs(run_paths, run_dir, max_open_runs=MAX_OPEN_RUNS):
+    '''
+    Merges the runs by groups of `max_open_runs` into new runs, as many
+    times as needed to have at most `max_open_runs` runs left. The merged
+    runs are removed.
+
+    :returns: The paths of the remaining runs.
+    '''
+    for merge_pass in itertools.count():
+        if len(run_paths) <= max_open_runs:
+            return run_paths
+        merged_run_paths = []
+        for i, group in enumerate(chunks(run_paths, max_open_runs)):
+            runs = [_read_sorted_run(run_path) for run_path in group]
+            try:
+                merged_run_path = os.path.join(run_dir, 'merge_{0}_{1:06d}.gz'.format(merge_pass, i))
+                merged_run_paths.append(_write_run(heapq.merge(*runs), merged_run_path))
+            finally:
+                for run in runs:
+                    run.close()
+            for run_path in group:
+                os.unlink(run_path)
+        run_paths = merged_run_paths
+
+
+def external_sort(file_path, parser=lambda s: s.rstrip('\n'), filter_=lambda s: s, chunk_size=SORT_CHUNK_SIZE, max_workers=1,
+                  max_open_runs=MAX_OPEN_RUNS, cache_dir=DUMPS_CACHE_DIR):
+    '''
+    Generator yielding the lines of `file_path` selected by `filter_` and
+    parsed with `parser` (see `parse_and_filter_lines`), sorted by byte
+    value as GNU sort with LC_ALL=C would.
+
+    The lines are read by chunks of `chunk_size`, each chunk is sorted, in
+    `max_workers` worker processes if greater than one, and written as a
+    gzip compressed run in a temporary directory of `cache_dir`. The runs
+    are then merged while the lines are consumed, so no sorted copy of the
+    whole file is written. If there are more than `max_open_runs` runs,
+    they are first merged by groups into bigger runs. The temporary
+    directory is removed once the generator is exhausted or closed. A file
+    which fits in one chunk is sorted in memory.
+
+    The parsed lines must not contain new line characters.
+    '''
+    run_dir = None
+    chunks_ = chunks(parse_and_filter_lines(file_path, parser=parser, filter_=filter_), chunk_size)
+    try:
+        first_chunk = next(chunks_, [])
+        second_chunk = next(chunks_, None)
+        if second_chunk is not None:
+            run_dir = tempfile.mkdtemp(dir=cache_dir, prefix='sort_')
+            all_chunks = itertools.chain((first_chunk, second_chunk), chunks_)
+            first_chunk = second_chunk = None
+            run_paths = _write_sorted_runs(all_chunks, run_dir, max_workers)
+            run_paths = _merge_sorted_runs(run_paths, run_dir, max_open_runs)
+    except BaseException:
+        if run_dir is not None:
+            shutil.rmtree(run_dir, ignore_errors=True)
+        raise
+    finally:
+        chunks_.close()
+
+    if run_dir is None:
+        first_chunk.sort()
+        yield from first_chunk
+        return
+
+    runs = [_read_sorted_run(run_path) for run_path in run_paths]
+    try:
+        yield from heapq.merge(*runs)
+    finally:
+        for run in runs:
+            run.close()
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+
 def populate_args(argparser):
     # Option to download the rucio replica dumps automatically
     parser = argparser.add_parser(
@@ -378,6 +484,12 @@ def populate_args(argparser):
                  'argument.',
             action='store_true'
         )
+        p.add_argument(
+            '--sort-workers',
+            help='Number of processes used to sort the chunks of the dumps',
+            type=int,
+            default=1,
+        )
 
 
 _date_re = re.compile(r'dump_(\d{8})')
@@ -444,6 +556,7 @@ def parse_args(args):
     args_dict['ddm_endpoint'] = args.ddm_endpoint
     args_dict['storage_dump'] = args.storage_dump
     args_dict['sort_rucio_replica_dumps'] = args.sort_rucio_dumps
+    args_dict['sort_workers'] = args.sort_workers
     if args.subcommand == 'consistency':
         args_dict.update(_parse_args_consistency(args))
     else:
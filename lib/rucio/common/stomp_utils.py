@@ -71,9 +71,13 @@ class StompConnectionManager:
 
         return False
 
+    @property
+    def connections(self) -> list[Connection]:
+        return list(self._connections.values())
+
     def disconnect(self):
         for conn in self._connections.values():
-            if not conn.is_connected():
+            if conn.is_connected():
                 conn.disconnect()
 
     def re_configure(
@@ -12,13 +12,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import datetime
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
 
 from sqlalchemy import and_, delete, insert, literal, select
 from sqlalchemy.exc import NoResultFound
 
+from rucio.common.utils import chunks
 from rucio.db.sqla import filter_thread_work, models
 from rucio.db.sqla.session import read_session, transactional_session
+from rucio.db.sqla.util import counter_delta_accumulator, flush_counter_deltas
 
 if TYPE_CHECKING:
     from sqlalchemy.orm import Session
@@ -57,6 +59,7 @@ def increase(
 ) -> None:
     """
     Increments the specified counter by the specified amount.
+    The increments of a transaction are merged into a single row per RSE and account on commit.
 
     :param rse_id:  The id of the RSE.
     :param account: The account name.
@@ -64,7 +67,7 @@ def increase(
     :param bytes_:   The corresponding amount in bytes.
     :param session: The database session in use.
     """
-    models.UpdatedAccountCounter(account=account, rse_id=rse_id, files=files, bytes=bytes_).save(session=session)
+    counter_delta_accumulator(session, models.UpdatedAccountCounter, ('rse_id', 'account')).add((rse_id, account), files, bytes_)
 
 
 @transactional_session
@@ -129,6 +132,7 @@ def get_updated_account_counters(
     :param session:            Database session in use.
     :returns:                  List of rse_ids whose rse_counters need to be updated.
     """
+    flush_counter_deltas(session, models.UpdatedAccountCounter)
 
     query = select(
         models.UpdatedAccountCounter.account,
@@ -146,23 +150,33 @@ def update_account_counter(
     account: "InternalAccount",
     rse_id: str,
     *,
+    limit: Optional[int] = None,
     session: "Session"
-) -> None:
+) -> int:
     """
     Read the updated_account_counters and update the account_counter.
 
     :param account:  The account to update.
     :param rse_id:   The rse_id to update.
+    :param limit:    The maximum number of updated_account_counters to apply, all of them if None.
     :param session:  Database session in use.
+    :returns:        The number of updated_account_counters applied.
     """
+    flush_counter_deltas(session, models.UpdatedAccountCounter)
 
     stmt = select(
-        models.UpdatedAccountCounter
+        models.UpdatedAccountCounter.id,
+        models.UpdatedAccountCounter.files,
+        models.UpdatedAccountCounter.bytes
     ).where(
         and_(models.UpdatedAccountCounter.account == account,
              models.UpdatedAccountCounter.rse_id == rse_id)
     )
-    updated_account_counters = session.execute(stmt).scalars().all()
+    if limit:
+        stmt = stmt.limit(limit)
+    updated_account_counters = session.execute(stmt).all()
+    sum_bytes = sum([updated_account_counter.bytes for updated_account_counter in updated_account_counters])
+    sum_files = sum([updated_account_counter.files for updated_account_counter in updated_account_counters])
 
     try:
         stmt = select(
@@ -172,16 +186,24 @@ def update_account_counter(
                  models.AccountUsage.rse_id == rse_id)
         )
         account_counter = session.execute(stmt).scalar_one()
-        account_counter.bytes += sum([updated_account_counter.bytes for updated_account_counter in updated_account_counters])
-        account_counter.files += sum([updated_account_counter.files for updated_account_counter in updated_account_counters])
+        account_counter.bytes += sum_bytes
+        account_counter.files += sum_files
     except NoResultFound:
         models.AccountUsage(rse_id=rse_id,
                             account=account,
-                            files=sum([updated_account_counter.files for updated_account_counter in updated_account_counters]),
-                            bytes=sum([updated_account_counter.bytes for updated_account_counter in updated_account_counters])).save(session=session)
+                            files=sum_files,
+                            bytes=sum_bytes).save(session=session)
 
-    for update in updated_account_counters:
-        update.delete(flush=False, session=session)
+    for ids in chunks([updated_account_counter.id for updated_account_counter in updated_account_counters], 1000):
+        stmt = delete(
+            models.UpdatedAccountCounter
+        ).where(
+            models.UpdatedAccountCounter.id.in_(ids)
+        ).execution_options(
+            synchronize_session=False
+        )
+        session.execute(stmt)
+    return len(updated_account_counters)
 
 
 @transactional_session
@@ -14,9 +14,12 @@
 
 import datetime
 import hashlib
+import math
+import random
 from typing import TYPE_CHECKING, Optional
 
-from sqlalchemy import and_, delete, func, select, update
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
 
 from rucio.common.exception import DatabaseException
 from rucio.common.utils import pid_exists
@@ -40,6 +43,7 @@ if TYPE_CHECKING:
         test: int
 
 DEFAULT_EXPIRATION_DELAY = datetime.timedelta(days=1).total_seconds()
+PARTITION_LEASE_HOSTNAME = 'partition-bucket'
 
 
 @transactional_session
@@ -267,6 +271,158 @@ def die(
     session.execute(stmt)
 
 
+@transactional_session
+def renew_partition_leases(
+    executable: str,
+    hostname: str,
+    pid: int,
+    thread: Optional["Thread"],
+    nr_buckets: int,
+    nr_workers: int,
+    lease_duration: int,
+    release_surplus: bool = True,
+    *,
+    session: "Session"
+) -> list[int]:
+    """
+    Renew the leases on the virtual partition buckets owned by a thread and balance the buckets between workers.
+
+    Each bucket lease is stored as a heartbeat of the executable suffixed by '--partition-buckets', with the
+    bucket number as pid and the owner as payload. A thread keeps at most its fair share of buckets,
+    releases the surplus, and steals free or expired buckets until it reaches its fair share.
+
+    :param executable: Executable name as a string, e.g., judge-evaluator.
+    :param hostname: Hostname as a string, e.g., rucio-daemon-prod-01.cern.ch.
+    :param pid: UNIX Process ID as a number, e.g., 1234.
+    :param thread: Python Thread Object.
+    :param nr_buckets: Total number of virtual buckets.
+    :param nr_workers: Number of live workers sharing the buckets.
+    :param lease_duration: Number of seconds after which a lease which was not renewed can be stolen.
+    :param release_surplus: If False, the buckets above the fair share are renewed instead of released. Used
+    while the thread is still working on its buckets, so that no other worker takes over one of them meanwhile.
+    :param session: The database session in use.
+
+    :returns: Sorted list of bucket numbers owned by the thread.
+    """
+    hash_executable = calc_hash(executable + '--partition-buckets')
+    owner = '%s:%s:%s' % (hostname, pid, thread.ident if thread else 0)
+    now = datetime.datetime.utcnow()
+    expired = now - datetime.timedelta(seconds=lease_duration)
+
+    stmt = select(
+        Heartbeat.pid,
+        Heartbeat.payload,
+        Heartbeat.updated_at
+    ).where(
+        and_(Heartbeat.executable == hash_executable,
+             Heartbeat.hostname == PARTITION_LEASE_HOSTNAME,
+             Heartbeat.pid < nr_buckets)
+    )
+    leases = session.execute(stmt).all()
+
+    for bucket in set(range(nr_buckets)).difference(lease.pid for lease in leases):
+        try:
+            with session.begin_nested():
+                Heartbeat(executable=hash_executable,
+                          readable=(executable + ' partition buckets')[:Heartbeat.readable.property.columns[0].type.length],
+                          hostname=PARTITION_LEASE_HOSTNAME,
+                          pid=bucket,
+                          thread_id=0,
+                          payload=None).save(session=session)
+        except IntegrityError:
+            # Another worker created the lease concurrently
+            pass
+
+    owned = sorted(lease.pid for lease in leases if lease.payload == owner)
+    free = [lease.pid for lease in leases if lease.payload != owner and (lease.payload is None or lease.updated_at < expired)]
+    free.extend(set(range(nr_buckets)).difference(lease.pid for lease in leases))
+    fair_share = math.ceil(nr_buckets / max(nr_workers, 1))
+
+    base_stmt = update(
+        Heartbeat
+    ).where(
+        and_(Heartbeat.executable == hash_executable,
+             Heartbeat.hostname == PARTITION_LEASE_HOSTNAME)
+    ).execution_options(
+        synchronize_session=False
+    )
+
+    if release_surplus and len(owned) > fair_share:
+        stmt = base_stmt.where(
+            and_(Heartbeat.pid.in_(owned[fair_share:]),
+                 Heartbeat.payload == owner)
+        ).values({
+            Heartbeat.payload: None
+        })
+        session.execute(stmt)
+        owned = owned[:fair_share]
+
+    if owned:
+        stmt = base_stmt.where(
+            and_(Heartbeat.pid.in_(owned),
+                 Heartbeat.payload == owner)
+        ).values({
+            Heartbeat.updated_at: now
+        })
+        session.execute(stmt)
+
+    random.shuffle(free)
+    for bucket in free[:max(fair_share - len(owned), 0)]:
+        stmt = base_stmt.where(
+            and_(Heartbeat.pid == bucket,
+                 or_(Heartbeat.payload.is_(None),
+                     Heartbeat.updated_at < expired))
+        ).values({
+            Heartbeat.payload: owner,
+            Heartbeat.updated_at: now
+        })
+        session.execute(stmt)
+
+    stmt = select(
+        Heartbeat.pid
+    ).where(
+        and_(Heartbeat.executable == hash_executable,
+             Heartbeat.hostname == PARTITION_LEASE_HOSTNAME,
+             Heartbeat.pid < nr_buckets,
+             Heartbeat.payload == owner)
+    ).order_by(
+        Heartbeat.pid
+    )
+    return list(session.execute(stmt).scalars().all())
+
+
+@transactional_session
+def release_partition_leases(
+    executable: str,
+    hostname: str,
+    pid: int,
+    thread: Optional["Thread"],
+    *,
+    session: "Session"
+) -> None:
+    """
+    Release all partition bucket leases owned by a thread, so that other workers can immediately take them over.
+
+    :param executable: Executable name as a string, e.g., judge-evaluator.
+    :param hostname: Hostname as a string, e.g., rucio-daemon-prod-01.cern.ch.
+    :param pid: UNIX Process ID as a number, e.g., 1234.
+    :param thread: Python Thread Object.
+    :param session: The database session in use.
+    """
+    stmt = update(
+        Heartbeat
+    ).where(
+        and_(Heartbeat.executable == calc_hash(executable + '--partition-buckets'),
+             Heartbeat.hostname == PARTITION_LEASE_HOSTNAME,
+             Heartbeat.payload == '%s:%s:%s' % (hostname, pid, thread.ident if thread else 0))
+    ).values({
+        Heartbeat.payload: None
+    }).execution_options(
+        synchronize_session=False
+    )
+    session.execute(stmt)
+
+
 @transactional_session
 def cardiac_arrest(older_than: Optional[int] = None, *, session: "Session") -> None:
     """
@@ -40,7 +40,7 @@ import rucio.core.did
 import rucio.core.lock
 from rucio.common import exception
 from rucio.common.cache import MemcacheRegion
-from rucio.common.config import config_get, config_get_bool
+from rucio.common.config import config_get, config_get_bool, config_get_int
 from rucio.common.constants import RseAttr, SuspiciousAvailability
 from rucio.common.types import InternalAccount, InternalScope
 from rucio.common.utils import add_url_query, chunks, clean_pfns, str_to_date
@@ -934,40 +934,37 @@ def _get_list_replicas_protocols(
     return protocols
 
 
-def _build_list_replicas_pfn(
-        scope: "InternalScope",
-        name: str,
+def _get_list_replicas_pfn_settings(
         rse_id: str,
         domain: str,
-        protocol: "RSEProtocol",
-        path: str,
+        scheme: str,
         sign_urls: bool,
-        signature_lifetime: Optional[int],
         client_location: Optional[dict[str, Any]],
         logger: "LoggerFunction" = logging.log,
         *,
         session: "Session",
-) -> str:
+) -> dict[str, Any]:
     """
-    Generate the PFN for the given scope/name on the rse.
-    If needed, sign the PFN url
-    If relevant, add the server-side root proxy to the pfn url
+    Look up the RSE attributes and configuration options used by _build_list_replicas_pfn
+    to post-process the PFNs of the given RSE. They don't depend on the file, so they can
+    be computed once per (rse, scheme, domain) and re-used for all files.
     """
-    pfn: str = list(protocol.lfns2pfns(lfns={'scope': scope.external,
-                                             'name': name,
-                                             'path': path}).values())[0]
+    settings = {
+        'sign_service': None,
+        'cache_site': '',
+        'root_proxy_internal': '',
+        'simulate_multirange': None,
+    }
 
     # do we need to sign the URLs?
-    if sign_urls and protocol.attributes['scheme'] == 'https':
-        service = get_rse_attribute(rse_id, RseAttr.SIGN_URL, session=session)
-        if service:
-            pfn = get_signed_url(rse_id=rse_id, service=service, operation='read', url=pfn, lifetime=signature_lifetime)
+    if sign_urls and scheme == 'https':
+        settings['sign_service'] = get_rse_attribute(rse_id, RseAttr.SIGN_URL, session=session)
 
     # server side root proxy handling if location is set.
     # supports root and http destinations
     # cannot be pushed into protocols because we need to lookup rse attributes.
     # ultra-conservative implementation.
-    if domain == 'wan' and protocol.attributes['scheme'] in ['root', 'http', 'https'] and client_location:
+    if domain == 'wan' and scheme in ['root', 'http', 'https'] and client_location:
 
         if 'site' in client_location and client_location['site']:
             replica_site = get_rse_attribute(rse_id, RseAttr.SITE, session=session)
@@ -975,29 +972,12 @@ def _build_list_replicas_pfn(
             # does it match with the client? if not, it's an outgoing connection
             # therefore the internal proxy must be prepended
             if client_location['site'] != replica_site:
-                cache_site = config_get('clientcachemap', client_location['site'], default='', session=session)
-                if cache_site != '':
-                    # print('client', client_location['site'], 'has cache:', cache_site)
-                    # print('filename', name)
-                    selected_prefix = get_multi_cache_prefix(cache_site, name)
-                    if selected_prefix:
-                        pfn = f"root://{selected_prefix}//{pfn.replace('davs://', 'root://')}"
-                else:
-                    # print('site:', client_location['site'], 'has no cache')
-                    # print('lets check if it has defined an internal root proxy ')
-                    root_proxy_internal = config_get('root-proxy-internal',    # section
-                                                     client_location['site'],  # option
-                                                     default='',               # empty string to circumvent exception
-                                                     session=session)
-
-                    if root_proxy_internal:
-                        # TODO: XCache does not seem to grab signed URLs. Doublecheck with XCache devs.
-                        #       For now -> skip prepending XCache for GCS.
-                        if 'storage.googleapis.com' in pfn or 'atlas-google-cloud.cern.ch' in pfn or 'amazonaws.com' in pfn:
-                            pass  # ATLAS HACK
-                        else:
-                            # don't forget to mangle gfal-style davs URL into generic https URL
-                            pfn = f"root://{root_proxy_internal}//{pfn.replace('davs://', 'https://')}"
+                settings['cache_site'] = config_get('clientcachemap', client_location['site'], default='', session=session)
+                if settings['cache_site'] == '':
+                    settings['root_proxy_internal'] = config_get('root-proxy-internal',    # section
+                                                                 client_location['site'],  # option
+                                                                 default='',               # empty string to circumvent exception
+                                                                 session=session)
 
     simulate_multirange = get_rse_attribute(rse_id, RseAttr.SIMULATE_MULTIRANGE, session=session)
 
@@ -1011,7 +991,67 @@ def _build_list_replicas_pfn(
         if simulate_multirange <= 0:
             logger(logging.WARNING, f'Value {simulate_multirange} encountered when retrieving RSE attribute "{RseAttr.SIMULATE_MULTIRANGE}" is <= 0, used default value "1".')
             simulate_multirange = 1
-        pfn += f'&#multirange=false&nconnections={simulate_multirange}'
+        settings['simulate_multirange'] = simulate_multirange
+
+    return settings
+
+
+def _build_list_replicas_pfn(
+        scope: "InternalScope",
+        name: str,
+        rse_id: str,
+        domain: str,
+        protocol: "RSEProtocol",
+        path: str,
+        sign_urls: bool,
+        signature_lifetime: Optional[int],
+        client_location: Optional[dict[str, Any]],
+        logger: "LoggerFunction" = logging.log,
+        pfn_settings: Optional[dict[str, Any]] = None,
+        *,
+        session: "Session",
+) -> str:
+    """
+    Generate the PFN for the given scope/name on the rse.
+    If needed, sign the PFN url
+    If relevant, add the server-side root proxy to the pfn url
+
+    :param pfn_settings: The output of _get_list_replicas_pfn_settings for this rse, scheme and domain.
+                         Computed on the fly if not given.
+    """
+    if pfn_settings is None:
+        pfn_settings = _get_list_replicas_pfn_settings(
+            rse_id=rse_id,
+            domain=domain,
+            scheme=protocol.attributes['scheme'],
+            sign_urls=sign_urls,
+            client_location=client_location,
+            logger=logger,
+            session=session,
+        )
+
+    pfn: str = list(protocol.lfns2pfns(lfns={'scope': scope.external,
+                                             'name': name,
+                                             'path': path}).values())[0]
+
+    if pfn_settings['sign_service']:
+        pfn = get_signed_url(rse_id=rse_id, service=pfn_settings['sign_service'], operation='read', url=pfn, lifetime=signature_lifetime)
+
+    if pfn_settings['cache_site']:
+        selected_prefix = get_multi_cache_prefix(pfn_settings['cache_site'], name)
+        if selected_prefix:
+            pfn = f"root://{selected_prefix}//{pfn.replace('davs://', 'root://')}"
+    elif pfn_settings['root_proxy_internal']:
+        # TODO: XCache does not seem to grab signed URLs. Doublecheck with XCache devs.
+        #       For now -> skip prepending XCache for GCS.
+        if 'storage.googleapis.com' in pfn or 'atlas-google-cloud.cern.ch' in pfn or 'amazonaws.com' in pfn:
+            pass  # ATLAS HACK
+        else:
+            # don't forget to mangle gfal-style davs URL into generic https URL
+            pfn = f"root://{pfn_settings['root_proxy_internal']}//{pfn.replace('davs://', 'https://')}"
+
+    if pfn_settings['simulate_multirange'] is not None:
+        pfn += f'&#multirange=false&nconnections={pfn_settings["simulate_multirange"]}'
 
     return pfn
 
@@ -1044,12 +1084,15 @@ def _list_replicas(
             except Exception:
                 pass  # do not hard fail if site cannot be resolved or is empty
 
-    file, pfns_cache = {}, {}
+    file = {}
     protocols_cache = defaultdict(dict)
+    pfn_settings_cache = {}
 
     for _, replica_group in groupby(replicas, key=lambda x: (x[0], x[1])):  # Group by scope/name
         file = {}
         pfns = {}
+        # Only cache paths for the current file, so that memory doesn't grow with the number of listed files
+        pfns_cache = {}
         for scope, name, archive_scope, archive_name, bytes_, md5, adler32, path, state, rse_id, rse, rse_type, volatile in replica_group:
             if isinstance(archive_scope, str):
                 archive_scope = InternalScope(archive_scope, from_external=False)
@@ -1076,7 +1119,7 @@ def _list_replicas(
 
             # It's the first time we see this RSE, initialize the protocols needed for PFN generation
             protocols = protocols_cache.get(rse_id, {}).get(is_archive)
-            if not protocols:
+            if protocols is None:
                 # select the lan door in autoselect mode, otherwise use the wan door
                 domain = input_domain
                 if domain is None:
@@ -1112,6 +1155,19 @@ def _list_replicas(
                         path = protocol._get_path(t_scope, t_name)
                         pfns_cache['%s:%s:%s' % (protocol.attributes['determinism_type'], t_scope.internal, t_name)] = path
 
+                pfn_settings_key = (rse_id, protocol.attributes['scheme'], domain)
+                pfn_settings = pfn_settings_cache.get(pfn_settings_key)
+                if pfn_settings is None:
+                    pfn_settings = _get_list_replicas_pfn_settings(
+                        rse_id=rse_id,
+                        domain=domain,
+                        scheme=protocol.attributes['scheme'],
+                        sign_urls=sign_urls,
+                        client_location=client_location,
+                        session=session,
+                    )
+                    pfn_settings_cache[pfn_settings_key] = pfn_settings
+
                 try:
                     pfn = _build_list_replicas_pfn(
                         scope=t_scope,
@@ -1123,6 +1179,7 @@ def _list_replicas(
                         sign_urls=sign_urls,
                         signature_lifetime=signature_lifetime,
                         client_location=client_location,
+                        pfn_settings=pfn_settings,
                         session=session,
                     )
 
@@ -1206,6 +1263,7 @@ def list_replicas(
         nrandom: Optional[int] = None,
         updated_after: Optional[datetime] = None,
         by_rse_name: bool = False,
+        yield_per: Optional[int] = None,
         *, session: "Session",
 ) -> 'Iterator':
     """
@@ -1226,6 +1284,10 @@ def list_replicas(
     :param resolve_parents: When set to true, find all parent datasets which contain the replicas.
     :param updated_after: datetime (UTC time), only return replicas updated after this time
     :param by_rse_name: if True, rse information will be returned in dicts indexed by rse name; otherwise: in dicts indexed by rse id
+    :param yield_per: If set, fetch the replica rows in batches of this size, using a server-side cursor where the
+                      dialect supports it, instead of letting the database driver buffer the whole result. Each file
+                      is returned as soon as all its replicas were fetched. Ignored on mysql. Defaults to the
+                      [core] list_replicas_yield_per configuration option.
     :param session: The database session in use.
     """
     # For historical reasons:
@@ -1549,20 +1611,32 @@ def list_replicas(
             # continue with the normal list_replicas flow and fetch all replicas
             pass
 
+    if yield_per is None:
+        yield_per = config_get_int('core', 'list_replicas_yield_per', raise_exception=False, default=0, session=session)
+    if session.bind.dialect.name == 'mysql':  # type: ignore
+        # Unbuffered mysql cursors don't allow running other queries on the connection until all
+        # rows are consumed. Building the pfns requires such queries.
+        yield_per = 0
+
+    def _execute(stmt: "Select") -> "Iterable[Any]":
+        if yield_per:
+            return session.execute(stmt.execution_options(yield_per=yield_per))
+        return session.execute(stmt)
+
     if len(replica_sources) == 1:
         stmt = replica_sources[0].order_by('scope', 'name')
-        replica_tuples = session.execute(stmt)
+        replica_tuples = _execute(stmt)
     else:
         if session.bind.dialect.name == 'mysql':  # type: ignore
             # On mysql, perform both queries independently and merge their result in python.
             # The union query fails with "Can't reopen table"
             replica_tuples = heapq.merge(
-                *[session.execute(stmt.order_by('scope', 'name')) for stmt in replica_sources],
+                *[_execute(stmt.order_by('scope', 'name')) for stmt in replica_sources],
                 key=lambda t: (t[0], t[1]),  # sort by scope, name
             )
         else:
             stmt = union(*replica_sources).order_by('scope', 'name')
-            replica_tuples = session.execute(stmt)
+            replica_tuples = _execute(stmt)
 
     yield from _pick_n_random(
         nrandom,  # type: ignore (nrandom is not None)
@@ -2546,6 +2620,73 @@ def list_and_mark_unlocked_replicas(
 
     :returns: a list of dictionary replica.
     """
+    return _list_and_mark_unlocked_replicas(limit=limit,
+                                            bytes_=bytes_,
+                                            rse_id=rse_id,
+                                            being_deleted_before=datetime.utcnow() - timedelta(seconds=delay_seconds),
+                                            only_delete_obsolete=only_delete_obsolete,
+                                            session=session)
+
+
+def iter_and_mark_unlocked_replicas(
+    limit: int,
+    batch_size: int,
+    bytes_: Optional[int] = None,
+    rse_id: Optional[str] = None,
+    delay_seconds: int = 600,
+    only_delete_obsolete: bool = False,
+) -> "Iterator[list[dict[str, Any]]]":
+    """
+    Same as list_and_mark_unlocked_replicas, but select and mark the replicas by batches of
+    batch_size. Each batch is marked BEING_DELETED in its own transaction, committed before
+    the batch is yielded, so that the caller can start deleting it while the next batch is
+    selected. The replicas marked by a previous batch are never selected again.
+
+    :param limit:                    Total number of replicas returned.
+    :param batch_size:               Maximal number of replicas per batch.
+    :param bytes_:                   The amount of needed bytes.
+    :param rse_id:                   The rse_id.
+    :param delay_seconds:            The delay to query replicas in BEING_DELETED state
+    :param only_delete_obsolete      If set to True, will only return the replicas with EPOCH tombstone
+
+    :returns: an iterator over lists of dictionary replica.
+    """
+    started_at = datetime.utcnow()
+    needed_space = bytes_
+    nb_replicas = 0
+    while nb_replicas < limit:
+        batch = _list_and_mark_unlocked_replicas(limit=min(batch_size, limit - nb_replicas),
+                                                 bytes_=needed_space,
+                                                 rse_id=rse_id,
+                                                 being_deleted_before=min(started_at, datetime.utcnow() - timedelta(seconds=delay_seconds)),
+                                                 only_delete_obsolete=only_delete_obsolete)
+        if not batch:
+            return
+        nb_replicas += len(batch)
+        yield batch
+
+        if len(batch) < batch_size:
+            return
+        if needed_space is not None and not only_delete_obsolete:
+            needed_space -= sum(replica['bytes'] or 0 for replica in batch if replica['state'] != ReplicaState.UNAVAILABLE)
+            if needed_space < 0:
+                return
+
+
+@transactional_session
+def _list_and_mark_unlocked_replicas(
+    limit: int,
+    bytes_: Optional[int],
+    rse_id: Optional[str],
+    being_deleted_before: datetime,
+    only_delete_obsolete: bool,
+    *,
+    session: "Session"
+) -> list[dict[str, Any]]:
+    """
+    List, and mark BEING_DELETED, RSE File replicas with no locks.
+    Replicas already BEING_DELETED are only listed if marked before being_deleted_before.
+    """
 
     needed_space = bytes_
     total_bytes = 0
@@ -2564,7 +2705,7 @@ def list_and_mark_unlocked_replicas(
         models.RSEFileAssociation.tombstone == OBSOLETE if only_delete_obsolete else models.RSEFileAssociation.tombstone < datetime.utcnow(),
     ).where(
         or_(models.RSEFileAssociation.state.in_((ReplicaState.AVAILABLE, ReplicaState.UNAVAILABLE, ReplicaState.BAD)),
-            and_(models.RSEFileAssociation.state == ReplicaState.BEING_DELETED, models.RSEFileAssociation.updated_at < datetime.utcnow() - timedelta(seconds=delay_seconds)))
+            and_(models.RSEFileAssociation.state == ReplicaState.BEING_DELETED, models.RSEFileAssociation.updated_at < being_deleted_before))
     ).outerjoin(
         models.Source,
         and_(models.RSEFileAssociation.scope == models.Source.scope,
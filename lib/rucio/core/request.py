@@ -28,7 +28,7 @@ from typing import TYPE_CHECKING, Any, Optional, Union
 from sqlalchemy import and_, delete, exists, insert, or_, select, update
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import aliased
-from sqlalchemy.sql.expression import asc, false, func, null, true
+from sqlalchemy.sql.expression import asc, bindparam, case, false, func, null, true
 from sqlalchemy.sql.functions import coalesce
 
 from rucio.common.config import config_get_bool, config_get_int
@@ -37,7 +37,7 @@ from rucio.common.exception import InvalidRSEExpression, RequestNotFound, RucioE
 from rucio.common.types import FilterDict, InternalAccount, InternalScope, LoggerFunction, RequestDict
 from rucio.common.utils import chunks, generate_uuid
 from rucio.core.distance import get_distances
-from rucio.core.message import add_message, add_messages
+from rucio.core.message import add_messages
 from rucio.core.monitor import MetricManager
 from rucio.core.rse import RseCollection, RseData, get_rse_attribute, get_rse_name, get_rse_vo
 from rucio.core.rse_expression_parser import parse_expression
@@ -74,6 +74,8 @@ TRANSFER_TIME_BUCKETS = (
 
 
 class RequestSource:
+    __slots__ = ('rse', 'distance', 'ranking', 'file_path', 'scheme', 'url')
+
     def __init__(
             self,
             rse: RseData,
@@ -95,6 +97,8 @@ class RequestSource:
 
 
 class TransferDestination:
+    __slots__ = ('rse', 'scheme')
+
     def __init__(
             self,
             rse: RseData,
@@ -108,6 +112,10 @@ class TransferDestination:
 
 
 class RequestWithSources:
+    __slots__ = ('request_id', 'request_type', 'rule_id', 'scope', 'name', 'md5', 'adler32', 'byte_count', 'activity', '_dict_attributes',
+                 '_db_attributes', 'previous_attempt_id', 'dest_rse', 'account', 'retry_count', 'priority', 'transfertool', 'requested_at',
+                 'sources', 'requested_source')
+
     def __init__(
             self,
             id_: Optional[str],
@@ -183,6 +191,7 @@ class DirectTransfer(metaclass=ABCMeta):
     """
     The configuration for a direct (non-multi-hop) transfer. It can be a multi-source transfer.
     """
+    __slots__ = ('sources', 'rws')
 
     def __init__(self, sources: list[RequestSource], rws: RequestWithSources) -> None:
         self.sources: list[RequestSource] = sources
@@ -655,17 +664,27 @@ def list_and_mark_transfer_requests_and_source_replicas(
             )
         )
 
+    # Each row holds its own copy of the values shared by many requests and sources (scope, account,
+    # activity, ...). Keep a single instance of each of them instead of one per request or source.
+    shared_values = {}
+    share = shared_values.setdefault
+
+    if session.bind.dialect.name != 'mysql':  # type: ignore
+        # Fetch the rows in batches instead of buffering the whole result. Unbuffered mysql cursors don't
+        # allow running other queries on the connection until all rows are consumed, which the loop needs.
+        stmt = stmt.execution_options(yield_per=1000)
+
     requests_by_id = {}
     for (request_id, req_type, rule_id, scope, name, md5, adler32, byte_count, activity, attributes, previous_attempt_id, source_rse_id, dest_rse_id, account, retry_count,
          priority, transfertool, requested_at, replica_rse_id, replica_rse_name, file_path, source_ranking, source_url, distance) in session.execute(stmt):
 
         request = requests_by_id.get(request_id)
         if not request:
-            request = RequestWithSources(id_=request_id, request_type=req_type, rule_id=rule_id, scope=scope, name=name,
-                                         md5=md5, adler32=adler32, byte_count=byte_count, activity=activity, attributes=attributes,
+            request = RequestWithSources(id_=request_id, request_type=req_type, rule_id=rule_id, scope=share(scope, scope), name=name,
+                                         md5=md5, adler32=adler32, byte_count=byte_count, activity=share(activity, activity), attributes=attributes,
                                          previous_attempt_id=previous_attempt_id, dest_rse=rse_collection[dest_rse_id],
-                                         account=account, retry_count=retry_count, priority=priority, transfertool=transfertool,
-                                         requested_at=requested_at)
+                                         account=share(account, account), retry_count=retry_count, priority=priority,
+                                         transfertool=share(transfertool, transfertool), requested_at=requested_at)
             requests_by_id[request_id] = request
             # if STAGEIN and destination RSE is QoS make sure the source is included
             if request.request_type == RequestType.STAGEIN and get_rse_attribute(rse_id=dest_rse_id, key=RseAttr.STAGING_REQUIRED, session=session):
@@ -676,7 +695,7 @@ def list_and_mark_transfer_requests_and_source_replicas(
             replica_rse = rse_collection[replica_rse_id]
             replica_rse.name = replica_rse_name
             source = RequestSource(rse=replica_rse, file_path=file_path,
-                                   ranking=source_ranking, distance=distance, url=source_url)
+                                   ranking=share(source_ranking, source_ranking), distance=share(distance, distance), url=source_url)
             request.sources.append(source)
             if source_rse_id == replica_rse_id:
                 request.requested_source = source
@@ -976,6 +995,81 @@ def update_request(
     return False
 
 
+@transactional_session
+def update_requests(
+        updates: 'Iterable[dict[str, Any]]',
+        *,
+        session: "Session",
+) -> None:
+    """
+    Bulk version of update_request. Missing requests are ignored.
+
+    Each update is a dictionary with the request_id and the update_request arguments to change;
+    None values are not updated. The updates changing the same columns are done by one statement
+    executed with the values of all of them.
+
+    :param updates:  The updates to apply.
+    :param session:  Database session to use.
+    """
+
+    table = models.Request.__table__
+    params_by_columns = defaultdict(list)
+    for update_ in updates:
+        columns = tuple(sorted(key for key, value in update_.items() if key != 'request_id' and value is not None))
+        params = {'b_%s' % column: update_[column] for column in columns}
+        if 'attributes' in columns:
+            params['b_attributes'] = json.dumps(params['b_attributes'])
+        params['b_request_id'] = update_['request_id']
+        params_by_columns[columns].append(params)
+
+    try:
+        updated_at = datetime.datetime.utcnow()
+        for columns, params in params_by_columns.items():
+            update_items: dict[Any, Any] = {
+                table.c.updated_at: updated_at
+            }
+            for column in columns:
+                update_items[table.c[column]] = bindparam('b_%s' % column)
+
+            stmt = update(
+                table
+            ).where(
+                table.c.id == bindparam('b_request_id')
+            ).values(
+                update_items
+            )
+            for params_chunk in chunks(params, 1000):
+                session.execute(stmt, params_chunk)
+    except IntegrityError as error:
+        raise RucioException(error.args)
+
+
+def can_transition_request_state(
+        request_id: str,
+        request: Optional[dict[str, Any]],
+        state: Optional[RequestState] = None,
+        external_id: Optional[str] = None,
+        *,
+        logger: LoggerFunction = logging.log
+) -> bool:
+    """
+    Check if the request, as loaded from the database, can be transitioned to the given state.
+    """
+    if not request:
+        # The request was deleted in the meantime. Ignore it.
+        logger(logging.WARNING, "Request %s not found. Cannot set its state to %s", request_id, state)
+        return False
+
+    if request['state'] == state:
+        logger(logging.INFO, "Request %s state is already %s. Will skip the update.", request_id, state)
+        return False
+
+    if state in [RequestState.FAILED, RequestState.DONE, RequestState.LOST] and (request["external_id"] != external_id):
+        logger(logging.ERROR, "Request %s should not be updated to 'Failed' or 'Done' without external transfer_id" % request_id)
+        return False
+    return True
+
+
 @METRICS.count_it
 @transactional_session
 def transition_request_state(
@@ -1003,17 +1097,7 @@ def transition_request_state(
     if request is None:
         request = get_request(request_id, session=session)
 
-    if not request:
-        # The request was deleted in the meantime. Ignore it.
-        logger(logging.WARNING, "Request %s not found. Cannot set its state to %s", request_id, state)
-        return False
-
-    if request['state'] == state:
-        logger(logging.INFO, "Request %s state is already %s. Will skip the update.", request_id, state)
-        return False
-
-    if state in [RequestState.FAILED, RequestState.DONE, RequestState.LOST] and (request["external_id"] != external_id):
-        logger(logging.ERROR, "Request %s should not be updated to 'Failed' or 'Done' without external transfer_id" % request_id)
+    if not can_transition_request_state(request_id, request, state=state, external_id=external_id, logger=logger):
         return False
 
     update_request(
@@ -1126,6 +1210,34 @@ def get_request(
         raise RucioException(error.args)
 
 
+@read_session
+def get_requests_by_id(
+    request_ids: 'Iterable[str]',
+    *,
+    session: "Session"
+) -> dict[str, dict[str, Any]]:
+    """
+    Retrieve multiple requests by their IDs.
+
+    :param request_ids:  Request-IDs as 32 character hex strings.
+    :param session:      Database session to use.
+    :returns:            Dictionary {request_id: request as a dictionary}. Missing requests are not part of it.
+    """
+
+    requests = {}
+    for chunk in chunks(list(set(request_ids)), 1000):
+        stmt = select(
+            models.Request
+        ).where(
+            models.Request.id.in_(chunk)
+        )
+        for tmp in session.execute(stmt).scalars():
+            tmp = tmp.to_dict()
+            tmp['attributes'] = json.loads(str(tmp['attributes'] or '{}'))
+            requests[tmp['id']] = tmp
+    return requests
+
+
 @METRICS.count_it
 @read_session
 def get_request_by_did(
@@ -1475,6 +1587,14 @@ def get_heavy_load_rses(
 
 
 class TransferStatsManager:
+    """
+    Records the number of done and failed transfers, and the transferred bytes, per link and activity.
+
+    The samples are accumulated in memory by recording intervals of raw_resolution and periodically
+    saved to the database, where they are downsampled to lower resolutions. Each thread calling
+    observe() accumulates the samples in its own shard, without any lock; the shards are merged
+    when the samples of an ended interval are saved.
+    """
 
     @dataclass
     class _StatsRecord:
@@ -1482,8 +1602,24 @@ class TransferStatsManager:
         files_done: int = 0
         bytes_done: int = 0
 
+    class _Shard:
+        """
+        The samples observed by one thread, by start time of their recording interval. Only the
+        owner thread adds samples; the intervals which ended are removed by the saving thread.
+        """
+        __slots__ = ('thread', 'interval_start', 'interval_end', 'samples', 'samples_by_interval')
+
+        def __init__(self):
+            self.thread = threading.current_thread()
+            self.interval_start = self.interval_end = datetime.datetime(year=1970, month=1, day=1)
+            self.samples: "dict[tuple[str, str, str], TransferStatsManager._StatsRecord]" = {}
+            self.samples_by_interval: "dict[datetime.datetime, dict[tuple[str, str, str], TransferStatsManager._StatsRecord]]" = {}
+
     def __init__(self):
+        # Only protects the list of shards
         self.lock = threading.Lock()
+        self._shards: "list[TransferStatsManager._Shard]" = []
+        self._local = threading.local()
 
         retentions = sorted([
             # resolution, retention
@@ -1494,10 +1630,8 @@ class TransferStatsManager:
 
         self.retentions = retentions
         self.raw_resolution, raw_retention = self.retentions[0]
-
-        self.current_timestamp = datetime.datetime(year=1970, month=1, day=1)
-        self.current_samples = defaultdict()
-        self._rollover_samples(rollover_time=datetime.datetime.utcnow())
+        # Leave time to the observations in progress at the end of an interval before saving it
+        self.save_delay = datetime.timedelta(seconds=10)
 
         self.record_stats = True
         self.save_timer = None
@@ -1536,7 +1670,6 @@ class TransferStatsManager:
             submitted_at: Optional[datetime.datetime] = None,
             started_at: Optional[datetime.datetime] = None,
             transferred_at: Optional[datetime.datetime] = None,
-            session: "Optional[Session]" = None
     ) -> None:
         """
         Increment counters for the given (source_rse, destination_rse, activity) as a result of
@@ -1544,44 +1677,50 @@ class TransferStatsManager:
         """
         if not self.record_stats:
             return
+        if state not in (RequestState.DONE, RequestState.FAILED):
+            return
+
+        shard = self._shard()
         now = datetime.datetime.utcnow()
-        with self.lock:
-            save_timestamp, save_samples = now, {}
-            if now >= self.current_timestamp + self.raw_resolution:
-                save_timestamp, save_samples = self._rollover_samples(now)
-
-            if state in (RequestState.DONE, RequestState.FAILED):
-                record = self.current_samples[dst_rse_id, src_rse_id, activity]
-                if state == RequestState.DONE:
-                    record.files_done += 1
-                    record.bytes_done += file_size
-
-                    if submitted_at is not None and started_at is not None:
-                        wait_time = (started_at - submitted_at).total_seconds()
-                        METRICS.timer(name='wait_time', buckets=TRANSFER_TIME_BUCKETS).observe(wait_time)
-                        if transferred_at is not None:
-                            transfer_time = (transferred_at - started_at).total_seconds()
-                            METRICS.timer(name='transfer_time', buckets=TRANSFER_TIME_BUCKETS).observe(transfer_time)
-                else:
-                    record.files_failed += 1
-        if save_samples:
-            self._save_samples(timestamp=save_timestamp, samples=save_samples, session=session)
+        if not shard.interval_start <= now < shard.interval_end:
+            _, shard.interval_start = next(self.slice_time(self.raw_resolution, start_time=now + self.raw_resolution))
+            shard.interval_end = shard.interval_start + self.raw_resolution
+            shard.samples = shard.samples_by_interval.setdefault(shard.interval_start, {})
+
+        record = shard.samples.get((dst_rse_id, src_rse_id, activity))
+        if record is None:
+            record = shard.samples[dst_rse_id, src_rse_id, activity] = self._StatsRecord()
+        if state == RequestState.DONE:
+            record.files_done += 1
+            record.bytes_done += file_size
+
+            if submitted_at is not None and started_at is not None:
+                wait_time = (started_at - submitted_at).total_seconds()
+                METRICS.timer(name='wait_time', buckets=TRANSFER_TIME_BUCKETS).observe(wait_time)
+                if transferred_at is not None:
+                    transfer_time = (transferred_at - started_at).total_seconds()
+                    METRICS.timer(name='transfer_time', buckets=TRANSFER_TIME_BUCKETS).observe(transfer_time)
+        else:
+            record.files_failed += 1
+
+    def _shard(self) -> "TransferStatsManager._Shard":
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = self._Shard()
+            with self.lock:
+                self._shards.append(shard)
+        return shard
 
     def periodic_save(self) -> None:
         """
-        Save samples to the database if the end of the current recording interval was reached.
-        Opportunistically perform down-sampling.
+        Save to the database the samples of the recording intervals which ended.
         """
         self.save_timer = threading.Timer(self.raw_resolution.total_seconds(), self.periodic_save)
         self.save_timer.start()
 
-        now = datetime.datetime.utcnow()
-        with self.lock:
-            save_timestamp, save_samples = now, {}
-            if now >= self.current_timestamp + self.raw_resolution:
-                save_timestamp, save_samples = self._rollover_samples(now)
-        if save_samples:
-            self._save_samples(timestamp=save_timestamp, samples=save_samples)
+        samples_by_interval = self._collect_samples(ended_before=datetime.datetime.utcnow() - self.save_delay)
+        if samples_by_interval:
+            self._save_samples(samples_by_interval=samples_by_interval)
 
     @transactional_session
     def force_save(self, *, session: "Session") -> None:
@@ -1591,22 +1730,45 @@ class TransferStatsManager:
 
         Only to be used for the final save operation on shutdown.
         """
-        with self.lock:
-            save_timestamp, save_samples = self._rollover_samples(datetime.datetime.utcnow())
-        if save_samples:
-            self._save_samples(timestamp=save_timestamp, samples=save_samples, session=session)
+        samples_by_interval = self._collect_samples()
+        if samples_by_interval:
+            self._save_samples(samples_by_interval=samples_by_interval, session=session)
 
-    def _rollover_samples(self, rollover_time: datetime.datetime) -> "tuple[datetime.datetime, Mapping[tuple[str, str, str], TransferStatsManager._StatsRecord]]":
-        previous_samples = (self.current_timestamp, self.current_samples)
-        self.current_samples = defaultdict(lambda: self._StatsRecord())
-        _, self.current_timestamp = next(self.slice_time(self.raw_resolution, start_time=rollover_time + self.raw_resolution))
-        return previous_samples
+    def _collect_samples(
+            self,
+            ended_before: Optional[datetime.datetime] = None
+    ) -> "dict[datetime.datetime, dict[tuple[str, str, str], TransferStatsManager._StatsRecord]]":
+        """
+        Remove from the shards the samples of the intervals which ended before the given time, or of
+        all intervals if no time is given, and merge them.
+        """
+        with self.lock:
+            shards = list(self._shards)
+
+        samples_by_interval = defaultdict(lambda: defaultdict(self._StatsRecord))
+        for shard in shards:
+            for interval_start in list(shard.samples_by_interval):
+                if ended_before is not None and interval_start + self.raw_resolution > ended_before:
+                    continue
+                shard_samples = shard.samples_by_interval.pop(interval_start, None)
+                if not shard_samples:
+                    continue
+                merged_samples = samples_by_interval[interval_start]
+                for key, record in shard_samples.items():
+                    merged_record = merged_samples[key]
+                    merged_record.files_failed += record.files_failed
+                    merged_record.files_done += record.files_done
+                    merged_record.bytes_done += record.bytes_done
+
+        # Forget the shards of the threads which ended
+        with self.lock:
+            self._shards = [shard for shard in self._shards if shard.thread.is_alive() or shard.samples_by_interval]
+        return samples_by_interval
 
     @transactional_session
     def _save_samples(
             self,
-            timestamp: "datetime.datetime",
-            samples: "Mapping[tuple[str, str, str], TransferStatsManager._StatsRecord]",
+            samples_by_interval: "Mapping[datetime.datetime, Mapping[tuple[str, str, str], TransferStatsManager._StatsRecord]]",
             *,
             session: "Session"
     ) -> None:
@@ -1614,17 +1776,18 @@ class TransferStatsManager:
         Commit the provided samples to the database.
         """
         rows_to_insert = []
-        for (dst_rse_id, src_rse_id, activity), record in samples.items():
-            rows_to_insert.append({
-                models.TransferStats.timestamp.name: timestamp,
-                models.TransferStats.resolution.name: self.raw_resolution.total_seconds(),
-                models.TransferStats.src_rse_id.name: src_rse_id,
-                models.TransferStats.dest_rse_id.name: dst_rse_id,
-                models.TransferStats.activity.name: activity,
-                models.TransferStats.files_failed.name: record.files_failed,
-                models.TransferStats.files_done.name: record.files_done,
-                models.TransferStats.bytes_done.name: record.bytes_done,
-            })
+        for timestamp, samples in samples_by_interval.items():
+            for (dst_rse_id, src_rse_id, activity), record in samples.items():
+                rows_to_insert.append({
+                    models.TransferStats.timestamp.name: timestamp,
+                    models.TransferStats.resolution.name: self.raw_resolution.total_seconds(),
+                    models.TransferStats.src_rse_id.name: src_rse_id,
+                    models.TransferStats.dest_rse_id.name: dst_rse_id,
+                    models.TransferStats.activity.name: activity,
+                    models.TransferStats.files_failed.name: record.files_failed,
+                    models.TransferStats.files_done.name: record.files_done,
+                    models.TransferStats.bytes_done.name: record.bytes_done,
+                })
         if rows_to_insert:
             stmt = insert(
                 models.TransferStats
@@ -1701,20 +1864,20 @@ class TransferStatsManager:
             else:
                 oldest_time_to_handle = now
 
-            # Create samples at lower resolution from samples at higher resolution
-            for recent_t, older_t in self.slice_time(dst_resolution, start_time=now, end_time=oldest_time_to_handle):
-                additional_fields = {
-                    models.TransferStats.timestamp.name: older_t,
-                    models.TransferStats.resolution.name: dst_resolution.total_seconds(),
-                }
-                src_totals = self._load_totals(resolution=src_resolution, recent_t=recent_t, older_t=older_t, session=session)
-                downsample_stats = [stat | additional_fields for stat in src_totals]
-                if downsample_stats:
-                    session.execute(insert(models.TransferStats), downsample_stats)
-                    if not oldest_available_dst_timestamp or older_t < oldest_available_dst_timestamp:
-                        oldest_available_dst_timestamp = older_t
-                    if not newest_available_dst_timestamp or older_t > newest_available_dst_timestamp:
-                        newest_available_dst_timestamp = older_t
+            # Create samples at lower resolution from samples at higher resolution, for all the intervals at once
+            intervals = list(self.slice_time(dst_resolution, start_time=now, end_time=oldest_time_to_handle))
+            additional_fields = {
+                models.TransferStats.resolution.name: dst_resolution.total_seconds(),
+            }
+            src_totals = self._load_totals_by_interval(resolution=src_resolution, intervals=intervals, session=session) if intervals else []
+            downsample_stats = [stat | additional_fields for stat in src_totals]
+            if downsample_stats:
+                session.execute(insert(models.TransferStats), downsample_stats)
+                timestamps = [stat[models.TransferStats.timestamp.name] for stat in downsample_stats]
+                if not oldest_available_dst_timestamp or min(timestamps) < oldest_available_dst_timestamp:
+                    oldest_available_dst_timestamp = min(timestamps)
+                if not newest_available_dst_timestamp or max(timestamps) > newest_available_dst_timestamp:
+                    newest_available_dst_timestamp = max(timestamps)
 
             if oldest_available_dst_timestamp and newest_available_dst_timestamp:
                 db_time_ranges[dst_resolution] = (newest_available_dst_timestamp, oldest_available_dst_timestamp)
@@ -1806,6 +1969,101 @@ class TransferStatsManager:
     ) -> "Iterator[Mapping[str, Union[str, int]]]":
         """
         Load aggregated totals for the given resolution and time interval.
+        """
+        sub_query = self._samples_sub_query(
+            resolution=resolution,
+            recent_t=recent_t,
+            older_t=older_t,
+            dest_rse_id=dest_rse_id,
+            src_rse_id=src_rse_id,
+            activity=activity,
+            by_activity=by_activity,
+        )
+
+        grouping = [
+            sub_query.c.src_rse_id,
+            sub_query.c.dest_rse_id,
+        ]
+        if by_activity:
+            grouping.append(sub_query.c.activity)
+
+        stmt = select(
+            *grouping,
+            func.sum(sub_query.c.files_failed).label(models.TransferStats.files_failed.name),
+            func.sum(sub_query.c.files_done).label(models.TransferStats.files_done.name),
+            func.sum(sub_query.c.bytes_done).label(models.TransferStats.bytes_done.name),
+        ).group_by(
+            *grouping,
+        )
+
+        for row in session.execute(stmt):
+            yield row._asdict()
+
+    @stream_session
+    def _load_totals_by_interval(
+            self,
+            resolution: "datetime.timedelta",
+            intervals: "Sequence[tuple[datetime.datetime, datetime.datetime]]",
+            *,
+            session: "Session"
+    ) -> "Iterator[Mapping[str, Union[str, int, datetime.datetime]]]":
+        """
+        Load the totals for the given resolution aggregated by link, activity and interval, with one query.
+        The intervals are (recent_t, older_t) tuples, as yielded by slice_time; the timestamp of each total
+        is the start (older_t) of its interval.
+        """
+        sub_query = self._samples_sub_query(
+            resolution=resolution,
+            recent_t=max(recent_t for recent_t, _ in intervals),
+            older_t=min(older_t for _, older_t in intervals),
+        )
+
+        # Assign each sample to its interval in a nested query, to group on a plain column
+        interval_query = select(
+            case(
+                *[(and_(sub_query.c.timestamp >= older_t, sub_query.c.timestamp < recent_t), older_t) for recent_t, older_t in intervals],
+                else_=null(),
+            ).label(models.TransferStats.timestamp.name),
+            sub_query.c.src_rse_id,
+            sub_query.c.dest_rse_id,
+            sub_query.c.activity,
+            sub_query.c.files_failed,
+            sub_query.c.files_done,
+            sub_query.c.bytes_done,
+        ).subquery()
+
+        grouping = [
+            interval_query.c.timestamp,
+            interval_query.c.src_rse_id,
+            interval_query.c.dest_rse_id,
+            interval_query.c.activity,
+        ]
+        stmt = select(
+            *grouping,
+            func.sum(interval_query.c.files_failed).label(models.TransferStats.files_failed.name),
+            func.sum(interval_query.c.files_done).label(models.TransferStats.files_done.name),
+            func.sum(interval_query.c.bytes_done).label(models.TransferStats.bytes_done.name),
+        ).where(
+            interval_query.c.timestamp.is_not(null())
+        ).group_by(
+            *grouping,
+        )
+
+        for row in session.execute(stmt):
+            yield row._asdict()
+
+    def _samples_sub_query(
+            self,
+            resolution: "datetime.timedelta",
+            recent_t: "datetime.datetime",
+            older_t: "datetime.datetime",
+            dest_rse_id: Optional[str] = None,
+            src_rse_id: Optional[str] = None,
+            activity: Optional[str] = None,
+            by_activity: bool = True,
+    ) -> "Subquery":
+        """
+        Select the samples of the given resolution and time interval.
 
         Ignore multiple values for the same timestamp at downsample resolutions.
         They are result of concurrent downsample operations (two different
@@ -1859,25 +2117,7 @@ class TransferStatsManager:
             )
 
         sub_query = sub_query.subquery()
-
-        grouping = [
-            sub_query.c.src_rse_id,
-            sub_query.c.dest_rse_id,
-        ]
-        if by_activity:
-            grouping.append(sub_query.c.activity)
-
-        stmt = select(
-            *grouping,
-            func.sum(sub_query.c.files_failed).label(models.TransferStats.files_failed.name),
-            func.sum(sub_query.c.files_done).label(models.TransferStats.files_done.name),
-            func.sum(sub_query.c.bytes_done).label(models.TransferStats.bytes_done.name),
-        ).group_by(
-            *grouping,
-        )
-
-        for row in session.execute(stmt):
-            yield row._asdict()
+        return sub_query
 
     @staticmethod
     def _cleanup(
@@ -2840,20 +3080,64 @@ def add_monitor_message(
     :param session:           The database session to use.
     """
 
+    add_monitor_messages([(new_state, request, additional_fields)], session=session)
+
+
+@read_session
+def add_monitor_messages(
+    monitor_messages: 'Iterable[tuple[RequestState, RequestDict, Mapping[str, Any]]]',
+    *,
+    session: "Session"
+) -> None:
+    """
+    Create the messages for hermes from multiple requests, with one query for the datatype
+    of all their DIDs.
+
+    :param monitor_messages: List of (new_state, request, additional_fields) tuples, as given to add_monitor_message.
+    :param session:          The database session to use.
+    """
+
+    monitor_messages = list(monitor_messages)
+    datatypes = {}
+    dids = list({(request['scope'], request['name']) for _, request, _ in monitor_messages})
+    for dids_chunk in chunks(dids, 100):
+        stmt = select(
+            models.DataIdentifier.scope,
+            models.DataIdentifier.name,
+            models.DataIdentifier.datatype
+        ).where(
+            or_(*[and_(models.DataIdentifier.scope == scope,
+                       models.DataIdentifier.name == name)
+                  for scope, name in dids_chunk])
+        )
+        for scope, name, datatype in session.execute(stmt):
+            datatypes[scope, name] = datatype
+
+    messages = []
+    for new_state, request, additional_fields in monitor_messages:
+        event_type, payload = _monitor_message(new_state, request, additional_fields, datatype=datatypes.get((request['scope'], request['name'])), session=session)
+        messages.append({'event_type': event_type, 'payload': payload})
+    add_messages(messages, session=session)
+
+
+def _monitor_message(
+    new_state: RequestState,
+    request: RequestDict,
+    additional_fields: "Mapping[str, Any]",
+    datatype: Optional[str],
+    *,
+    session: "Session"
+) -> tuple[str, dict[str, Any]]:
+    """
+    Build the event type and payload of the hermes message for a request.
+    """
+
     if request['request_type']:
         transfer_status = '%s-%s' % (request['request_type'].name, new_state.name)
     else:
         transfer_status = 'transfer-%s' % new_state.name
     transfer_status = transfer_status.lower()
 
-    stmt = select(
-        models.DataIdentifier.datatype
-    ).where(
-        and_(models.DataIdentifier.scope == request['scope'],
-             models.DataIdentifier.name == request['name'])
-    )
-    datatype = session.execute(stmt).scalar_one_or_none()
-
     # Start by filling up fields from database request or with defaults.
     message = {'activity': request.get('activity', None),
                'request-id': request['id'],
@@ -2923,7 +3207,7 @@ def add_monitor_message(
         field_value = message[time_field]
         message[time_field] = str(field_value) if field_value else None
 
-    add_message(transfer_status, message, session=session)
+    return transfer_status, message
 
 
 def get_transfer_error(
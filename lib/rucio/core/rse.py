@@ -13,13 +13,18 @@
 # limitations under the License.
 
 import json
+import logging
+import threading
+import time
 from datetime import datetime
 from io import StringIO
 from re import match
+from types import MappingProxyType
 from typing import TYPE_CHECKING, Any, Generic, Literal, Optional, TypeVar, Union, overload
 
 import sqlalchemy
 from dogpile.cache.api import NO_VALUE
+from sqlalchemy import event
 from sqlalchemy.exc import DatabaseError, IntegrityError, OperationalError
 from sqlalchemy.orm import aliased
 from sqlalchemy.orm.exc import FlushError
@@ -28,7 +33,7 @@ from sqlalchemy.sql.expression import and_, delete, desc, false, func, or_, sele
 from rucio.common import exception, types, utils
 from rucio.common.cache import MemcacheRegion
 from rucio.common.checksum import CHECKSUM_KEY, GLOBALLY_SUPPORTED_CHECKSUMS
-from rucio.common.config import get_lfn2pfn_algorithm_default
+from rucio.common.config import config_get_int, get_lfn2pfn_algorithm_default
 from rucio.common.constants import RSE_ALL_SUPPORTED_PROTOCOL_OPERATIONS, RSE_ATTRS_BOOL, RSE_ATTRS_STR, SUPPORTED_SIGN_URL_SERVICES_LITERAL, RseAttr
 from rucio.common.utils import Availability
 from rucio.core.rse_counter import add_counter, get_counter
@@ -38,14 +43,92 @@ from rucio.db.sqla.session import read_session, stream_session, transactional_se
 from rucio.db.sqla.util import temp_table_mngr
 
 if TYPE_CHECKING:
-    from collections.abc import Iterable, Iterator
+    from collections.abc import Iterable, Iterator, Mapping
 
     from sqlalchemy.orm import Session
 
 T = TypeVar('T', bound="RseData")
 
 RSE_SETTINGS = ["continent", "city", "region_code", "country_name", "time_zone", "ISP", "ASN"]
-REGION = MemcacheRegion(expiration_time=900)
+REGION = MemcacheRegion(expiration_time=900, name='rse', local_cache_size=10000)
+# Not using the local cache tier, so that changes made by other processes are seen
+VERSION_REGION = MemcacheRegion(expiration_time=86400)
+
+TOPOLOGY_VERSION_CACHE_KEY = 'rse_topology_version'
+TOPOLOGY_VERSION_BUMP_KEY = 'rse_topology_version_bump'
+TOPOLOGY_VERSION_POLL_INTERVAL = 10
+SNAPSHOT_REFRESH_INTERVAL = 60
+
+
+class _TopologyVersion:
+    """
+    Version of the RSE topology (RSEs and their attributes).
+
+    The version is made of a process-local counter, incremented on every local change,
+    and of a token shared between processes through the cache. The shared token is
+    re-read at most every TOPOLOGY_VERSION_POLL_INTERVAL seconds, so that reading the
+    version is usually just a local lookup.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = 0
+        self._shared = None
+        self._shared_read_at = 0.0
+
+    def get(self) -> tuple[int, Optional[str]]:
+        now = time.monotonic()
+        if now - self._shared_read_at > TOPOLOGY_VERSION_POLL_INTERVAL:
+            shared = VERSION_REGION.get(TOPOLOGY_VERSION_CACHE_KEY)
+            self._shared = None if shared is NO_VALUE else shared
+            self._shared_read_at = now
+        return self._local, self._shared
+
+    def bump(self) -> None:
+        with self._lock:
+            self._local += 1
+            self._shared = utils.generate_uuid()
+            self._shared_read_at = time.monotonic()
+            VERSION_REGION.set(TOPOLOGY_VERSION_CACHE_KEY, self._shared)
+
+
+_TOPOLOGY_VERSION = _TopologyVersion()
+
+
+def get_rse_topology_version() -> tuple[int, Optional[str]]:
+    """
+    Return the current version of the RSE topology.
+
+    The version changes each time an RSE is added, deleted or updated, or when an RSE
+    attribute is added or deleted. It can be used as part of cache keys for values derived
+    from the RSE topology, like the result of RSE expressions.
+
+    Without memcached, the shared part of the version is always None and the changes made
+    by other processes are not seen: values cached with the version must also expire.
+
+    :returns: An opaque, hashable version identifier.
+    """
+    return _TOPOLOGY_VERSION.get()
+
+
+def _bump_rse_topology_version_after_commit(session: "Session") -> None:
+    if session.info.get(TOPOLOGY_VERSION_BUMP_KEY):
+        session.info[TOPOLOGY_VERSION_BUMP_KEY] = False
+        _TOPOLOGY_VERSION.bump()
+
+
+def bump_rse_topology_version(*, session: "Session") -> None:
+    """
+    Invalidate all values derived from the RSE topology, in this process and in all the
+    processes sharing the same cache, once the transaction of the session is committed.
+
+    Bumping the version before the commit would let other threads or processes cache the
+    topology which is about to change under the new version. Several calls during the same
+    transaction result in a single bump. A rolled back bump is kept for the next commit of
+    the session, which only causes a spurious invalidation.
+    """
+    if TOPOLOGY_VERSION_BUMP_KEY not in session.info:
+        event.listen(session, 'after_commit', _bump_rse_topology_version_after_commit)
+    session.info[TOPOLOGY_VERSION_BUMP_KEY] = True
 
 
 class RseData:
@@ -152,6 +235,26 @@ class RseData:
             self._name = get_rse_name(rse_id=self.id, session=session)
         return self
 
+    def fill_from(self, other: "RseData") -> None:
+        """
+        Re-use the fields loaded in another RseData object of the same RSE for all
+        the fields which are not loaded yet in this one.
+        """
+        if self._name is None:
+            self._name = other._name
+        if self._columns is None:
+            self._columns = other._columns
+        if self._attributes is None:
+            self._attributes = other._attributes
+        if self._info is None:
+            self._info = other._info
+        if self._usage is None:
+            self._usage = other._usage
+        if self._limits is None:
+            self._limits = other._limits
+        if self._transfer_limits is None:
+            self._transfer_limits = other._transfer_limits
+
     @staticmethod
     @read_session
     def bulk_load(
@@ -300,10 +403,14 @@ class RseData:
 class RseCollection(Generic[T]):
     """
     Container which keeps track of information loaded from the database for a group of RSEs.
+
+    If use_rse_snapshot is set, data is taken from the process-wide RSE snapshot (see
+    subscribe_rse_snapshot) when available, and only loaded from the database otherwise.
     """
 
-    def __init__(self, rse_ids: Optional['Iterable[str]'] = None, rse_data_cls: type[T] = RseData):
+    def __init__(self, rse_ids: Optional['Iterable[str]'] = None, rse_data_cls: type[T] = RseData, use_rse_snapshot: bool = False):
         self._rse_data_cls = rse_data_cls
+        self.use_rse_snapshot = use_rse_snapshot
         self.rse_id_to_data_map: dict[str, T] = {}
         if rse_ids is not None:
             for rse_id in rse_ids:
@@ -347,8 +454,15 @@ class RseCollection(Generic[T]):
             *,
             session: "Session",
     ):
+        rse_id_to_data = {rse_id: self.get_or_create(rse_id) for rse_id in rse_ids} if rse_ids else self.rse_id_to_data_map
+        snapshot = get_rse_snapshot() if self.use_rse_snapshot and not include_deleted else None
+        if snapshot is not None:
+            for rse_id, rse_data in rse_id_to_data.items():
+                snapshot_data = snapshot.get(rse_id)
+                if snapshot_data is not None:
+                    rse_data.fill_from(snapshot_data)
         RseData.bulk_load(
-            rse_id_to_data={rse_id: self.get_or_create(rse_id) for rse_id in rse_ids} if rse_ids else self.rse_id_to_data_map,
+            rse_id_to_data=rse_id_to_data,
             load_name=load_name,
             load_columns=load_columns,
             load_attributes=load_attributes,
@@ -360,6 +474,138 @@ class RseCollection(Generic[T]):
         )
 
 
+class RseSnapshot:
+    """
+    Read-only view of the RSEs, with their name, columns, attributes, info, usage
+    and limits loaded, as seen at a given point in time.
+
+    Snapshots are never modified once published: the RseData objects they hold
+    are shared between threads and must be treated as read-only by the callers.
+    """
+
+    def __init__(self, rse_id_to_data: "dict[str, RseData]", created_at: float) -> None:
+        self.rse_id_to_data_map: "Mapping[str, RseData]" = MappingProxyType(rse_id_to_data)
+        self.created_at = created_at
+
+    def __contains__(self, item):
+        if isinstance(item, RseData):
+            return item.id in self.rse_id_to_data_map
+        if isinstance(item, str):
+            return item in self.rse_id_to_data_map
+        return False
+
+    def __iter__(self) -> "Iterator[RseData]":
+        return iter(self.rse_id_to_data_map.values())
+
+    def __len__(self) -> int:
+        return len(self.rse_id_to_data_map)
+
+    def get(self, rse_id: str) -> "Optional[RseData]":
+        return self.rse_id_to_data_map.get(rse_id)
+
+
+@transactional_session
+def _load_rse_snapshot(*, session: "Session") -> RseSnapshot:
+    """
+    Load all the non-deleted RSEs from the database into a new snapshot.
+    """
+    created_at = time.monotonic()
+    stmt = select(
+        models.RSE.id
+    ).where(
+        models.RSE.deleted == false()
+    )
+    rse_collection = RseCollection(rse_ids=(str(rse_id) for rse_id in session.execute(stmt).scalars()))
+    rse_collection.ensure_loaded(load_name=True, load_columns=True, load_attributes=True, load_info=True,
+                                 load_usage=True, load_limits=True, session=session)
+    return RseSnapshot(rse_collection.rse_id_to_data_map, created_at=created_at)
+
+
+class _RseSnapshotService:
+    """
+    Keeps an up-to-date RseSnapshot for all the threads of the process.
+
+    A single background thread re-loads all RSEs every SNAPSHOT_REFRESH_INTERVAL
+    seconds (configurable via [rse] snapshot_refresh_interval) and atomically swaps
+    the published snapshot, so readers never take a lock. The thread only runs while
+    there is at least one subscriber.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = 0
+        self._snapshot: Optional[RseSnapshot] = None
+        self._stop_event: Optional[threading.Event] = None
+
+    def get(self) -> Optional[RseSnapshot]:
+        return self._snapshot
+
+    def refresh(self, stop_event: threading.Event) -> None:
+        """
+        Load a new snapshot without holding the lock, then publish it unless
+        the subscription it was loaded for was released in the meantime.
+        """
+        try:
+            snapshot = _load_rse_snapshot()
+        except Exception:
+            logging.warning('Failed to refresh the RSE snapshot', exc_info=True)
+            return
+        with self._lock:
+            if stop_event is self._stop_event:
+                self._snapshot = snapshot
+
+    def subscribe(self) -> None:
+        with self._lock:
+            self._subscribers += 1
+            if self._subscribers > 1:
+                return
+            stop_event = self._stop_event = threading.Event()
+        # Load the first snapshot synchronously, so that subscribers can use it right away
+        self.refresh(stop_event)
+        thread = threading.Thread(target=self._run, args=(stop_event,), name='rse-snapshot', daemon=True)
+        thread.start()
+
+    def unsubscribe(self) -> None:
+        with self._lock:
+            self._subscribers -= 1
+            if self._subscribers > 0:
+                return
+            self._subscribers = 0
+            if self._stop_event is not None:
+                self._stop_event.set()
+                self._stop_event = None
+            self._snapshot = None
+
+    def _run(self, stop_event: threading.Event) -> None:
+        while not stop_event.wait(config_get_int('rse', 'snapshot_refresh_interval', raise_exception=False, default=SNAPSHOT_REFRESH_INTERVAL)):
+            self.refresh(stop_event)
+
+
+_RSE_SNAPSHOT_SERVICE = _RseSnapshotService()
+
+
+def subscribe_rse_snapshot() -> None:
+    """
+    Start maintaining a process-wide RSE snapshot, if not done already.
+    Each call must be paired with a call to unsubscribe_rse_snapshot.
+    """
+    _RSE_SNAPSHOT_SERVICE.subscribe()
+
+
+def unsubscribe_rse_snapshot() -> None:
+    """
+    Release a subscription taken with subscribe_rse_snapshot. The snapshot is
+    dropped and its background refresh stopped when the last subscriber leaves.
+    """
+    _RSE_SNAPSHOT_SERVICE.unsubscribe()
+
+
+def get_rse_snapshot() -> Optional[RseSnapshot]:
+    """
+    Return the latest process-wide RSE snapshot, or None if nobody subscribed to it.
+    """
+    return _RSE_SNAPSHOT_SERVICE.get()
+
+
 @stream_session
 def _group_query_result_by_rse_id(stmt, *, session: "Session") -> 'Iterator[tuple[str, list[Any]]]':
     """
@@ -496,6 +742,7 @@ def del_rse(rse_id, *, session: "Session"):
         del_rse_attribute(rse_id=rse_id, key=rse_name, session=session)
     except exception.RSEAttributeNotFound:
         pass
+    bump_rse_topology_version(session=session)
 
 
 @transactional_session
@@ -770,6 +1017,8 @@ def add_rse_attribute(rse_id, key, value, *, session: "Session"):
     except IntegrityError:
         rse = get_rse_name(rse_id=rse_id, session=session)
         raise exception.Duplicate(f"RSE attribute '{key}-{value}' for RSE '{rse}' already exists!")
+    REGION.delete_multi([f'rse_attributes_{rse_id}_{key}', f'rse_attributes_{rse_id}'])
+    bump_rse_topology_version(session=session)
     return True
 
 
@@ -795,6 +1044,8 @@ def del_rse_attribute(rse_id, key, *, session: "Session"):
     except sqlalchemy.orm.exc.NoResultFound:
         raise exception.RSEAttributeNotFound('RSE attribute \'%s\' cannot be found' % key)
     rse_attr.delete(session=session)
+    REGION.delete_multi([f'rse_attributes_{rse_id}_{key}', f'rse_attributes_{rse_id}'])
+    bump_rse_topology_version(session=session)
     return True
 
 
@@ -1707,6 +1958,7 @@ def update_rse(rse_id: str, parameters: dict[str, Any], *, session: "Session"):
     if 'rse' in param:
         add_rse_attribute(rse_id=rse_id, key=parameters['name'], value=True, session=session)
         del_rse_attribute(rse_id=rse_id, key=old_rse_name, session=session)
+    bump_rse_topology_version(session=session)
 
 
 @read_session
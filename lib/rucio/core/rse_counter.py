@@ -17,8 +17,10 @@ from sqlalchemy import and_, delete, select
 from sqlalchemy.exc import NoResultFound
 
 from rucio.common.exception import CounterNotFound
+from rucio.common.utils import chunks
 from rucio.db.sqla import filter_thread_work, models
 from rucio.db.sqla.session import read_session, transactional_session
+from rucio.db.sqla.util import counter_delta_accumulator, flush_counter_deltas
 
 if TYPE_CHECKING:
     from sqlalchemy.orm import Session
@@ -40,14 +42,14 @@ def add_counter(rse_id, *, session: "Session"):
 def increase(rse_id, files, bytes_, *, session: "Session"):
     """
     Increments the specified counter by the specified amount.
+    The increments of a transaction are merged into a single row per RSE on commit.
 
     :param rse_id:  The id of the RSE.
     :param files:   The number of added files.
     :param bytes_:   The number of added bytes.
     :param session: The database session in use.
     """
-    models.UpdatedRSECounter(rse_id=rse_id, files=files, bytes=bytes_).\
-        save(session=session)
+    counter_delta_accumulator(session, models.UpdatedRSECounter, ('rse_id',)).add((rse_id,), files, bytes_)
 
 
 @transactional_session
@@ -124,6 +126,7 @@ def get_updated_rse_counters(total_workers, worker_number, *, session: "Session"
     :param session:            Database session in use.
     :returns:                  List of rse_ids whose rse_counters need to be updated.
     """
+    flush_counter_deltas(session, models.UpdatedRSECounter)
     stmt = select(
         models.UpdatedRSECounter.rse_id
     ).distinct(
@@ -134,20 +137,27 @@ def get_updated_rse_counters(total_workers, worker_number, *, session: "Session"
 
 
 @transactional_session
-def update_rse_counter(rse_id, *, session: "Session"):
+def update_rse_counter(rse_id, *, limit=None, session: "Session"):
     """
     Read the updated_rse_counters and update the rse_counter.
 
     :param rse_id:   The rse_id to update.
+    :param limit:    The maximum number of updated_rse_counters to apply, all of them if None.
     :param session:  Database session in use.
+    :returns:        The number of updated_rse_counters applied.
     """
+    flush_counter_deltas(session, models.UpdatedRSECounter)
 
     stmt = select(
-        models.UpdatedRSECounter
+        models.UpdatedRSECounter.id,
+        models.UpdatedRSECounter.files,
+        models.UpdatedRSECounter.bytes
     ).where(
         models.UpdatedRSECounter.rse_id == rse_id
     )
-    updated_rse_counters = session.execute(stmt).scalars().all()
+    if limit:
+        stmt = stmt.limit(limit)
+    updated_rse_counters = session.execute(stmt).all()
     sum_bytes = sum([updated_rse_counter.bytes for updated_rse_counter in updated_rse_counters])
     sum_files = sum([updated_rse_counter.files for updated_rse_counter in updated_rse_counters])
 
@@ -167,8 +177,16 @@ def update_rse_counter(rse_id, *, session: "Session"):
                         files=sum_files,
                         source='rucio').save(session=session)
 
-    for update in updated_rse_counters:
-        update.delete(flush=False, session=session)
+    for ids in chunks([updated_rse_counter.id for updated_rse_counter in updated_rse_counters], 1000):
+        stmt = delete(
+            models.UpdatedRSECounter
+        ).where(
+            models.UpdatedRSECounter.id.in_(ids)
+        ).execution_options(
+            synchronize_session=False
+        )
+        session.execute(stmt)
+    return len(updated_rse_counters)
 
 
 @transactional_session
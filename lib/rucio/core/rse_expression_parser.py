@@ -14,14 +14,18 @@
 
 import abc
 import re
+import threading
+import time
+from collections import OrderedDict
 from hashlib import sha256
-from typing import TYPE_CHECKING, Any
+from typing import TYPE_CHECKING, Any, Optional
 
 from dogpile.cache.api import NoValue
 
 from rucio.common.cache import MemcacheRegion
+from rucio.common.config import config_get_int
 from rucio.common.exception import InvalidRSEExpression, RSEWriteBlocked
-from rucio.core.rse import get_rse_attribute, get_rses_with_attribute, list_rses
+from rucio.core.rse import get_rse_attribute, get_rse_topology_version, get_rses_with_attribute, list_rses
 from rucio.db.sqla.session import transactional_session
 
 if TYPE_CHECKING:
@@ -37,7 +41,134 @@ COMPLEMENT = r'(\\%s)' % (PRIMITIVE)
 
 PATTERN = r'^%s(%s|%s|%s)*' % (PRIMITIVE, UNION, INTERSECTION, COMPLEMENT)
 
-REGION = MemcacheRegion(expiration_time=600)
+EXPRESSION_CACHE_EXPIRATION = 600
+REGION = MemcacheRegion(expiration_time=EXPRESSION_CACHE_EXPIRATION)
+COMPILED_CACHE_SIZE = config_get_int('core', 'rse_expression_cache_size', raise_exception=False, default=10000, check_config_table=False)
+
+
+class _RSEBitIndex:
+    """
+    Assigns a stable bit position to every RSE id seen by the parser, so that
+    sets of RSEs can be represented as integer bitsets.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bits: dict[str, int] = {}
+
+    def bit(self, rse_id: str) -> int:
+        bit = self._bits.get(rse_id)
+        if bit is None:
+            with self._lock:
+                bit = self._bits.setdefault(rse_id, len(self._bits))
+        return bit
+
+
+_RSE_BIT_INDEX = _RSEBitIndex()
+
+
+class _CompiledExpression:
+    """
+    Parsed RSE expression together with its resolution for one version of the RSE topology.
+    The resolved RSEs are stored as a bitset, with secondary bitsets used to apply the
+    VO and availability filters without iterating over the RSE dictionaries.
+    """
+    __slots__ = ('ast', 'version', 'loaded_at', 'rse_bits', 'rses', 'vo_bits', 'write_bits', 'filtered')
+
+    def __init__(self, ast: "BaseExpressionElement"):
+        self.ast = ast
+        self.version = None
+        self.loaded_at = 0.0
+        self.rse_bits = 0
+        self.rses: dict[int, dict[str, Any]] = {}
+        self.vo_bits: dict[Optional[str], int] = {}
+        self.write_bits = 0
+        self.filtered: dict[tuple[Optional[str], bool, bool], list[dict[str, Any]]] = {}
+
+    def load(self, rses: list[dict[str, Any]], version) -> None:
+        rse_bits = write_bits = 0
+        rses_by_bit = {}
+        vo_bits = {}
+        for rse in rses:
+            mask = 1 << _RSE_BIT_INDEX.bit(rse['id'])
+            rses_by_bit[mask] = rse
+            rse_bits |= mask
+            vo_bits[rse.get('vo')] = vo_bits.get(rse.get('vo'), 0) | mask
+            if rse.get('availability_write'):
+                write_bits |= mask
+        self.rse_bits, self.rses, self.vo_bits, self.write_bits = rse_bits, rses_by_bit, vo_bits, write_bits
+        self.filtered = {}
+        self.version = version
+        self.loaded_at = time.time()
+
+    def is_valid(self, version) -> bool:
+        # The expiration bounds the staleness when the version does not reflect the changes of
+        # the other processes (e.g. without memcached), like the cache in REGION
+        return (self.version == version
+                and time.time() - self.loaded_at < EXPRESSION_CACHE_EXPIRATION
+                and not REGION.region_invalidator.is_invalidated(self.loaded_at))
+
+    def _materialize(self, bits: int) -> list[dict[str, Any]]:
+        result = []
+        while bits:
+            mask = bits & -bits
+            result.append(self.rses[mask])
+            bits ^= mask
+        return result
+
+    def evaluate(self, filter_: Optional[dict[str, Any]]) -> list[dict[str, Any]]:
+        vo = None
+        other_filters = False
+        if filter_:
+            vo = filter_.get('vo') or None
+            other_filters = any(key != 'vo' for key in filter_) if vo else True
+        write_only = bool(other_filters and filter_.get('availability_write', False))
+        filter_key = (vo, other_filters, write_only)
+
+        result = self.filtered.get(filter_key)
+        if result is None:
+            bits = self.rse_bits
+            if vo:
+                bits &= self.vo_bits.get(vo, 0)
+            if not bits:
+                raise InvalidRSEExpression('RSE Expression resulted in an empty set.')
+            if other_filters:
+                bits = bits & self.write_bits if write_only else 0
+                if not bits:
+                    raise RSEWriteBlocked('RSE excluded; not available for writing.')
+            result = self._materialize(bits)
+            self.filtered[filter_key] = result
+        return [rse.copy() for rse in result]
+
+
+class _CompiledExpressionCache:
+    """
+    Bounded, process-local LRU cache of compiled RSE expressions.
+    """
+    def __init__(self, max_size: int):
+        self._lock = threading.Lock()
+        self._max_size = max_size
+        self._entries: OrderedDict[str, _CompiledExpression] = OrderedDict()
+
+    def get(self, expression: str) -> Optional[_CompiledExpression]:
+        with self._lock:
+            compiled = self._entries.get(expression)
+            if compiled is not None:
+                self._entries.move_to_end(expression)
+            return compiled
+
+    def set(self, expression: str, compiled: _CompiledExpression) -> None:
+        with self._lock:
+            self._entries[expression] = compiled
+            self._entries.move_to_end(expression)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+COMPILED_CACHE = _CompiledExpressionCache(max_size=COMPILED_CACHE_SIZE)
 
 
 @transactional_session
@@ -45,69 +176,70 @@ def parse_expression(expression, filter_=None, *, session: "Session"):
     """
     Parse a RSE expression and return the list of RSE dictionaries.
 
+    Parsed expressions and their resolution are kept in a process-local cache, which is
+    invalidated each time the RSE topology version changes (see :py:func:`rucio.core.rse.get_rse_topology_version`)
+    or when REGION is invalidated. Like the REGION entries, they expire after EXPRESSION_CACHE_EXPIRATION seconds.
+
     :param expression:    RSE expression, e.g: 'CERN|BNL'.
     :param filter_:       Availability filter (dictionary) used for the RSEs. e.g.: {'availability_write': True}
     :param session:       Database session in use.
     :returns:             A list of rse dictionaries.
     :raises:              InvalidRSEExpression, RSENotFound, RSEWriteBlocked
     """
-    result = REGION.get(sha256(expression.encode()).hexdigest())
-    if type(result) is NoValue:
-        # Evaluate the correctness of the parentheses
-        parantheses_open_count = 0
-        parantheses_close_count = 0
-        for char in expression:
-            if (char == '('):
-                parantheses_open_count += 1
-            elif (char == ')'):
-                parantheses_close_count += 1
-            if (parantheses_close_count > parantheses_open_count):
-                raise InvalidRSEExpression('Problem with parentheses.')
-        if (parantheses_open_count != parantheses_close_count):
-            raise InvalidRSEExpression('Problem with parentheses.')
+    version = get_rse_topology_version()
+    compiled = COMPILED_CACHE.get(expression)
+    if compiled is not None and compiled.is_valid(version):
+        return compiled.evaluate(filter_)
 
-        # Check the expression pattern
-        match = re.match(PATTERN, expression)
-        if match is None:
-            raise InvalidRSEExpression('Expression does not comply to RSE Expression syntax')
-        else:
-            if match.group() != expression:
-                raise InvalidRSEExpression('Expression does not comply to RSE Expression syntax')
-        result_tuple = __resolve_term_expression(expression)[0].resolve_elements(session=session)
+    # The cached compiled expression can be evaluated by other threads: never modify it, replace it
+    compiled = _CompiledExpression(__compile_expression(expression) if compiled is None else compiled.ast)
+
+    cache_key = '%s_%s' % (sha256(expression.encode()).hexdigest(), version[1])
+    result = REGION.get(cache_key)
+    if type(result) is NoValue:
+        result_tuple = compiled.ast.resolve_elements(session=session)
         # result_tuple = ([rse_ids], {rse_id: {rse_info}})
         result = []
         for rse in list(result_tuple[0]):
             result.append(result_tuple[1][rse])
-        REGION.set(sha256(expression.encode()).hexdigest(), result)
-
-    # Filter for VO
-    vo_result = []
-    if filter_ and filter_.get('vo'):
-        filter_ = filter_.copy()  # Make a copy so we can pop('vo') without affecting the object `filter` outside this function
-        vo = filter_.pop('vo')
-        for rse in result:
-            if rse.get('vo') == vo:
-                vo_result.append(rse)
-    else:
-        vo_result = result
-
-    if not vo_result:
-        raise InvalidRSEExpression('RSE Expression resulted in an empty set.')
-
-    # Filter
-    final_result = []
-    if filter_:
-        for rse in vo_result:
-            if filter_.get('availability_write', False):
-                if rse.get('availability_write'):
-                    final_result.append(rse)
-        if not final_result:
-            raise RSEWriteBlocked('RSE excluded; not available for writing.')
-    else:
-        final_result = vo_result
+        REGION.set(cache_key, result)
+
+    compiled.load(result, version)
+    COMPILED_CACHE.set(expression, compiled)
 
     # final_result = [{rse-info}]
-    return final_result
+    return compiled.evaluate(filter_)
+
+
+def __compile_expression(expression):
+    """
+    Validate a RSE expression and return its BaseExpressionElement tree.
+
+    :param expression:  String of the RSE expression.
+    :returns:           BaseExpressionElement
+    :raises:            InvalidRSEExpression
+    """
+    # Evaluate the correctness of the parentheses
+    parantheses_open_count = 0
+    parantheses_close_count = 0
+    for char in expression:
+        if (char == '('):
+            parantheses_open_count += 1
+        elif (char == ')'):
+            parantheses_close_count += 1
+        if (parantheses_close_count > parantheses_open_count):
+            raise InvalidRSEExpression('Problem with parentheses.')
+    if (parantheses_open_count != parantheses_close_count):
+        raise InvalidRSEExpression('Problem with parentheses.')
+
+    # Check the expression pattern
+    match = re.match(PATTERN, expression)
+    if match is None:
+        raise InvalidRSEExpression('Expression does not comply to RSE Expression syntax')
+    else:
+        if match.group() != expression:
+            raise InvalidRSEExpression('Expression does not comply to RSE Expression syntax')
+    return __resolve_term_expression(expression)[0]
 
 
 def __resolve_term_expression(expression):
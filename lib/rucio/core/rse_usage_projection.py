@@ -0,0 +1,304 @@
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Process-local projection of the space used on the RSEs.
+
+The projection is loaded for all the RSEs at once, with a fixed number of queries, and is
+kept up to date between two loads with the space freed by the deletions done in the process.
+Readers never hit the database.
+"""
+
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import TYPE_CHECKING, Optional
+
+from sqlalchemy import false, func, select
+
+from rucio.common.config import config_get_int
+from rucio.common.constants import RseAttr
+from rucio.db.sqla import models
+from rucio.db.sqla.session import read_session
+
+if TYPE_CHECKING:
+    from sqlalchemy.orm import Session
+
+    from rucio.common.types import LoggerFunction
+
+# Seconds between two loads of the usage of all the RSEs
+USAGE_REFRESH_INTERVAL = 60
+
+# Needed free space reported for RSEs on which the deletion is greedy
+GREEDY_NEEDED_FREE_SPACE = 1000000000000
+
+
+class RseUsageEstimate:
+    """
+    Space used on an RSE, as loaded from the database, plus the local adjustments since then.
+    """
+    __slots__ = ('rse_id', 'usage', 'pending_bytes', 'min_free_space', 'source_for_total_space', 'source_for_used_space', 'adjustments')
+
+    def __init__(
+            self,
+            rse_id: str,
+            usage: dict[str, tuple[int, int, Optional[datetime]]],
+            pending_bytes: int,
+            min_free_space: int,
+            source_for_total_space: str,
+            source_for_used_space: str,
+    ):
+        self.rse_id = rse_id
+        # {source: (total, used, updated_at)}
+        self.usage = usage
+        # Counter deltas not yet applied to the 'rucio' usage by abacus
+        self.pending_bytes = pending_bytes
+        self.min_free_space = min_free_space
+        self.source_for_total_space = source_for_total_space
+        self.source_for_used_space = source_for_used_space
+        # [(recorded_at, bytes)] changes of the used space observed by this process
+        self.adjustments: list[tuple[datetime, int]] = []
+
+    def used(self, loaded_at: datetime) -> Optional[int]:
+        """
+        Projected used space according to the source_for_used_space, or None if this source is unknown.
+        """
+        usage = self.usage.get(self.source_for_used_space)
+        if usage is None:
+            return None
+        _, used, updated_at = usage
+        if self.source_for_used_space == 'rucio':
+            # Once loaded, the counter deltas already account for the adjustments recorded before the load
+            used += self.pending_bytes
+            since = loaded_at
+        else:
+            since = updated_at or loaded_at
+        return used + sum(bytes_ for recorded_at, bytes_ in self.adjustments if recorded_at >= since)
+
+    def total(self) -> Optional[int]:
+        usage = self.usage.get(self.source_for_total_space)
+        if usage is None:
+            return None
+        return usage[0]
+
+
+class RseUsageProjection:
+    """
+    Keeps, for all the RSEs, an estimate of their used space and of the space which has to be
+    freed to respect their MinFreeSpace limit.
+
+    The usage, MinFreeSpace limits and source_for_{total,used}_space attributes of all RSEs are
+    re-loaded at most every refresh_interval seconds, together with the counter deltas not yet
+    applied by abacus. In-between, the callers report the bytes they removed from, or added to,
+    an RSE with record_usage_delta; these adjustments are only kept as long as the loaded usage
+    does not account for them.
+
+    The projection is shared between threads. Use get_rse_usage_projection to share it between
+    the daemons of a process.
+    """
+
+    def __init__(self, refresh_interval: float = USAGE_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._estimates: dict[str, RseUsageEstimate] = {}
+        self._loaded_at: Optional[datetime] = None
+        self._loaded_monotonic: Optional[float] = None
+
+    def refresh(self, force: bool = False) -> None:
+        """
+        Re-load the usage of all the RSEs if it is older than the refresh interval.
+        """
+        if not force and self._loaded_monotonic is not None and time.monotonic() - self._loaded_monotonic < self.refresh_interval:
+            return
+        # Only one thread loads the usage; the others keep using the previous one meanwhile
+        if not self._refresh_lock.acquire(blocking=self._loaded_monotonic is None):
+            return
+        try:
+            loaded_at = datetime.utcnow()
+            loaded_monotonic = time.monotonic()
+            estimates = _load_usage_estimates()
+            with self._lock:
+                for rse_id, estimate in estimates.items():
+                    previous = self._estimates.get(rse_id)
+                    if previous is None:
+                        continue
+                    # Drop the adjustments already accounted for by the loaded usage
+                    _, _, updated_at = estimate.usage.get(estimate.source_for_used_space, (0, 0, None))
+                    since = loaded_at if estimate.source_for_used_space == 'rucio' else (updated_at or loaded_at)
+                    estimate.adjustments = [(recorded_at, bytes_) for recorded_at, bytes_ in previous.adjustments if recorded_at >= since]
+                self._estimates = estimates
+                self._loaded_at = loaded_at
+                self._loaded_monotonic = loaded_monotonic
+        finally:
+            self._refresh_lock.release()
+
+    def record_usage_delta(self, rse_id: str, bytes_: int) -> None:
+        """
+        Report that bytes_ were added to the RSE, or removed from it if negative.
+        """
+        with self._lock:
+            estimate = self._estimates.get(rse_id)
+            if estimate is not None:
+                estimate.adjustments.append((datetime.utcnow(), bytes_))
+
+    def record_deletion(self, rse_id: str, bytes_: int) -> None:
+        """
+        Report that bytes_ were deleted from the RSE.
+        """
+        self.record_usage_delta(rse_id, -bytes_)
+
+    def used_space(self, rse_id: str) -> Optional[int]:
+        """
+        Returns the projected used space of the RSE, according to its source_for_used_space.
+        """
+        self.refresh()
+        with self._lock:
+            estimate = self._estimates.get(rse_id)
+            if estimate is None or self._loaded_at is None:
+                return None
+            return estimate.used(self._loaded_at)
+
+    def free_space(self, rse_id: str) -> Optional[int]:
+        """
+        Returns the projected free space of the RSE, or None if its usage is unknown.
+        """
+        self.refresh()
+        with self._lock:
+            estimate = self._estimates.get(rse_id)
+            if estimate is None or self._loaded_at is None:
+                return None
+            total, used = estimate.total(), estimate.used(self._loaded_at)
+            if total is None or used is None:
+                return None
+            return total - used
+
+    def needed_free_space(self, rse_id: str, rse_name: Optional[str] = None, greedy: bool = False, logger: "LoggerFunction" = logging.log) -> tuple[int, bool]:
+        """
+        Returns the space to free on the RSE to respect its MinFreeSpace limit.
+
+        :param rse_id:   The RSE id.
+        :param rse_name: The RSE name, for logging.
+        :param greedy:   If True, needed_free_space will be set to 1TB regardless of actual rse usage.
+        :param logger:   Optional decorated logger that can be passed from the calling daemons or servers.
+
+        :returns: needed_free_space, only_delete_obsolete.
+        """
+        if greedy:
+            return GREEDY_NEEDED_FREE_SPACE, False
+
+        self.refresh()
+        rse_name = rse_name or rse_id
+        with self._lock:
+            estimate = self._estimates.get(rse_id)
+            if estimate is None or self._loaded_at is None:
+                logger(logging.WARNING, 'RSE: %s, no usage known. Will only delete obsolete', rse_name)
+                return 0, True
+            total, used = estimate.total(), estimate.used(self._loaded_at)
+        if total is None:
+            logger(logging.WARNING, 'RSE: %s, \'%s\' requested for source_for_total_space but cannot be found. Will only delete obsolete',
+                   rse_name, estimate.source_for_total_space)
+            return 0, True
+        if used is None:
+            logger(logging.WARNING, 'RSE: %s, \'%s\' requested for source_for_used_space but cannot be found. Will only delete obsolete',
+                   rse_name, estimate.source_for_used_space)
+            return 0, True
+
+        needed_free_space = 0
+        if estimate.min_free_space:
+            needed_free_space = estimate.min_free_space - (total - used)
+        if needed_free_space > 0:
+            return needed_free_space, False
+        return 0, True
+
+
+@read_session
+def _load_usage_estimates(*, session: "Session") -> dict[str, RseUsageEstimate]:
+    """
+    Load the usage estimates of all the non-deleted RSEs.
+    """
+    stmt = select(
+        models.RSEUsage.rse_id,
+        models.RSEUsage.source,
+        models.RSEUsage.used,
+        models.RSEUsage.free,
+        models.RSEUsage.updated_at,
+    ).join(
+        models.RSE,
+        models.RSE.id == models.RSEUsage.rse_id
+    ).where(
+        models.RSE.deleted == false()
+    )
+    usage_by_rse = defaultdict(dict)
+    for rse_id, source, used, free, updated_at in session.execute(stmt):
+        usage_by_rse[str(rse_id)][source] = ((free or 0) + (used or 0), used or 0, updated_at)
+
+    stmt = select(
+        models.UpdatedRSECounter.rse_id,
+        func.sum(models.UpdatedRSECounter.bytes)
+    ).group_by(
+        models.UpdatedRSECounter.rse_id
+    )
+    pending_bytes_by_rse = {str(rse_id): int(bytes_ or 0) for rse_id, bytes_ in session.execute(stmt)}
+
+    stmt = select(
+        models.RSELimit.rse_id,
+        models.RSELimit.value
+    ).where(
+        models.RSELimit.name == 'MinFreeSpace'
+    )
+    min_free_space_by_rse = {str(rse_id): value for rse_id, value in session.execute(stmt)}
+
+    stmt = select(
+        models.RSEAttrAssociation.rse_id,
+        models.RSEAttrAssociation.key,
+        models.RSEAttrAssociation.value
+    ).where(
+        models.RSEAttrAssociation.key.in_([RseAttr.SOURCE_FOR_TOTAL_SPACE, RseAttr.SOURCE_FOR_USED_SPACE])
+    )
+    sources_by_rse = defaultdict(dict)
+    for rse_id, key, value in session.execute(stmt):
+        sources_by_rse[str(rse_id)][key] = value
+
+    estimates = {}
+    for rse_id, usage in usage_by_rse.items():
+        sources = sources_by_rse.get(rse_id, {})
+        estimates[rse_id] = RseUsageEstimate(
+            rse_id=rse_id,
+            usage=usage,
+            pending_bytes=pending_bytes_by_rse.get(rse_id, 0),
+            min_free_space=min_free_space_by_rse.get(rse_id) or 0,
+            source_for_total_space=sources.get(RseAttr.SOURCE_FOR_TOTAL_SPACE, 'storage'),
+            source_for_used_space=sources.get(RseAttr.SOURCE_FOR_USED_SPACE, 'storage'),
+        )
+    return estimates
+
+
+_RSE_USAGE_PROJECTION_LOCK = threading.Lock()
+_RSE_USAGE_PROJECTION: Optional[RseUsageProjection] = None
+
+
+def get_rse_usage_projection() -> RseUsageProjection:
+    """
+    Returns the RSE usage projection shared by all the threads of the process.
+    Its refresh interval is read from [rse] usage_refresh_interval when it is created.
+    """
+    global _RSE_USAGE_PROJECTION
+    with _RSE_USAGE_PROJECTION_LOCK:
+        if _RSE_USAGE_PROJECTION is None:
+            refresh_interval = config_get_int('rse', 'usage_refresh_interval', raise_exception=False, default=USAGE_REFRESH_INTERVAL)
+            _RSE_USAGE_PROJECTION = RseUsageProjection(refresh_interval=refresh_interval)
+        return _RSE_USAGE_PROJECTION
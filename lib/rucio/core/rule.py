@@ -2056,6 +2056,7 @@ def re_evaluate_did(
     name: str,
     rule_evaluation_action: DIDReEvaluation,
     *,
+    updated_did_ids: Optional["Sequence[str]"] = None,
     session: "Session"
 ) -> None:
     """
@@ -2064,6 +2065,7 @@ def re_evaluate_did(
     :param scope:                   The scope of the did to be re-evaluated.
     :param name:                    The name of the did to be re-evaluated.
     :param rule_evaluation_action:  The Rule evaluation action.
+    :param updated_did_ids:         Ids of the updated_dids covered by this evaluation, deleted in the same transaction.
     :param session:                 The database session in use.
     :raises:                        DataIdentifierNotFound
     """
@@ -2105,6 +2107,9 @@ def re_evaluate_did(
                                         name=name,
                                         did_type=did.did_type).save(session=session)
 
+    if updated_did_ids:
+        delete_updated_dids(ids=updated_did_ids, session=session)
+
 
 @read_session
 def get_updated_dids(
@@ -2363,6 +2368,29 @@ def delete_updated_did(
     session.execute(stmt)
 
 
+@transactional_session
+def delete_updated_dids(
+    ids: "Sequence[str]",
+    *,
+    session: "Session"
+) -> None:
+    """
+    Delete updated_dids by id.
+
+    :param ids:                     Ids of the rows to delete.
+    :param session:                 The database session in use.
+    """
+    for chunk in chunks(ids, 1000):
+        stmt = delete(
+            models.UpdatedDID
+        ).where(
+            models.UpdatedDID.id.in_(chunk)
+        ).execution_options(
+            synchronize_session=False
+        )
+        session.execute(stmt)
+
+
 @transactional_session
 def update_rules_for_lost_replica(
     scope: InternalScope,
@@ -3425,12 +3453,13 @@ def __evaluate_did_detach(
             nowait=True
         )
         rules = list(session.execute(stmt).scalars().all())
-        for did in parent_dids:
+        for parent_chunk in chunks(parent_dids, 100):
             stmt = select(
                 models.ReplicationRule
             ).where(
-                and_(models.ReplicationRule.scope == did['scope'],
-                     models.ReplicationRule.name == did['name'])
+                or_(*[and_(models.ReplicationRule.scope == did['scope'],
+                           models.ReplicationRule.name == did['name'])
+                      for did in parent_chunk])
             ).with_for_update(
                 nowait=True
             )
@@ -11,19 +11,21 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import concurrent.futures
 import copy
 import datetime
 import itertools
 import logging
+import multiprocessing
 import threading
 import weakref
 from decimal import Decimal
 from typing import TYPE_CHECKING, Any, Generic, Optional, TypeVar, Union, cast
 
-from sqlalchemy import and_, select
+from sqlalchemy import and_, func, select
 
 from rucio.common.config import config_get, config_get_int
-from rucio.common.exception import InvalidRSEExpression, NoDistance, RSEProtocolNotSupported
+from rucio.common.exception import InvalidRSEExpression, NoDistance, RSENotFound, RSEProtocolNotSupported
 from rucio.common.utils import PriorityQueue
 from rucio.core.rse import RseCollection, RseData
 from rucio.core.rse_expression_parser import parse_expression
@@ -37,7 +39,7 @@ TE = TypeVar("TE", bound="Edge")
 ExpiringObjectCacheNewObject = TypeVar("ExpiringObjectCacheNewObject")
 
 if TYPE_CHECKING:
-    from collections.abc import Callable, Iterable, Iterator
+    from collections.abc import Callable, Iterable, Iterator, Sequence
     from typing import Protocol
 
     from sqlalchemy.orm import Session
@@ -60,6 +62,9 @@ if TYPE_CHECKING:
 
 DEFAULT_HOP_PENALTY = 10
 INF = float('inf')
+# Safety margin, in seconds, subtracted from the time of the last refresh when searching for changed rows.
+# Covers the clock skew between the hosts which set updated_at and the one refreshing the topology.
+REFRESH_CLOCK_SKEW = 60
 
 
 class Node(RseData):
@@ -127,8 +132,11 @@ class Topology(RseCollection, Generic[TN, TE]):
             ignore_availability: bool = False,
             node_cls: type[TN] = Node,
             edge_cls: type[TE] = Edge,
+            use_routing_table: bool = False,
+            use_rse_snapshot: bool = False,
+            routing_table_workers: "Optional[RoutingTableWorkers]" = None,
     ) -> None:
-        super().__init__(rse_ids=rse_ids, rse_data_cls=node_cls)
+        super().__init__(rse_ids=rse_ids, rse_data_cls=node_cls, use_rse_snapshot=use_rse_snapshot)
         self._edge_cls = edge_cls
         self._edges: dict[tuple[TN, TN], TE] = {}
         self._edges_loaded = False
@@ -136,6 +144,21 @@ class Topology(RseCollection, Generic[TN, TE]):
         self._hop_penalty = DEFAULT_HOP_PENALTY
         self.ignore_availability = ignore_availability
 
+        # Shortest path trees towards each destination, indexed by (dst_node, operation_src, operation_dest, domain, limit_dest_schemes)
+        self.use_routing_table = use_routing_table
+        self._routing_table: dict[tuple[TN, str, str, str, tuple[str, ...]], tuple[dict[TN, list[dict[str, Any]]], set[TN]]] = {}
+        self._routing_table_generation = 0
+        # Worker processes used to precompute the shortest path trees of several destinations
+        self.routing_table_workers = routing_table_workers
+        # Routing graphs, with the scheme compatibility of all edges, indexed by (operation_src, operation_dest, domain)
+        self._routing_graphs: dict[tuple[str, str, str], _RoutingGraph] = {}
+        # Read-only copy of the inbound edges of all nodes and of the multihop nodes, walked by dijkstra_spf
+        self._spf_graph: Optional[tuple[dict[TN, tuple[tuple[TN, TE], ...]], frozenset[TN]]] = None
+
+        # Number of attributes and protocols per RSE, used to detect deletions on incremental refresh
+        self._attribute_counts: Optional[dict[str, int]] = None
+        self._protocol_counts: Optional[dict[str, int]] = None
+
         self._lock = threading.RLock()
 
     @transactional_session
@@ -177,6 +200,7 @@ class Topology(RseCollection, Generic[TN, TE]):
                     self.rse_id_to_data_map[rse_id] = rse_data = self._rse_data_cls(rse_id)
                     # A new node added. Edges which were already loaded are probably incomplete now.
                     self._edges_loaded = False
+                    self.invalidate_routing_table()
         return rse_data
 
     @property
@@ -194,12 +218,24 @@ class Topology(RseCollection, Generic[TN, TE]):
                 edge = self._edges.get((src_node, dst_node))
                 if not edge:
                     self._edges[src_node, dst_node] = edge = self._edge_cls(src_node, dst_node)
+                    self.invalidate_routing_table()
         return edge
 
     def delete_edge(self, src_node: TN, dst_node: TN) -> None:
         with self._lock:
-            edge = self._edges[src_node, dst_node]
+            edge = self._edges.pop((src_node, dst_node))
             edge.remove_from_nodes()
+            self.invalidate_routing_table()
+
+    def invalidate_routing_table(self) -> None:
+        """
+        Drop all precomputed shortest paths. Must be called each time the graph changes.
+        """
+        with self._lock:
+            self._routing_table_generation += 1
+            self._routing_table = {}
+            self._routing_graphs = {}
+            self._spf_graph = None
 
     @property
     def multihop_enabled(self) -> bool:
@@ -224,6 +260,9 @@ class Topology(RseCollection, Generic[TN, TE]):
                 if not multihop_rse_ids:
                     logger(logging.WARNING, 'multihop_rse_expression is not empty, but returned no RSEs')
 
+        previous_multihop_nodes = set(self._multihop_nodes)
+        previous_hop_penalty = self._hop_penalty
+
         for node in self._multihop_nodes:
             node.used_for_multihop = False
 
@@ -236,6 +275,9 @@ class Topology(RseCollection, Generic[TN, TE]):
                 self._multihop_nodes.add(node)
 
         self._hop_penalty = config_get_int('transfers', 'hop_penalty', default=DEFAULT_HOP_PENALTY, session=session)
+
+        if self._multihop_nodes != previous_multihop_nodes or self._hop_penalty != previous_hop_penalty:
+            self.invalidate_routing_table()
         return self
 
     @read_session
@@ -279,8 +321,145 @@ class Topology(RseCollection, Generic[TN, TE]):
             for src_node, dst_node in to_remove:
                 self.delete_edge(src_node, dst_node)
 
+        self.invalidate_routing_table()
         self._edges_loaded = True
 
+    @read_session
+    def refresh(self, since: Optional[datetime.datetime] = None, *, session: "Session") -> bool:
+        """
+        Incrementally update, in place, the nodes and edges which changed in the database since the given time:
+        RSE columns, attributes, protocols and distances. Without `since`, only record the current state
+        of the database, against which the next refresh will detect deletions.
+
+        The changes are first read from the database, then applied all at once while holding the lock of
+        the topology. The shortest path searches walk a read-only copy of the graph, taken under the same
+        lock, so they never see a half-updated graph and neither blocks the other.
+
+        :param since: the time of the previous refresh.
+        :returns: False if the topology cannot be patched (an RSE was deleted) and must be rebuilt.
+        """
+        def _counts_by_rse(model):
+            stmt = select(
+                model.rse_id,
+                func.count(),
+            ).group_by(
+                model.rse_id
+            )
+            return {str(rse_id): count for rse_id, count in session.execute(stmt)}
+
+        with self._lock:
+            nodes = dict(self.rse_id_to_data_map)
+            edges_loaded = self._edges_loaded
+
+        attribute_counts = _counts_by_rse(models.RSEAttrAssociation)
+        protocol_counts = _counts_by_rse(models.RSEProtocol)
+        previous_attribute_counts, self._attribute_counts = self._attribute_counts, attribute_counts
+        previous_protocol_counts, self._protocol_counts = self._protocol_counts, protocol_counts
+        if since is None or previous_attribute_counts is None or previous_protocol_counts is None:
+            return True
+
+        since = since - datetime.timedelta(seconds=REFRESH_CLOCK_SKEW)
+
+        changed_rse_ids = set()
+        for counts, previous_counts in ((attribute_counts, previous_attribute_counts), (protocol_counts, previous_protocol_counts)):
+            changed_rse_ids.update(rse_id for rse_id in set(counts).union(previous_counts) if counts.get(rse_id) != previous_counts.get(rse_id))
+        for model in (models.RSEAttrAssociation, models.RSEProtocol):
+            stmt = select(
+                model.rse_id
+            ).distinct(
+            ).where(
+                model.updated_at >= since
+            )
+            changed_rse_ids.update(str(rse_id) for rse_id in session.execute(stmt).scalars())
+        stmt = select(
+            models.RSE.id,
+            models.RSE.deleted,
+        ).where(
+            models.RSE.updated_at >= since
+        )
+        for rse_id, deleted in session.execute(stmt):
+            rse_id = str(rse_id)
+            if deleted and rse_id in nodes:
+                return False
+            changed_rse_ids.add(rse_id)
+
+        # Load the new data in separate objects, swapped into the nodes below
+        to_load: dict[tuple[bool, ...], dict[str, RseData]] = {}
+        for rse_id in changed_rse_ids:
+            node = nodes.get(rse_id)
+            if node is None:
+                continue
+            loaded = (node._name is not None, node._columns is not None, node._attributes is not None,
+                      node._info is not None, node._usage is not None, node._limits is not None)
+            if any(loaded):
+                to_load.setdefault(loaded, {})[rse_id] = RseData(rse_id)
+        for (load_name, load_columns, load_attributes, load_info, load_usage, load_limits), rse_data_by_id in to_load.items():
+            try:
+                RseData.bulk_load(rse_data_by_id, load_name=load_name, load_columns=load_columns, load_attributes=load_attributes,
+                                  load_info=load_info, load_usage=load_usage, load_limits=load_limits, session=session)
+            except RSENotFound:
+                return False
+
+        distances = []
+        nb_distances = None
+        if edges_loaded:
+            stmt = select(
+                models.Distance.src_rse_id,
+                models.Distance.dest_rse_id,
+                models.Distance.distance,
+            ).where(
+                and_(
+                    models.Distance.updated_at >= since,
+                    models.Distance.src_rse_id.in_(nodes.keys()),
+                    models.Distance.dest_rse_id.in_(nodes.keys()),
+                )
+            )
+            distances = session.execute(stmt).all()
+
+            stmt = select(
+                func.count()
+            ).select_from(
+                models.Distance
+            ).where(
+                and_(
+                    models.Distance.distance.is_not(None),
+                    models.Distance.src_rse_id.in_(nodes.keys()),
+                    models.Distance.dest_rse_id.in_(nodes.keys()),
+                )
+            )
+            nb_distances = session.execute(stmt).scalar()
+
+        with self._lock:
+            for rse_data_by_id in to_load.values():
+                for rse_id, rse_data in rse_data_by_id.items():
+                    node = nodes[rse_id]
+                    node._name = rse_data._name
+                    node._columns = rse_data._columns
+                    node._attributes = rse_data._attributes
+                    node._info = rse_data._info
+                    node._usage = rse_data._usage
+                    node._limits = rse_data._limits
+                    node._transfer_limits = None
+
+            # If nodes were added meanwhile, the edges are already marked to be reloaded
+            if edges_loaded and self._edges_loaded:
+                for src_rse_id, dst_rse_id, distance in distances:
+                    src_node = nodes[str(src_rse_id)]
+                    dst_node = nodes[str(dst_rse_id)]
+                    if distance is None:
+                        if self.edge(src_node, dst_node):
+                            self.delete_edge(src_node, dst_node)
+                        continue
+                    edge = self.get_or_create_edge(src_node, dst_node)
+                    edge.cost = int(distance) if distance >= 0 else 0
+
+                if nb_distances != len(self._edges):
+                    # Some distances were deleted. Reload all edges the next time they are needed.
+                    self._edges_loaded = False
+
+            self.invalidate_routing_table()
+        return True
+
     @read_session
     def search_shortest_paths(
             self,
@@ -295,17 +474,162 @@ class Topology(RseCollection, Generic[TN, TE]):
     ) -> dict[TN, list[dict[str, Any]]]:
         """
         Find the shortest paths from multiple sources towards dest_rse_id.
+
+        If the routing table is enabled, the complete shortest path tree towards dest_rse_id is
+        computed once and then served from memory to all following calls, until the topology changes.
         """
 
-        for rse in itertools.chain(src_nodes, [dst_node], self._multihop_nodes):
-            rse.ensure_loaded(load_attributes=True, load_info=True, session=session)
+        if self.use_routing_table:
+            paths, scheme_missmatch_found = self.shortest_path_tree(dst_node=dst_node, operation_src=operation_src, operation_dest=operation_dest,
+                                                                    domain=domain, limit_dest_schemes=limit_dest_schemes, session=session)
+        else:
+            for rse in itertools.chain(src_nodes, [dst_node], self._multihop_nodes):
+                rse.ensure_loaded(load_attributes=True, load_info=True, session=session)
+            self.ensure_edges_loaded(session=session)
+
+            if self._multihop_nodes:
+                # Filter out island source RSEs
+                nodes_to_find = {node for node in src_nodes if node.out_edges}
+            else:
+                nodes_to_find = set(src_nodes)
+
+            paths, scheme_missmatch_found = self._compute_shortest_paths(dst_node=dst_node, nodes_to_find=nodes_to_find, operation_src=operation_src,
+                                                                         operation_dest=operation_dest, domain=domain, limit_dest_schemes=limit_dest_schemes)
+
+        result = {}
+        for node in src_nodes:
+            path = paths.get(node)
+            if path is not None:
+                result[node] = path
+            elif node in scheme_missmatch_found:
+                result[node] = []
+        return result
+
+    @read_session
+    def shortest_path_tree(
+            self,
+            dst_node: TN,
+            operation_src: str,
+            operation_dest: str,
+            domain: str,
+            limit_dest_schemes: Optional[list[str]] = None,
+            *,
+            session: "Session",
+    ) -> tuple[dict[TN, list[dict[str, Any]]], set[TN]]:
+        """
+        Return the shortest paths from all known nodes towards dst_node, together with the set of
+        nodes for which a scheme mismatch was found. Intermediate hops are restricted to multihop nodes.
+
+        The result is kept in the routing table of this topology and must not be modified.
+        """
+        key = (dst_node, operation_src, operation_dest, domain, tuple(limit_dest_schemes or ()))
+        entry = self._routing_table.get(key)
+        if entry is not None:
+            return entry
+
+        [entry] = self._fill_routing_table(dst_nodes=[dst_node], operation_src=operation_src, operation_dest=operation_dest, domain=domain,
+                                           limit_dest_schemes=limit_dest_schemes, session=session)
+        return entry
+
+    @read_session
+    def precompute_routing_table(
+            self,
+            operation_src: str,
+            operation_dest: str,
+            domain: str,
+            limit_dest_schemes: Optional[list[str]] = None,
+            dst_nodes: "Optional[Iterable[TN]]" = None,
+            *,
+            session: "Session",
+    ) -> None:
+        """
+        Fill the routing table for the given destinations (all known nodes by default), so that
+        following calls to search_shortest_paths are served from memory.
+
+        If the topology was given routing_table_workers, the shortest path trees of the destinations
+        are computed in parallel by these worker processes.
+        """
+        with self._lock:
+            dst_nodes = list(dst_nodes if dst_nodes is not None else self.rse_id_to_data_map.values())
+        limit_key = tuple(limit_dest_schemes or ())
+        dst_nodes = [dst_node for dst_node in dict.fromkeys(dst_nodes)
+                     if (dst_node, operation_src, operation_dest, domain, limit_key) not in self._routing_table]
+        if dst_nodes:
+            self._fill_routing_table(dst_nodes=dst_nodes, operation_src=operation_src, operation_dest=operation_dest, domain=domain,
+                                     limit_dest_schemes=limit_dest_schemes, session=session)
+
+    def _fill_routing_table(
+            self,
+            dst_nodes: "Sequence[TN]",
+            operation_src: str,
+            operation_dest: str,
+            domain: str,
+            limit_dest_schemes: Optional[list[str]],
+            *,
+            session: "Session",
+    ) -> list[tuple[dict[TN, list[dict[str, Any]]], set[TN]]]:
+        """
+        Compute the shortest path trees towards the given destinations and store them in the
+        routing table, unless the topology changed in the meantime.
+        """
+        self.ensure_loaded(load_attributes=True, load_info=True, session=session)
         self.ensure_edges_loaded(session=session)
 
-        if self._multihop_nodes:
-            # Filter out island source RSEs
-            nodes_to_find = {node for node in src_nodes if node.out_edges}
-        else:
-            nodes_to_find = set(src_nodes)
+        generation = self._routing_table_generation
+        graph = self._routing_graph(operation_src, operation_dest, domain)
+        entries = graph.shortest_path_trees(dst_nodes, limit_dest_schemes, workers=self.routing_table_workers)
+        limit_key = tuple(limit_dest_schemes or ())
+        with self._lock:
+            if generation == self._routing_table_generation:
+                for dst_node, entry in zip(dst_nodes, entries):
+                    self._routing_table[dst_node, operation_src, operation_dest, domain, limit_key] = entry
+        return entries
+
+    def _routing_graph(self, operation_src: str, operation_dest: str, domain: str) -> "_RoutingGraph":
+        """
+        Return the routing graph of the current version of the topology for the given operations,
+        building it if needed. All nodes and edges must be loaded.
+        """
+        key = (operation_src, operation_dest, domain)
+        graph = self._routing_graphs.get(key)
+        if graph is None:
+            with self._lock:
+                generation = self._routing_table_generation
+                graph = _RoutingGraph(nodes=list(self.rse_id_to_data_map.values()), multihop_enabled=self.multihop_enabled, hop_penalty=self._hop_penalty,
+                                      operation_src=operation_src, operation_dest=operation_dest, domain=domain)
+                if generation == self._routing_table_generation:
+                    self._routing_graphs[key] = graph
+        return graph
+
+    def _read_only_spf_graph(self) -> tuple[dict[TN, tuple[tuple[TN, TE], ...]], frozenset[TN]]:
+        """
+        Return the inbound edges of all nodes and the multihop nodes of the current version of the
+        topology, copying them if needed. The copy is never modified: a change of the topology replaces it.
+        """
+        graph = self._spf_graph
+        if graph is None:
+            with self._lock:
+                graph = self._spf_graph
+                if graph is None:
+                    self._spf_graph = graph = (
+                        {node: tuple(node.in_edges.items()) for node in self.rse_id_to_data_map.values()},
+                        frozenset(self._multihop_nodes),
+                    )
+        return graph
+
+    def _compute_shortest_paths(
+            self,
+            dst_node: TN,
+            nodes_to_find: Optional[set[TN]],
+            operation_src: str,
+            operation_dest: str,
+            domain: str,
+            limit_dest_schemes: Optional[list[str]],
+    ) -> tuple[dict[TN, list[dict[str, Any]]], set[TN]]:
+        """
+        Run the backwards Dijkstra towards dst_node and build the list of hops for every node
+        reached. If nodes_to_find is None, the whole shortest path tree is built.
+        """
 
         class _NodeStateProvider:
             _hop_penalty = self._hop_penalty
@@ -314,12 +638,9 @@ class Topology(RseCollection, Generic[TN, TE]):
                 self.enabled: bool = True
                 self.cost: _Number = 0
                 if node != dst_node:
-                    try:
-                        self.cost = int(node.attributes.get('hop_penalty', self._hop_penalty))
-                    except ValueError:
-                        self.cost = self._hop_penalty
+                    self.cost = _node_hop_penalty(node, self._hop_penalty)
 
-        scheme_missmatch_found = {}
+        scheme_missmatch_found = set()
 
         class _EdgeStateProvider:
             def __init__(self, edge: TE) -> None:
@@ -332,31 +653,20 @@ class Topology(RseCollection, Generic[TN, TE]):
 
             @property
             def enabled(self) -> bool:
-                try:
-                    matching_scheme = rsemgr.find_matching_scheme(
-                        rse_settings_src=self.edge.src_node.info,
-                        rse_settings_dest=self.edge.dst_node.info,
-                        operation_src=operation_src,
-                        operation_dest=operation_dest,
-                        domain=domain,
-                        scheme=limit_dest_schemes if self.edge.dst_node == dst_node and limit_dest_schemes else None,
-                    )
-                    self.chosen_scheme = {
-                        'source_scheme': matching_scheme[1],
-                        'dest_scheme': matching_scheme[0],
-                        'source_scheme_priority': matching_scheme[3],
-                        'dest_scheme_priority': matching_scheme[2],
-                    }
-                    return True
-                except RSEProtocolNotSupported:
-                    scheme_missmatch_found[self.edge.src_node] = True
+                chosen_scheme = _chosen_scheme(self.edge.src_node, self.edge.dst_node, operation_src, operation_dest, domain,
+                                               scheme=limit_dest_schemes if self.edge.dst_node == dst_node and limit_dest_schemes else None)
+                if chosen_scheme is None:
+                    scheme_missmatch_found.add(self.edge.src_node)
                     return False
+                self.chosen_scheme = chosen_scheme
+                return True
 
         paths = {dst_node: []}
         for node, distance, _, edge_to_next_hop, edge_state in self.dijkstra_spf(dst_node=dst_node,
                                                                                  nodes_to_find=nodes_to_find,
                                                                                  node_state_provider=_NodeStateProvider,
-                                                                                 edge_state_provider=_EdgeStateProvider):
+                                                                                 edge_state_provider=_EdgeStateProvider,
+                                                                                 transit_only_multihop=nodes_to_find is None):
             nh_node = edge_to_next_hop.dst_node
             edge_state = cast(_EdgeStateProvider, edge_state)
             hop = {
@@ -368,19 +678,13 @@ class Topology(RseCollection, Generic[TN, TE]):
             }
             paths[node] = [hop] + paths[nh_node]
 
-            nodes_to_find.discard(node)
-            if not nodes_to_find:
-                # We found the shortest paths to all desired nodes
-                break
+            if nodes_to_find is not None:
+                nodes_to_find.discard(node)
+                if not nodes_to_find:
+                    # We found the shortest paths to all desired nodes
+                    break
 
-        result = {}
-        for node in src_nodes:
-            path = paths.get(node)
-            if path is not None:
-                result[node] = path
-            elif scheme_missmatch_found.get(node):
-                result[node] = []
-        return result
+        return paths, scheme_missmatch_found
 
     def dijkstra_spf(
             self,
@@ -388,16 +692,20 @@ class Topology(RseCollection, Generic[TN, TE]):
             nodes_to_find: Optional[set[TN]] = None,
             node_state_provider: "Callable[[TN], TNState]" = lambda x: x,
             edge_state_provider: "Callable[[TE], TEState]" = lambda x: x,
+            transit_only_multihop: bool = False,
     ) -> "Iterator[tuple[TN, _Number, TNState, TE, TEState]]":
         """
         Does a Backwards Dijkstra's algorithm: start from destination and follow inbound links to other nodes.
         If multihop is disabled, stop after analysing direct connections to dest_rse.
         If the optional nodes_to_find parameter is set, will restrict search only towards these nodes.
         Otherwise, traverse the graph in integrality.
+        If transit_only_multihop is set, only multihop nodes are used as intermediate hops.
 
-        Will yield nodes in order of their distance from the destination.
+        Will yield nodes in order of their distance from the destination. The graph is walked on a read-only
+        copy of the current version of the topology, so it can be refreshed concurrently.
         """
 
+        in_edges, multihop_nodes = self._read_only_spf_graph()
         priority_q = PriorityQueue()
         priority_q[dst_node] = 0
         next_hops: dict[TN, tuple[_Number, TNState, Optional[TE], Optional[TEState]]] =\
@@ -409,12 +717,12 @@ class Topology(RseCollection, Generic[TN, TE]):
             if edge_to_nh is not None and edge_to_nh_state is not None:  # skip dst_node
                 yield node, node_dist, node_state, edge_to_nh, edge_to_nh_state
 
-            if self._multihop_nodes or edge_to_nh is None:
+            if edge_to_nh is None or (multihop_nodes and (node in multihop_nodes or not transit_only_multihop)):
                 # If multihop is disabled, only examine neighbors of dst_node
 
-                for adjacent_node, edge in node.in_edges.items():
+                for adjacent_node, edge in in_edges.get(node, ()):
 
-                    if nodes_to_find is None or adjacent_node in nodes_to_find or adjacent_node.used_for_multihop:
+                    if nodes_to_find is None or adjacent_node in nodes_to_find or adjacent_node in multihop_nodes:
 
                         edge_state = edge_state_provider(edge)
                         new_adjacent_dist = node_dist + node_state.cost + edge_state.cost
@@ -424,32 +732,288 @@ class Topology(RseCollection, Generic[TN, TE]):
                             priority_q[adjacent_node] = new_adjacent_dist
 
 
+def _node_hop_penalty(node: "Node", default: int) -> int:
+    try:
+        return int(node.attributes.get('hop_penalty', default))
+    except ValueError:
+        return default
+
+
+def _chosen_scheme(src_node: "Node", dst_node: "Node", operation_src: str, operation_dest: str, domain: str, scheme: Optional[list[str]] = None) -> Optional[dict[str, Any]]:
+    """
+    Return the schemes to use on an edge, or None if the two nodes have no compatible scheme.
+    """
+    try:
+        matching_scheme = rsemgr.find_matching_scheme(
+            rse_settings_src=src_node.info,
+            rse_settings_dest=dst_node.info,
+            operation_src=operation_src,
+            operation_dest=operation_dest,
+            domain=domain,
+            scheme=scheme,
+        )
+    except RSEProtocolNotSupported:
+        return None
+    return {
+        'source_scheme': matching_scheme[1],
+        'dest_scheme': matching_scheme[0],
+        'source_scheme_priority': matching_scheme[3],
+        'dest_scheme_priority': matching_scheme[2],
+    }
+
+
+class _SpfGraph:
+    """
+    Index-based graph on which the backwards Dijkstra of Topology.dijkstra_spf is run to build
+    complete shortest path trees, with intermediate hops restricted to multihop nodes. It only
+    holds integers and booleans, so that it can be shared with worker processes.
+    """
+
+    def __init__(
+            self,
+            hop_costs: list[_Number],
+            multihop: list[bool],
+            in_edges: list[list[tuple[int, _Number]]],
+            compatible: list[list[bool]],
+            multihop_enabled: bool,
+    ) -> None:
+        self.hop_costs = hop_costs
+        self.multihop = multihop
+        # For each node, the (source node, cost) of its inbound edges
+        self.in_edges = in_edges
+        # For each node, whether a scheme matches on each of its inbound edges
+        self.compatible = compatible
+        self.multihop_enabled = multihop_enabled
+
+    def tree(self, dst: int, dst_compatible: Optional[list[bool]] = None) -> tuple[list[tuple[int, _Number, int, int]], set[int]]:
+        """
+        Compute the shortest path tree towards dst. dst_compatible overrides the scheme
+        compatibility of the inbound edges of dst.
+
+        :returns: the (node, distance, next hop, position of the edge in the inbound edges of the next hop)
+                  of the reached nodes, in order of their distance; and the nodes for which a scheme
+                  mismatch was found.
+        """
+        priority_q = PriorityQueue()
+        priority_q[dst] = 0
+        next_hops: dict[int, tuple[_Number, Optional[int], int]] = {dst: (0, None, -1)}
+        reached = []
+        scheme_missmatch_found = set()
+        while priority_q:
+            node = priority_q.pop()
+            node_dist, next_hop, edge_position = next_hops[node]
+
+            if next_hop is not None:  # skip dst
+                reached.append((node, node_dist, next_hop, edge_position))
+
+            if next_hop is None or (self.multihop_enabled and self.multihop[node]):
+                # If multihop is disabled, only examine neighbors of dst
+                node_cost = 0 if node == dst else self.hop_costs[node]
+                compatible = dst_compatible if node == dst and dst_compatible is not None else self.compatible[node]
+                for position, (adjacent_node, edge_cost) in enumerate(self.in_edges[node]):
+                    new_adjacent_dist = node_dist + node_cost + edge_cost
+                    if new_adjacent_dist < next_hops.get(adjacent_node, (INF, ))[0]:
+                        if compatible[position]:
+                            next_hops[adjacent_node] = new_adjacent_dist, node, position
+                            priority_q[adjacent_node] = new_adjacent_dist
+                        else:
+                            scheme_missmatch_found.add(adjacent_node)
+        return reached, scheme_missmatch_found
+
+
+def _spf_trees(
+        graph: _SpfGraph,
+        dsts: list[int],
+        dst_compatible: list[Optional[list[bool]]],
+) -> list[tuple[list[tuple[int, _Number, int, int]], set[int]]]:
+    return [graph.tree(dst, compatible) for dst, compatible in zip(dsts, dst_compatible)]
+
+
+class RoutingTableWorkers:
+    """
+    Pool of worker processes computing the shortest path trees of the routing tables. It is meant
+    to be created once, when the daemon starts, and shared by all its topologies. The workers are
+    started with forkserver (or spawn) instead of being forked from the multithreaded daemon, and
+    the graph is sent once per worker and per call instead of once per destination.
+    """
+
+    def __init__(self, nb_workers: int) -> None:
+        self.nb_workers = nb_workers
+        start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=nb_workers, mp_context=multiprocessing.get_context(start_method))
+
+    def __enter__(self) -> "Self":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def shortest_path_trees(
+            self,
+            graph: _SpfGraph,
+            dsts: list[int],
+            dst_compatible: list[Optional[list[bool]]],
+    ) -> list[tuple[list[tuple[int, _Number, int, int]], set[int]]]:
+        """
+        Compute the shortest path trees towards each of the destinations, splitting them evenly between the workers.
+        """
+        nb_chunks = min(self.nb_workers, len(dsts))
+        futures = [self._executor.submit(_spf_trees, graph, dsts[i::nb_chunks], dst_compatible[i::nb_chunks]) for i in range(nb_chunks)]
+        chunk_trees = [future.result() for future in futures]
+        trees = [None] * len(dsts)
+        for i, chunk in enumerate(chunk_trees):
+            trees[i::nb_chunks] = chunk
+        return trees  # type: ignore
+
+
+class _RoutingGraph(Generic[TN]):
+    """
+    Immutable copy of a version of the topology, used to build its routing table: the hop
+    penalty of every node and the schemes to use on every edge are computed once for all
+    destinations.
+    """
+
+    def __init__(
+            self,
+            nodes: list[TN],
+            multihop_enabled: bool,
+            hop_penalty: int,
+            operation_src: str,
+            operation_dest: str,
+            domain: str,
+    ) -> None:
+        self.nodes = nodes
+        self.index = {node: i for i, node in enumerate(nodes)}
+        self.operation_src = operation_src
+        self.operation_dest = operation_dest
+        self.domain = domain
+
+        in_edges = []
+        # For each node, the schemes to use on each of its inbound edges, None if they are incompatible
+        self.schemes: list[list[Optional[dict[str, Any]]]] = []
+        for node in nodes:
+            node_in_edges, node_schemes = [], []
+            for adjacent_node, edge in node.in_edges.items():
+                node_in_edges.append((self.index[adjacent_node], edge.cost))
+                node_schemes.append(_chosen_scheme(adjacent_node, node, operation_src, operation_dest, domain))
+            in_edges.append(node_in_edges)
+            self.schemes.append(node_schemes)
+
+        self.spf = _SpfGraph(
+            hop_costs=[_node_hop_penalty(node, hop_penalty) for node in nodes],
+            multihop=[node.used_for_multihop for node in nodes],
+            in_edges=in_edges,
+            compatible=[[chosen is not None for chosen in node_schemes] for node_schemes in self.schemes],
+            multihop_enabled=multihop_enabled,
+        )
+
+    def _dst_schemes(self, dst: int, limit_dest_schemes: Optional[list[str]]) -> Optional[list[Optional[dict[str, Any]]]]:
+        """
+        The schemes to use on the inbound edges of the destination, when they are restricted.
+        """
+        if not limit_dest_schemes:
+            return None
+        dst_node = self.nodes[dst]
+        return [_chosen_scheme(self.nodes[adjacent_node], dst_node, self.operation_src, self.operation_dest, self.domain, scheme=limit_dest_schemes)
+                for adjacent_node, _ in self.spf.in_edges[dst]]
+
+    def _paths(
+            self,
+            dst: int,
+            dst_schemes: Optional[list[Optional[dict[str, Any]]]],
+            reached: list[tuple[int, _Number, int, int]],
+            scheme_missmatch_found: set[int],
+    ) -> tuple[dict[TN, list[dict[str, Any]]], set[TN]]:
+        nodes = self.nodes
+        paths = {nodes[dst]: []}
+        for node, distance, next_hop, edge_position in reached:
+            schemes = dst_schemes if next_hop == dst and dst_schemes is not None else self.schemes[next_hop]
+            hop = {
+                'source_rse': nodes[node],
+                'dest_rse': nodes[next_hop],
+                'hop_distance': self.spf.in_edges[next_hop][edge_position][1],
+                'cumulated_distance': distance,
+                **schemes[edge_position],  # type: ignore
+            }
+            paths[nodes[node]] = [hop] + paths[nodes[next_hop]]
+        return paths, {nodes[node] for node in scheme_missmatch_found}
+
+    def shortest_path_trees(
+            self,
+            dst_nodes: "Sequence[TN]",
+            limit_dest_schemes: Optional[list[str]],
+            workers: Optional[RoutingTableWorkers] = None,
+    ) -> list[tuple[dict[TN, list[dict[str, Any]]], set[TN]]]:
+        """
+        Compute the shortest path trees towards each of the destinations, in the given worker processes if any.
+        """
+        dsts = [self.index[dst_node] for dst_node in dst_nodes]
+        dst_schemes = [self._dst_schemes(dst, limit_dest_schemes) for dst in dsts]
+        dst_compatible = [None if schemes is None else [chosen is not None for chosen in schemes] for schemes in dst_schemes]
+
+        if workers is not None and workers.nb_workers > 1 and len(dsts) > 1:
+            trees = workers.shortest_path_trees(self.spf, dsts, dst_compatible)
+        else:
+            trees = _spf_trees(self.spf, dsts, dst_compatible)
+
+        return [self._paths(dst, schemes, reached, scheme_missmatch_found)
+                for dst, schemes, (reached, scheme_missmatch_found) in zip(dsts, dst_schemes, trees)]
+
+
 class ExpiringObjectCache(Generic[ExpiringObjectCacheNewObject]):
     """
     Thread-safe container which builds and object with the function passed in parameter and
     caches it for the TTL duration.
+
+    If a refresh function is given, the expired object is refreshed in place instead of being rebuilt.
+    The refresh function is called with the object and the time of its previous refresh (None right
+    after the object was built) and must return False if the object must be rebuilt instead.
+    While one thread refreshes the object, the other threads continue using the expired one.
     """
 
     def __init__(
             self,
             ttl: int,
-            new_obj_fnc: "Callable[[], ExpiringObjectCacheNewObject]"
+            new_obj_fnc: "Callable[[], ExpiringObjectCacheNewObject]",
+            refresh_fnc: "Optional[Callable[[ExpiringObjectCacheNewObject, Optional[datetime.datetime]], bool]]" = None,
     ) -> None:
         self._lock = threading.Lock()
         self._object: Optional[ExpiringObjectCacheNewObject] = None
         self._creation_time: Optional[datetime.datetime] = None
         self._new_obj_fnc = new_obj_fnc
+        self._refresh_fnc = refresh_fnc
         self._ttl = ttl
 
+    def _expired(self) -> bool:
+        return not self._object \
+            or not self._creation_time \
+            or datetime.datetime.utcnow() - self._creation_time > datetime.timedelta(seconds=self._ttl)
+
     def get(self, logger: "LoggerFunction" = logging.log) -> ExpiringObjectCacheNewObject:
-        with self._lock:
-            if not self._object \
-                    or not self._creation_time \
-                    or datetime.datetime.utcnow() - self._creation_time > datetime.timedelta(seconds=self._ttl):
-                self._object = self._new_obj_fnc()
-                self._creation_time = datetime.datetime.utcnow()
-                logger(logging.INFO, "Refreshed topology object")
+        if not self._expired():
+            return self._object
+
+        if not self._lock.acquire(blocking=self._object is None):
+            # Another thread is already refreshing the object
+            return self._object
+        try:
+            if self._expired():
+                refresh_time = datetime.datetime.utcnow()
+                if self._object and self._refresh_fnc and self._refresh_fnc(self._object, self._creation_time):
+                    logger(logging.INFO, "Incrementally refreshed topology object")
+                else:
+                    new_object = self._new_obj_fnc()
+                    if self._refresh_fnc:
+                        self._refresh_fnc(new_object, None)
+                    self._object = new_object
+                    logger(logging.INFO, "Refreshed topology object")
+                self._creation_time = refresh_time
             return self._object
+        finally:
+            self._lock.release()
 
 
 @transactional_session
@@ -25,13 +25,13 @@ from typing import TYPE_CHECKING, cast
 from dogpile.cache import make_region
 from dogpile.cache.api import NoValue
 from sqlalchemy import select, update
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import DatabaseError, IntegrityError
 
 from rucio.common import constants
 from rucio.common.config import config_get, config_get_list
 from rucio.common.constants import SUPPORTED_PROTOCOLS, RseAttr
-from rucio.common.exception import InvalidRSEExpression, RequestNotFound, RSEProtocolNotSupported, RucioException, UnsupportedOperation
-from rucio.common.utils import construct_non_deterministic_pfn
+from rucio.common.exception import DatabaseException, InvalidRSEExpression, RequestNotFound, RSEProtocolNotSupported, RucioException, UnsupportedOperation
+from rucio.common.utils import chunks, construct_non_deterministic_pfn
 from rucio.core import did
 from rucio.core import message as message_core
 from rucio.core import request as request_core
@@ -106,6 +106,8 @@ class DirectTransferImplementation(DirectTransfer):
     The class wraps the legacy dict-based transfer definition to maintain compatibility with existing code
     during the migration.
     """
+    __slots__ = ('destination', 'protocol_factory', 'operation_src', 'operation_dest', '_dest_url', '_source_urls')
+
     def __init__(self, source: RequestSource, destination: TransferDestination, rws: RequestWithSources,
                  protocol_factory: ProtocolFactory, operation_src: str, operation_dest: str):
         super().__init__(sources=[source], rws=rws)
@@ -250,6 +252,8 @@ class StageinTransferImplementation(DirectTransferImplementation):
         - must be from TAPE to non-TAPE RSE
         - can only have one source
     """
+    __slots__ = ()
+
     def __init__(
             self,
             source: RequestSource,
@@ -501,6 +505,7 @@ def update_transfer_state(
         tt_status_report: 'TransferStatusReport',
         stats_manager: request_core.TransferStatsManager,
         *,
+        request: "Optional[dict[str, Any]]" = None,
         session: "Session",
         logger=logging.log
 ):
@@ -509,6 +514,7 @@ def update_transfer_state(
     after the response by the external transfertool.
 
     :param tt_status_report:      The transfertool status update, retrieved via request.query_request().
+    :param request:               The request, if it was already loaded within this session.
     :param session:               The database session to use.
     :param logger:                Optional decorated logger that can be passed from the calling daemons or servers.
     :returns:                     The number of updated requests
@@ -524,7 +530,8 @@ def update_transfer_state(
         else:
             logger(logging.INFO, 'UPDATING REQUEST %s FOR %s with changes: %s' % (str(request_id), tt_status_report, fields_to_update))
 
-            request = request_core.get_request(request_id, session=session)
+            if request is None:
+                request = request_core.get_request(request_id, session=session)
             updated = transition_request_state(request_id, request=request, session=session, **fields_to_update)
 
             if not updated:
@@ -545,7 +552,6 @@ def update_transfer_state(
                     submitted_at=request.get('submitted_at', None),
                     started_at=fields_to_update.get('started_at', None),
                     transferred_at=fields_to_update.get('transferred_at', None),
-                    session=session,
                 )
             request_core.add_monitor_message(
                 new_state=tt_status_report.state,
@@ -561,6 +567,117 @@ def update_transfer_state(
         logger(logging.CRITICAL, "Exception", exc_info=True)
 
 
+@transactional_session
+def update_transfer_states(
+        tt_status_reports: 'Iterable[TransferStatusReport]',
+        stats_manager: request_core.TransferStatsManager,
+        *,
+        session: "Session",
+        logger=logging.log
+) -> int:
+    """
+    Bulk version of update_transfer_state, for the poller.
+
+    The requests to transition are loaded with one query and updated with one statement per set
+    of changed columns. The hermes messages are inserted together. The requests without state
+    change are only touched, in bulk too. Like in update_transfer_state, an exception in the
+    handling of one request is logged and the other requests are still updated. Database errors
+    are raised.
+
+    :param tt_status_reports:     The transfertool status updates.
+    :param stats_manager:         The transfer statistics manager.
+    :param session:               The database session to use.
+    :param logger:                Optional decorated logger that can be passed from the calling daemons or servers.
+    :returns:                     The number of updated requests
+    """
+
+    reports_to_apply = []
+    request_ids_to_touch = []
+    for tt_status_report in {tt_status_report.request_id: tt_status_report for tt_status_report in tt_status_reports}.values():
+        try:
+            fields_to_update = tt_status_report.get_db_fields_to_update(session=session, logger=logger)
+        except (DatabaseException, DatabaseError):
+            raise
+        except Exception:
+            logger(logging.CRITICAL, "Exception", exc_info=True)
+            continue
+        if fields_to_update:
+            reports_to_apply.append((tt_status_report, fields_to_update))
+        else:
+            request_ids_to_touch.append(tt_status_report.request_id)
+
+    requests_by_id = request_core.get_requests_by_id([tt_status_report.request_id for tt_status_report, _ in reports_to_apply], session=session)
+    updates = []
+    transitions = []
+    for tt_status_report, fields_to_update in reports_to_apply:
+        request_id = tt_status_report.request_id
+        logger(logging.INFO, 'UPDATING REQUEST %s FOR %s with changes: %s' % (str(request_id), tt_status_report, fields_to_update))
+
+        request = requests_by_id.get(request_id)
+        if not request_core.can_transition_request_state(request_id, request, state=fields_to_update.get('state'),
+                                                         external_id=fields_to_update.get('external_id'), logger=logger):
+            continue
+        # The external_id is only used to validate the transition
+        updates.append({'request_id': request_id, **{field: value for field, value in fields_to_update.items() if field != 'external_id'}})
+        transitions.append((tt_status_report, fields_to_update, request))
+
+    request_core.update_requests(updates + [{'request_id': request_id} for request_id in request_ids_to_touch], session=session)
+
+    # A failure in the post-processing of one request must not prevent the update of the others.
+    # Database errors are raised: the caller retries the requests one by one.
+    nb_updated = len(transitions)
+    monitor_messages = []
+    observations = []
+    for tt_status_report, fields_to_update, request in transitions:
+        try:
+            if tt_status_report.state == RequestState.FAILED:
+                if request_core.is_intermediate_hop(request):
+                    nb_updated += request_core.handle_failed_intermediate_hop(request, session=session)
+
+            if tt_status_report.state:
+                observations.append({
+                    'src_rse_id': request['source_rse_id'],
+                    'dst_rse_id': request['dest_rse_id'],
+                    'activity': request['activity'],
+                    'state': tt_status_report.state,
+                    'file_size': request['bytes'],
+                    'submitted_at': request.get('submitted_at', None),
+                    'started_at': fields_to_update.get('started_at', None),
+                    'transferred_at': fields_to_update.get('transferred_at', None),
+                })
+            monitor_messages.append((
+                tt_status_report.state,
+                request,
+                tt_status_report.get_monitor_msg_fields(session=session, logger=logger),
+            ))
+        except (DatabaseException, DatabaseError):
+            raise
+        except Exception:
+            logger(logging.CRITICAL, "Exception", exc_info=True)
+
+    try:
+        request_core.add_monitor_messages(monitor_messages, session=session)
+    except (DatabaseException, DatabaseError):
+        raise
+    except Exception:
+        logger(logging.WARNING, "Failed to add the monitor messages in bulk, adding them one by one", exc_info=True)
+        for new_state, request, additional_fields in monitor_messages:
+            try:
+                request_core.add_monitor_message(new_state=new_state, request=request, additional_fields=additional_fields, session=session)
+            except (DatabaseException, DatabaseError):
+                raise
+            except Exception:
+                logger(logging.CRITICAL, "Exception", exc_info=True)
+
+    # Only observed once the database changes are done, to not count twice the requests retried one by one
+    for observation in observations:
+        try:
+            stats_manager.observe(**observation)
+        except Exception:
+            logger(logging.CRITICAL, "Exception", exc_info=True)
+    return nb_updated
+
+
 @transactional_session
 def mark_transfer_lost(request, *, session: "Session", logger=logging.log):
     new_state = RequestState.LOST
@@ -601,6 +718,36 @@ def touch_transfer(external_host, transfer_id, *, session: "Session"):
         raise RucioException(error.args)
 
 
+@METRICS.count_it
+@transactional_session
+def touch_transfers(external_host, transfer_ids, *, session: "Session"):
+    """
+    Update the timestamp of requests in multiple transfers. Fails silently for the transfer_ids which do not exist.
+    :param request_host:   Name of the external host.
+    :param transfer_ids:   External transfer job ids as strings.
+    :param session:        Database session to use.
+    """
+    try:
+        for transfer_ids_chunk in chunks(list(transfer_ids), 1000):
+            # don't touch them if they were already touched in 30 seconds
+            stmt = update(
+                models.Request
+            ).prefix_with(
+                "/*+ INDEX(REQUESTS REQUESTS_EXTERNALID_UQ) */", dialect='oracle'
+            ).where(
+                models.Request.external_id.in_(transfer_ids_chunk),
+                models.Request.state == RequestState.SUBMITTED,
+                models.Request.updated_at < datetime.datetime.utcnow() - datetime.timedelta(seconds=30)
+            ).execution_options(
+                synchronize_session=False
+            ).values(
+                updated_at=datetime.datetime.utcnow()
+            )
+            session.execute(stmt)
+    except IntegrityError as error:
+        raise RucioException(error.args)
+
+
 def _create_transfer_definitions(
         topology: "Topology",
         protocol_factory: ProtocolFactory,
@@ -820,6 +967,24 @@ class TransferPathBuilder:
 
         self.definition_by_request_id = {}
 
+    def _transfer_schemes(self, rws: RequestWithSources) -> list[str]:
+        if rws.previous_attempt_id and self.failover_schemes:
+            return self.failover_schemes
+        return self.schemes
+
+    def precompute_paths(self, requests_with_sources: "Iterable[RequestWithSources]", *, session: "Session") -> None:
+        """
+        Fill the routing table of the topology with the shortest path trees towards the destinations
+        of all the given requests at once, so that the topology can compute them in parallel.
+        """
+        dst_nodes_by_schemes = {}
+        for rws in requests_with_sources:
+            if rws.request_type != RequestType.STAGEIN:
+                dst_nodes_by_schemes.setdefault(tuple(self._transfer_schemes(rws)), []).append(rws.dest_rse)
+        for transfer_schemes, dst_nodes in dst_nodes_by_schemes.items():
+            self.topology.precompute_routing_table(operation_src='third_party_copy_read', operation_dest='third_party_copy_write', domain='wan',
+                                                   limit_dest_schemes=list(transfer_schemes), dst_nodes=dst_nodes, session=session)
+
     def build_or_return_cached(
             self,
             rws: RequestWithSources,
@@ -838,9 +1003,7 @@ class TransferPathBuilder:
         if definition:
             return definition
 
-        transfer_schemes = self.schemes
-        if rws.previous_attempt_id and self.failover_schemes:
-            transfer_schemes = self.failover_schemes
+        transfer_schemes = self._transfer_schemes(rws)
 
         candidate_sources = sources
         if self.requested_source_only and rws.requested_source:
@@ -896,6 +1059,23 @@ class RequestRankingContext:
             verdict = sys.maxsize
         return verdict
 
+    def apply_many(self, sources: "Sequence[RequestSource]") -> "list[int | _SkipSource]":
+        """
+        Apply the strategy on all the given sources at once. If the verdict of the strategy only
+        depends on the source RSE, it is computed once per RSE and shared by all requests.
+        """
+        if not self.strategy.per_rse:
+            return [self.apply(source) for source in sources]
+
+        verdict_by_rse = self.strategy.verdict_by_rse
+        verdicts = []
+        for source in sources:
+            verdict = verdict_by_rse.get(source.rse)
+            if verdict is None:
+                verdict_by_rse[source.rse] = verdict = self.apply(source)
+            verdicts.append(verdict)
+        return verdicts
+
 
 class SourceRankingStrategy:
     """
@@ -903,8 +1083,14 @@ class SourceRankingStrategy:
     which will be the actual source used for the transfer.
 
     If filter_only is True, any value other than SKIP_SOURCE returned by apply() will be ignored.
+    If per_rse is True, apply() must only depend on the RSE of the source: the verdict is then
+    computed once per RSE and reused for all requests ranked with this strategy instance.
     """
     filter_only: bool = False
+    per_rse: bool = False
+
+    def __init__(self) -> None:
+        self.verdict_by_rse: "dict[RseData, int | _SkipSource]" = {}
 
     def for_request(
             self,
@@ -990,6 +1176,7 @@ class SkipRestrictedRSEs(SourceFilterStrategy):
 
 
 class SkipBlocklistedRSEs(SourceFilterStrategy):
+    per_rse = True
 
     def __init__(self, topology: "Topology"):
         super().__init__()
@@ -1011,17 +1198,25 @@ class EnforceStagingBuffer(SourceFilterStrategy):
 class RestrictTapeSources(SourceFilterStrategy):
     def apply(self, ctx: RequestRankingContext, source: RequestSource) -> "Optional[int | _SkipSource]":
         # Ignore tape sources if they are not desired
-        if source.rse.is_tape_or_staging_required() and not ctx.rws.attributes.get("allow_tape_source", True):
+        if not ctx.rws.attributes.get("allow_tape_source", True) and source.rse.is_tape_or_staging_required():
             return SKIP_SOURCE
 
 
 class HighestAdjustedRankingFirst(SourceRankingStrategy):
+    def __init__(self) -> None:
+        super().__init__()
+        self.penalty_by_rse: "dict[RseData, int]" = {}
+
     def apply(self, ctx: RequestRankingContext, source: RequestSource) -> "Optional[int | _SkipSource]":
-        source_ranking_penalty = 1 if source.rse.is_tape_or_staging_required() else 0
+        source_ranking_penalty = self.penalty_by_rse.get(source.rse)
+        if source_ranking_penalty is None:
+            source_ranking_penalty = self.penalty_by_rse[source.rse] = 1 if source.rse.is_tape_or_staging_required() else 0
         return - source.ranking + source_ranking_penalty
 
 
 class PreferDiskOverTape(SourceRankingStrategy):
+    per_rse = True
+
     def apply(self, ctx: RequestRankingContext, source: RequestSource) -> "Optional[int | _SkipSource]":
         return int(source.rse.is_tape_or_staging_required())  # rely on the fact that False < True
 
@@ -1068,6 +1263,8 @@ class FailureRate(SourceRankingStrategy):
     A source ranking strategy that ranks source nodes based on their failure rates for the past hour. Failure rate is
     calculated by dividing files failed by files attempted.
     """
+    per_rse = True
+
     class _FailureRateStat:
         def __init__(self) -> None:
             self.files_done = 0
@@ -1122,6 +1319,42 @@ class SkipIntermediateTape(PathDistance):
             return SKIP_SOURCE
 
 
+def _rank_sources(
+        rws: RequestWithSources,
+        strategies: "Sequence[SourceRankingStrategy]",
+        *,
+        logger: "LoggerFunction" = logging.log,
+        session: "Session",
+) -> "tuple[dict[RequestSource, list[int]], dict[str, list[RequestSource]]]":
+    """
+    Apply the strategies, one after the other, on the sources of the request.
+
+    :returns: the cost of each accepted source (list of costs: one for each ranking strategy), and,
+              for each strategy name, the sources which were rejected by it.
+    """
+    rejected_sources = defaultdict(list)
+    cost_vectors = {s: [] for s in rws.sources}
+    for strategy in strategies:
+        sources = list(cost_vectors)
+        if not sources:
+            # All sources where filtered by previous strategies. It's worthless to continue.
+            break
+        verdicts = strategy.for_request(rws, sources, logger=logger, session=session).apply_many(sources)
+        if strategy.filter_only:
+            for source, verdict in zip(sources, verdicts):
+                if verdict is SKIP_SOURCE:
+                    rejected_sources[strategy.external_name].append(source)
+                    del cost_vectors[source]
+        else:
+            for source, verdict in zip(sources, verdicts):
+                if verdict is SKIP_SOURCE:
+                    rejected_sources[strategy.external_name].append(source)
+                    del cost_vectors[source]
+                else:
+                    cost_vectors[source].append(verdict)
+    return cost_vectors, rejected_sources
+
+
 @transactional_session
 def build_transfer_paths(
         topology: "Topology",
@@ -1206,6 +1439,10 @@ def build_transfer_paths(
     # transfers issues when there are many sources, but can be very useful for small number of sources.
     num_sources_in_logs = 4
 
+    if topology.use_routing_table:
+        requests_with_sources = list(requests_with_sources)
+        transfer_path_builder.precompute_paths(requests_with_sources, session=session)
+
     candidate_paths_by_request_id, reqs_no_source, reqs_only_tape_source, reqs_scheme_mismatch = {}, set(), set(), set()
     reqs_unsupported_transfertool = set()
     for rws in requests_with_sources:
@@ -1243,23 +1480,7 @@ def build_transfer_paths(
             reqs_no_source.remove(rws.request_id)
             continue
 
-        # For each strategy name, gives the sources which were rejected by it
-        rejected_sources = defaultdict(list)
-        # Cost of each accepted source (lists of ordered costs: one for each ranking strategy)
-        cost_vectors = {s: [] for s in rws.sources}
-        for strategy in strategies:
-            sources = list(cost_vectors)
-            if not sources:
-                # All sources where filtered by previous strategies. It's worthless to continue.
-                break
-            rws_strategy = strategy.for_request(rws, sources, logger=logger, session=session)
-            for source in sources:
-                verdict = rws_strategy.apply(source)
-                if verdict is SKIP_SOURCE:
-                    rejected_sources[strategy.external_name].append(source)
-                    cost_vectors.pop(source)
-                elif not strategy.filter_only:
-                    cost_vectors[source].append(verdict)
+        cost_vectors, rejected_sources = _rank_sources(rws, strategies, logger=logger, session=session)
 
         transfers_by_rse = transfer_path_builder.build_or_return_cached(rws, cost_vectors, logger=logger, session=session)
         candidate_paths = ((s, transfers_by_rse[s.rse]) for s, _ in sorted(cost_vectors.items(), key=operator.itemgetter(1)))
@@ -1302,6 +1523,9 @@ def build_transfer_paths(
         candidate_paths_by_request_id[rws.request_id] = [path for _, path in candidate_paths]
         reqs_no_source.remove(rws.request_id)
 
+    for stat, value in rsemgr.MATCHING_SCHEME_CACHE.stats().items():
+        METRICS.gauge('matching_scheme_cache.{stat}', documentation='Statistics of the matching scheme cache').labels(stat=stat).set(value)
+
     return candidate_paths_by_request_id, reqs_no_source, reqs_scheme_mismatch, reqs_only_tape_source, reqs_unsupported_transfertool
 
 
@@ -23,6 +23,7 @@ from typing import TYPE_CHECKING
 
 import rucio.db.sqla.util
 from rucio.common import exception
+from rucio.common.config import config_get_int
 from rucio.common.logging import setup_logging
 from rucio.common.utils import get_thread_with_periodic_running_function
 from rucio.core.account_counter import fill_account_counter_history_table, get_updated_account_counters, update_account_counter
@@ -50,6 +51,7 @@ def account_update(
         partition_wait_time=1,
         sleep_time=sleep_time,
         run_once_fnc=run_once,
+        work_stealing=True,
     )
 
 
@@ -58,6 +60,7 @@ def run_once(
         **_kwargs
 ) -> None:
     worker_number, total_workers, logger = heartbeat_handler.live()
+    chunk_size = config_get_int('abacus-account', 'stream_chunk_size', raise_exception=False, default=0) or None
 
     start = time.time()  # NOQA
     updated_account_counters = get_updated_account_counters(total_workers=total_workers,
@@ -74,7 +77,11 @@ def run_once(
         if graceful_stop.is_set():
             break
         start_time = time.time()
-        update_account_counter(account=account_counter['account'], rse_id=account_counter['rse_id'])
+        # In streaming mode, the updates are applied by chunks, each in its own transaction
+        while update_account_counter(account=account_counter['account'], rse_id=account_counter['rse_id'], limit=chunk_size) == chunk_size:
+            heartbeat_handler.live()
+            if graceful_stop.is_set():
+                break
         logger(logging.DEBUG, 'update of account-rse counter "%s-%s" took %f' % (account_counter['account'], account_counter['rse_id'], time.time() - start_time))
 
 
@@ -23,6 +23,7 @@ from typing import TYPE_CHECKING
 
 import rucio.db.sqla.util
 from rucio.common import exception
+from rucio.common.config import config_get_int
 from rucio.common.logging import setup_logging
 from rucio.common.utils import get_thread_with_periodic_running_function
 from rucio.core.rse_counter import fill_rse_counter_history_table, get_updated_rse_counters, update_rse_counter
@@ -50,6 +51,7 @@ def rse_update(
         partition_wait_time=1,
         sleep_time=sleep_time,
         run_once_fnc=run_once,
+        work_stealing=True,
     )
 
 
@@ -58,6 +60,7 @@ def run_once(
         **_kwargs
 ) -> None:
     worker_number, total_workers, logger = heartbeat_handler.live()
+    chunk_size = config_get_int('abacus-rse', 'stream_chunk_size', raise_exception=False, default=0) or None
 
     # Select a bunch of rses for to update for this worker
     start = time.time()  # NOQA
@@ -75,7 +78,11 @@ def run_once(
         if graceful_stop.is_set():
             break
         start_time = time.time()
-        update_rse_counter(rse_id=rse_id)
+        # In streaming mode, the updates are applied by chunks, each in its own transaction
+        while update_rse_counter(rse_id=rse_id, limit=chunk_size) == chunk_size:
+            heartbeat_handler.live()
+            if graceful_stop.is_set():
+                break
         logger(logging.DEBUG, 'update of rse "%s" took %f' % (rse_id, time.time() - start_time))
 
 
@@ -22,11 +22,11 @@ import socket
 import threading
 from typing import TYPE_CHECKING, Optional
 
-from rucio.common.config import config_get_float
+from rucio.common.config import config_get_bool, config_get_float
 from rucio.common.exception import InvalidRSEExpression
 from rucio.common.logging import setup_logging
 from rucio.core.heartbeat import list_payload_counts, sanity_check
-from rucio.core.rse import get_rse_usage
+from rucio.core.rse import get_rse_snapshot, get_rse_usage, subscribe_rse_snapshot, unsubscribe_rse_snapshot
 from rucio.core.rse_expression_parser import parse_expression
 from rucio.daemons.bb8.common import get_active_locks, rebalance_rse
 from rucio.daemons.common import HeartbeatHandler, run_daemon
@@ -57,20 +57,27 @@ def rule_rebalancer(
     :param once: Run only once.
     :param dry_run: To run in dry run mode (i.e. rules are not created).
     """
-    run_daemon(
-        once=once,
-        graceful_stop=graceful_stop,
-        executable=DAEMON_NAME,
-        partition_wait_time=1,
-        sleep_time=sleep_time,
-        run_once_fnc=functools.partial(
-            run_once,
-            rse_expression=rse_expression,
-            move_subscriptions=move_subscriptions,
-            use_dump=use_dump,
-            dry_run=dry_run,
-        ),
-    )
+    use_rse_snapshot = config_get_bool('bb8', 'use_rse_snapshot', raise_exception=False, default=False)
+    if use_rse_snapshot:
+        subscribe_rse_snapshot()
+    try:
+        run_daemon(
+            once=once,
+            graceful_stop=graceful_stop,
+            executable=DAEMON_NAME,
+            partition_wait_time=1,
+            sleep_time=sleep_time,
+            run_once_fnc=functools.partial(
+                run_once,
+                rse_expression=rse_expression,
+                move_subscriptions=move_subscriptions,
+                use_dump=use_dump,
+                dry_run=dry_run,
+            ),
+        )
+    finally:
+        if use_rse_snapshot:
+            unsubscribe_rse_snapshot()
 
 
 def run_once(
@@ -133,9 +140,14 @@ def run_once(
         total_secondary = 0
         total_total = 0
         global_ratio = float(0)
+        rse_snapshot = get_rse_snapshot()
         for rse in rses:
             logger(logging.DEBUG, "Getting RSE usage on %s", rse["rse"])
-            rse_usage = get_rse_usage(rse_id=rse["id"])
+            rse_data = rse_snapshot.get(rse["id"]) if rse_snapshot else None
+            if rse_data is not None:
+                rse_usage = rse_data.usage
+            else:
+                rse_usage = get_rse_usage(rse_id=rse["id"])
             usage_dict = {}
             for item in rse_usage:
                 # TODO Check last update
@@ -15,6 +15,7 @@
 import datetime
 import functools
 import logging
+import math
 import os
 import queue
 import socket
@@ -22,6 +23,7 @@ import threading
 import time
 from typing import TYPE_CHECKING, Any, Generic, Optional, TypeVar, Union
 
+from rucio.common.config import config_get_int
 from rucio.common.logging import formatted_logger
 from rucio.common.utils import PriorityQueue
 from rucio.core import heartbeat as heartbeat_core
@@ -35,17 +37,21 @@ if TYPE_CHECKING:
 T = TypeVar('T')
 METRICS = MetricManager(module=__name__)
 
+_CONSUMER_STOP = object()
+
 
 class HeartbeatHandler:
     """
     Simple contextmanager which sets a heartbeat and associated logger on entry and cleans up the heartbeat on exit.
     """
 
-    def __init__(self, executable: str, renewal_interval: int):
+    def __init__(self, executable: str, renewal_interval: int, partition_buckets: int = 0):
         """
         :param executable: the executable name which will be set in heartbeats
         :param renewal_interval: the interval at which the heartbeat will be renewed in the database.
         Calls to live() in-between intervals will reuse the locally cached heartbeat.
+        :param partition_buckets: if set, the work is split into this many virtual buckets, which are leased
+        by the workers and balanced between them. See `current_bucket` and `cycle_buckets`.
         """
         self.executable = executable
         self._hash_executable = None
@@ -61,6 +67,12 @@ class HeartbeatHandler:
         self.last_time = None
         self.last_payload = None
 
+        self.partition_buckets = partition_buckets
+        self.lease_duration = renewal_interval * 3 if renewal_interval and renewal_interval > 0 else 60
+        self.buckets: list[int] = []
+        self.current_bucket: Optional[int] = None
+        self.release_pending = False
+
     def __enter__(self) -> 'HeartbeatHandler':
         heartbeat_core.sanity_check(executable=self.executable, hostname=self.hostname)
         self.live()
@@ -69,6 +81,8 @@ class HeartbeatHandler:
     def __exit__(self, exc_type, exc_val, exc_tb) -> None:
         if self.last_heart_beat:
             heartbeat_core.die(self.executable, self.hostname, self.pid, self.hb_thread)
+            if self.partition_buckets:
+                heartbeat_core.release_partition_leases(self.executable, self.hostname, self.pid, self.hb_thread)
             if self.logger:
                 self.logger(logging.INFO, 'Heartbeat cleaned up')
 
@@ -88,7 +102,9 @@ class HeartbeatHandler:
             payload: Optional[str] = None
     ) -> tuple[int, int, 'Callable']:
         """
-        :return: a tuple: <the number of the current worker>, <total number of workers>, <decorated logger>
+        :return: a tuple: <the number of the current worker>, <total number of workers>, <decorated logger>.
+        When working on a partition bucket, the bucket and the total number of buckets are returned instead
+        of the worker number and the number of workers. This way, they can be passed unchanged to filter_thread_work().
         """
         if force_renew \
                 or not self.last_time \
@@ -100,6 +116,20 @@ class HeartbeatHandler:
             else:
                 self.last_heart_beat = heartbeat_core.live(self.executable, self.hostname, self.pid, self.hb_thread, payload=payload)
 
+            if self.partition_buckets:
+                # A bucket must not be released while it is being worked on: it could be taken over
+                # by another worker and processed twice. The surplus is released by cycle_buckets().
+                self.buckets = heartbeat_core.renew_partition_leases(
+                    self.executable, self.hostname, self.pid, self.hb_thread,
+                    nr_buckets=self.partition_buckets,
+                    nr_workers=self.last_heart_beat['nr_threads'],
+                    lease_duration=self.lease_duration,
+                    release_surplus=self.current_bucket is None,
+                )
+                fair_share = math.ceil(self.partition_buckets / max(self.last_heart_beat['nr_threads'], 1))
+                self.release_pending = len(self.buckets) > fair_share
+                METRICS.gauge('partition_buckets_owned').set(len(self.buckets))
+
             prefix = '[%i/%i]: ' % (self.last_heart_beat['assign_thread'], self.last_heart_beat['nr_threads'])
             self.logger = formatted_logger(logging.log, prefix + '%s')
 
@@ -110,8 +140,19 @@ class HeartbeatHandler:
             self.last_time = datetime.datetime.now()
             self.last_payload = payload
 
+        if self.current_bucket is not None:
+            return self.current_bucket, self.partition_buckets, self.logger
         return self.last_heart_beat['assign_thread'], self.last_heart_beat['nr_threads'], self.logger
 
+    def cycle_buckets(self) -> list[int]:
+        """
+        :return: the buckets to work on during the next cycle. The surplus buckets kept by the renewals
+        done while working on the previous cycle are released first.
+        """
+        if self.release_pending:
+            self.live(force_renew=True, payload=self.last_payload)
+        return list(self.buckets)
+
 
 def _activity_looper(
         once: bool,
@@ -178,6 +219,8 @@ def db_workqueue(
         partition_wait_time: int,
         sleep_time: int,
         activities: Optional['Sequence[str]'] = None,
+        batch_size: Optional['AdaptiveBatchSize'] = None,
+        work_stealing: bool = False,
 ) -> 'Callable[[Callable[..., Union[bool, tuple[bool, T], None]]], Callable[[], Iterator[Union[T, None]]]]':
     """
     Used to wrap a function for interacting with the database as a work queue: i.e. to select
@@ -191,14 +234,21 @@ def db_workqueue(
     :param partition_wait_time: time to wait for database partition rebalancing before starting the actual daemon loop
     :param sleep_time: time to sleep between the iterations of the daemon
     :param activities: optional list of activities on which to work. The run_once_fnc will be called on activities one by one.
+    :param batch_size: optional adaptive batch size which is informed about how long it took to fetch each returned value
+    :param work_stealing: whether run_once_fnc supports partitioning into virtual buckets. If [heartbeat] partition_buckets
+    is configured, the run_once_fnc will be called on the leased buckets one by one. Workers re-balance the buckets on each
+    heartbeat renewal and take over the buckets of dead workers once their lease expires.
     """
+    partition_buckets = 0
+    if work_stealing:
+        partition_buckets = config_get_int('heartbeat', 'partition_buckets', raise_exception=False, default=0)
 
     def _decorate(run_once_fnc: 'Callable[..., Optional[Union[bool, tuple[bool, T]]]]') -> 'Callable[[], Iterator[Optional[T]]]':
 
         @functools.wraps(run_once_fnc)
         def _generator() -> 'Iterator[T]':
 
-            with HeartbeatHandler(executable=executable, renewal_interval=sleep_time - 1) as heartbeat_handler:
+            with HeartbeatHandler(executable=executable, renewal_interval=sleep_time - 1, partition_buckets=partition_buckets) as heartbeat_handler:
                 logger = heartbeat_handler.logger
                 logger(logging.INFO, 'started')
 
@@ -219,27 +269,37 @@ def db_workqueue(
 
                     must_sleep = True
                     start_time = time.time()
-                    try:
-                        result = run_once_fnc(heartbeat_handler=heartbeat_handler, activity=activity)
-
-                        # Handle return values already existing in the code
-                        # TODO: update all existing daemons to always explicitly return (must_sleep, ret_value)
-                        if result is None:
-                            must_sleep = True
-                            ret_value = None
-                        elif isinstance(result, bool):
-                            must_sleep = result
-                            ret_value = None
-                        else:
-                            must_sleep, ret_value = result
-
-                        if ret_value is not None:
-                            yield ret_value
-                    except Exception as e:
-                        METRICS.counter('exceptions.{exception}').labels(exception=e.__class__.__name__).inc()
-                        logger(logging.CRITICAL, "Exception", exc_info=True)
-                        if once:
-                            raise
+                    for bucket in heartbeat_handler.cycle_buckets() if partition_buckets else [None]:
+                        if graceful_stop.is_set():
+                            break
+                        heartbeat_handler.current_bucket = bucket
+                        try:
+                            bucket_start_time = time.time()
+                            result = run_once_fnc(heartbeat_handler=heartbeat_handler, activity=activity)
+
+                            # Handle return values already existing in the code
+                            # TODO: update all existing daemons to always explicitly return (must_sleep, ret_value)
+                            if result is None:
+                                bucket_must_sleep = True
+                                ret_value = None
+                            elif isinstance(result, bool):
+                                bucket_must_sleep = result
+                                ret_value = None
+                            else:
+                                bucket_must_sleep, ret_value = result
+                            must_sleep = must_sleep and bucket_must_sleep
+
+                            if ret_value is not None:
+                                if batch_size is not None:
+                                    batch_size.record_fetch(ret_value, time.time() - bucket_start_time)
+                                yield ret_value
+                        except Exception as e:
+                            METRICS.counter('exceptions.{exception}').labels(exception=e.__class__.__name__).inc()
+                            logger(logging.CRITICAL, "Exception", exc_info=True)
+                            if once:
+                                raise
+                        finally:
+                            heartbeat_handler.current_bucket = None
 
                     try:
                         activity, time_to_sleep = activity_loop.send((start_time, must_sleep))
@@ -261,7 +321,8 @@ def run_daemon(
         partition_wait_time: int,
         sleep_time: int,
         run_once_fnc: 'Callable[..., Optional[Union[bool, tuple[bool, Any]]]]',
-        activities: Optional[list[str]] = None
+        activities: Optional[list[str]] = None,
+        work_stealing: bool = False,
 ) -> None:
     """
     Run the daemon loop and call the function run_once_fnc at each iteration
@@ -274,15 +335,109 @@ def run_daemon(
         partition_wait_time=partition_wait_time,
         sleep_time=sleep_time,
         activities=activities,
+        work_stealing=work_stealing,
     )(run_once_fnc)
 
     for _ in daemon():
         pass
 
 
+class AdaptiveBatchSize:
+    """
+    Size of the batches fetched from the database by a daemon, adapted to the time it takes
+    to fetch and to consume them.
+
+    The fetch and consume durations per item are tracked as exponentially weighted moving averages.
+    The batch size is chosen such that neither fetching nor consuming one batch takes longer than
+    target_duration. It changes by at most a factor of two per observation and stays within [minimum, maximum].
+    """
+
+    def __init__(
+            self,
+            initial: int,
+            minimum: Optional[int] = None,
+            maximum: Optional[int] = None,
+            target_duration: float = 60,
+            adaptive: bool = True,
+            size_fnc: 'Callable[[Any], int]' = len,
+            smoothing: float = 0.3,
+    ):
+        """
+        :param initial: the initial batch size. If adaptive is False, this value is never changed.
+        :param minimum: the smallest batch size. Defaults to a tenth of the initial value.
+        :param maximum: the largest batch size. Defaults to four times the initial value.
+        :param target_duration: the desired maximum time, in seconds, to fetch or to consume one batch
+        :param adaptive: whether the batch size is allowed to change. Measurements are exported in both cases.
+        :param size_fnc: function returning the number of items in a batch
+        :param smoothing: the weight of the newest observation in the moving averages
+        """
+        self.minimum = max(1, minimum if minimum is not None else initial // 10)
+        self.maximum = max(self.minimum, maximum if maximum is not None else initial * 4)
+        self.target_duration = target_duration
+        self.adaptive = adaptive
+        self.size_fnc = size_fnc
+        self.smoothing = smoothing
+
+        self._value = min(max(initial, self.minimum), self.maximum) if adaptive else initial
+        self._fetch_time_per_item: Optional[float] = None
+        self._consume_time_per_item: Optional[float] = None
+        self._lock = threading.Lock()
+        METRICS.gauge('batch_size').set(self._value)
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def record_fetch(self, batch: Any, duration: float) -> None:
+        """
+        Record the time it took to fetch a batch from the database.
+
+        Batches less than half full are ignored: they are dominated by fixed per-query
+        costs and say nothing about the cost of fetching more items.
+        """
+        size = self.size_fnc(batch)
+        METRICS.gauge('fetch_seconds').set(duration)
+        if not size or size < self._value / 2:
+            return
+        with self._lock:
+            self._fetch_time_per_item = self._ewma(self._fetch_time_per_item, duration / size)
+            self._update()
+
+    def record_consume(self, batch: Any, duration: float) -> None:
+        """
+        Record the time it took a consumer to handle a batch.
+        """
+        size = self.size_fnc(batch)
+        METRICS.gauge('consume_seconds').set(duration)
+        if not size:
+            return
+        with self._lock:
+            self._consume_time_per_item = self._ewma(self._consume_time_per_item, duration / size)
+            self._update()
+
+    def _ewma(self, average: Optional[float], sample: float) -> float:
+        if average is None:
+            return sample
+        return self.smoothing * sample + (1 - self.smoothing) * average
+
+    def _update(self) -> None:
+        if not self.adaptive:
+            return
+        target = float(self.maximum)
+        for time_per_item in (self._fetch_time_per_item, self._consume_time_per_item):
+            if time_per_item:
+                target = min(target, self.target_duration / time_per_item)
+        target = min(max(target, self._value / 2), self._value * 2)
+        self._value = int(min(max(target, self.minimum), self.maximum))
+        METRICS.gauge('batch_size').set(self._value)
+
+
 class ProducerConsumerDaemon(Generic[T]):
     """
-    Daemon which connects N producers with M consumers via a queue.
+    Daemon which connects N producers with M consumers via a bounded queue.
+
+    Producers block when the queue is full and consumers block when it is empty, so
+    no thread ever sleeps while there is work it could do.
     """
 
     def __init__(
@@ -290,17 +445,24 @@ class ProducerConsumerDaemon(Generic[T]):
             producers: 'Sequence[Callable[[], Iterator[T]]]',
             consumers: 'Sequence[Callable[..., None]]',
             graceful_stop: threading.Event,
-            logger: "LoggerFunction" = logging.log
+            logger: "LoggerFunction" = logging.log,
+            queue_size: Optional[int] = None,
+            batch_size: Optional[AdaptiveBatchSize] = None,
     ):
+        """
+        :param queue_size: the maximum number of products waiting for a consumer. Defaults to the number of consumers.
+        :param batch_size: optional adaptive batch size which is informed about how long consumers take for each product
+        """
         self.producers = producers
         self.consumers = consumers
 
-        self.queue = queue.Queue()
+        self.queue = queue.Queue(maxsize=queue_size or len(consumers))
         self.lock = threading.Lock()
         self.graceful_stop = graceful_stop
         self.active_producers = 0
         self.producers_done_event = threading.Event()
         self.logger = logger
+        self.batch_size = batch_size
 
     def _produce(
             self,
@@ -310,7 +472,8 @@ class ProducerConsumerDaemon(Generic[T]):
         """
         Iterate over the generator function and put the extracted elements into the queue.
 
-        Perform a graceful shutdown when graceful_stop is set.
+        Perform a graceful shutdown when graceful_stop is set. The last producer to exit
+        tells all consumers to stop once they have handled the remaining elements.
         """
 
         i = it()
@@ -318,24 +481,30 @@ class ProducerConsumerDaemon(Generic[T]):
             self.active_producers += 1
         try:
             while not self.graceful_stop.is_set():
-                if self.queue.qsize() > len(self.consumers):
-                    self.graceful_stop.wait(1)
-                    continue
-
                 try:
                     product = next(i)
-                    self.queue.put(product)
                 except StopIteration:
                     break
                 except Exception as e:
                     METRICS.counter('exceptions.{exception}').labels(exception=e.__class__.__name__).inc()
                     self.logger(logging.CRITICAL, "Exception", exc_info=True)
+                    continue
+
+                start_time = time.monotonic()
+                self.queue.put(product)
+                METRICS.gauge('producer_wait_seconds').set(time.monotonic() - start_time)
+                METRICS.gauge('queue_depth').set(self.queue.qsize())
         finally:
             with self.lock:
                 self.active_producers -= 1
-                if not self.active_producers > 0:
+                last_producer = not self.active_producers > 0
+                if last_producer:
                     self.producers_done_event.set()
 
+            if last_producer:
+                for _ in self.consumers:
+                    self.queue.put(_CONSUMER_STOP)
+
             if wait_for_consumers:
                 self.queue.join()
 
@@ -346,17 +515,22 @@ class ProducerConsumerDaemon(Generic[T]):
         """
         Wait for elements to arrive via the queue and call the given function on each element.
 
-        If producers_done_event is set, handle all remaining elements from the queue and exit gracefully.
+        Exit when the producers signal that no more elements will come.
         """
-        while not self.producers_done_event.is_set() or self.queue.unfinished_tasks:
-            try:
-                product = self.queue.get_nowait()
-            except queue.Empty:
-                self.producers_done_event.wait(1)
-                continue
+        while True:
+            start_time = time.monotonic()
+            product = self.queue.get()
+            METRICS.gauge('consumer_wait_seconds').set(time.monotonic() - start_time)
+            METRICS.gauge('queue_depth').set(self.queue.qsize())
 
             try:
+                if product is _CONSUMER_STOP:
+                    break
+
+                start_time = time.monotonic()
                 fnc(product)
+                if self.batch_size is not None:
+                    self.batch_size.record_consume(product, time.monotonic() - start_time)
             except Exception as e:
                 METRICS.counter('exceptions.{exception}').labels(exception=e.__class__.__name__).inc()
                 self.logger(logging.CRITICAL, "Exception", exc_info=True)
@@ -397,8 +571,6 @@ class ProducerConsumerDaemon(Generic[T]):
                 thread.join(timeout=3.14)
             producer_threads = [thread for thread in producer_threads if thread.is_alive()]
 
-        self.producers_done_event.set()
-
         while consumer_threads:
             for thread in consumer_threads:
                 thread.join(timeout=3.14)
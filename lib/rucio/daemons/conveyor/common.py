@@ -23,7 +23,7 @@ import logging
 import re
 from typing import TYPE_CHECKING, Any, Optional
 
-from rucio.common.config import config_get_bool
+from rucio.common.config import config_get_bool, config_get_float
 from rucio.common.constants import RseAttr
 from rucio.common.exception import DatabaseException, DuplicateFileTransferSubmission, InvalidRSEExpression, RequestNotFound, TransferToolTimeout, TransferToolWrongAnswer, VONotFound
 from rucio.common.stopwatch import Stopwatch
@@ -36,13 +36,14 @@ from rucio.core.rse import list_rses
 from rucio.core.rse_expression_parser import parse_expression
 from rucio.core.transfer import build_transfer_paths
 from rucio.core.vo import list_vos
+from rucio.daemons.common import AdaptiveBatchSize
 from rucio.db.sqla import models
 from rucio.db.sqla.constants import ReplicaState, RequestState
 from rucio.db.sqla.session import transactional_session
 from rucio.rse import rsemanager as rsemgr
 
 if TYPE_CHECKING:
-    from collections.abc import Iterable, Mapping, Sequence
+    from collections.abc import Callable, Iterable, Mapping, Sequence
 
     from sqlalchemy.orm import Session
 
@@ -496,6 +497,27 @@ def _submit_transfers(
                     logger(logging.ERROR, 'Failed to cancel transfers %s on %s with error' % (eid, transfertool_obj), exc_info=True)
 
 
+def get_batch_size(
+        bulk: int,
+        size_fnc: "Callable[[Any], int]" = len,
+) -> AdaptiveBatchSize:
+    """
+    Get the size of the batches fetched from the database by a conveyor daemon.
+
+    The size only adapts to the measured fetch and handling times if enabled in the configuration.
+
+    :param bulk:      The configured batch size, used as initial value.
+    :param size_fnc:  Function returning the number of requests in a batch.
+    :return:          The batch size object to pass to the db_workqueue and ProducerConsumerDaemon.
+    """
+    return AdaptiveBatchSize(
+        initial=bulk,
+        adaptive=config_get_bool('conveyor', 'adaptive_batch_size', raise_exception=False, default=False),
+        target_duration=config_get_float('conveyor', 'adaptive_batch_target_duration', raise_exception=False, default=60),
+        size_fnc=size_fnc,
+    )
+
+
 def get_conveyor_rses(
         rses: Optional["Sequence[Mapping[str, Any]]"] = None,
         include_rses: Optional[str] = None,
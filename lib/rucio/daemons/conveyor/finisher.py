@@ -43,6 +43,7 @@ from rucio.core.rse import list_rses
 from rucio.core.topology import ExpiringObjectCache, Topology
 from rucio.core.transfer import ProtocolFactory
 from rucio.daemons.common import ProducerConsumerDaemon, db_workqueue
+from rucio.daemons.conveyor.common import get_batch_size
 from rucio.db.sqla.constants import MYSQL_LOCK_WAIT_TIMEOUT_EXCEEDED, ORACLE_DEADLOCK_DETECTED_REGEX, ORACLE_RESOURCE_BUSY_REGEX, BadFilesStatus, ReplicaState, RequestState, RequestType
 from rucio.db.sqla.session import transactional_session
 
@@ -171,6 +172,8 @@ def finisher(
         activities.sort()
         executable += '--activities ' + str(activities)
 
+    batch_size = get_batch_size(db_bulk, size_fnc=lambda batch: len(batch[0]))
+
     @db_workqueue(
         once=once,
         graceful_stop=GRACEFUL_STOP,
@@ -178,6 +181,7 @@ def finisher(
         partition_wait_time=partition_wait_time,
         sleep_time=sleep_time,
         activities=activities,
+        batch_size=batch_size,
     )
     def _db_producer(
         *,
@@ -185,7 +189,7 @@ def finisher(
         heartbeat_handler: "HeartbeatHandler"
     ) -> tuple[bool, tuple[list[dict[str, Any]], Topology]]:
         return _fetch_requests(
-            db_bulk=db_bulk,
+            db_bulk=batch_size.value,
             cached_topology=cached_topology,
             activity=activity,
             set_last_processed_by=not once,
@@ -204,6 +208,7 @@ def finisher(
         producers=[_db_producer],
         consumers=[_consumer for _ in range(total_threads)],
         graceful_stop=GRACEFUL_STOP,
+        batch_size=batch_size,
     ).run()
 
 
@@ -231,7 +236,8 @@ def run(
     if rucio.db.sqla.util.is_old_db():
         raise DatabaseException('Database was not updated, daemon won\'t start')
 
-    cached_topology = ExpiringObjectCache(ttl=300, new_obj_fnc=lambda: Topology())
+    incremental_refresh = config_get_bool('conveyor', 'incremental_topology_refresh', False, False)
+    cached_topology = ExpiringObjectCache(ttl=300, new_obj_fnc=lambda: Topology(), refresh_fnc=Topology.refresh if incremental_refresh else None)
     finisher(
         once=once,
         activities=activities,
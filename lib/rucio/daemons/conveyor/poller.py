@@ -23,6 +23,7 @@ import logging
 import re
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from itertools import groupby
 from typing import TYPE_CHECKING, Any, Optional
 
@@ -30,7 +31,7 @@ from requests.exceptions import RequestException
 from sqlalchemy.exc import DatabaseError
 
 import rucio.db.sqla.util
-from rucio.common.config import config_get, config_get_bool
+from rucio.common.config import config_get, config_get_bool, config_get_int
 from rucio.common.exception import DatabaseException, TransferToolTimeout, TransferToolWrongAnswer
 from rucio.common.logging import setup_logging
 from rucio.common.stopwatch import Stopwatch
@@ -41,11 +42,13 @@ from rucio.core import transfer as transfer_core
 from rucio.core.monitor import MetricManager
 from rucio.core.topology import ExpiringObjectCache, Topology
 from rucio.daemons.common import ProducerConsumerDaemon, db_workqueue
+from rucio.daemons.conveyor.common import get_batch_size
 from rucio.db.sqla.constants import MYSQL_LOCK_WAIT_TIMEOUT_EXCEEDED, ORACLE_DEADLOCK_DETECTED_REGEX, ORACLE_RESOURCE_BUSY_REGEX, RequestState, RequestType
 from rucio.transfertool.fts3 import FTS3Transfertool
 
 if TYPE_CHECKING:
-    from collections.abc import Mapping, Sequence
+    from collections.abc import Iterator, Mapping, Sequence
+    from concurrent.futures import Future
     from types import FrameType
 
     from rucio.daemons.common import HeartbeatHandler
@@ -117,9 +120,11 @@ def _handle_requests(
         transfertool: str,
         transfer_stats_manager: request_core.TransferStatsManager,
         oidc_account: Optional[str],
+        query_concurrency: int = 1,
         *,
         logger: LoggerFunction = logging.log,
 ) -> None:
+    polls = []
     transfs.sort(key=lambda t: (t['external_host'] or '',
                                 t['scope'].vo if multi_vo else '',
                                 t['external_id'] or '',
@@ -148,6 +153,9 @@ def _handle_requests(
                     })
 
                 transfertool_obj = transfertool_cls(external_host=external_host, **transfertool_kwargs)
+                if query_concurrency > 1:
+                    polls.append((transfertool_obj, chunk))
+                    continue
                 poll_transfers(
                     transfertool_obj=transfertool_obj,
                     transfers_by_eid=chunk,
@@ -158,6 +166,15 @@ def _handle_requests(
             except Exception:
                 logger(logging.ERROR, 'Exception', exc_info=True)
 
+    if polls:
+        poll_transfers_concurrently(
+            polls=polls,
+            transfer_stats_manager=transfer_stats_manager,
+            timeout=timeout,
+            max_workers=query_concurrency,
+            logger=logger,
+        )
+
 
 def poller(
         once: bool = False,
@@ -183,6 +200,7 @@ def poller(
 
     multi_vo = config_get_bool('common', 'multi_vo', False, None)
     oidc_account = config_get('conveyor', 'poller_oidc_account', False, None)
+    query_concurrency = config_get_int('conveyor', 'poll_query_concurrency', False, 1)
 
     executable = DAEMON_NAME
 
@@ -196,6 +214,8 @@ def poller(
 
     transfer_stats_manager = request_core.TransferStatsManager()
 
+    batch_size = get_batch_size(db_bulk)
+
     @db_workqueue(
         once=once,
         graceful_stop=GRACEFUL_STOP,
@@ -203,6 +223,7 @@ def poller(
         partition_wait_time=partition_wait_time,
         sleep_time=sleep_time,
         activities=activities,
+        batch_size=batch_size,
     )
     def _db_producer(
         *,
@@ -210,7 +231,7 @@ def poller(
         heartbeat_handler: "HeartbeatHandler"
     ) -> tuple[bool, list[dict[str, Any]]]:
         return _fetch_requests(
-            db_bulk=db_bulk,
+            db_bulk=batch_size.value,
             older_than=older_than,
             activity_shares=activity_shares,
             transfertool=transfertool,
@@ -230,6 +251,7 @@ def poller(
             oidc_account=oidc_account,
             transfertool=transfertool,  # type: ignore (transfertool is not None)
             transfer_stats_manager=transfer_stats_manager,
+            query_concurrency=query_concurrency,
         )
 
     with transfer_stats_manager:
@@ -237,6 +259,7 @@ def poller(
             producers=[_db_producer],
             consumers=[_consumer for _ in range(total_threads)],
             graceful_stop=GRACEFUL_STOP,
+            batch_size=batch_size,
         ).run()
 
 
@@ -286,7 +309,8 @@ def run(
         parsed_activity_shares.update((share, int(percentage * db_bulk)) for share, percentage in parsed_activity_shares.items())
         logging.info('activity shares enabled: %s' % parsed_activity_shares)
 
-    cached_topology = ExpiringObjectCache(ttl=300, new_obj_fnc=lambda: Topology())
+    incremental_refresh = config_get_bool('conveyor', 'incremental_topology_refresh', False, False)
+    cached_topology = ExpiringObjectCache(ttl=300, new_obj_fnc=lambda: Topology(), refresh_fnc=Topology.refresh if incremental_refresh else None)
     poller(
         once=once,
         fts_bulk=fts_bulk,
@@ -318,13 +342,72 @@ def poll_transfers(
         poll_individual_transfers = True
 
     if poll_individual_transfers:
-        logger(logging.ERROR, 'Problem querying %s on %s. All jobs are being checked individually' % (list(transfers_by_eid), transfertool_obj))
-        for external_id, transfers in transfers_by_eid.items():
-            logger(logging.DEBUG, 'Checking %s on %s' % (external_id, transfertool_obj))
-            try:
-                _poll_transfers(transfertool_obj, {external_id: transfers}, transfer_stats_manager, timeout, logger)
-            except Exception as err:
-                logger(logging.ERROR, 'Problem querying %s on %s . Error returned : %s' % (external_id, transfertool_obj, str(err)))
+        _poll_individual_transfers(transfertool_obj, transfers_by_eid, transfer_stats_manager, timeout, logger)
+
+
+def poll_transfers_concurrently(
+        polls: "Sequence[tuple[Transfertool, Mapping[str, Mapping[str, Any]]]]",
+        transfer_stats_manager: request_core.TransferStatsManager,
+        timeout: "Optional[int]" = None,
+        max_workers: int = 4,
+        logger: "LoggerFunction" = logging.log
+) -> None:
+    """
+    Poll several lists of transfers, each one from its own FTS server, at once.
+
+    The servers are queried in parallel by at most max_workers threads. The database is
+    updated from the calling thread, as soon as the answer to each query arrives.
+    """
+    for transfertool_obj, transfers_by_eid, future in _query_transfers_concurrently(polls, timeout=timeout, max_workers=max_workers, logger=logger):
+        try:
+            resps = future.result()
+        except TransferToolWrongAnswer:
+            _poll_individual_transfers(transfertool_obj, transfers_by_eid, transfer_stats_manager, timeout, logger)
+            continue
+        except Exception:
+            logger(logging.ERROR, 'Exception', exc_info=True)
+            continue
+        if resps is not None:
+            _update_transfers(transfertool_obj, transfers_by_eid, resps, transfer_stats_manager, logger)
+
+
+def _query_transfers_concurrently(
+        polls: "Sequence[tuple[Transfertool, Mapping[str, Mapping[str, Any]]]]",
+        timeout: "Optional[int]" = None,
+        max_workers: int = 4,
+        logger: "LoggerFunction" = logging.log
+) -> "Iterator[tuple[Transfertool, Mapping[str, Mapping[str, Any]], Future]]":
+    """
+    Send the bulk query of each poll in a pool of threads. Yield the polls together with the
+    future of their response, in the order in which the responses arrive.
+    """
+    with ThreadPoolExecutor(max_workers=max(min(max_workers, len(polls)), 1), thread_name_prefix='poller-query') as executor:
+        futures = {
+            executor.submit(_query_transfers, transfertool_obj, transfers_by_eid, timeout, logger): (transfertool_obj, transfers_by_eid)
+            for transfertool_obj, transfers_by_eid in polls
+        }
+        for future in as_completed(futures):
+            transfertool_obj, transfers_by_eid = futures[future]
+            yield transfertool_obj, transfers_by_eid, future
+
+
+def _poll_individual_transfers(
+        transfertool_obj: 'Transfertool',
+        transfers_by_eid: 'Mapping[str, Mapping[str, Any]]',
+        transfer_stats_manager: request_core.TransferStatsManager,
+        timeout: "Optional[int]" = None,
+        logger: "LoggerFunction" = logging.log
+) -> None:
+    """
+    Poll the transfers one job at a time, after their bulk query failed.
+    """
+    logger(logging.ERROR, 'Problem querying %s on %s. All jobs are being checked individually' % (list(transfers_by_eid), transfertool_obj))
+    for external_id, transfers in transfers_by_eid.items():
+        logger(logging.DEBUG, 'Checking %s on %s' % (external_id, transfertool_obj))
+        try:
+            _poll_transfers(transfertool_obj, {external_id: transfers}, transfer_stats_manager, timeout, logger)
+        except Exception as err:
+            logger(logging.ERROR, 'Problem querying %s on %s . Error returned : %s' % (external_id, transfertool_obj, str(err)))
 
 
 def _poll_transfers(
@@ -337,6 +420,21 @@ def _poll_transfers(
     """
     Helper function for poll_transfers which performs the actual polling and database update.
     """
+    resps = _query_transfers(transfertool_obj, transfers_by_eid, timeout, logger)
+    if resps is not None:
+        _update_transfers(transfertool_obj, transfers_by_eid, resps, transfer_stats_manager, logger)
+
+
+def _query_transfers(
+        transfertool_obj: 'Transfertool',
+        transfers_by_eid: 'Mapping[str, Mapping[str, Any]]',
+        timeout: "Optional[int]" = None,
+        logger: "LoggerFunction" = logging.log
+) -> Optional[dict[str, Any]]:
+    """
+    Query the status of the transfers from the transfertool. Returns None if the query failed.
+    Raises TransferToolWrongAnswer if the answer to a bulk query cannot be used: the transfers must then be queried one by one.
+    """
     is_bulk = len(transfers_by_eid) > 1
     try:
         stopwatch = Stopwatch()
@@ -347,58 +445,94 @@ def _poll_transfers(
         logger(logging.DEBUG, 'Polled %s transfer requests status in %s seconds' % (len(transfers_by_eid), stopwatch.elapsed))
     except TransferToolTimeout as error:
         logger(logging.ERROR, str(error))
-        return
+        return None
     except TransferToolWrongAnswer as error:
         logger(logging.ERROR, str(error))
         if is_bulk:
             raise  # The calling context will retry transfers one-by-one
         else:
-            return
+            return None
     except RequestException as error:
         logger(logging.ERROR, "Failed to contact FTS server: %s" % (str(error)))
-        return
+        return None
     except Exception:
         logger(logging.ERROR, "Failed to query FTS info", exc_info=True)
-        return
+        return None
+    return resps
 
+
+def _update_transfers(
+        transfertool_obj: 'Transfertool',
+        transfers_by_eid: 'Mapping[str, Mapping[str, Any]]',
+        resps: dict[str, Any],
+        transfer_stats_manager: request_core.TransferStatsManager,
+        logger: "LoggerFunction" = logging.log
+) -> None:
+    """
+    Update the database with the status of the transfers returned by the transfertool.
+    """
     tss = time.time()
     logger(logging.DEBUG, 'Updating %s transfer requests status' % (len(transfers_by_eid)))
     cnt = 0
 
     request_ids = set(itertools.chain.from_iterable(transfers_by_eid.values()))
+    tt_status_reports = []
     for transfer_id in resps:
-        try:
-            transf_resp = resps[transfer_id]
-            # transf_resp is None: Lost.
-            #             is Exception: Failed to get fts job status.
-            #             is {}: No terminated jobs.
-            #             is {request_id: {file_status}}: terminated jobs.
-            if transf_resp is None:
+        transf_resp = resps[transfer_id]
+        # transf_resp is None: Lost.
+        #             is Exception: Failed to get fts job status.
+        #             is {}: No terminated jobs.
+        #             is {request_id: {file_status}}: terminated jobs.
+        if transf_resp is None:
+            try:
                 for request_id, request in transfers_by_eid[transfer_id].items():
                     transfer_core.mark_transfer_lost(request, logger=logger)
                 METRICS.counter('transfer_lost').inc()
-            elif isinstance(transf_resp, Exception):
-                logger(logging.WARNING, "Failed to poll FTS(%s) job (%s): %s" % (transfertool_obj, transfer_id, transf_resp))
-                METRICS.counter('query_transfer_exception').inc()
-            else:
-                for request_id in request_ids.intersection(transf_resp):
-                    ret = transfer_core.update_transfer_state(
-                        tt_status_report=transf_resp[request_id],
-                        stats_manager=transfer_stats_manager,
-                        logger=logger,
-                    )
-                    cnt += ret
-                    if ret:
-                        METRICS.counter('update_request_state.{updated}').labels(updated=True).inc(delta=ret)
-                    else:
-                        METRICS.counter('update_request_state.{updated}').labels(updated=False).inc()
-
-            # should touch transfers.
-            # Otherwise if one bulk transfer includes many requests and one is not terminated, the transfer will be poll again.
-            transfer_core.touch_transfer(transfertool_obj.external_host, transfer_id)
-        except (DatabaseException, DatabaseError) as error:
-            if re.match(ORACLE_RESOURCE_BUSY_REGEX, error.args[0]) or re.match(ORACLE_DEADLOCK_DETECTED_REGEX, error.args[0]) or MYSQL_LOCK_WAIT_TIMEOUT_EXCEEDED in error.args[0]:
-                logger(logging.WARNING, "Lock detected when handling request %s - skipping" % transfer_id)
-            else:
-                logger(logging.ERROR, 'Exception', exc_info=True)
+            except (DatabaseException, DatabaseError) as error:
+                _log_database_error(error, transfer_id, logger)
+        elif isinstance(transf_resp, Exception):
+            logger(logging.WARNING, "Failed to poll FTS(%s) job (%s): %s" % (transfertool_obj, transfer_id, transf_resp))
+            METRICS.counter('query_transfer_exception').inc()
+        else:
+            tt_status_reports.extend(transf_resp[request_id] for request_id in request_ids.intersection(transf_resp))
+
+    try:
+        # All the terminated requests of the polled jobs are updated by a few bulk statements
+        cnt = transfer_core.update_transfer_states(
+            tt_status_reports=tt_status_reports,
+            stats_manager=transfer_stats_manager,
+            logger=logger,
+        )
+    except (DatabaseException, DatabaseError) as error:
+        # The bulk transaction was rolled back. Retry the requests one by one, so that a lock
+        # on one of them doesn't prevent the update of the others.
+        _log_database_error(error, ', '.join(resps), logger)
+        cnt = 0
+        for tt_status_report in tt_status_reports:
+            try:
+                cnt += transfer_core.update_transfer_state(
+                    tt_status_report=tt_status_report,
+                    stats_manager=transfer_stats_manager,
+                    logger=logger,
+                ) or 0
+            except (DatabaseException, DatabaseError) as error:
+                _log_database_error(error, tt_status_report.request_id, logger)
+    if cnt:
+        METRICS.counter('update_request_state.{updated}').labels(updated=True).inc(delta=cnt)
+    if len(tt_status_reports) > cnt:
+        METRICS.counter('update_request_state.{updated}').labels(updated=False).inc(delta=len(tt_status_reports) - cnt)
+
+    try:
+        # should touch transfers.
+        # Otherwise if one bulk transfer includes many requests and one is not terminated, the transfer will be poll again.
+        transfer_core.touch_transfers(transfertool_obj.external_host, list(resps))
+    except (DatabaseException, DatabaseError) as error:
+        _log_database_error(error, ', '.join(resps), logger)
     logger(logging.DEBUG, 'Finished updating %s transfer requests status (%i requests state changed) in %s seconds' % (len(transfers_by_eid), cnt, (time.time() - tss)))
+
+
+def _log_database_error(error: Exception, transfer_id: str, logger: "LoggerFunction" = logging.log) -> None:
+    if re.match(ORACLE_RESOURCE_BUSY_REGEX, error.args[0]) or re.match(ORACLE_DEADLOCK_DETECTED_REGEX, error.args[0]) or MYSQL_LOCK_WAIT_TIMEOUT_EXCEEDED in error.args[0]:
+        logger(logging.WARNING, "Lock detected when handling request %s - skipping" % transfer_id)
+    else:
+        logger(logging.ERROR, 'Exception', exc_info=True)
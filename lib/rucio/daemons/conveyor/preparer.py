@@ -19,14 +19,15 @@ from typing import TYPE_CHECKING, Optional
 
 import rucio.db.sqla.util
 from rucio.common import exception
-from rucio.common.config import config_get_list
+from rucio.common.config import config_get_bool, config_get_int, config_get_list
 from rucio.common.exception import RucioException
 from rucio.common.logging import setup_logging
 from rucio.core import transfer as transfer_core
 from rucio.core.request import RequestWithSources, list_and_mark_transfer_requests_and_source_replicas, transition_requests_state_if_possible
-from rucio.core.topology import ExpiringObjectCache, Topology
+from rucio.core.topology import ExpiringObjectCache, RoutingTableWorkers, Topology
 from rucio.core.transfer import ProtocolFactory, build_transfer_paths, list_transfer_admin_accounts, prepare_transfers
 from rucio.daemons.common import ProducerConsumerDaemon, db_workqueue
+from rucio.daemons.conveyor.common import get_batch_size
 from rucio.db.sqla.constants import RequestState, RequestType
 
 if TYPE_CHECKING:
@@ -65,16 +66,28 @@ def run(
     if rucio.db.sqla.util.is_old_db():
         raise exception.DatabaseException('Database was not updated, daemon won\'t start')
 
-    cached_topology = ExpiringObjectCache(ttl=300, new_obj_fnc=lambda: Topology(ignore_availability=ignore_availability))
+    use_routing_table = config_get_bool('conveyor', 'use_routing_table', False, False)
+    incremental_refresh = config_get_bool('conveyor', 'incremental_topology_refresh', False, False)
+    nb_routing_table_workers = config_get_int('conveyor', 'routing_table_workers', False, 1)
+    # The worker processes are started once and shared by all the topologies built by the daemon
+    routing_table_workers = RoutingTableWorkers(nb_routing_table_workers) if use_routing_table and nb_routing_table_workers > 1 else None
+    cached_topology = ExpiringObjectCache(ttl=300,
+                                          new_obj_fnc=lambda: Topology(ignore_availability=ignore_availability, use_routing_table=use_routing_table,
+                                                                       routing_table_workers=routing_table_workers),
+                                          refresh_fnc=Topology.refresh if incremental_refresh else None)
 
-    preparer(
-        once=once,
-        sleep_time=sleep_time,
-        bulk=bulk,
-        ignore_availability=ignore_availability,
-        cached_topology=cached_topology,
-        total_threads=threads
-    )
+    try:
+        preparer(
+            once=once,
+            sleep_time=sleep_time,
+            bulk=bulk,
+            ignore_availability=ignore_availability,
+            cached_topology=cached_topology,
+            total_threads=threads
+        )
+    finally:
+        if routing_table_workers:
+            routing_table_workers.close()
 
 
 def preparer(
@@ -92,19 +105,22 @@ def preparer(
     if not transfertools:
         transfertools = config_get_list('conveyor', 'transfertool', False, None)
 
+    batch_size = get_batch_size(bulk, size_fnc=lambda batch: len(batch[1]))
+
     @db_workqueue(
         once=once,
         graceful_stop=GRACEFUL_STOP,
         executable=executable,
         partition_wait_time=partition_wait_time,
-        sleep_time=sleep_time)
+        sleep_time=sleep_time,
+        batch_size=batch_size)
     def _db_producer(
         *,
         activity: str,
         heartbeat_handler: "HeartbeatHandler"
     ) -> tuple[bool, tuple[Topology, dict[str, RequestWithSources]]]:
         return _fetch_requests(
-            bulk=bulk,
+            bulk=batch_size.value,
             ignore_availability=ignore_availability,
             cached_topology=cached_topology,
             heartbeat_handler=heartbeat_handler,
@@ -122,6 +138,7 @@ def preparer(
         producers=[_db_producer],
         consumers=[_consumer for _ in range(total_threads)],
         graceful_stop=GRACEFUL_STOP,
+        batch_size=batch_size,
     ).run()
 
 
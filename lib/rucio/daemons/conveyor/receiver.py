@@ -18,6 +18,7 @@ Conveyor is a daemon to manage file transfers.
 
 import json
 import logging
+import queue
 import socket
 import threading
 import time
@@ -28,7 +29,7 @@ import stomp
 
 import rucio.db.sqla.util
 from rucio.common import exception
-from rucio.common.config import config_get, config_get_bool, config_get_int
+from rucio.common.config import config_get, config_get_bool, config_get_float, config_get_int
 from rucio.common.logging import setup_logging
 from rucio.common.policy import get_policy
 from rucio.core import request as request_core
@@ -77,9 +78,18 @@ class Receiver:
     def on_message(self, frame: "Frame") -> None:
         msg = json.loads(frame.body)  # type: ignore
 
+        if self._is_rucio_completion_message(msg):
+            METRICS.counter('message_rucio').inc()
+
+            self._perform_request_update(msg)
+
+    def _is_rucio_completion_message(self, msg: dict[str, Any]) -> bool:
+        """
+        Returns True if the message reports the completion of a transfer submitted by this rucio instance.
+        """
         if not self.__all_vos:
             if 'vo' not in msg or msg['vo'] != get_policy():
-                return
+                return False
 
         if 'job_metadata' in msg.keys() \
            and isinstance(msg['job_metadata'], dict) \
@@ -87,9 +97,8 @@ class Receiver:
            and str(msg['job_metadata']['issuer']) == 'rucio':
 
             if 'job_state' in msg.keys() and (str(msg['job_state']) != 'ACTIVE' or msg.get('job_multihop', False) is True):
-                METRICS.counter('message_rucio').inc()
-
-                self._perform_request_update(msg)
+                return True
+        return False
 
     @transactional_session
     def _perform_request_update(
@@ -103,22 +112,164 @@ class Receiver:
         request_id = msg['file_metadata'].get('request_id', None)
         try:
             tt_status_report = FTS3CompletionMessageTransferStatusReport(external_host, request_id=request_id, fts_message=msg)
-            if tt_status_report.get_db_fields_to_update(session=session, logger=logger):  # type: ignore
-                logging.info('RECEIVED %s', tt_status_report)
-
-                ret = transfer_core.update_transfer_state(
-                    tt_status_report=tt_status_report,
-                    stats_manager=self._transfer_stats_manager,
-                    session=session,
-                    logger=logger,
-                )
-                if ret:
-                    METRICS.counter('update_request_state.{updated}').labels(updated=True).inc(delta=ret)
-                else:
-                    METRICS.counter('update_request_state.{updated}').labels(updated=False).inc()
+            self._update_request_state(tt_status_report, session=session, logger=logger)
         except Exception:
             logging.critical(traceback.format_exc())
 
+    def _update_request_state(
+        self,
+        tt_status_report: FTS3CompletionMessageTransferStatusReport,
+        request: Optional[dict[str, Any]] = None,
+        *,
+        session: "Session",
+        logger: "LoggerFunction" = logging.log
+    ) -> None:
+        if tt_status_report.get_db_fields_to_update(session=session, logger=logger):
+            logging.info('RECEIVED %s', tt_status_report)
+
+            ret = transfer_core.update_transfer_state(
+                tt_status_report=tt_status_report,
+                stats_manager=self._transfer_stats_manager,
+                request=request,
+                session=session,
+                logger=logger,
+            )
+            if ret:
+                METRICS.counter('update_request_state.{updated}').labels(updated=True).inc(delta=ret)
+            else:
+                METRICS.counter('update_request_state.{updated}').labels(updated=False).inc()
+
+
+class BatchingReceiver(Receiver):
+    """
+    Receiver which applies the completion messages by batches.
+
+    The messages are buffered until batch_size of them are received, or for at most batch_wait
+    seconds after the first one. The requests of a batch are then loaded with one query and
+    updated in one transaction, by a thread distinct from the one reading the connection.
+    The messages are only acknowledged once this transaction is committed: if the daemon dies
+    in-between, the broker re-delivers them. The connection must thus be subscribed with
+    ack='client-individual'.
+    """
+
+    def __init__(
+            self,
+            broker: str,
+            id_: str,
+            total_threads: int,
+            transfer_stats_manager: request_core.TransferStatsManager,
+            conn: "stomp.Connection12",
+            batch_size: int,
+            batch_wait: float,
+            all_vos: bool = False
+    ):
+        super().__init__(broker=broker, id_=id_, total_threads=total_threads, transfer_stats_manager=transfer_stats_manager, all_vos=all_vos)
+        self._conn = conn
+        self._batch_size = batch_size
+        self._batch_wait = batch_wait
+        # (message, ack id) tuples waiting to be applied
+        self._messages = queue.Queue()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='receiver-batch', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Apply the messages received so far, then stop the batching thread.
+        """
+        self._stop_event.set()
+        self._thread.join(timeout=timeout)
+
+    @METRICS.count_it
+    def on_message(self, frame: "Frame") -> None:
+        ack_id = frame.headers.get('ack', frame.headers.get('message-id'))
+        try:
+            msg = json.loads(frame.body)  # type: ignore
+        except ValueError:
+            logging.error('Cannot decode message %s: %s', ack_id, frame.body)
+            self._ack(ack_id)
+            return
+
+        if self._is_rucio_completion_message(msg):
+            METRICS.counter('message_rucio').inc()
+            self._messages.put((msg, ack_id))
+        else:
+            self._ack(ack_id)
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set() or not self._messages.empty():
+            batch = self._next_batch()
+            if batch:
+                self._apply_batch(batch)
+
+    def _next_batch(self) -> list[tuple[dict[str, Any], str]]:
+        """
+        Wait for the next batch of messages. Returns an empty list if none was received within batch_wait.
+        """
+        try:
+            batch = [self._messages.get(timeout=self._batch_wait)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self._batch_wait
+        while len(batch) < self._batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._messages.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _apply_batch(self, batch: list[tuple[dict[str, Any], str]]) -> None:
+        """
+        Apply a batch of messages in one transaction and acknowledge them. If the transaction
+        fails, fall back to applying each message in its own transaction.
+        """
+        try:
+            with METRICS.timer('batch_update_request_state'):
+                self._perform_request_updates([msg for msg, _ in batch])
+        except Exception:
+            logging.warning('Failed to apply a batch of %d messages, will apply them one by one', len(batch), exc_info=True)
+            for msg, ack_id in batch:
+                try:
+                    self._perform_request_update(msg)
+                except Exception:
+                    logging.critical(traceback.format_exc())
+                self._ack(ack_id)
+            return
+
+        METRICS.counter('batch_messages').inc(delta=len(batch))
+        for _, ack_id in batch:
+            self._ack(ack_id)
+
+    @transactional_session
+    def _perform_request_updates(
+        self,
+        msgs: list[dict[str, Any]],
+        *,
+        session: "Session",
+        logger: "LoggerFunction" = logging.log
+    ) -> None:
+        requests_by_id = request_core.get_requests_by_id([msg['file_metadata'].get('request_id') for msg in msgs], session=session)
+        for msg in msgs:
+            external_host = msg.get('endpnt', None)
+            request_id = msg['file_metadata'].get('request_id', None)
+            # Only the first message of a request can rely on the pre-loaded request; the next ones
+            # must see the changes done by the previous messages.
+            request = requests_by_id.pop(request_id, None)
+            tt_status_report = FTS3CompletionMessageTransferStatusReport(external_host, request_id=request_id, fts_message=msg, request=request)
+            self._update_request_state(tt_status_report, request=request, session=session, logger=logger)
+
+    def _ack(self, ack_id: str) -> None:
+        try:
+            self._conn.ack(ack_id)
+        except Exception:
+            # Not acknowledged messages are re-delivered on the next connection
+            logging.warning('Failed to acknowledge message %s', ack_id, exc_info=True)
+
 
 def receiver(
         id_: str,
@@ -161,6 +312,10 @@ def receiver(
         password = config_get('messaging-fts3', 'password')
         port = config_get_int('messaging-fts3', 'nonssl_port')
 
+    # Apply the messages by batches if more than one message is allowed per batch
+    batch_size = config_get_int('conveyor', 'receiver_batch_size', False, 1)
+    batch_wait = config_get_float('conveyor', 'receiver_batch_wait', False, 0.5)
+
     conns = []
     for broker in brokers_resolved:
         if not use_ssl:
@@ -179,6 +334,7 @@ def receiver(
 
     logging.info('receiver started')
 
+    batching_receivers = {}
     with (HeartbeatHandler(executable=DAEMON_NAME, renewal_interval=30) as heartbeat_handler,
           request_core.TransferStatsManager() as transfer_stats_manager):
         while not GRACEFUL_STOP.is_set():
@@ -191,24 +347,45 @@ def receiver(
                     logger(logging.INFO, 'connecting to %s' % conn.transport._Transport__host_and_ports[0][0])
                     METRICS.counter('reconnect.{host}').labels(host=conn.transport._Transport__host_and_ports[0][0].split('.')[0]).inc()
 
-                    conn.set_listener(
-                        'rucio-messaging-fts3',
-                        Receiver(
+                    if batch_size > 1:
+                        previous_receiver = batching_receivers.pop(conn, None)
+                        if previous_receiver:
+                            previous_receiver.stop()
+                        listener = batching_receivers[conn] = BatchingReceiver(
+                            broker=conn.transport._Transport__host_and_ports[0],
+                            id_=id_,
+                            total_threads=total_threads,
+                            transfer_stats_manager=transfer_stats_manager,
+                            conn=conn,
+                            batch_size=batch_size,
+                            batch_wait=batch_wait,
+                            all_vos=all_vos
+                        )
+                        listener.start()
+                        ack, headers = 'client-individual', {'activemq.prefetchSize': 2 * batch_size}
+                    else:
+                        listener = Receiver(
                             broker=conn.transport._Transport__host_and_ports[0],
                             id_=id_,
                             total_threads=total_threads,
                             transfer_stats_manager=transfer_stats_manager,
                             all_vos=all_vos
-                        ))
+                        )
+                        ack, headers = 'auto', None
+                    conn.set_listener('rucio-messaging-fts3', listener)
                     if not use_ssl:
                         conn.connect(username, password, wait=True)
                     else:
                         conn.connect(wait=True)
                     conn.subscribe(destination=config_get('messaging-fts3', 'destination'),
                                    id='rucio-messaging-fts3',
-                                   ack='auto')
+                                   ack=ack,
+                                   headers=headers)
             time.sleep(1)
 
+        # Apply and acknowledge the buffered messages before disconnecting
+        for batching_receiver in batching_receivers.values():
+            batching_receiver.stop()
         for conn in conns:
             try:
                 conn.disconnect()
@@ -27,10 +27,11 @@ from rucio.common.schema import get_schema_value
 from rucio.common.stopwatch import Stopwatch
 from rucio.core.monitor import MetricManager
 from rucio.core.request import RequestWithSources, list_and_mark_transfer_requests_and_source_replicas
-from rucio.core.topology import ExpiringObjectCache, Topology
+from rucio.core.rse import subscribe_rse_snapshot, unsubscribe_rse_snapshot
+from rucio.core.topology import ExpiringObjectCache, RoutingTableWorkers, Topology
 from rucio.core.transfer import DEFAULT_MULTIHOP_TOMBSTONE_DELAY, TRANSFERTOOL_CLASSES_BY_NAME, ProtocolFactory, list_transfer_admin_accounts, transfer_path_str
 from rucio.daemons.common import ProducerConsumerDaemon, db_workqueue
-from rucio.daemons.conveyor.common import get_conveyor_rses, pick_and_prepare_submission_path, submit_transfer
+from rucio.daemons.conveyor.common import get_batch_size, get_conveyor_rses, pick_and_prepare_submission_path, submit_transfer
 from rucio.db.sqla.constants import RequestState, RequestType
 from rucio.transfertool.fts3 import FTS3Transfertool
 from rucio.transfertool.globus import GlobusTransferTool
@@ -275,20 +276,23 @@ def submitter(
         },
     }
 
+    batch_size = get_batch_size(bulk, size_fnc=lambda batch: len(batch[1]))
+
     @db_workqueue(
         once=once,
         graceful_stop=GRACEFUL_STOP,
         executable=executable,
         partition_wait_time=partition_wait_time,
         sleep_time=sleep_time,
-        activities=activities)
+        activities=activities,
+        batch_size=batch_size)
     def _db_producer(
         *,
         activity: str,
         heartbeat_handler: "HeartbeatHandler"
     ) -> tuple[bool, tuple[Topology, dict[str, RequestWithSources]]]:
         return _fetch_requests(
-            bulk=bulk,
+            bulk=batch_size.value,
             filter_transfertool=filter_transfertool,
             ignore_availability=ignore_availability,
             partition_hash_var=partition_hash_var,
@@ -317,6 +321,7 @@ def submitter(
         producers=[_db_producer],
         consumers=[_consumer for _ in range(total_threads)],
         graceful_stop=GRACEFUL_STOP,
+        batch_size=batch_size,
     ).run()
 
 
@@ -385,19 +390,36 @@ def run(
                 if activity in activities:
                     activities.remove(activity)
 
-    cached_topology = ExpiringObjectCache(ttl=300, new_obj_fnc=lambda: Topology(ignore_availability=ignore_availability))
-    submitter(
-        once=once,
-        rses=working_rses,
-        bulk=bulk,
-        group_bulk=group_bulk,
-        group_policy=group_policy,
-        activities=activities,
-        ignore_availability=ignore_availability,
-        sleep_time=sleep_time,
-        max_sources=max_sources,
-        source_strategy=source_strategy,
-        archive_timeout_override=archive_timeout_override,
-        cached_topology=cached_topology,
-        total_threads=total_threads,
-    )
+    use_routing_table = config_get_bool('conveyor', 'use_routing_table', False, False)
+    incremental_refresh = config_get_bool('conveyor', 'incremental_topology_refresh', False, False)
+    use_rse_snapshot = config_get_bool('conveyor', 'use_rse_snapshot', False, False)
+    nb_routing_table_workers = config_get_int('conveyor', 'routing_table_workers', False, 1)
+    # The worker processes are started once and shared by all the topologies built by the daemon
+    routing_table_workers = RoutingTableWorkers(nb_routing_table_workers) if use_routing_table and nb_routing_table_workers > 1 else None
+    cached_topology = ExpiringObjectCache(ttl=300,
+                                          new_obj_fnc=lambda: Topology(ignore_availability=ignore_availability, use_routing_table=use_routing_table,
+                                                                       use_rse_snapshot=use_rse_snapshot, routing_table_workers=routing_table_workers),
+                                          refresh_fnc=Topology.refresh if incremental_refresh else None)
+    if use_rse_snapshot:
+        subscribe_rse_snapshot()
+    try:
+        submitter(
+            once=once,
+            rses=working_rses,
+            bulk=bulk,
+            group_bulk=group_bulk,
+            group_policy=group_policy,
+            activities=activities,
+            ignore_availability=ignore_availability,
+            sleep_time=sleep_time,
+            max_sources=max_sources,
+            source_strategy=source_strategy,
+            archive_timeout_override=archive_timeout_override,
+            cached_topology=cached_topology,
+            total_threads=total_threads,
+        )
+    finally:
+        if use_rse_snapshot:
+            unsubscribe_rse_snapshot()
+        if routing_table_workers:
+            routing_table_workers.close()
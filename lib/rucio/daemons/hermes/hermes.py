@@ -19,15 +19,16 @@
 import calendar
 import datetime
 import functools
+import itertools
 import json
 import logging
 import random
-import re
 import smtplib
 import socket
 import sys
 import threading
 import time
+import zlib
 from configparser import NoOptionError, NoSectionError
 from email.mime.text import MIMEText
 from typing import TYPE_CHECKING, Any, Optional, Union
@@ -45,12 +46,14 @@ from rucio.common.config import (
 )
 from rucio.common.exception import DatabaseException
 from rucio.common.logging import setup_logging
+from rucio.common.stomp_utils import StompConnectionManager
+from rucio.common.utils import chunks
 from rucio.core.message import delete_messages, retrieve_messages
 from rucio.core.monitor import MetricManager
 from rucio.daemons.common import run_daemon
 
 if TYPE_CHECKING:
-    from collections.abc import Iterable, Sequence
+    from collections.abc import Callable, Iterable, Iterator, Sequence
     from types import FrameType
 
     from stomp.utils import Frame
@@ -86,6 +89,8 @@ class HermesListener(stomp.ConnectionListener):
         __init__
         """
         self.__broker = broker
+        self.__receipts = set()
+        self.__condition = threading.Condition()
 
     def on_error(self, frame: "Frame") -> None:
         """
@@ -93,20 +98,46 @@ class HermesListener(stomp.ConnectionListener):
         """
         logging.error("[broker] [%s]: %s", self.__broker, frame.body)
 
+    def on_receipt(self, frame: "Frame") -> None:
+        """
+        Receipt handler
+        """
+        with self.__condition:
+            self.__receipts.add(frame.headers.get("receipt-id"))
+            self.__condition.notify_all()
+
+    def wait_for_receipt(self, receipt: str, timeout: Optional[float]) -> bool:
+        """
+        Wait until the broker acknowledged the frame sent with the given receipt header.
+
+        :param receipt:            The receipt id.
+        :param timeout:            The maximum number of seconds to wait.
+
+        :returns:                  True if the receipt was received in time.
+        """
+        with self.__condition:
+            received = self.__condition.wait_for(lambda: receipt in self.__receipts, timeout=timeout)
+            self.__receipts.discard(receipt)
+        return received
+
 
 def setup_activemq(
-        logger: "LoggerFunction"
+        logger: "LoggerFunction",
+        stomp_conn_mngr: StompConnectionManager,
 ) -> tuple[
-    Optional[list[stomp.Connection12]],
+    Optional[list[stomp.Connection]],
     Optional[str],
     Optional[str],
     Optional[str],
     Optional[bool]
 ]:
     """
-    Deliver messages to ActiveMQ
+    Refresh the connections to the ActiveMQ brokers. The connections are kept
+    by the connection manager across cycles: only the new and stalled ones are
+    re-created.
 
     :param logger:             The logger object.
+    :param stomp_conn_mngr:    The connection manager holding the broker connections.
     """
 
     logger(logging.INFO, "[broker] Resolving brokers")
@@ -166,54 +197,141 @@ def setup_activemq(
         password = config_get("messaging-hermes", "password")
         port = config_get_int("messaging-hermes", "nonssl_port")
 
-    conns = []
-    for broker in brokers_resolved:
-        if not use_ssl:
+    # DNS round-robin may return the addresses in any order; sort them to not
+    # mistake a permutation for a configuration change.
+    created_conns, _ = stomp_conn_mngr.re_configure(
+        brokers=sorted(set(brokers_resolved)),
+        port=port,
+        use_ssl=use_ssl,
+        vhost=vhost,
+        reconnect_attempts=config_get_int("messaging-hermes", "reconnect_attempts", raise_exception=False, default=100),
+        ssl_key_file=config_get("messaging-hermes", "ssl_key_file", raise_exception=False),
+        ssl_cert_file=config_get("messaging-hermes", "ssl_cert_file", raise_exception=False),
+        timeout=broker_timeout,
+        logger=logger,
+    )
+    for con in created_conns:
+        if use_ssl:
             logger(
                 logging.INFO,
-                "[broker] setting up username/password authentication: %s",
-                broker,
+                "[broker] setting up ssl cert/key authentication: %s",
+                con.transport._Transport__host_and_ports[0][0],
             )
         else:
             logger(
                 logging.INFO,
-                "[broker] setting up ssl cert/key authentication: %s",
-                broker,
-            )
-
-        con = stomp.Connection12(
-            host_and_ports=[(broker, port)],
-            vhost=vhost,
-            keepalive=True,
-            timeout=broker_timeout,
-        )
-        if use_ssl:
-            con.set_ssl(
-                key_file=config_get("messaging-hermes", "ssl_key_file"),
-                cert_file=config_get("messaging-hermes", "ssl_cert_file"),
+                "[broker] setting up username/password authentication: %s",
+                con.transport._Transport__host_and_ports[0][0],
             )
-
         con.set_listener(
             "rucio-hermes", HermesListener(con.transport._Transport__host_and_ports[0])
         )
 
-        conns.append(con)
     destination = config_get("messaging-hermes", "destination")
-    return conns, destination, username, password, use_ssl
+    return stomp_conn_mngr.connections, destination, username, password, use_ssl
+
+
+def _log_activemq_message(message: dict[str, Any], logger: "LoggerFunction") -> None:
+    event_type = str(message["event_type"]).lower()
+    if event_type.startswith("transfer") or event_type.startswith("stagein"):
+        logger(
+            logging.DEBUG,
+            "[broker] - event_type: %s, scope: %s, name: %s, rse: %s, request-id: %s, transfer-id: %s, created_at: %s",
+            event_type,
+            message["payload"].get("scope", None),
+            message["payload"].get("name", None),
+            message["payload"].get("dst-rse", None),
+            message["payload"].get("request-id", None),
+            message["payload"].get("transfer-id", None),
+            str(message["created_at"]),
+        )
+
+    elif event_type.startswith("dataset"):
+        logger(
+            logging.DEBUG,
+            "[broker] - event_type: %s, scope: %s, name: %s, rse: %s, rule-id: %s, created_at: %s)",
+            event_type,
+            message["payload"].get("scope", None),
+            message["payload"].get("name", None),
+            message["payload"].get("rse", None),
+            message["payload"].get("rule_id", None),
+            str(message["created_at"]),
+        )
+
+    elif event_type.startswith("deletion"):
+        if "url" not in message["payload"]:
+            message["payload"]["url"] = "unknown"
+        logger(
+            logging.DEBUG,
+            "[broker] - event_type: %s, scope: %s, name: %s, rse: %s, url: %s, created_at: %s)",
+            event_type,
+            message["payload"].get("scope", None),
+            message["payload"].get("name", None),
+            message["payload"].get("rse", None),
+            message["payload"].get("url", None),
+            str(message["created_at"]),
+        )
+    else:
+        logger(logging.DEBUG, "[broker] Other message: %s", message)
+
+
+def _send_activemq_batch(
+    conn: stomp.Connection,
+    frames: "Sequence[tuple[str, str]]",
+    destination: str,
+    receipt_timeout: Optional[float],
+) -> bool:
+    """
+    Send the frames in a single broker transaction and wait for the broker to
+    acknowledge the commit.
+
+    :param conn:               The connection to use.
+    :param frames:             List of (event_type, body) tuples.
+    :param destination:        The destination topic or queue.
+    :param receipt_timeout:    The maximum number of seconds to wait for the commit receipt.
+
+    :returns:                  True if the commit was acknowledged by the broker.
+    """
+    transaction = conn.begin()
+    try:
+        for event_type, body in frames:
+            conn.send(
+                body=body,
+                destination=destination,
+                headers={
+                    "persistent": "true",
+                    "event_type": event_type,
+                },
+                transaction=transaction,
+            )
+    except Exception:
+        if conn.is_connected():
+            conn.abort(transaction)
+        raise
+    receipt = "commit-%s" % transaction
+    conn.commit(transaction, headers={"receipt": receipt})
+    return conn.get_listener("rucio-hermes").wait_for_receipt(receipt, timeout=receipt_timeout)
 
 
 def deliver_to_activemq(
     messages: "Iterable[dict[str, Any]]",
-    conns: "Sequence[stomp.Connection12]",
+    conns: "Sequence[stomp.Connection]",
     destination: str,
     username: str,
     password: str,
     use_ssl: bool,
-    logger: "LoggerFunction"
+    logger: "LoggerFunction",
+    batch_size: int = 500,
+    receipt_timeout: Optional[float] = 30,
+    on_batch_delivered: "Optional[Callable[[list[dict[str, Any]]], None]]" = None,
 ) -> list[str]:
     """
     Deliver messages to ActiveMQ
 
+    The messages are sent in batches, each batch within a broker transaction
+    on one of the connections. A batch is only considered delivered once the
+    broker acknowledged its commit.
+
     :param messages:           The list of messages.
     :param conns:              A list of connections.
     :param destination:        The destination topic or queue.
@@ -221,115 +339,94 @@ def deliver_to_activemq(
     :param password:           The username if no SSL connection.
     :param use_ssl:            Boolean to choose if SSL connection is used.
     :param logger:             The logger object.
+    :param batch_size:         The maximum number of messages sent in one broker transaction.
+    :param receipt_timeout:    The maximum number of seconds to wait for the broker to acknowledge a batch.
+    :param on_batch_delivered: Called with the messages of each batch once it is delivered.
 
     :returns:                  List of message_id to delete
     """
+    messages = list(messages)
+    conns = random.sample(conns, len(conns))
     to_delete = []
-    for message in messages:
-        try:
-            conn = random.sample(conns, 1)[0]
-            if not conn.is_connected():
-                host_and_ports = conn.transport._Transport__host_and_ports[0][0]
-                RECONNECT_COUNTER.labels(host=host_and_ports.split(".")[0]).inc()
-                if not use_ssl:
-                    logger(
-                        logging.INFO,
-                        "[broker] - connecting with USERPASS to %s",
-                        host_and_ports,
-                    )
-                    conn.connect(username, password, wait=True)
-                else:
-                    logger(
-                        logging.INFO,
-                        "[broker] - connecting with SSL to %s",
-                        host_and_ports,
-                    )
-                    conn.connect(wait=True)
+    for batch_number, offset in enumerate(range(0, len(messages), batch_size)):
+        batch = messages[offset:offset + batch_size]
 
-            conn.send(
-                body=json.dumps(
+        delivered = []
+        frames = []
+        for message in batch:
+            event_type = str(message["event_type"]).lower()
+            try:
+                body = json.dumps(
                     {
-                        "event_type": str(message["event_type"]).lower(),
+                        "event_type": event_type,
                         "payload": message["payload"],
                         "created_at": str(message["created_at"]),
                     }
-                ),
-                destination=destination,
-                headers={
-                    "persistent": "true",
-                    "event_type": str(message["event_type"]).lower(),
-                },
-            )
-
-            to_delete.append(message["id"])
-        except ValueError:
-            logger(
-                logging.ERROR,
-                "[broker] Cannot serialize payload to JSON: %s",
-                str(message["payload"]),
-            )
-            to_delete.append(message["id"])
-            continue
-        except stomp.exception.NotConnectedException as error:
-            logger(
-                logging.WARNING,
-                "[broker] Could not deliver message due to NotConnectedException: %s",
-                str(error),
-            )
-            continue
-        except stomp.exception.ConnectFailedException as error:
-            logger(
-                logging.WARNING,
-                "[broker] Could not deliver message due to ConnectFailedException: %s",
-                str(error),
-            )
-            continue
-        except Exception as error:
-            logger(logging.ERROR, "[broker] Could not deliver message: %s", str(error))
-            continue
-
-        if str(message["event_type"]).lower().startswith("transfer") or str(
-            message["event_type"]
-        ).lower().startswith("stagein"):
-            logger(
-                logging.DEBUG,
-                "[broker] - event_type: %s, scope: %s, name: %s, rse: %s, request-id: %s, transfer-id: %s, created_at: %s",
-                str(message["event_type"]).lower(),
-                message["payload"].get("scope", None),
-                message["payload"].get("name", None),
-                message["payload"].get("dst-rse", None),
-                message["payload"].get("request-id", None),
-                message["payload"].get("transfer-id", None),
-                str(message["created_at"]),
-            )
-
-        elif str(message["event_type"]).lower().startswith("dataset"):
-            logger(
-                logging.DEBUG,
-                "[broker] - event_type: %s, scope: %s, name: %s, rse: %s, rule-id: %s, created_at: %s)",
-                str(message["event_type"]).lower(),
-                message["payload"].get("scope", None),
-                message["payload"].get("name", None),
-                message["payload"].get("rse", None),
-                message["payload"].get("rule_id", None),
-                str(message["created_at"]),
-            )
+                )
+            except (TypeError, ValueError):
+                logger(
+                    logging.ERROR,
+                    "[broker] Cannot serialize payload to JSON: %s",
+                    str(message["payload"]),
+                )
+                delivered.append(message)
+                continue
+            frames.append((event_type, body))
 
-        elif str(message["event_type"]).lower().startswith("deletion"):
-            if "url" not in message["payload"]:
-                message["payload"]["url"] = "unknown"
-            logger(
-                logging.DEBUG,
-                "[broker] - event_type: %s, scope: %s, name: %s, rse: %s, url: %s, created_at: %s)",
-                str(message["event_type"]).lower(),
-                message["payload"].get("scope", None),
-                message["payload"].get("name", None),
-                message["payload"].get("rse", None),
-                message["payload"].get("url", None),
-                str(message["created_at"]),
-            )
-        else:
-            logger(logging.DEBUG, "[broker] Other message: %s", message)
+        if frames:
+            conn = conns[batch_number % len(conns)]
+            sent = False
+            try:
+                if not conn.is_connected():
+                    host_and_ports = conn.transport._Transport__host_and_ports[0][0]
+                    RECONNECT_COUNTER.labels(host=host_and_ports.split(".")[0]).inc()
+                    if not use_ssl:
+                        logger(
+                            logging.INFO,
+                            "[broker] - connecting with USERPASS to %s",
+                            host_and_ports,
+                        )
+                        conn.connect(username, password, wait=True)
+                    else:
+                        logger(
+                            logging.INFO,
+                            "[broker] - connecting with SSL to %s",
+                            host_and_ports,
+                        )
+                        conn.connect(wait=True)
+
+                sent = _send_activemq_batch(conn, frames, destination, receipt_timeout)
+                if not sent:
+                    logger(
+                        logging.WARNING,
+                        "[broker] Could not deliver %i messages: no commit receipt after %s seconds",
+                        len(frames),
+                        receipt_timeout,
+                    )
+            except stomp.exception.NotConnectedException as error:
+                logger(
+                    logging.WARNING,
+                    "[broker] Could not deliver %i messages due to NotConnectedException: %s",
+                    len(frames),
+                    str(error),
+                )
+            except stomp.exception.ConnectFailedException as error:
+                logger(
+                    logging.WARNING,
+                    "[broker] Could not deliver %i messages due to ConnectFailedException: %s",
+                    len(frames),
+                    str(error),
+                )
+            except Exception as error:
+                logger(logging.ERROR, "[broker] Could not deliver %i messages: %s", len(frames), str(error))
+            if sent:
+                delivered = batch
+
+        for message in delivered:
+            _log_activemq_message(message, logger)
+        to_delete.extend(message["id"] for message in delivered)
+        if on_batch_delivered and delivered:
+            on_batch_delivered(delivered)
     return to_delete
 
 
@@ -406,115 +503,208 @@ def submit_to_elastic(
     return res.status_code
 
 
-def aggregate_to_influx(
+def _influx_transfer_timestamp(transferred_at: str, bin_size: str, microsecond: int) -> Union[int, time.struct_time]:
+    timestamp = time.strptime(transferred_at, "%Y-%m-%d %H:%M:%S")
+    if bin_size == "1m":
+        return int(calendar.timegm(timestamp)) * 1000000000 + microsecond
+    return timestamp
+
+
+def _influx_deletion_timestamp(created_at: datetime.datetime, bin_size: str, microsecond: int) -> int:
+    if bin_size == "1m":
+        created_at = created_at.replace(
+            second=0, microsecond=0, tzinfo=datetime.timezone.utc
+        ).timestamp()
+    return int(created_at) * 1000000000 + microsecond
+
+
+def aggregate_influx_series(
     messages: "Iterable[dict[str, Any]]",
-    bin_size: int,
-    endpoint: str,
-    logger: "LoggerFunction"
-) -> int:
+    bin_size: str,
+    logger: "LoggerFunction",
+    microsecond: Optional[int] = None,
+) -> dict[tuple, list[int]]:
     """
-    Aggregate a list of message using a certain bin_size
-    and submit them to a InfluxDB endpoint
+    Aggregate a list of transfer and deletion messages into InfluxDB series.
+
+    The messages are split into columns. Timestamps are converted once per
+    distinct value, and each distinct series accumulates its counters, so the
+    formatting work depends on the number of series rather than the number of
+    messages.
 
     :param messages:           The list of messages.
     :param bin_size:           The size of the bins for the aggregation (e.g. 10m, 1h, etc.).
-    :param endpoint:           The InfluxDB endpoint were to send the messages.
     :param logger:             The logger object.
+    :param microsecond:        The offset added to the timestamps. Defaults to the microseconds of the current time.
 
-    :returns:                  HTTP status code. 200 and 204 OK. Rest is failure.
+    :returns:                  Dictionary {(measurement, timestamp, *tags): [nb_done, bytes_done, nb_failed, bytes_failed]}
     """
-    bins = {}
-    dtime = datetime.datetime.now()
-    microsecond = dtime.microsecond
+    if microsecond is None:
+        microsecond = datetime.datetime.now().microsecond
 
+    transfers = []
+    deletions = []
     for message in messages:
         event_type = message["event_type"]
-        payload = message["payload"]
-        if event_type in ["transfer-failed", "transfer-done"]:
-            if not payload["transferred_at"]:
+        if event_type in ("transfer-failed", "transfer-done"):
+            if not message["payload"]["transferred_at"]:
                 logger(
                     logging.WARNING,
                     "No transferred_at for message. Reason : %s",
-                    payload["reason"],
+                    message["payload"]["reason"],
                 )
                 continue
-            transferred_at = time.strptime(
-                payload["transferred_at"], "%Y-%m-%d %H:%M:%S"
-            )
-            if bin_size == "1m":
-                transferred_at = int(calendar.timegm(transferred_at)) * 1000000000
-                transferred_at += microsecond
-            if transferred_at not in bins:
-                bins[transferred_at] = {}
-            src_rse, dest_rse, activity = (
-                payload["src-rse"],
-                payload["dst-rse"],
-                payload["activity"],
-            )
-            activity = re.sub(" ", r"\ ", activity)
-            key = "transfer,activity=%s,src_rse=%s,dst_rse=%s" % (
-                activity,
-                src_rse,
-                dest_rse,
-            )
-            if key not in bins[transferred_at]:
-                bins[transferred_at][key] = [0, 0, 0, 0]
-            if event_type == "transfer-done":
-                bins[transferred_at][key][0] += 1
-                bins[transferred_at][key][1] += payload["bytes"]
-            if event_type == "transfer-failed":
-                bins[transferred_at][key][2] += 1
-                bins[transferred_at][key][3] += payload["bytes"]
-        elif event_type in ["deletion-failed", "deletion-done"]:
-            created_at = message["created_at"]
-            if bin_size == "1m":
-                created_at = created_at.replace(
-                    second=0, microsecond=0, tzinfo=datetime.timezone.utc
-                ).timestamp()
-            created_at = int(created_at) * 1000000000
-            created_at += microsecond
-            if created_at not in bins:
-                bins[created_at] = {}
-            rse = payload["rse"]
-            key = "deletion,rse=%s" % (rse)
-            if key not in bins[created_at]:
-                bins[created_at][key] = [0, 0, 0, 0]
-            if event_type == "deletion-done":
-                bins[created_at][key][0] += 1
-                bins[created_at][key][1] += payload["bytes"]
-            if event_type == "deletion-failed":
-                bins[created_at][key][2] += 1
-                bins[created_at][key][3] += payload["bytes"]
-    points = ""
-    for timestamp in bins:
-        for entry in bins[timestamp]:
-            metrics = bins[timestamp][entry]
-            event_type = entry.split(",")[0]
-            point = (
-                "%s nb_%s_done=%s,bytes_%s_done=%s,nb_%s_failed=%s,bytes_%s_failed=%s %s"
-                % (
-                    entry,
-                    event_type,
-                    metrics[0],
-                    event_type,
-                    metrics[1],
-                    event_type,
-                    metrics[2],
-                    event_type,
-                    metrics[3],
-                    timestamp,
+            transfers.append(message)
+        elif event_type in ("deletion-failed", "deletion-done"):
+            deletions.append(message)
+
+    series = {}
+
+    def _accumulate(keys: "Iterable[tuple]", done_column: "Iterable[bool]", bytes_column: "Iterable[int]") -> None:
+        for key, done, bytes_ in zip(keys, done_column, bytes_column):
+            metrics = series.get(key)
+            if metrics is None:
+                metrics = series[key] = [0, 0, 0, 0]
+            if done:
+                metrics[0] += 1
+                metrics[1] += bytes_
+            else:
+                metrics[2] += 1
+                metrics[3] += bytes_
+
+    if transfers:
+        payloads = [message["payload"] for message in transfers]
+        transferred_at = [payload["transferred_at"] for payload in payloads]
+        timestamps = {value: _influx_transfer_timestamp(value, bin_size, microsecond) for value in set(transferred_at)}
+        _accumulate(
+            keys=zip(
+                itertools.repeat("transfer"),
+                map(timestamps.__getitem__, transferred_at),
+                [payload["activity"] for payload in payloads],
+                [payload["src-rse"] for payload in payloads],
+                [payload["dst-rse"] for payload in payloads],
+            ),
+            done_column=[message["event_type"] == "transfer-done" for message in transfers],
+            bytes_column=[payload["bytes"] for payload in payloads],
+        )
+
+    if deletions:
+        payloads = [message["payload"] for message in deletions]
+        created_at = [message["created_at"] for message in deletions]
+        timestamps = {value: _influx_deletion_timestamp(value, bin_size, microsecond) for value in set(created_at)}
+        _accumulate(
+            keys=zip(
+                itertools.repeat("deletion"),
+                map(timestamps.__getitem__, created_at),
+                [payload["rse"] for payload in payloads],
+            ),
+            done_column=[message["event_type"] == "deletion-done" for message in deletions],
+            bytes_column=[payload["bytes"] for payload in payloads],
+        )
+    return series
+
+
+def influx_line_protocol(series: dict[tuple, list[int]]) -> "Iterator[str]":
+    """
+    Render the aggregated series as InfluxDB line protocol, one point per line.
+
+    :param series:             The series, as returned by aggregate_influx_series.
+    """
+    series_keys = {}
+    for (measurement, timestamp, *tags), metrics in series.items():
+        tags = tuple(tags)
+        series_key = series_keys.get((measurement, tags))
+        if series_key is None:
+            if measurement == "transfer":
+                activity, src_rse, dest_rse = tags
+                series_key = "transfer,activity=%s,src_rse=%s,dst_rse=%s" % (
+                    activity.replace(" ", "\\ "),
+                    src_rse,
+                    dest_rse,
                 )
-            )
-            points += point
-            points += "\n"
+            else:
+                series_key = "deletion,rse=%s" % tags
+            series_keys[measurement, tags] = series_key
+        yield "%s nb_%s_done=%s,bytes_%s_done=%s,nb_%s_failed=%s,bytes_%s_failed=%s %s\n" % (
+            series_key,
+            measurement,
+            metrics[0],
+            measurement,
+            metrics[1],
+            measurement,
+            metrics[2],
+            measurement,
+            metrics[3],
+            timestamp,
+        )
+
+
+def _gzip_stream(lines: "Iterable[str]", chunk_size: int = 1000) -> "Iterator[bytes]":
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks(lines, chunk_size):
+        data = compressor.compress("".join(chunk).encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def aggregate_to_influx(
+    messages: "Iterable[dict[str, Any]]",
+    bin_size: str,
+    endpoint: str,
+    logger: "LoggerFunction",
+    http_session: Optional[requests.Session] = None,
+) -> int:
+    """
+    Aggregate a list of message using a certain bin_size
+    and submit them to a InfluxDB endpoint
+
+    :param messages:           The list of messages.
+    :param bin_size:           The size of the bins for the aggregation (e.g. 10m, 1h, etc.).
+    :param endpoint:           The InfluxDB endpoint were to send the messages.
+    :param logger:             The logger object.
+    :param http_session:       The HTTP session to reuse for the submission.
+
+    :returns:                  HTTP status code. 200 and 204 OK. Rest is failure.
+    """
+    series = aggregate_influx_series(messages=messages, bin_size=bin_size, logger=logger)
+    if not series:
+        return 204
+
+    headers = {}
     influx_token = config_get("hermes", "influxdb_token", False, None)
     if influx_token:
-        headers = {"Authorization": "Token %s" % influx_token}
-    if points:
-        res = requests.post(endpoint, headers=headers, data=points)
-        logger(logging.DEBUG, "%s", str(res.text))
-        return res.status_code
-    return 204
+        headers["Authorization"] = "Token %s" % influx_token
+    data = influx_line_protocol(series)
+    if config_get_bool("hermes", "influxdb_gzip", raise_exception=False, default=True):
+        headers["Content-Encoding"] = "gzip"
+        data = _gzip_stream(data)
+    else:
+        data = "".join(data)
+
+    res = (http_session or requests).post(endpoint, headers=headers, data=data)
+    logger(logging.DEBUG, "%s", str(res.text))
+    return res.status_code
+
+
+def _delete_delivered_messages(messages: "Iterable[dict[str, Any]]") -> None:
+    """
+    Delete the delivered messages and archive them to the history.
+
+    :param messages:           The delivered messages.
+    """
+    delete_messages(
+        messages=[
+            {
+                "id": message["id"],
+                "created_at": message["created_at"],
+                "updated_at": message["created_at"],
+                "payload": str(message["payload"]),
+                "event_type": message["event_type"],
+            }
+            for message in messages
+        ]
+    )
 
 
 def hermes(once: bool = False, bulk: int = 1000, sleep_time: int = 10) -> None:
@@ -527,6 +717,8 @@ def hermes(once: bool = False, bulk: int = 1000, sleep_time: int = 10) -> None:
     :param bulk:       The number of requests to process.
     :param sleep_time: Time between two cycles.
     """
+    stomp_conn_mngr = StompConnectionManager()
+    http_session = requests.Session()
     run_daemon(
         once=once,
         graceful_stop=graceful_stop,
@@ -536,11 +728,21 @@ def hermes(once: bool = False, bulk: int = 1000, sleep_time: int = 10) -> None:
         run_once_fnc=functools.partial(
             run_once,
             bulk=bulk,
+            stomp_conn_mngr=stomp_conn_mngr,
+            http_session=http_session,
         ),
     )
+    stomp_conn_mngr.disconnect()
+    http_session.close()
 
 
-def run_once(heartbeat_handler: "HeartbeatHandler", bulk: int, **_kwargs) -> bool:
+def run_once(
+    heartbeat_handler: "HeartbeatHandler",
+    bulk: int,
+    stomp_conn_mngr: Optional[StompConnectionManager] = None,
+    http_session: Optional[requests.Session] = None,
+    **_kwargs
+) -> bool:
 
     worker_number, total_workers, logger = heartbeat_handler.live()
     try:
@@ -573,8 +775,12 @@ def run_once(heartbeat_handler: "HeartbeatHandler", bulk: int, **_kwargs) -> boo
             logger(logging.ERROR, str(err))
     conns = None
     if "activemq" in services_list:
+        if stomp_conn_mngr is None:
+            stomp_conn_mngr = StompConnectionManager()
+        activemq_batch_size = config_get_int("hermes", "activemq_batch_size", raise_exception=False, default=500)
+        receipt_timeout = config_get_int("messaging-hermes", "receipt_timeout", raise_exception=False, default=30)
         try:
-            conns, destination, username, password, use_ssl = setup_activemq(logger)
+            conns, destination, username, password, use_ssl = setup_activemq(logger, stomp_conn_mngr)
             if not conns:
                 logger(
                     logging.ERROR,
@@ -619,6 +825,7 @@ def run_once(heartbeat_handler: "HeartbeatHandler", bulk: int, **_kwargs) -> boo
                     bin_size="1m",
                     endpoint=influx_endpoint,
                     logger=logger,
+                    http_session=http_session,
                 )
                 if state in [204, 200]:
                     logger(
@@ -696,31 +903,22 @@ def run_once(heartbeat_handler: "HeartbeatHandler", bulk: int, **_kwargs) -> boo
                     password=password,  # type: ignore (argument could be None)
                     use_ssl=use_ssl,  # type: ignore (argument could be None)
                     logger=logger,
+                    batch_size=activemq_batch_size,
+                    receipt_timeout=receipt_timeout,
+                    # Delete each batch as soon as the broker acknowledged it
+                    on_batch_delivered=_delete_delivered_messages,
                 )
                 logger(
                     logging.INFO,
                     "%s messages successfully submitted to ActiveMQ in %s seconds",
-                    len(message_dict["activemq"]),
+                    len(messages_sent),
                     time.time() - t_time,
                 )
-                for message in message_dict["activemq"]:
-                    if message["id"] in messages_sent:
-                        to_delete.append(message)
             except Exception as error:
                 logger(logging.ERROR, "Error sending to ActiveMQ : %s", str(error))
 
     logger(logging.INFO, "Deleting %s messages", len(to_delete))
-    to_delete = [
-        {
-            "id": message["id"],
-            "created_at": message["created_at"],
-            "updated_at": message["created_at"],
-            "payload": str(message["payload"]),
-            "event_type": message["event_type"],
-        }
-        for message in to_delete
-    ]
-    delete_messages(messages=to_delete)
+    _delete_delivered_messages(to_delete)
     must_sleep = True
     return must_sleep
 
@@ -34,7 +34,7 @@ from rucio.common.exception import DatabaseException, DataIdentifierNotFound, Re
 from rucio.common.logging import setup_logging
 from rucio.common.types import InternalScope
 from rucio.core.monitor import MetricManager
-from rucio.core.rule import delete_updated_did, get_updated_dids, re_evaluate_did
+from rucio.core.rule import delete_updated_dids, get_updated_dids, re_evaluate_did
 from rucio.daemons.common import HeartbeatHandler, run_daemon
 from rucio.db.sqla.constants import ORACLE_CONNECTION_LOST_CONTACT_REGEX, ORACLE_RESOURCE_BUSY_REGEX, ORACLE_UNIQUE_CONSTRAINT_VIOLATED_REGEX
 
@@ -66,7 +66,8 @@ def re_evaluator(
             run_once,
             did_limit=did_limit,
             paused_dids=paused_dids,
-        )
+        ),
+        work_stealing=True,
     )
 
 
@@ -100,54 +101,49 @@ def run_once(
         logger(logging.DEBUG, 'did not get any work (paused_dids=%s)', str(len(paused_dids)))
         return
 
-    done_dids = {}
+    # Group the updated dids by did and by action: each group is evaluated once,
+    # and all of its updated_did rows are deleted in the evaluation transaction
+    grouped_dids = {}  # {(scope, name): {rule_evaluation_action: [id, ...]}}
     for did in dids:
-        _, _, logger = heartbeat_handler.live()
-        if graceful_stop.is_set():
-            break
-
-        # Check if this did has already been operated on
-        did_tag = '%s:%s' % (did.scope.internal, did.name)
-        if did_tag in done_dids:
-            if did.rule_evaluation_action in done_dids[did_tag]:
-                logger(logging.DEBUG, 'evaluation of %s:%s already done', did.scope, did.name)
-                delete_updated_did(id_=did.id)
-                continue
-        else:
-            done_dids[did_tag] = []
+        grouped_dids.setdefault((did.scope, did.name), {}).setdefault(did.rule_evaluation_action, []).append(did.id)
 
+    for (scope, name), actions in grouped_dids.items():
         # Jump paused dids
-        if (did.scope.internal, did.name) in paused_dids:
+        if (scope.internal, name) in paused_dids:
             continue
 
-        try:
-            start_time = time.time()
-            re_evaluate_did(scope=did.scope, name=did.name, rule_evaluation_action=did.rule_evaluation_action)
-            logger(logging.DEBUG, 'evaluation of %s:%s took %f', did.scope, did.name, time.time() - start_time)
-            delete_updated_did(id_=did.id)
-            done_dids[did_tag].append(did.rule_evaluation_action)
-        except DataIdentifierNotFound:
-            delete_updated_did(id_=did.id)
-        except (DatabaseException, DatabaseError) as e:
-            if match(ORACLE_UNIQUE_CONSTRAINT_VIOLATED_REGEX, str(e.args[0])) or match(ORACLE_RESOURCE_BUSY_REGEX, str(e.args[0])):
-                paused_dids[(did.scope.internal, did.name)] = datetime.utcnow() + timedelta(seconds=randint(60, 600))  # noqa: S311
-                logger(logging.WARNING, 'Locks detected for %s:%s', did.scope, did.name)
-                METRICS.counter('exceptions.{exception}').labels(exception='LocksDetected').inc()
-            elif match('.*QueuePool.*', str(e.args[0])):
-                logger(logging.WARNING, traceback.format_exc())
+        for rule_evaluation_action, updated_did_ids in actions.items():
+            _, _, logger = heartbeat_handler.live()
+            if graceful_stop.is_set():
+                return
+
+            try:
+                start_time = time.time()
+                re_evaluate_did(scope=scope, name=name, rule_evaluation_action=rule_evaluation_action, updated_did_ids=updated_did_ids)
+                logger(logging.DEBUG, 'evaluation of %s:%s (%d updates) took %f', scope, name, len(updated_did_ids), time.time() - start_time)
+            except DataIdentifierNotFound:
+                delete_updated_dids(ids=updated_did_ids)
+            except (DatabaseException, DatabaseError) as e:
+                if match(ORACLE_UNIQUE_CONSTRAINT_VIOLATED_REGEX, str(e.args[0])) or match(ORACLE_RESOURCE_BUSY_REGEX, str(e.args[0])):
+                    paused_dids[(scope.internal, name)] = datetime.utcnow() + timedelta(seconds=randint(60, 600))  # noqa: S311
+                    logger(logging.WARNING, 'Locks detected for %s:%s', scope, name)
+                    METRICS.counter('exceptions.{exception}').labels(exception='LocksDetected').inc()
+                    break
+                elif match('.*QueuePool.*', str(e.args[0])):
+                    logger(logging.WARNING, traceback.format_exc())
+                    METRICS.counter('exceptions.{exception}').labels(exception=e.__class__.__name__).inc()
+                elif match(ORACLE_CONNECTION_LOST_CONTACT_REGEX, str(e.args[0])):
+                    logger(logging.WARNING, traceback.format_exc())
+                    METRICS.counter('exceptions.{exception}').labels(exception=e.__class__.__name__).inc()
+                else:
+                    logger(logging.ERROR, traceback.format_exc())
+                    METRICS.counter('exceptions.{exception}').labels(exception=e.__class__.__name__).inc()
+            except ReplicationRuleCreationTemporaryFailed as e:
                 METRICS.counter('exceptions.{exception}').labels(exception=e.__class__.__name__).inc()
-            elif match(ORACLE_CONNECTION_LOST_CONTACT_REGEX, str(e.args[0])):
-                logger(logging.WARNING, traceback.format_exc())
+                logger(logging.WARNING, 'Replica Creation temporary failed, retrying later for %s:%s', scope, name)
+            except FlushError as e:
                 METRICS.counter('exceptions.{exception}').labels(exception=e.__class__.__name__).inc()
-            else:
-                logger(logging.ERROR, traceback.format_exc())
-                METRICS.counter('exceptions.{exception}').labels(exception=e.__class__.__name__).inc()
-        except ReplicationRuleCreationTemporaryFailed as e:
-            METRICS.counter('exceptions.{exception}').labels(exception=e.__class__.__name__).inc()
-            logger(logging.WARNING, 'Replica Creation temporary failed, retrying later for %s:%s', did.scope, did.name)
-        except FlushError as e:
-            METRICS.counter('exceptions.{exception}').labels(exception=e.__class__.__name__).inc()
-            logger(logging.WARNING, 'Flush error for %s:%s', did.scope, did.name)
+                logger(logging.WARNING, 'Flush error for %s:%s', scope, name)
 
 
 def stop(signum: Optional[int] = None, frame: Optional["FrameType"] = None) -> None:
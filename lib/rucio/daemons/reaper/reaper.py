@@ -20,14 +20,14 @@ import concurrent.futures.thread  # noqa (https://github.com/rucio/rucio/issues/
 
 import functools
 import logging
+import queue
 import random
 import threading
 import time
-import traceback
 from configparser import NoOptionError, NoSectionError
 from datetime import datetime, timedelta
 from math import log2
-from typing import TYPE_CHECKING, Any, Optional
+from typing import TYPE_CHECKING, Any, Generic, Optional, TypeVar
 
 from dogpile.cache.api import NoValue
 from sqlalchemy.exc import DatabaseError, IntegrityError
@@ -45,20 +45,25 @@ from rucio.core.heartbeat import list_payload_counts
 from rucio.core.message import add_message
 from rucio.core.monitor import MetricManager
 from rucio.core.oidc import request_token
-from rucio.core.replica import delete_replicas, list_and_mark_unlocked_replicas
-from rucio.core.rse import RseData, determine_audience_for_rse, determine_scope_for_rse, list_rses
+from rucio.core.replica import delete_replicas, iter_and_mark_unlocked_replicas
+from rucio.core.rse import RseData, determine_audience_for_rse, determine_scope_for_rse, get_rse_snapshot, list_rses, subscribe_rse_snapshot, unsubscribe_rse_snapshot
 from rucio.core.rse_expression_parser import parse_expression
+from rucio.core.rse_usage_projection import RseUsageProjection, get_rse_usage_projection
 from rucio.core.rule import get_evaluation_backlog
 from rucio.core.vo import list_vos
 from rucio.daemons.common import run_daemon
+from rucio.db.sqla.models import Heartbeat
 from rucio.rse import rsemanager as rsemgr
 
 if TYPE_CHECKING:
-    from collections.abc import Iterable, Sequence
+    from collections.abc import Callable, Iterable, Iterator, Sequence
     from types import FrameType
 
     from rucio.common.types import LoggerFunction
     from rucio.daemons.common import HeartbeatHandler
+    from rucio.rse.protocols.protocol import RSEProtocol
+
+T = TypeVar('T')
 
 GRACEFUL_STOP = threading.Event()
 METRICS = MetricManager(module=__name__)
@@ -67,6 +72,171 @@ DAEMON_NAME = 'reaper'
 
 EXCLUDED_RSE_GAUGE = METRICS.gauge('excluded_rses.{rse}', documentation='Temporarly excluded RSEs')
 
+# Number of files passed to a single call of the bulk_delete method of the protocols
+BULK_DELETE_SIZE = 100
+
+# The deletion slots reserved by a worker must fit in its heartbeat payload
+HEARTBEAT_PAYLOAD_MAX_LENGTH = Heartbeat.__table__.c.payload.type.length
+
+DELETED_FILES_BY_HOST_COUNTER = METRICS.counter('deleted_files.{host}', documentation='Files deleted per storage host')
+DELETION_RATE_GAUGE = METRICS.gauge('deletion_rate.{host}', documentation='Allowed deletion rate, in files per second, per storage host')
+
+
+class DeletionRateLimiter:
+    """
+    Token bucket limiting the rate, in files per second, and the concurrency of the deletions on a
+    storage host. The rate adapts to the host (AIMD): it increases additively after each batch
+    deleted without errors within the target latency, and is cut multiplicatively when the host
+    reports unavailability errors or gets slower than the target latency. Only the batches started
+    after the previous cut can cut the rate again, so that concurrent batches hitting the same
+    congestion only count once.
+
+    The limiters are shared by all the reaper threads of the process. Their state is local to the process.
+    """
+
+    def __init__(
+            self,
+            hostname: str,
+            initial_rate: float = 10,
+            min_rate: float = 1,
+            max_rate: float = 1000,
+            increase: float = 5,
+            decrease_factor: float = 0.5,
+            target_latency: float = 2,
+            max_in_flight: int = 5
+    ):
+        self.hostname = hostname
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.target_latency = target_latency
+        self.max_in_flight = max_in_flight
+
+        self.rate = max(min_rate, min(initial_rate, max_rate))
+        self._tokens = self.rate
+        self._in_flight = 0
+        self._last_refill = time.monotonic()
+        self._last_decrease = self._last_refill
+        self._unreachable_count = 0
+        self._blocked_until = 0.0
+        self._condition = threading.Condition()
+        DELETION_RATE_GAUGE.labels(host=hostname).set(self.rate)
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.rate, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self, nb_files: int, stop_event: Optional[threading.Event] = None) -> float:
+        """
+        Wait until nb_files can be deleted on the host. The bucket can go into debt to let through
+        batches bigger than its capacity; the following batches wait for the debt to be paid back.
+        Returns the time at which the batch was let through, to be given back to release().
+        """
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if (self._tokens >= 0 and self._in_flight < self.max_in_flight) or (stop_event is not None and stop_event.is_set()):
+                    self._tokens -= nb_files
+                    self._in_flight += 1
+                    return now
+                timeout = 1.0
+                if self._tokens < 0:
+                    timeout = min(timeout, -self._tokens / self.rate)
+                self._condition.wait(timeout=timeout)
+
+    def release(self, started_at: float, nb_files: int, duration: float, nb_unavailable: int) -> None:
+        """
+        Adapt the rate to the outcome of a batch let through by acquire().
+
+        :param started_at:     The value returned by acquire().
+        :param nb_files:       The number of files in the batch.
+        :param duration:       The average deletion duration per file.
+        :param nb_unavailable: The number of files which failed because the storage was unavailable.
+        """
+        with self._condition:
+            self._in_flight -= 1
+            if nb_unavailable or duration > self.target_latency:
+                if started_at >= self._last_decrease:
+                    self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                    self._tokens = min(self._tokens, self.rate)
+                    self._last_decrease = time.monotonic()
+            else:
+                self._unreachable_count = 0
+                self.rate = min(self.max_rate, self.rate + self.increase)
+            self._condition.notify_all()
+            rate = self.rate
+        DELETION_RATE_GAUGE.labels(host=self.hostname).set(rate)
+
+    def set_max_in_flight(self, max_in_flight: int) -> None:
+        """
+        Change the number of batches which can be deleted concurrently on the host.
+        """
+        with self._condition:
+            self.max_in_flight = max_in_flight
+            self._condition.notify_all()
+
+    def mark_unreachable(self, max_backoff: float) -> None:
+        """
+        The host could not be reached at all: drop to the minimal rate and stop scheduling deletions
+        on the host for a period doubling at each consecutive failure, up to max_backoff seconds.
+        """
+        with self._condition:
+            self._unreachable_count += 1
+            self.rate = self.min_rate
+            self._tokens = min(self._tokens, self.rate)
+            self._last_decrease = time.monotonic()
+            self._blocked_until = self._last_decrease + min(max_backoff, 10 * 2 ** (self._unreachable_count - 1))
+        DELETION_RATE_GAUGE.labels(host=self.hostname).set(self.min_rate)
+
+    def is_blocked(self) -> bool:
+        """
+        Returns whether the host is backing off after being unreachable.
+        """
+        return time.monotonic() < self._blocked_until
+
+
+_RATE_LIMITERS = {}
+_RATE_LIMITERS_LOCK = threading.Lock()
+
+
+def get_deletion_rate_limiter(hostname: str) -> DeletionRateLimiter:
+    """
+    Returns the process-wide deletion rate limiter of the given storage host.
+    Its parameters are read from the [reaper] configuration section when it is created.
+    """
+    with _RATE_LIMITERS_LOCK:
+        limiter = _RATE_LIMITERS.get(hostname)
+        if limiter is None:
+            limiter = DeletionRateLimiter(
+                hostname=hostname,
+                initial_rate=config_get_int('reaper', 'initial_deletion_rate', default=10, raise_exception=False),
+                min_rate=config_get_int('reaper', 'min_deletion_rate', default=1, raise_exception=False),
+                max_rate=config_get_int('reaper', 'max_deletion_rate', default=1000, raise_exception=False),
+                increase=config_get_int('reaper', 'deletion_rate_increase', default=5, raise_exception=False),
+                target_latency=config_get_int('reaper', 'deletion_target_latency', default=2, raise_exception=False),
+            )
+            _RATE_LIMITERS[hostname] = limiter
+    limiter.set_max_in_flight(get_max_deletion_threads_by_hostname(hostname))
+    return limiter
+
+
+class _StaticHeartbeat:
+    """
+    Stands in for the HeartbeatHandler in the threads deleting on several RSEs in parallel:
+    heartbeats are only sent by the daemon thread.
+    """
+
+    def __init__(self, heartbeat_handler: "HeartbeatHandler", logger: "LoggerFunction"):
+        self.executable = heartbeat_handler.executable
+        self.older_than = heartbeat_handler.older_than
+        self.logger = logger
+        self.worker_number, self.total_workers = None, None
+
+    def live(self, payload: Optional[str] = None) -> tuple[Optional[int], Optional[int], "LoggerFunction"]:
+        return self.worker_number, self.total_workers, self.logger
+
 
 def get_rses_to_process(
         rses: Optional["Iterable[str]"],
@@ -135,114 +305,226 @@ def get_rses_to_process(
     return rses_to_process
 
 
-def delete_from_storage(heartbeat_handler, hb_payload, replicas, prot, rse_info, is_staging, auto_exclude_threshold, logger=logging.log):
+def _bulk_delete(
+        prot: "RSEProtocol",
+        batches: "Sequence[list[tuple[dict[str, Any], str, dict[str, Any]]]]",
+        nb_threads: int,
+        create_protocol: "Optional[Callable[[], RSEProtocol]]",
+        logger: "LoggerFunction" = logging.log,
+        rate_limiter: Optional[DeletionRateLimiter] = None
+) -> "Iterator[tuple[list[tuple[dict[str, Any], str, dict[str, Any]]], dict[str, Optional[Exception]], float]]":
+    """
+    Call bulk_delete on each batch of (replica, pfn, deletion_dict) and yield, in order, each batch with
+    the errors by pfn and the average deletion duration per file. With nb_threads > 1, batches are
+    deleted concurrently, each thread using its own protocol object. Only the storage is accessed from
+    the helper threads: the caller processes the results in its own thread. If a rate limiter is given,
+    each batch waits for it and reports its outcome to it.
+    """
+    def _delete(prot, batch):
+        started_at = rate_limiter.acquire(len(batch), stop_event=GRACEFUL_STOP) if rate_limiter else None
+        stopwatch = Stopwatch()
+        try:
+            errors = prot.bulk_delete([pfn for _, pfn, _ in batch]) or {}
+        except Exception as error:
+            errors = {pfn: error for _, pfn, _ in batch}
+        duration = stopwatch.elapsed / len(batch)
+        if rate_limiter:
+            nb_unavailable = sum(1 for error in errors.values() if isinstance(error, (ServiceUnavailable, RSEAccessDenied, ResourceTemporaryUnavailable)))
+            rate_limiter.release(started_at, len(batch), duration, nb_unavailable)
+            DELETED_FILES_BY_HOST_COUNTER.labels(host=rate_limiter.hostname).inc(sum(1 for _, pfn, _ in batch if errors.get(pfn) is None))
+        return batch, errors, duration
+
+    nb_threads = min(nb_threads, len(batches))
+    if nb_threads <= 1 or create_protocol is None:
+        for batch in batches:
+            yield _delete(prot, batch)
+        return
+
+    protocols = queue.Queue()
+    protocols.put(prot)
+    extra_protocols = []
+    try:
+        for _ in range(nb_threads - 1):
+            extra_prot = create_protocol()
+            extra_prot.connect()
+            extra_protocols.append(extra_prot)
+            protocols.put(extra_prot)
+    except Exception as error:
+        logger(logging.WARNING, 'Could only open %d connections for concurrent deletion: %s', len(extra_protocols) + 1, str(error))
+
+    def _delete_with_pooled_protocol(batch):
+        pooled_prot = protocols.get()
+        try:
+            return _delete(pooled_prot, batch)
+        finally:
+            protocols.put(pooled_prot)
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(extra_protocols) + 1, thread_name_prefix='reaper-delete') as executor:
+            futures = [executor.submit(_delete_with_pooled_protocol, batch) for batch in batches]
+            try:
+                for future in futures:
+                    yield future.result()
+            finally:
+                # The caller can stop early (for example: too many failures). Don't start new deletions.
+                for future in futures:
+                    future.cancel()
+    finally:
+        for extra_prot in extra_protocols:
+            extra_prot.close()
+
+
+def delete_from_storage(heartbeat_handler, hb_payload, replicas, prot, rse_info, is_staging, auto_exclude_threshold, logger=logging.log,
+                        bulk_size=BULK_DELETE_SIZE, nb_threads=1, create_protocol=None, rate_limiter=None, auto_exclude_timeout=600):
+    """
+    Physically delete the replicas from the storage, bulk_size files at a time using the bulk_delete
+    method of the protocol. If nb_threads > 1, up to nb_threads batches are deleted concurrently, using
+    additional protocol objects built by create_protocol. Returns the replicas which are gone from the storage.
+
+    Without rate limiter, the RSE is temporarily excluded after auto_exclude_threshold unavailability
+    errors, and no further batch is deleted once it is excluded, by this or by another worker. With a
+    rate limiter, the deletion rate on the host adapts to the errors instead, and the host backs off
+    for up to auto_exclude_timeout seconds if it cannot be reached at all.
+    """
     deleted_files = []
     rse_name = rse_info['rse']
     rse_id = rse_info['id']
     noaccess_attempts = 0
-    pfns_to_bulk_delete = []
+    excluded = False
     try:
         prot.connect()
+        to_delete = []
         for replica in replicas:
-            # Physical deletion
-            _, _, logger = heartbeat_handler.live(payload=hb_payload)
-            stopwatch = Stopwatch()
             deletion_dict = {'scope': replica['scope'].external,
                              'name': replica['name'],
                              'rse': rse_name,
                              'file-size': replica['bytes'],
                              'bytes': replica['bytes'],
-                             'url': replica['pfn'],
+                             'url': replica.get('pfn'),
                              'protocol': prot.attributes['scheme'],
                              'datatype': replica['datatype']}
-            try:
-                if replica['scope'].vo != 'def':
-                    deletion_dict['vo'] = replica['scope'].vo
-                logger(logging.DEBUG, 'Deletion ATTEMPT of %s:%s as %s on %s', replica['scope'], replica['name'], replica['pfn'], rse_name)
-                # For STAGING RSEs, no physical deletion
-                if is_staging:
-                    logger(logging.WARNING, 'Deletion STAGING of %s:%s as %s on %s, will only delete the catalog and not do physical deletion', replica['scope'], replica['name'], replica['pfn'], rse_name)
-                    deleted_files.append({'scope': replica['scope'], 'name': replica['name']})
-                    continue
-
-                if replica['pfn']:
-                    pfn = replica['pfn']
-                    # sign the URL if necessary
-                    if prot.attributes['scheme'] == 'https' and rse_info['sign_url'] is not None:
-                        pfn = get_signed_url(rse_id, rse_info['sign_url'], 'delete', pfn)
-                    if prot.attributes['scheme'] == 'globus':
-                        pfns_to_bulk_delete.append(replica['pfn'])
-                    else:
-                        prot.delete(pfn)
-                else:
-                    logger(logging.WARNING, 'Deletion UNAVAILABLE of %s:%s as %s on %s', replica['scope'], replica['name'], replica['pfn'], rse_name)
-
-                duration = stopwatch.elapsed
-                METRICS.timer('delete.{scheme}.{rse}').labels(scheme=prot.attributes['scheme'], rse=rse_name).observe(duration)
-
+            if replica['scope'].vo != 'def':
+                deletion_dict['vo'] = replica['scope'].vo
+            if 'pfn' not in replica:
+                logger(logging.CRITICAL, 'Deletion CRITICAL of %s:%s on %s: the pfn could not be resolved', replica['scope'], replica['name'], rse_name)
+                deletion_dict['reason'] = 'PFN could not be resolved'
+                add_message('deletion-failed', deletion_dict)
+                continue
+            logger(logging.DEBUG, 'Deletion ATTEMPT of %s:%s as %s on %s', replica['scope'], replica['name'], replica['pfn'], rse_name)
+            # For STAGING RSEs, no physical deletion
+            if is_staging:
+                logger(logging.WARNING, 'Deletion STAGING of %s:%s as %s on %s, will only delete the catalog and not do physical deletion', replica['scope'], replica['name'], replica['pfn'], rse_name)
                 deleted_files.append({'scope': replica['scope'], 'name': replica['name']})
+                continue
 
-                deletion_dict['duration'] = duration
+            if not replica['pfn']:
+                logger(logging.WARNING, 'Deletion UNAVAILABLE of %s:%s as %s on %s', replica['scope'], replica['name'], replica['pfn'], rse_name)
+                deleted_files.append({'scope': replica['scope'], 'name': replica['name']})
+                deletion_dict['duration'] = 0
                 add_message('deletion-done', deletion_dict)
-                logger(logging.INFO, 'Deletion SUCCESS of %s:%s as %s on %s in %.2f seconds', replica['scope'], replica['name'], replica['pfn'], rse_name, duration)
+                continue
 
-            except SourceNotFound:
-                duration = stopwatch.elapsed
-                err_msg = 'Deletion NOTFOUND of %s:%s as %s on %s in %.2f seconds' % (replica['scope'], replica['name'], replica['pfn'], rse_name, duration)
-                logger(logging.WARNING, '%s', err_msg)
-                deletion_dict['reason'] = 'File Not Found'
-                deletion_dict['duration'] = duration
-                add_message('deletion-not-found', deletion_dict)
-                deleted_files.append({'scope': replica['scope'], 'name': replica['name']})
+            pfn = replica['pfn']
+            # sign the URL if necessary
+            if prot.attributes['scheme'] == 'https' and rse_info['sign_url'] is not None:
+                pfn = get_signed_url(rse_id, rse_info['sign_url'], 'delete', pfn)
+            to_delete.append((replica, pfn, deletion_dict))
 
-            except (ServiceUnavailable, RSEAccessDenied, ResourceTemporaryUnavailable) as error:
-                duration = stopwatch.elapsed
-                logger(logging.WARNING, 'Deletion NOACCESS of %s:%s as %s on %s: %s in %.2f', replica['scope'], replica['name'], replica['pfn'], rse_name, str(error), duration)
-                deletion_dict['reason'] = str(error)
-                deletion_dict['duration'] = duration
-                add_message('deletion-failed', deletion_dict)
-                noaccess_attempts += 1
-                if noaccess_attempts >= auto_exclude_threshold:
-                    logger(logging.INFO, 'Too many (%d) NOACCESS attempts for %s. RSE will be temporarily excluded.', noaccess_attempts, rse_name)
-                    REGION.set('temporary_exclude_%s' % rse_id, True)
-                    METRICS.gauge('excluded_rses.{rse}').labels(rse=rse_name).set(1)
-
-                    EXCLUDED_RSE_GAUGE.labels(rse=rse_name).set(1)
-                    break
-
-            except Exception as error:
-                duration = stopwatch.elapsed
-                logger(logging.CRITICAL, 'Deletion CRITICAL of %s:%s as %s on %s in %.2f seconds : %s', replica['scope'], replica['name'], replica['pfn'], rse_name, duration, str(traceback.format_exc()))
-                deletion_dict['reason'] = str(error)
+        batches = list(chunks(to_delete, bulk_size))
+        for batch, errors, duration in _bulk_delete(prot, batches, nb_threads=nb_threads, create_protocol=create_protocol, logger=logger, rate_limiter=rate_limiter):
+            _, _, logger = heartbeat_handler.live(payload=hb_payload)
+            for replica, pfn, deletion_dict in batch:
+                error = errors.get(pfn)
                 deletion_dict['duration'] = duration
-                add_message('deletion-failed', deletion_dict)
+                if error is None:
+                    METRICS.timer('delete.{scheme}.{rse}').labels(scheme=prot.attributes['scheme'], rse=rse_name).observe(duration)
+                    deleted_files.append({'scope': replica['scope'], 'name': replica['name']})
+                    add_message('deletion-done', deletion_dict)
+                    logger(logging.INFO, 'Deletion SUCCESS of %s:%s as %s on %s in %.2f seconds', replica['scope'], replica['name'], replica['pfn'], rse_name, duration)
+
+                elif isinstance(error, SourceNotFound):
+                    logger(logging.WARNING, 'Deletion NOTFOUND of %s:%s as %s on %s in %.2f seconds', replica['scope'], replica['name'], replica['pfn'], rse_name, duration)
+                    deletion_dict['reason'] = 'File Not Found'
+                    add_message('deletion-not-found', deletion_dict)
+                    deleted_files.append({'scope': replica['scope'], 'name': replica['name']})
+
+                elif isinstance(error, (ServiceUnavailable, RSEAccessDenied, ResourceTemporaryUnavailable)):
+                    logger(logging.WARNING, 'Deletion NOACCESS of %s:%s as %s on %s: %s in %.2f', replica['scope'], replica['name'], replica['pfn'], rse_name, str(error), duration)
+                    deletion_dict['reason'] = str(error)
+                    add_message('deletion-failed', deletion_dict)
+                    noaccess_attempts += 1
+                    if not rate_limiter and not excluded:
+                        if noaccess_attempts >= auto_exclude_threshold:
+                            logger(logging.INFO, 'Too many (%d) NOACCESS attempts for %s. RSE will be temporarily excluded.', noaccess_attempts, rse_name)
+                            REGION.set('temporary_exclude_%s' % rse_id, True)
+                            METRICS.gauge('excluded_rses.{rse}').labels(rse=rse_name).set(1)
+
+                            EXCLUDED_RSE_GAUGE.labels(rse=rse_name).set(1)
+                            excluded = True
+                        elif not isinstance(REGION.get('temporary_exclude_%s' % rse_id, expiration_time=auto_exclude_timeout), NoValue):
+                            logger(logging.INFO, '%s was temporarily excluded by another worker.', rse_name)
+                            excluded = True
 
-        if pfns_to_bulk_delete and prot.attributes['scheme'] == 'globus':
-            logger(logging.DEBUG, 'Attempting bulk delete on RSE %s for scheme %s', rse_name, prot.attributes['scheme'])
-            prot.bulk_delete(pfns_to_bulk_delete)
+                else:
+                    logger(logging.CRITICAL, 'Deletion CRITICAL of %s:%s as %s on %s in %.2f seconds : %s', replica['scope'], replica['name'], replica['pfn'], rse_name, duration, str(error))
+                    deletion_dict['reason'] = str(error)
+                    add_message('deletion-failed', deletion_dict)
+
+            if excluded:
+                # The remaining results of this batch were still recorded, as those deletions already happened
+                break
 
     except (ServiceUnavailable, RSEAccessDenied, ResourceTemporaryUnavailable) as error:
         for replica in replicas:
-            logger(logging.WARNING, 'Deletion NOACCESS of %s:%s as %s on %s: %s', replica['scope'], replica['name'], replica['pfn'], rse_name, str(error))
+            logger(logging.WARNING, 'Deletion NOACCESS of %s:%s as %s on %s: %s', replica['scope'], replica['name'], replica.get('pfn'), rse_name, str(error))
             payload = {'scope': replica['scope'].external,
                        'name': replica['name'],
                        'rse': rse_name,
                        'file-size': replica['bytes'],
                        'bytes': replica['bytes'],
-                       'url': replica['pfn'],
+                       'url': replica.get('pfn'),
                        'reason': str(error),
                        'protocol': prot.attributes['scheme']}
             if replica['scope'].vo != 'def':
                 payload['vo'] = replica['scope'].vo
             add_message('deletion-failed', payload)
-        logger(logging.INFO, 'Cannot connect to %s. RSE will be temporarily excluded.', rse_name)
-        REGION.set('temporary_exclude_%s' % rse_id, True)
-        EXCLUDED_RSE_GAUGE.labels(rse=rse_name).set(1)
+        if rate_limiter:
+            logger(logging.INFO, 'Cannot connect to %s. Deletions on %s will back off.', rse_name, rate_limiter.hostname)
+            rate_limiter.mark_unreachable(max_backoff=auto_exclude_timeout)
+        else:
+            logger(logging.INFO, 'Cannot connect to %s. RSE will be temporarily excluded.', rse_name)
+            REGION.set('temporary_exclude_%s' % rse_id, True)
+            EXCLUDED_RSE_GAUGE.labels(rse=rse_name).set(1)
     finally:
         prot.close()
     return deleted_files
 
 
+def _resolve_pfns(replicas: "Sequence[dict[str, Any]]", prot: "RSEProtocol", rse_name: str, logger: "LoggerFunction" = logging.log) -> None:
+    """
+    Set the 'pfn' of all the replicas with a single lfns2pfns call. If it fails, fall back
+    to resolving the pfns one by one, to find the problematic replicas.
+    """
+    lfns = [{'scope': replica['scope'].external, 'name': replica['name'], 'path': replica['path']} for replica in replicas]
+    try:
+        pfns = prot.lfns2pfns(lfns=lfns)
+        for replica, lfn in zip(replicas, lfns):
+            replica['pfn'] = str(pfns['%s:%s' % (lfn['scope'], lfn['name'])])
+        return
+    except Exception as error:
+        logger(logging.DEBUG, 'Bulk pfn resolution failed on %s, resolving one by one: %s', rse_name, str(error))
+
+    for replica, lfn in zip(replicas, lfns):
+        try:
+            replica['pfn'] = str(list(prot.lfns2pfns(lfns=[lfn]).values())[0])
+        except (ReplicaUnAvailable, ReplicaNotFound) as error:
+            logger(logging.WARNING, 'Failed get pfn UNAVAILABLE replica %s:%s on %s with error %s', replica['scope'], replica['name'], rse_name, str(error))
+            replica['pfn'] = None
+
+        except Exception:
+            logger(logging.CRITICAL, 'Exception', exc_info=True)
+
+
 def _rse_deletion_hostname(rse: RseData, scheme: Optional[str]) -> Optional[str]:
     """
     Retrieves the hostname of the default deletion protocol
@@ -280,7 +562,13 @@ def get_max_deletion_threads_by_hostname(hostname: str) -> int:
     return result
 
 
-def __try_reserve_worker_slot(heartbeat_handler: "HeartbeatHandler", rse: RseData, hostname: str, logger: "LoggerFunction") -> Optional[str]:
+def __try_reserve_worker_slot(
+        heartbeat_handler: "HeartbeatHandler",
+        rse: RseData,
+        hostname: str,
+        logger: "LoggerFunction",
+        reserved_slots: Optional[list[str]] = None
+) -> Optional[tuple[str, int]]:
     """
     The maximum number of concurrent workers is limited per hostname and per RSE due to storage performance reasons.
     This function tries to reserve a slot to run the deletion worker for the given RSE and hostname.
@@ -288,28 +576,38 @@ def __try_reserve_worker_slot(heartbeat_handler: "HeartbeatHandler", rse: RseDat
     The function doesn't guarantee strong consistency: the number of total workers may end being slightly
     higher than the configured limit.
 
-    The reservation is done using the "payload" field of the rucio heart-beats.
-    if reservation successful, returns the heartbeat payload used for the reservation. Otherwise, returns None
+    The reservation is done using the "payload" field of the rucio heart-beats. A worker processing several RSEs
+    in parallel holds one slot per RSE: reserved_slots are the slots it already holds, and its payload lists
+    all of them, separated by ';'.
+    if reservation successful, returns the heartbeat payload used for the reservation and the number of
+    deletion threads still available for the hostname, counting the reserved one. Otherwise, returns None
     """
 
     rse_hostname_key = '%s,%s' % (rse.id, hostname)
     payload_cnt = list_payload_counts(heartbeat_handler.executable, older_than=heartbeat_handler.older_than)  # type: ignore (argument missing: session)
     tot_threads_for_hostname = 0
     tot_threads_for_rse = 0
-    for key in payload_cnt:
-        if key and key.find(',') > -1:
-            if key.split(',')[1] == hostname:
-                tot_threads_for_hostname += payload_cnt[key]
-            if key.split(',')[0] == str(rse.id):
-                tot_threads_for_rse += payload_cnt[key]
+    reserved_keys = set()
+    for payload in payload_cnt:
+        for key in (payload or '').split(';'):
+            if key.find(',') > -1:
+                reserved_keys.add(key)
+                if key.split(',')[1] == hostname:
+                    tot_threads_for_hostname += payload_cnt[payload]
+                if key.split(',')[0] == str(rse.id):
+                    tot_threads_for_rse += payload_cnt[payload]
     max_deletion_thread = get_max_deletion_threads_by_hostname(hostname)
-    if rse_hostname_key in payload_cnt and tot_threads_for_hostname >= max_deletion_thread:
+    if rse_hostname_key in reserved_keys and tot_threads_for_hostname >= max_deletion_thread:
         logger(logging.DEBUG, 'Too many deletion threads for %s on RSE %s. Back off', hostname, rse.name)
         return None
     logger(logging.INFO, 'Nb workers on %s smaller than the limit (current %i vs max %i). Starting new worker on RSE %s', hostname, tot_threads_for_hostname, max_deletion_thread, rse.name)
-    _, total_workers, logger = heartbeat_handler.live(payload=rse_hostname_key)
+    hb_payload = ';'.join((reserved_slots or []) + [rse_hostname_key])
+    if len(hb_payload) > HEARTBEAT_PAYLOAD_MAX_LENGTH:
+        logger(logging.WARNING, 'Cannot hold more deletion slots in the heartbeat payload. Back off from RSE %s', rse.name)
+        return None
+    _, total_workers, logger = heartbeat_handler.live(payload=hb_payload)
     logger(logging.DEBUG, 'Total deletion workers for %s : %i', hostname, tot_threads_for_hostname + 1)
-    return rse_hostname_key
+    return hb_payload, max(1, max_deletion_thread - tot_threads_for_hostname)
 
 
 def __check_rse_usage_cached(rse: RseData, greedy: bool = False, logger: "LoggerFunction" = logging.log) -> tuple[int, bool]:
@@ -410,26 +708,33 @@ def reaper(
     :param auto_exclude_threshold: Number of service unavailable exceptions after which the RSE gets temporarily excluded.
     :param auto_exclude_timeout:   Timeout for temporarily excluded RSEs.
     """
-    run_daemon(
-        once=once,
-        graceful_stop=GRACEFUL_STOP,
-        executable=DAEMON_NAME,
-        partition_wait_time=0 if once else 10,
-        sleep_time=sleep_time,
-        run_once_fnc=functools.partial(
-            run_once,
-            rses=rses,
-            include_rses=include_rses,
-            exclude_rses=exclude_rses,
-            vos=vos,
-            chunk_size=chunk_size,
-            greedy=greedy,
-            scheme=scheme,
-            delay_seconds=delay_seconds,
-            auto_exclude_threshold=auto_exclude_threshold,
-            auto_exclude_timeout=auto_exclude_timeout,
+    use_rse_snapshot = config_get_bool('reaper', 'use_rse_snapshot', raise_exception=False, default=False)
+    if use_rse_snapshot:
+        subscribe_rse_snapshot()
+    try:
+        run_daemon(
+            once=once,
+            graceful_stop=GRACEFUL_STOP,
+            executable=DAEMON_NAME,
+            partition_wait_time=0 if once else 10,
+            sleep_time=sleep_time,
+            run_once_fnc=functools.partial(
+                run_once,
+                rses=rses,
+                include_rses=include_rses,
+                exclude_rses=exclude_rses,
+                vos=vos,
+                chunk_size=chunk_size,
+                greedy=greedy,
+                scheme=scheme,
+                delay_seconds=delay_seconds,
+                auto_exclude_threshold=auto_exclude_threshold,
+                auto_exclude_timeout=auto_exclude_timeout,
+            )
         )
-    )
+    finally:
+        if use_rse_snapshot:
+            unsubscribe_rse_snapshot()
 
 
 def run_once(
@@ -477,7 +782,17 @@ def run_once(
         logger(logging.ERROR, 'Reaper: No RSEs found. Will sleep for 30 seconds')
         return must_sleep
     else:
-        rses_to_process = [RseData(id_=rse['id'], name=rse['rse'], columns=rse) for rse in rses_to_process]
+        # Re-use the fully loaded RSEs from the process-wide snapshot, if the reaper subscribed to it.
+        # The snapshot objects are shared between threads: copy their fields instead of using them directly.
+        rse_snapshot = get_rse_snapshot()
+        rse_datas = []
+        for rse in rses_to_process:
+            rse_data = RseData(id_=rse['id'], name=rse['rse'], columns=rse)
+            snapshot_rse_data = rse_snapshot.get(rse['id']) if rse_snapshot else None
+            if snapshot_rse_data:
+                rse_data.fill_from(snapshot_rse_data)
+            rse_datas.append(rse_data)
+        rses_to_process = rse_datas
 
     # On big deletion campaigns, we desire to re-iterate fast on RSEs which have a lot of data to delete.
     # The called function will return the RSEs which have more work remaining.
@@ -523,6 +838,9 @@ def _run_once(
     dict_rses = {}
     _, total_workers, logger = heartbeat_handler.live()
     tot_needed_free_space = 0
+    usage_projection = None
+    if config_get_bool('reaper', 'use_usage_projection', raise_exception=False, default=False):
+        usage_projection = get_rse_usage_projection()
     for rse in rses_to_process:
         # Check if RSE is blocklisted
         if not rse.columns['availability_delete']:
@@ -530,7 +848,10 @@ def _run_once(
             continue
         rse.ensure_loaded(load_attributes=True)
         enable_greedy = rse.attributes.get(RseAttr.GREEDYDELETION, False) or greedy
-        needed_free_space, only_delete_obsolete = __check_rse_usage_cached(rse, greedy=enable_greedy, logger=logger)
+        if usage_projection:
+            needed_free_space, only_delete_obsolete = usage_projection.needed_free_space(rse.id, rse_name=rse.name, greedy=enable_greedy, logger=logger)
+        else:
+            needed_free_space, only_delete_obsolete = __check_rse_usage_cached(rse, greedy=enable_greedy, logger=logger)
         if needed_free_space:
             dict_rses[rse] = [needed_free_space, only_delete_obsolete, enable_greedy]
             tot_needed_free_space += needed_free_space
@@ -550,100 +871,203 @@ def _run_once(
 
     random.shuffle(rses_with_params)
 
+    # With several RSEs processed in parallel, the worker reserves one slot per RSE in its heartbeat
+    # payload, and the deletions on each storage host are additionally throttled by its rate limiter
+    max_concurrent_rses = config_get_int('reaper', 'max_concurrent_rses', default=1, raise_exception=False)
+    use_rate_limiter = max_concurrent_rses > 1 or config_get_bool('reaper', 'adaptive_rate_control', default=False, raise_exception=False)
+
     work_remaining_by_rse = {}
     paused_rses = []
-    for rse, needed_free_space, only_delete_obsolete, enable_greedy in rses_with_params:
-        result = REGION.get('pause_deletion_%s' % rse.id, expiration_time=120)
-        if not isinstance(result, NoValue):
-            paused_rses.append(rse.name)
-            logger(logging.DEBUG, 'Not enough replicas to delete on %s during the previous cycle. Deletion paused for a while', rse.name)
-            continue
+    futures = {}
+    # The slots are only held by the RSEs being processed, so never more than max_concurrent_rses at once
+    reserved_slots = []
+    reserved_slots_lock = threading.Lock()
+    executor = None
+    if max_concurrent_rses > 1:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrent_rses, thread_name_prefix='reaper-rse')
+
+    def _reserve_and_delete_on_rse(delete_on_rse, rse, rse_hostname, rate_limiter):
+        """
+        Reserve the slot of the RSE when the deletion on it actually starts, and release it once it is done.
+        """
+        with reserved_slots_lock:
+            reservation = __try_reserve_worker_slot(heartbeat_handler=heartbeat_handler, rse=rse, hostname=rse_hostname, logger=logger,
+                                                    reserved_slots=reserved_slots if executor else None)
+            if not reservation:
+                return None
+            hb_payload, available_threads = reservation
+            slot = '%s,%s' % (rse.id, rse_hostname)
+            slots_on_host = sum(1 for reserved_slot in reserved_slots if reserved_slot.split(',')[1] == rse_hostname)
+            if executor:
+                reserved_slots.append(slot)
+        if rate_limiter:
+            # The deletions of this process on the host share the threads available to the slots it reserved
+            rate_limiter.set_max_in_flight(available_threads + slots_on_host)
+        if not executor:
+            return delete_on_rse(heartbeat_handler=heartbeat_handler, hb_payload=hb_payload, available_threads=available_threads)
+        try:
+            return delete_on_rse(heartbeat_handler=_StaticHeartbeat(heartbeat_handler, logger), hb_payload=hb_payload, available_threads=available_threads)
+        finally:
+            with reserved_slots_lock:
+                reserved_slots.remove(slot)
+                heartbeat_handler.live(payload=';'.join(reserved_slots) or None)
 
-        result = REGION.get('temporary_exclude_%s' % rse.id, expiration_time=auto_exclude_timeout)
-        if not isinstance(result, NoValue):
-            logger(logging.WARNING, 'Too many failed attempts for %s in last cycle. RSE is temporarily excluded.', rse.name)
-            EXCLUDED_RSE_GAUGE.labels(rse=rse.name).set(1)
-            continue
-        EXCLUDED_RSE_GAUGE.labels(rse=rse.name).set(0)
+    try:
+        for rse, needed_free_space, only_delete_obsolete, enable_greedy in rses_with_params:
+            result = REGION.get('pause_deletion_%s' % rse.id, expiration_time=120)
+            if not isinstance(result, NoValue):
+                paused_rses.append(rse.name)
+                logger(logging.DEBUG, 'Not enough replicas to delete on %s during the previous cycle. Deletion paused for a while', rse.name)
+                continue
+
+            result = REGION.get('temporary_exclude_%s' % rse.id, expiration_time=auto_exclude_timeout)
+            if not isinstance(result, NoValue):
+                logger(logging.WARNING, 'Too many failed attempts for %s in last cycle. RSE is temporarily excluded.', rse.name)
+                EXCLUDED_RSE_GAUGE.labels(rse=rse.name).set(1)
+                continue
+            EXCLUDED_RSE_GAUGE.labels(rse=rse.name).set(0)
+
+            percent = 0
+            if tot_needed_free_space:
+                percent = needed_free_space / tot_needed_free_space * 100
+            logger(logging.DEBUG, 'Working on %s. Percentage of the total space needed %.2f', rse.name, percent)
+
+            rse_hostname = _rse_deletion_hostname(rse, scheme)
+            if not rse_hostname:
+                if scheme:
+                    logger(logging.WARNING, 'Protocol %s not supported on %s', scheme, rse.name)
+                else:
+                    logger(logging.WARNING, 'No default delete protocol for %s', rse.name)
+                REGION.set('pause_deletion_%s' % rse.id, True)
+                continue
 
-        percent = 0
-        if tot_needed_free_space:
-            percent = needed_free_space / tot_needed_free_space * 100
-        logger(logging.DEBUG, 'Working on %s. Percentage of the total space needed %.2f', rse.name, percent)
+            rate_limiter = None
+            if use_rate_limiter:
+                rate_limiter = get_deletion_rate_limiter(rse_hostname)
+                if rate_limiter.is_blocked():
+                    logger(logging.WARNING, 'Storage %s of %s could not be reached recently. Backing off', rse_hostname, rse.name)
+                    continue
 
-        rse_hostname = _rse_deletion_hostname(rse, scheme)
-        if not rse_hostname:
-            if scheme:
-                logger(logging.WARNING, 'Protocol %s not supported on %s', scheme, rse.name)
+            delete_on_rse = functools.partial(
+                _delete_on_rse,
+                rse=rse,
+                needed_free_space=needed_free_space,
+                only_delete_obsolete=only_delete_obsolete,
+                enable_greedy=enable_greedy,
+                chunk_size=chunk_size,
+                scheme=scheme,
+                delay_seconds=delay_seconds,
+                auto_exclude_threshold=auto_exclude_threshold,
+                auto_exclude_timeout=auto_exclude_timeout,
+                rate_limiter=rate_limiter,
+                usage_projection=usage_projection,
+                logger=logger,
+            )
+            if executor:
+                futures[executor.submit(_reserve_and_delete_on_rse, delete_on_rse, rse, rse_hostname, rate_limiter)] = rse
             else:
-                logger(logging.WARNING, 'No default delete protocol for %s', rse.name)
-            REGION.set('pause_deletion_%s' % rse.id, True)
-            continue
+                # If the slot could not be reserved, might need to reschedule a try on this RSE later in the same cycle
+                work_remaining = _reserve_and_delete_on_rse(delete_on_rse, rse, rse_hostname, rate_limiter)
+                if work_remaining is not None:
+                    work_remaining_by_rse[rse] = work_remaining
+
+        # Only the daemon thread sends heartbeats while the RSEs are processed in parallel
+        pending = set(futures)
+        while pending:
+            done, pending = concurrent.futures.wait(pending, timeout=10)
+            for future in done:
+                work_remaining = future.result()
+                if work_remaining is not None:
+                    work_remaining_by_rse[futures[future]] = work_remaining
+            with reserved_slots_lock:
+                heartbeat_handler.live(payload=';'.join(reserved_slots) or None)
+    finally:
+        if executor:
+            executor.shutdown(wait=True)
 
-        hb_payload = __try_reserve_worker_slot(heartbeat_handler=heartbeat_handler, rse=rse, hostname=rse_hostname, logger=logger)
-        if not hb_payload:
-            # Might need to reschedule a try on this RSE later in the same cycle
-            continue
+    if paused_rses:
+        logger(logging.INFO, 'Deletion paused for a while for following RSEs: %s', ', '.join(paused_rses))
 
-        # List and mark BEING_DELETED the files to delete
-        del_start_time = time.time()
-        try:
-            with METRICS.timer('list_unlocked_replicas'):
-                if only_delete_obsolete:
-                    logger(logging.DEBUG, 'Will run list_and_mark_unlocked_replicas on %s. No space needed, will only delete EPOCH tombstoned replicas', rse.name)
-                replicas = list_and_mark_unlocked_replicas(limit=chunk_size,
-                                                           bytes_=needed_free_space,
-                                                           rse_id=rse.id,
-                                                           delay_seconds=delay_seconds,
-                                                           only_delete_obsolete=only_delete_obsolete,
-                                                           session=None)  # type: ignore (argument missing: session)
-            logger(logging.DEBUG, 'list_and_mark_unlocked_replicas on %s for %s bytes in %s seconds: %s replicas', rse.name, needed_free_space, time.time() - del_start_time, len(replicas))
-            if (len(replicas) == 0 and enable_greedy) or (len(replicas) < chunk_size and not enable_greedy):
-                logger(logging.DEBUG, 'Not enough replicas to delete on %s (%s requested vs %s returned). Will skip any new attempts on this RSE until next cycle', rse.name, chunk_size, len(replicas))
-                REGION.set('pause_deletion_%s' % rse.id, True)
-                work_remaining_by_rse[rse] = False
-            else:
-                work_remaining_by_rse[rse] = True
+    rses_with_more_work = [rse for rse, has_more_work in work_remaining_by_rse.items() if has_more_work]
+    return rses_with_more_work
 
-        except (DatabaseException, IntegrityError, DatabaseError) as error:
-            logger(logging.ERROR, '%s', str(error))
-            continue
-        except Exception:
-            logger(logging.CRITICAL, 'Exception', exc_info=True)
-            continue
-        # Physical  deletion will take place there
-        try:
-            rse.ensure_loaded(load_info=True, load_attributes=True)
-            prot = rsemgr.create_protocol(rse.info, 'delete', scheme=scheme, logger=logger)
-            if rse.attributes.get(RseAttr.OIDC_SUPPORT) is True and prot.attributes['scheme'] == 'davs':
-                audience = determine_audience_for_rse(rse.id)
-                # FIXME: At the time of writing, StoRM requires `storage.read`
-                # in order to perform a stat operation.
-                scope = determine_scope_for_rse(rse.id, scopes=['storage.modify', 'storage.read'])
-                auth_token = request_token(audience, scope)
-                if auth_token:
-                    logger(logging.INFO, 'Using a token to delete on RSE %s', rse.name)
-                    prot = rsemgr.create_protocol(rse.info, 'delete', scheme=scheme, auth_token=auth_token, logger=logger)
-                else:
-                    logger(logging.WARNING, 'Failed to procure a token to delete on RSE %s', rse.name)
+
+def _delete_on_rse(
+        rse: RseData,
+        needed_free_space: int,
+        only_delete_obsolete: bool,
+        enable_greedy: bool,
+        chunk_size: int,
+        scheme: Optional[str],
+        delay_seconds: int,
+        auto_exclude_threshold: int,
+        auto_exclude_timeout: int,
+        heartbeat_handler: "HeartbeatHandler",
+        hb_payload: Optional[str],
+        available_threads: int,
+        rate_limiter: Optional[DeletionRateLimiter],
+        usage_projection: Optional[RseUsageProjection] = None,
+        logger: "LoggerFunction" = logging.log,
+) -> Optional[bool]:
+    """
+    List, mark, and delete a chunk of replicas on the RSE.
+
+    :returns: Whether the RSE has more replicas to delete, or None if the replicas could not be listed.
+    """
+    # List and mark BEING_DELETED the files to delete. With [reaper] list_batch_size smaller than the chunk size,
+    # they are listed by batches, the next batch being listed while the current one is deleted from the storage
+    list_batch_size = config_get_int('reaper', 'list_batch_size', default=0, raise_exception=False)
+    batch_size = list_batch_size if 0 < list_batch_size < chunk_size else chunk_size
+    if only_delete_obsolete:
+        logger(logging.DEBUG, 'Will run list_and_mark_unlocked_replicas on %s. No space needed, will only delete EPOCH tombstoned replicas', rse.name)
+    batches = iter_and_mark_unlocked_replicas(limit=chunk_size,
+                                              batch_size=batch_size,
+                                              bytes_=needed_free_space,
+                                              rse_id=rse.id,
+                                              delay_seconds=delay_seconds,
+                                              only_delete_obsolete=only_delete_obsolete)
+    if batch_size < chunk_size:
+        batches = _PrefetchingIterator(batches)
+    try:
+        replicas = _next_replicas_batch(batches, rse, needed_free_space, logger)
+    except (DatabaseException, IntegrityError, DatabaseError) as error:
+        logger(logging.ERROR, '%s', str(error))
+        return None
+    except Exception:
+        logger(logging.CRITICAL, 'Exception', exc_info=True)
+        return None
+    nb_replicas = len(replicas)
+    # Physical  deletion will take place there
+    try:
+        rse.ensure_loaded(load_info=True, load_attributes=True)
+        auth_token = None
+        prot = rsemgr.create_protocol(rse.info, 'delete', scheme=scheme, logger=logger)
+        if rse.attributes.get(RseAttr.OIDC_SUPPORT) is True and prot.attributes['scheme'] == 'davs':
+            audience = determine_audience_for_rse(rse.id)
+            # FIXME: At the time of writing, StoRM requires `storage.read`
+            # in order to perform a stat operation.
+            scope = determine_scope_for_rse(rse.id, scopes=['storage.modify', 'storage.read'])
+            auth_token = request_token(audience, scope)
+            if auth_token:
+                logger(logging.INFO, 'Using a token to delete on RSE %s', rse.name)
+                prot = rsemgr.create_protocol(rse.info, 'delete', scheme=scheme, auth_token=auth_token, logger=logger)
+            else:
+                logger(logging.WARNING, 'Failed to procure a token to delete on RSE %s', rse.name)
+        create_protocol = functools.partial(rsemgr.create_protocol, rse.info, 'delete', scheme=scheme, auth_token=auth_token, logger=logger)
+        # Threads deleting in parallel on the same storage count as workers for the per-hostname limit
+        nb_threads = min(available_threads, config_get_int('reaper', 'max_deletion_threads_per_worker', default=1, raise_exception=False))
+        bulk_size = config_get_int('reaper', 'bulk_delete_size', default=BULK_DELETE_SIZE, raise_exception=False)
+        while replicas:
             for file_replicas in chunks(replicas, chunk_size):
                 # Refresh heartbeat
                 _, total_workers, logger = heartbeat_handler.live(payload=hb_payload)
                 del_start_time = time.time()
-                for replica in file_replicas:
-                    try:
-                        replica['pfn'] = str(list(rsemgr.lfns2pfns(rse_settings=rse.info,
-                                                                   lfns=[{'scope': replica['scope'].external, 'name': replica['name'], 'path': replica['path']}],
-                                                                   operation='delete', scheme=scheme).values())[0])
-                    except (ReplicaUnAvailable, ReplicaNotFound) as error:
-                        logger(logging.WARNING, 'Failed get pfn UNAVAILABLE replica %s:%s on %s with error %s', replica['scope'], replica['name'], rse.name, str(error))
-                        replica['pfn'] = None
-
-                    except Exception:
-                        logger(logging.CRITICAL, 'Exception', exc_info=True)
+                _resolve_pfns(file_replicas, prot, rse.name, logger=logger)
 
                 is_staging = rse.columns['staging_area']
-                deleted_files = delete_from_storage(heartbeat_handler, hb_payload, file_replicas, prot, rse.info, is_staging, auto_exclude_threshold, logger=logger)
+                deleted_files = delete_from_storage(heartbeat_handler, hb_payload, file_replicas, prot, rse.info, is_staging, auto_exclude_threshold, logger=logger,
+                                                    bulk_size=bulk_size, nb_threads=nb_threads, create_protocol=create_protocol,
+                                                    rate_limiter=rate_limiter, auto_exclude_timeout=auto_exclude_timeout)
                 logger(logging.INFO, '%i files processed in %s seconds', len(file_replicas), time.time() - del_start_time)
 
                 # Then finally delete the replicas
@@ -651,16 +1075,83 @@ def _run_once(
                 delete_replicas(rse_id=rse.id, files=deleted_files)  # type: ignore (argument missing: session)
                 logger(logging.DEBUG, 'delete_replicas succeeded on %s : %s replicas in %s seconds', rse.name, len(deleted_files), time.time() - del_start)
                 METRICS.counter('deletion.done').inc(len(deleted_files))
-        except RSEProtocolNotSupported:
-            logger(logging.WARNING, 'Protocol %s not supported on %s', scheme, rse.name)
-        except Exception:
-            logger(logging.CRITICAL, 'Exception', exc_info=True)
+                if usage_projection:
+                    deleted_dids = {(file['scope'], file['name']) for file in deleted_files}
+                    usage_projection.record_deletion(rse.id, sum(replica['bytes'] or 0 for replica in file_replicas if (replica['scope'], replica['name']) in deleted_dids))
+            replicas = _next_replicas_batch(batches, rse, needed_free_space, logger)
+            nb_replicas += len(replicas)
+    except RSEProtocolNotSupported:
+        logger(logging.WARNING, 'Protocol %s not supported on %s', scheme, rse.name)
+    except Exception:
+        logger(logging.CRITICAL, 'Exception', exc_info=True)
+    finally:
+        batches.close()
 
-    if paused_rses:
-        logger(logging.INFO, 'Deletion paused for a while for following RSEs: %s', ', '.join(paused_rses))
+    if (nb_replicas == 0 and enable_greedy) or (nb_replicas < chunk_size and not enable_greedy):
+        logger(logging.DEBUG, 'Not enough replicas to delete on %s (%s requested vs %s returned). Will skip any new attempts on this RSE until next cycle', rse.name, chunk_size, nb_replicas)
+        REGION.set('pause_deletion_%s' % rse.id, True)
+        return False
+    return True
 
-    rses_with_more_work = [rse for rse, has_more_work in work_remaining_by_rse.items() if has_more_work]
-    return rses_with_more_work
+
+def _next_replicas_batch(batches: "Iterator[list[dict[str, Any]]]", rse: RseData, needed_free_space: int, logger: "LoggerFunction") -> list[dict[str, Any]]:
+    """
+    Returns the next batch of replicas listed and marked BEING_DELETED on the RSE, or an empty list if there is none.
+    """
+    start_time = time.time()
+    with METRICS.timer('list_unlocked_replicas'):
+        replicas = next(batches, [])
+    logger(logging.DEBUG, 'list_and_mark_unlocked_replicas on %s for %s bytes in %s seconds: %s replicas', rse.name, needed_free_space, time.time() - start_time, len(replicas))
+    return replicas
+
+
+class _PrefetchingIterator(Generic[T]):
+    """
+    Iterates over an iterator from a helper thread, one item ahead of the caller, so that
+    producing the next item overlaps with the processing of the current one. Exceptions
+    raised by the iterator are re-raised in the caller.
+    """
+
+    def __init__(self, iterator: "Iterator[T]"):
+        self._items = queue.Queue(maxsize=1)
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._produce, args=(iterator,), name='reaper-prefetch', daemon=True)
+        self._thread.start()
+
+    def _put(self, item: tuple[bool, Any]) -> bool:
+        while not self._stop_event.is_set():
+            try:
+                self._items.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, iterator: "Iterator[T]") -> None:
+        try:
+            for item in iterator:
+                if not self._put((True, item)):
+                    return
+            self._put((False, None))
+        except Exception as error:
+            self._put((False, error))
+
+    def __iter__(self) -> "_PrefetchingIterator[T]":
+        return self
+
+    def __next__(self) -> T:
+        if self._stop_event.is_set():
+            raise StopIteration
+        has_item, item = self._items.get()
+        if has_item:
+            return item
+        self._stop_event.set()
+        if item is not None:
+            raise item
+        raise StopIteration
+
+    def close(self) -> None:
+        self._stop_event.set()
 
 
 def stop(signum: Optional[int] = None, frame: Optional["FrameType"] = None) -> None:
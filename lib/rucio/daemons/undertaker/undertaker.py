@@ -64,7 +64,8 @@ def undertaker(once: bool = False, sleep_time: int = 60, chunk_size: int = 10) -
             run_once,
             paused_dids=paused_dids,
             chunk_size=chunk_size,
-        )
+        ),
+        work_stealing=True,
     )
 
 
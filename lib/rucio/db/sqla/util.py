@@ -22,7 +22,7 @@ import sqlalchemy
 from alembic import command, op
 from alembic.config import Config
 from dogpile.cache.api import NoValue
-from sqlalchemy import Column, PrimaryKeyConstraint, func, inspect
+from sqlalchemy import Column, PrimaryKeyConstraint, event, func, insert, inspect
 from sqlalchemy.dialects.postgresql.base import PGInspector
 from sqlalchemy.exc import DatabaseError, IntegrityError
 from sqlalchemy.orm import declarative_base
@@ -47,6 +47,8 @@ if TYPE_CHECKING:
     from sqlalchemy.engine import Inspector
     from sqlalchemy.orm import Query, Session
 
+    from rucio.db.sqla.models import ModelBase
+
     # TypeVar representing the DeclarativeObj class defined inside _create_temp_table
     DeclarativeObj = TypeVar('DeclarativeObj')
 
@@ -541,3 +543,70 @@ def temp_table_mngr(session: "Session") -> TempTableManager:
         mngr = TempTableManager(session)
         session.info[key] = mngr
     return mngr
+
+
+class CounterDeltaAccumulator:
+    """
+    Merges the counter deltas registered during a transaction and inserts a
+    single row per key into the given "updated counters" table when the
+    transaction is committed. Deltas are dropped if the transaction is rolled
+    back, so the inserted rows always match the committed changes.
+
+    The lifecycle of this object is bound to a particular session.
+    """
+
+    def __init__(self, session: "Session", model: type["ModelBase"], key_columns: "Sequence[str]"):
+        self.session = session
+        self.model = model
+        self.key_columns = tuple(key_columns)
+
+        self.deltas = {}
+        event.listen(session, 'before_commit', self._on_before_commit)
+        event.listen(session, 'after_rollback', self._on_after_rollback)
+
+    def add(self, key: tuple, files: int, bytes_: int) -> None:
+        """
+        Register a delta for the counter identified by the values of the key columns.
+        """
+        total_files, total_bytes = self.deltas.get(key, (0, 0))
+        self.deltas[key] = (total_files + files, total_bytes + bytes_)
+
+    def flush(self) -> None:
+        """
+        Insert the merged deltas into the table. Deltas which cancel out are not written.
+        """
+        rows = [
+            {**dict(zip(self.key_columns, key)), 'files': files, 'bytes': bytes_}
+            for key, (files, bytes_) in self.deltas.items()
+            if files or bytes_
+        ]
+        self.deltas = {}
+        if rows:
+            self.session.execute(insert(self.model), rows)
+
+    def _on_before_commit(self, session: "Session") -> None:
+        self.flush()
+
+    def _on_after_rollback(self, session: "Session") -> None:
+        self.deltas = {}
+
+
+def counter_delta_accumulator(session: "Session", model: type["ModelBase"], key_columns: "Sequence[str]") -> CounterDeltaAccumulator:
+    """
+    Creates (if doesn't yet exist) and returns the CounterDeltaAccumulator of the given table associated to the session
+    """
+    key = f'counter_delta_accumulator_{model.__tablename__}'
+    accumulator = session.info.get(key)
+    if not accumulator:
+        accumulator = CounterDeltaAccumulator(session, model, key_columns)
+        session.info[key] = accumulator
+    return accumulator
+
+
+def flush_counter_deltas(session: "Session", model: type["ModelBase"]) -> None:
+    """
+    Write the pending counter deltas of the given table, if any, so that they are visible to the queries of the session
+    """
+    accumulator = session.info.get(f'counter_delta_accumulator_{model.__tablename__}')
+    if accumulator:
+        accumulator.flush()
@@ -309,6 +309,31 @@ class Default(protocol.RSEProtocol):
         except Exception as error:
             raise exception.ServiceUnavailable(error)
 
+    def bulk_delete(self, pfns):
+        """
+        Deletes several files from the connected RSE with a single gfal2 bulk unlink.
+
+        :param pfns: list of physical file names to delete
+
+        :returns: a dict {pfn: None if the file was deleted, or the exception raised when deleting it}
+        """
+        self.logger(logging.DEBUG, 'bulk deleting {} files'.format(len(pfns)))
+
+        try:
+            errors = self.__ctx.unlink([str(pfn) for pfn in pfns])
+        except Exception as error:
+            return {pfn: exception.ServiceUnavailable(error) for pfn in pfns}
+
+        result = {}
+        for pfn, error in zip(pfns, errors):
+            if not error:
+                result[pfn] = None
+            elif error.code == errno.ENOENT or 'No such file' in str(error):
+                result[pfn] = exception.SourceNotFound(error)
+            else:
+                result[pfn] = exception.ServiceUnavailable(error)
+        return result
+
     def rename(self, path, new_path):
         """
         Allows to rename a file stored inside the connected RSE.
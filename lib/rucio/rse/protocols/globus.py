@@ -212,6 +212,8 @@ class GlobusRSEProtocol(RSEProtocol):
 
             :param pfns: list of pfns to delete
 
+            :returns: a dict {pfn: None} once the task was accepted. The deletion itself is asynchronous.
+
             :raises TransferAPIError: if unexpected response from the service.
         """
         if self.globus_endpoint_id:
@@ -225,6 +227,7 @@ class GlobusRSEProtocol(RSEProtocol):
         if bulk_delete_response['code'] != 'Accepted':
             self.logger(logging.DEBUG, 'delete_response: %s' % bulk_delete_response)
             raise exception.RucioException('delete_task not accepted by Globus')
+        return {pfn: None for pfn in pfns}
 
     def connect(self):
         """
@@ -108,9 +108,11 @@ class Default(protocol.RSEProtocol):
 
             :param pfns: list of pfns to delete
 
+            :returns: a dict {pfn: None} for all pfns
+
             :raises TransferAPIError: if unexpected response from the service.
         """
-        pass
+        return {pfn: None for pfn in pfns}
 
     def rename(self, pfn, new_pfn):
         """ Allows to rename a file stored inside the connected RSE.
@@ -275,6 +275,24 @@ class RSEProtocol(ABC):
         """
         raise NotImplementedError
 
+    def bulk_delete(self, pfns):
+        """
+            Deletes several files from the connected RSE. The default implementation deletes
+            them one by one; protocols which can do better should override it.
+
+            :param pfns: list of physical file names to delete
+
+            :returns: a dict {pfn: None if the file was deleted, or the exception raised when deleting it}
+        """
+        result = {}
+        for pfn in pfns:
+            try:
+                self.delete(pfn)
+                result[pfn] = None
+            except Exception as error:
+                result[pfn] = error
+        return result
+
     @abstractmethod
     def rename(self, path, new_path):
         """ Allows to rename a file stored inside the connected RSE.
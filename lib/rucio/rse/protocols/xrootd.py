@@ -274,6 +274,38 @@ class Default(protocol.RSEProtocol):
         except Exception as e:
             raise exception.ServiceUnavailable(e)
 
+    def bulk_delete(self, pfns):
+        """
+            Deletes several files from the connected RSE with a single xrdfs rm call. xrdfs
+            attempts to remove every path and reports each failure on stderr: if the call
+            fails, only the files whose path is reported in the error output are deleted again
+            one by one, to find out why they could not be deleted. If no path is reported
+            (e.g. the server could not be reached), all files are deleted one by one.
+
+            :param pfns: list of physical file names to delete
+
+            :returns: a dict {pfn: None if the file was deleted, or the exception raised when deleting it}
+        """
+        self.logger(logging.DEBUG, 'xrootd.bulk_delete: {} pfns'.format(len(pfns)))
+        try:
+            pfn_to_path = {pfn: self.pfn2path(pfn) for pfn in pfns}
+            cmd = f'{self._auth_env} xrdfs {self.hostname}:{self.port} rm {" ".join(pfn_to_path.values())}'
+            self.logger(logging.DEBUG, 'xrootd.bulk_delete: cmd: {}'.format(cmd))
+            status, out, err = execute(cmd)
+            if status == 0:
+                return {pfn: None for pfn in pfns}
+            reported_paths = {token.rstrip(';:,') for token in (err or '').split()}
+            failed_pfns = [pfn for pfn, path in pfn_to_path.items() if path in reported_paths]
+            if failed_pfns:
+                self.logger(logging.DEBUG, 'xrootd.bulk_delete: falling back to single deletes for {} pfns: {}'.format(len(failed_pfns), err))
+                result = {pfn: None for pfn in pfns}
+                result.update(super().bulk_delete(failed_pfns))
+                return result
+            self.logger(logging.DEBUG, 'xrootd.bulk_delete: falling back to single deletes: {}'.format(err))
+        except Exception as e:
+            self.logger(logging.DEBUG, 'xrootd.bulk_delete: falling back to single deletes: {}'.format(e))
+        return super().bulk_delete(pfns)
+
     def rename(self, pfn, new_pfn):
         """ Allows to rename a file stored inside the connected RSE.
 
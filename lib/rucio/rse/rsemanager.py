@@ -15,6 +15,8 @@
 import copy
 import logging
 import random
+import threading
+from collections import OrderedDict
 from time import sleep
 from typing import TYPE_CHECKING
 from urllib.parse import urlparse
@@ -658,6 +660,58 @@ def get_space_usage(rse_settings: types.RSESettingsDict, scheme=None, domain='wa
     return [gs, ret]
 
 
+MATCHING_SCHEME_CACHE_SIZE = 100000
+
+
+class _MatchingSchemeCache:
+    """
+    Bounded LRU memoizing the deterministic part of find_matching_scheme.
+
+    Entries are keyed by a fingerprint of the protocol configuration of both RSEs (the scheme
+    and priority of each protocol for the requested operations and domain), so any change
+    of the protocols of an RSE automatically results in a different key.
+    """
+    def __init__(self, max_size):
+        self._lock = threading.Lock()
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'size': len(self._entries)}
+
+
+MATCHING_SCHEME_CACHE = _MatchingSchemeCache(max_size=MATCHING_SCHEME_CACHE_SIZE)
+
+
+def _protocols_fingerprint(protocols, operation, domain):
+    return tuple((protocol['scheme'], protocol['domains'].get(domain, {}).get(operation, '-')) for protocol in protocols)
+
+
 def find_matching_scheme(rse_settings_dest, rse_settings_src, operation_src, operation_dest, domain='wan', scheme=None):
     """
     Find the best matching scheme between two RSEs
@@ -672,7 +726,37 @@ def find_matching_scheme(rse_settings_dest, rse_settings_src, operation_src, ope
     """
     operation_src = operation_src.lower()
     operation_dest = operation_dest.lower()
+    if scheme and not isinstance(scheme, list):
+        scheme = scheme.split(',')
+
+    key = (
+        _protocols_fingerprint(rse_settings_src['protocols'], operation_src, domain),
+        _protocols_fingerprint(rse_settings_dest['protocols'], operation_dest, domain),
+        operation_src,
+        operation_dest,
+        domain,
+        tuple(scheme) if scheme else None,
+    )
+    candidates = MATCHING_SCHEME_CACHE.get(key)
+    if candidates is None:
+        candidates = _matching_scheme_candidates(rse_settings_dest, rse_settings_src, operation_src, operation_dest, domain, scheme)
+        MATCHING_SCHEME_CACHE.set(key, candidates)
+
+    if not candidates:
+        raise exception.RSEProtocolNotSupported('No protocol for provided settings found : %s.' % str(rse_settings_dest))
+
+    # Pick randomly between equal priorities to load-balance across protocols.
+    return random.choice(random.choice(candidates))  # noqa: S311
+
+
+def _matching_scheme_candidates(rse_settings_dest, rse_settings_src, operation_src, operation_dest, domain, scheme):
+    """
+    Compute all the equally good results of find_matching_scheme.
 
+    :returns: A tuple with one entry for each destination protocol of the best usable priority.
+              Each entry is the tuple of (dest_scheme, src_scheme, dest_scheme_priority, src_scheme_priority)
+              for the best compatible source protocols. Empty if no protocols match.
+    """
     src_candidates = copy.copy(rse_settings_src['protocols'])
     dest_candidates = copy.copy(rse_settings_dest['protocols'])
 
@@ -681,8 +765,6 @@ def find_matching_scheme(rse_settings_dest, rse_settings_src, operation_src, ope
     for protocol in src_candidates:
         # Check if scheme given and filter if so
         if scheme:
-            if not isinstance(scheme, list):
-                scheme = scheme.split(',')
             if protocol['scheme'] not in scheme:
                 tbr.append(protocol)
                 continue
@@ -697,8 +779,6 @@ def find_matching_scheme(rse_settings_dest, rse_settings_src, operation_src, ope
     for protocol in dest_candidates:
         # Check if scheme given and filter if so
         if scheme:
-            if not isinstance(scheme, list):
-                scheme = scheme.split(',')
             if protocol['scheme'] not in scheme:
                 tbr.append(protocol)
                 continue
@@ -709,22 +789,26 @@ def find_matching_scheme(rse_settings_dest, rse_settings_src, operation_src, ope
         dest_candidates.remove(r)
 
     if not len(src_candidates) or not len(dest_candidates):
-        raise exception.RSEProtocolNotSupported('No protocol for provided settings found : %s.' % str(rse_settings_dest))
-
-    # Shuffle the candidates to load-balance across equal weights.
-    random.shuffle(dest_candidates)
-    random.shuffle(src_candidates)
+        return ()
 
-    # Select the one with the highest priority
+    # Select the ones with the highest priority
     dest_candidates = sorted(dest_candidates, key=lambda k: k['domains'][domain][operation_dest])
     src_candidates = sorted(src_candidates, key=lambda k: k['domains'][domain][operation_src])
 
+    candidates = []
+    best_dest_priority = None
     for dest_protocol in dest_candidates:
-        for src_protocol in src_candidates:
-            if __check_compatible_scheme(dest_protocol['scheme'], src_protocol['scheme']):
-                return (dest_protocol['scheme'], src_protocol['scheme'], dest_protocol['domains'][domain][operation_dest], src_protocol['domains'][domain][operation_src])
-
-    raise exception.RSEProtocolNotSupported('No protocol for provided settings found : %s.' % str(rse_settings_dest))
+        dest_priority = dest_protocol['domains'][domain][operation_dest]
+        if best_dest_priority is not None and dest_priority != best_dest_priority:
+            break
+        compatible = [src_protocol for src_protocol in src_candidates if __check_compatible_scheme(dest_protocol['scheme'], src_protocol['scheme'])]
+        if not compatible:
+            continue
+        best_src_priority = compatible[0]['domains'][domain][operation_src]
+        candidates.append(tuple((dest_protocol['scheme'], src_protocol['scheme'], dest_priority, best_src_priority)
+                                for src_protocol in compatible if src_protocol['domains'][domain][operation_src] == best_src_priority))
+        best_dest_priority = dest_priority
+    return tuple(candidates)
 
 
 def _retry_protocol_stat(protocol, pfn):
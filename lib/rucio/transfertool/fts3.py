@@ -16,6 +16,7 @@ import datetime
 import json
 import logging
 import pathlib
+import threading
 import traceback
 import uuid
 from configparser import NoOptionError, NoSectionError
@@ -25,7 +26,7 @@ from urllib.parse import urlparse
 
 import requests
 from dogpile.cache.api import NoValue
-from requests.adapters import ReadTimeout
+from requests.adapters import HTTPAdapter, ReadTimeout
 from requests.packages.urllib3 import disable_warnings  # pylint: disable=import-error
 
 from rucio.common.cache import MemcacheRegion
@@ -162,6 +163,65 @@ def _scitags_ids(logger: "LoggerFunction" = logging.log) -> "tuple[int | None, d
     return _SCITAGS_EXP_ID, _SCITAGS_ACTIVITY_IDS
 
 
+class FTS3SessionPool:
+    """
+    Keep-alive HTTP sessions to the FTS servers, shared by all the FTS3Transfertool objects of the process.
+
+    One session is kept per FTS server and client certificate, so consecutive calls to the same
+    server reuse its connections instead of doing a new TLS handshake each time. At most
+    max_connections requests are sent in parallel to a server; the other callers wait for a
+    connection to be released.
+    """
+
+    def __init__(self, max_connections: int = 10):
+        self.max_connections = max_connections
+        self._lock = threading.Lock()
+        self._sessions: dict[tuple[str, Any], requests.Session] = {}
+
+    def session(self, external_host: str, cert: Any = None) -> requests.Session:
+        """
+        Returns the session to use for the given FTS server and client certificate.
+        """
+        key = (external_host, cert)
+        session = self._sessions.get(key)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(key)
+                if session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_connections, pool_block=True)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._sessions[key] = session
+        return session
+
+    def clear(self) -> None:
+        """
+        Close all the sessions and their connections.
+        """
+        with self._lock:
+            sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            session.close()
+
+
+_FTS3_SESSION_POOL_LOCK = threading.Lock()
+_FTS3_SESSION_POOL: Optional[FTS3SessionPool] = None
+
+
+def get_fts3_session_pool() -> FTS3SessionPool:
+    """
+    Returns the FTS session pool shared by all the threads of the process.
+    The maximum number of connections per FTS server is read from [conveyor] fts_max_connections when it is created.
+    """
+    global _FTS3_SESSION_POOL
+    with _FTS3_SESSION_POOL_LOCK:
+        if _FTS3_SESSION_POOL is None:
+            max_connections = config_get_int('conveyor', 'fts_max_connections', raise_exception=False, default=10)
+            _FTS3_SESSION_POOL = FTS3SessionPool(max_connections=max_connections)
+        return _FTS3_SESSION_POOL
+
+
 def _pick_cert_file(vo: Optional[str]) -> Optional[str]:
     cert = None
     if vo:
@@ -700,8 +760,8 @@ class FTS3CompletionMessageTransferStatusReport(Fts3TransferStatusReport):
     """
     Parses FTS Completion messages received via the message queue
     """
-    def __init__(self, external_host: str, request_id: str, fts_message: dict[str, Any]):
-        super().__init__(external_host=external_host, request_id=request_id)
+    def __init__(self, external_host: str, request_id: str, fts_message: dict[str, Any], request: Optional[dict[str, Any]] = None):
+        super().__init__(external_host=external_host, request_id=request_id, request=request)
 
         self.fts_message = fts_message
 
@@ -930,6 +990,8 @@ class FTS3Transfertool(Transfertool):
             self.cert = None
             self.verify = True  # True is the default setting of a requests.* method
 
+        self.session = get_fts3_session_pool().session(self.external_host, self.cert)
+
         self.scitags_exp_id, self.scitags_activity_ids = _scitags_ids(logger=logger)
 
     @classmethod
@@ -1100,12 +1162,12 @@ class FTS3Transfertool(Transfertool):
         post_result = None
         stopwatch = Stopwatch()
         try:
-            post_result = requests.post('%s/jobs' % self.external_host,
-                                        verify=self.verify,
-                                        cert=self.cert,
-                                        data=params_str,
-                                        headers=self.headers,
-                                        timeout=timeout)
+            post_result = self.session.post('%s/jobs' % self.external_host,
+                                            verify=self.verify,
+                                            cert=self.cert,
+                                            data=params_str,
+                                            headers=self.headers,
+                                            timeout=timeout)
             labels = {'host': self.__extract_host(self.external_host)}
             METRICS.timer('submit_transfer.{host}').labels(**labels).observe(stopwatch.elapsed / (len(files) or 1))
         except ReadTimeout as error:
@@ -1149,11 +1211,11 @@ class FTS3Transfertool(Transfertool):
 
         job = None
 
-        job = requests.delete('%s/jobs/%s' % (self.external_host, transfer_id),
-                              verify=self.verify,
-                              cert=self.cert,
-                              headers=self.headers,
-                              timeout=timeout)
+        job = self.session.delete('%s/jobs/%s' % (self.external_host, transfer_id),
+                                  verify=self.verify,
+                                  cert=self.cert,
+                                  headers=self.headers,
+                                  timeout=timeout)
 
         if job and job.status_code == 200:
             CANCEL_COUNTER.labels(state='success', host=self.__extract_host(self.external_host)).inc()
@@ -1176,12 +1238,12 @@ class FTS3Transfertool(Transfertool):
         params_dict = {"params": {"priority": priority}}
         params_str = json.dumps(params_dict, cls=APIEncoder)
 
-        job = requests.post('%s/jobs/%s' % (self.external_host, transfer_id),
-                            verify=self.verify,
-                            data=params_str,
-                            cert=self.cert,
-                            headers=self.headers,
-                            timeout=timeout)  # TODO set to 3 in conveyor
+        job = self.session.post('%s/jobs/%s' % (self.external_host, transfer_id),
+                                verify=self.verify,
+                                data=params_str,
+                                cert=self.cert,
+                                headers=self.headers,
+                                timeout=timeout)  # TODO set to 3 in conveyor
 
         if job and job.status_code == 200:
             UPDATE_PRIORITY_COUNTER.labels(state='success', host=self.__extract_host(self.external_host)).inc()
@@ -1209,11 +1271,11 @@ class FTS3Transfertool(Transfertool):
 
         job = None
 
-        job = requests.get('%s/jobs/%s' % (self.external_host, transfer_id),
-                           verify=self.verify,
-                           cert=self.cert,
-                           headers=self.headers,
-                           timeout=timeout)  # TODO Set to 5 in conveyor
+        job = self.session.get('%s/jobs/%s' % (self.external_host, transfer_id),
+                               verify=self.verify,
+                               cert=self.cert,
+                               headers=self.headers,
+                               timeout=timeout)  # TODO Set to 5 in conveyor
         if job and job.status_code == 200:
             QUERY_COUNTER.labels(state='success', host=self.__extract_host(self.external_host)).inc()
             return [job.json()]
@@ -1232,10 +1294,10 @@ class FTS3Transfertool(Transfertool):
 
         get_result = None
 
-        get_result = requests.get('%s/whoami' % self.external_host,
-                                  verify=self.verify,
-                                  cert=self.cert,
-                                  headers=self.headers)
+        get_result = self.session.get('%s/whoami' % self.external_host,
+                                      verify=self.verify,
+                                      cert=self.cert,
+                                      headers=self.headers)
 
         if get_result and get_result.status_code == 200:
             WHOAMI_COUNTER.labels(state='success', host=self.__extract_host(self.external_host)).inc()
@@ -1253,10 +1315,10 @@ class FTS3Transfertool(Transfertool):
 
         get_result = None
 
-        get_result = requests.get('%s/' % self.external_host,
-                                  verify=self.verify,
-                                  cert=self.cert,
-                                  headers=self.headers)
+        get_result = self.session.get('%s/' % self.external_host,
+                                      verify=self.verify,
+                                      cert=self.cert,
+                                      headers=self.headers)
 
         if get_result and get_result.status_code == 200:
             VERSION_COUNTER.labels(state='success', host=self.__extract_host(self.external_host)).inc()
@@ -1274,13 +1336,12 @@ class FTS3Transfertool(Transfertool):
         """
 
         responses = {}
-        fts_session = requests.Session()
         xfer_ids = ','.join(requests_by_eid)
-        jobs = fts_session.get('%s/jobs/%s?files=file_state,dest_surl,finish_time,start_time,staging_start,staging_finished,reason,source_surl,file_metadata' % (self.external_host, xfer_ids),
-                               verify=self.verify,
-                               cert=self.cert,
-                               headers=self.headers,
-                               timeout=timeout)
+        jobs = self.session.get('%s/jobs/%s?files=file_state,dest_surl,finish_time,start_time,staging_start,staging_finished,reason,source_surl,file_metadata' % (self.external_host, xfer_ids),
+                                verify=self.verify,
+                                cert=self.cert,
+                                headers=self.headers,
+                                timeout=timeout)
 
         if jobs is None:
             BULK_QUERY_COUNTER.labels(state='failure', host=self.__extract_host(self.external_host)).inc()
@@ -1312,11 +1373,11 @@ class FTS3Transfertool(Transfertool):
         """
 
         try:
-            result = requests.get('%s/ban/se' % self.external_host,
-                                  verify=self.verify,
-                                  cert=self.cert,
-                                  headers=self.headers,
-                                  timeout=None)
+            result = self.session.get('%s/ban/se' % self.external_host,
+                                      verify=self.verify,
+                                      cert=self.cert,
+                                      headers=self.headers,
+                                      timeout=None)
         except Exception as error:
             raise Exception('Could not retrieve transfer information: %s', error)
         if result and result.status_code == 200:
@@ -1331,11 +1392,11 @@ class FTS3Transfertool(Transfertool):
         """
 
         try:
-            result = requests.get('%s/config/se' % (self.external_host),
-                                  verify=self.verify,
-                                  cert=self.cert,
-                                  headers=self.headers,
-                                  timeout=None)
+            result = self.session.get('%s/config/se' % (self.external_host),
+                                      verify=self.verify,
+                                      cert=self.cert,
+                                      headers=self.headers,
+                                      timeout=None)
         except Exception:
             self.logger(logging.WARNING, 'Could not get config of %s on %s - %s', storage_element, self.external_host, str(traceback.format_exc()))
         if result and result.status_code == 200:
@@ -1398,12 +1459,12 @@ class FTS3Transfertool(Transfertool):
         params_str = json.dumps(params_dict, cls=APIEncoder)
 
         try:
-            result = requests.post('%s/config/se' % (self.external_host),
-                                   verify=self.verify,
-                                   cert=self.cert,
-                                   data=params_str,
-                                   headers=self.headers,
-                                   timeout=None)
+            result = self.session.post('%s/config/se' % (self.external_host),
+                                       verify=self.verify,
+                                       cert=self.cert,
+                                       data=params_str,
+                                       headers=self.headers,
+                                       timeout=None)
 
         except Exception:
             self.logger(logging.WARNING, 'Could not set the config of %s on %s - %s', storage_element, self.external_host, str(traceback.format_exc()))
@@ -1437,12 +1498,12 @@ class FTS3Transfertool(Transfertool):
         result = None
         if ban:
             try:
-                result = requests.post('%s/ban/se' % self.external_host,
-                                       verify=self.verify,
-                                       cert=self.cert,
-                                       data=params_str,
-                                       headers=self.headers,
-                                       timeout=None)
+                result = self.session.post('%s/ban/se' % self.external_host,
+                                           verify=self.verify,
+                                           cert=self.cert,
+                                           data=params_str,
+                                           headers=self.headers,
+                                           timeout=None)
             except Exception:
                 self.logger(logging.WARNING, 'Could not ban %s on %s - %s', storage_element, self.external_host, str(traceback.format_exc()))
             if result and result.status_code == 200:
@@ -1451,12 +1512,12 @@ class FTS3Transfertool(Transfertool):
         else:
 
             try:
-                result = requests.delete('%s/ban/se?storage=%s' % (self.external_host, storage_element),
-                                         verify=self.verify,
-                                         cert=self.cert,
-                                         data=params_str,
-                                         headers=self.headers,
-                                         timeout=None)
+                result = self.session.delete('%s/ban/se?storage=%s' % (self.external_host, storage_element),
+                                             verify=self.verify,
+                                             cert=self.cert,
+                                             data=params_str,
+                                             headers=self.headers,
+                                             timeout=None)
             except Exception:
                 self.logger(logging.WARNING, 'Could not unban %s on %s - %s', storage_element, self.external_host, str(traceback.format_exc()))
             if result and result.status_code == 204:
@@ -1487,11 +1548,11 @@ class FTS3Transfertool(Transfertool):
 
                 get_result = None
                 try:
-                    get_result = requests.get('%s/whoami' % self.external_host,
-                                              verify=self.verify,
-                                              cert=self.cert,
-                                              headers=self.headers,
-                                              timeout=5)
+                    get_result = self.session.get('%s/whoami' % self.external_host,
+                                                  verify=self.verify,
+                                                  cert=self.cert,
+                                                  headers=self.headers,
+                                                  timeout=5)
                 except ReadTimeout as error:
                     raise TransferToolTimeout(error)
                 except json.JSONDecodeError as error:
@@ -1584,11 +1645,11 @@ class FTS3Transfertool(Transfertool):
 
         files = None
 
-        files = requests.get('%s/jobs/%s/files' % (self.external_host, transfer_id),
-                             verify=self.verify,
-                             cert=self.cert,
-                             headers=self.headers,
-                             timeout=5)
+        files = self.session.get('%s/jobs/%s/files' % (self.external_host, transfer_id),
+                                 verify=self.verify,
+                                 cert=self.cert,
+                                 headers=self.headers,
+                                 timeout=5)
         if files and (files.status_code == 200 or files.status_code == 207):
             QUERY_DETAILS_COUNTER.labels(state='success', host=self.__extract_host(self.external_host)).inc()
             return files.json()
@@ -19,7 +19,7 @@ from dogpile.cache.backends.null import NullBackend
 from dogpile.cache.util import function_key_generator
 
 import rucio.common.cache as cache
-from rucio.common.cache import CacheKey, MemcacheRegion
+from rucio.common.cache import CacheKey, LocalLRUProxy, MemcacheRegion
 
 
 class TestCache:
@@ -71,6 +71,41 @@ class TestCache:
             # Change region.backend.memcached_expire_time to region.backend['expire']
             assert region.backend.memcached_expire_time == expected_memcached_expire_time
 
+        def test_local_cache(self, monkeypatch):
+            cache.ENABLE_CACHING = False
+            monkeypatch.setattr(cache, 'ENABLE_LOCAL_CACHING', True)
+            region = MemcacheRegion(60, name='test_local_cache', local_cache_size=2)
+
+            assert isinstance(region.backend, LocalLRUProxy)
+            assert isinstance(region.backend.proxied, NullBackend)
+
+            value = {'key': 'value'}
+            region.set('a', value)
+            assert region.get('a') == value
+            # Callers get independent copies of the cached value
+            region.get('a')['key'] = 'changed'
+            assert region.get('a') == value
+
+            region.set('b', 'b')
+            region.set('c', 'c')
+            assert region.get('a') is cache.NO_VALUE
+            assert region.get('b') == 'b'
+            assert region.get('c') == 'c'
+
+            region.delete('b')
+            assert region.get('b') is cache.NO_VALUE
+
+        def test_local_cache_expiration(self, monkeypatch):
+            cache.ENABLE_CACHING = False
+            monkeypatch.setattr(cache, 'ENABLE_LOCAL_CACHING', True)
+            region = MemcacheRegion(60, name='test_local_cache_expiration', local_cache_size=10, local_expiration_time=10)
+            assert region.local_cache.expiration_time == 10
+
+            region.set('a', 'a')
+            now = cache.time.monotonic()
+            monkeypatch.setattr(cache.time, 'monotonic', lambda: now + 11)
+            assert region.get('a') is cache.NO_VALUE
+
     class TestCacheKey:
         section = "test"
         option = "test2"
@@ -11,6 +11,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import json
 import logging
 import threading
 import time
@@ -20,12 +21,13 @@ from unittest.mock import patch
 from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
 
 import pytest
-from sqlalchemy import and_, delete, select, update
+from sqlalchemy import and_, delete, event, select, update
+from stomp.utils import Frame
 
 import rucio.daemons.reaper.reaper
 from rucio.common.checksum import adler32
 from rucio.common.constants import RseAttr
-from rucio.common.exception import ReplicaNotFound, RequestNotFound
+from rucio.common.exception import DatabaseException, ReplicaNotFound, RequestNotFound
 from rucio.common.types import InternalAccount
 from rucio.common.utils import generate_uuid
 from rucio.core import config as core_config
@@ -42,16 +44,16 @@ from rucio.daemons.conveyor.finisher import finisher
 from rucio.daemons.conveyor.poller import poller
 from rucio.daemons.conveyor.preparer import preparer
 from rucio.daemons.conveyor.receiver import GRACEFUL_STOP as receiver_graceful_stop
-from rucio.daemons.conveyor.receiver import Receiver, receiver
+from rucio.daemons.conveyor.receiver import BatchingReceiver, Receiver, receiver
 from rucio.daemons.conveyor.stager import stager
 from rucio.daemons.conveyor.submitter import submitter
 from rucio.daemons.conveyor.throttler import throttler
 from rucio.daemons.reaper.reaper import reaper
 from rucio.db.sqla import models
 from rucio.db.sqla.constants import LockState, ReplicaState, RequestState, RequestType, RSEType, RuleState
-from rucio.db.sqla.session import read_session, transactional_session
+from rucio.db.sqla.session import get_engine, read_session, transactional_session
 from rucio.tests.common import skip_rse_tests_with_accounts
-from rucio.transfertool.fts3 import FTS3Transfertool
+from rucio.transfertool.fts3 import FTS3ApiTransferStatusReport, FTS3Transfertool, get_fts3_session_pool
 from tests.mocks.mock_http_server import MockServer
 from tests.ruciopytest import NoParallelGroups
 
@@ -1425,6 +1427,257 @@ def test_multi_vo_certificates(file_config_mock, rse_factory, did_factory, scope
         assert sorted(certs_used_by_poller) == ['DEFAULT_DUMMY_CERT', 'NEW_VO_DUMMY_CERT']
 
 
+@pytest.mark.noparallel(groups=[NoParallelGroups.SUBMITTER, NoParallelGroups.POLLER])
+@pytest.mark.parametrize("file_config_mock", [{"overrides": [
+    ('conveyor', 'poll_query_concurrency', '4'),
+]}], indirect=True)
+def test_poller_concurrent_queries(file_config_mock, rse_factory, did_factory, root_account):
+    """
+    Test that the poller queries the different fts servers in parallel
+    """
+    fts_hosts = ['https://fts1:8446', 'https://fts2:8446']
+    all_rses = []
+    for fts_host in fts_hosts:
+        src_rse, src_rse_id = rse_factory.make_rse(scheme='mock', protocol_impl='rucio.rse.protocols.posix.Default')
+        dst_rse, dst_rse_id = rse_factory.make_rse(scheme='mock', protocol_impl='rucio.rse.protocols.posix.Default')
+        for rse_id in (src_rse_id, dst_rse_id):
+            rse_core.add_rse_attribute(rse_id, RseAttr.FTS, fts_host)
+        distance_core.add_distance(src_rse_id, dst_rse_id, distance=10)
+        did = did_factory.random_file_did()
+        replica_core.add_replica(rse_id=src_rse_id, bytes_=1, account=root_account, adler32=None, md5=None, **did)
+        rule_core.add_rule(dids=[did], account=root_account, copies=1, rse_expression=dst_rse, grouping='ALL', weight=None,
+                           lifetime=None, locked=False, subscription_id=None)
+        all_rses.extend([src_rse_id, dst_rse_id])
+
+    queries = []
+
+    class _FTSWrapper(FTS3Transfertool):
+        # Don't actually perform any interaction with fts; and record the thread querying each server
+        def submit(self, transfers, job_params, timeout=None):
+            return generate_uuid()
+
+        def bulk_query(self, requests_by_eid, timeout=None):
+            queries.append((self.external_host, threading.current_thread().name))
+            return {}
+
+    with patch('rucio.core.transfer.TRANSFERTOOL_CLASSES_BY_NAME', new={'fts3': _FTSWrapper}):
+        submitter(once=True, rses=[{'id': rse_id} for rse_id in all_rses], partition_wait_time=0, transfertype='single', filter_transfertool=None)
+        poller(once=True, older_than=0, partition_wait_time=0)
+
+    assert sorted(host for host, _ in queries) == fts_hosts
+    assert all(thread_name.startswith('poller-query') for _, thread_name in queries)
+
+
+def test_poller_bulk_state_update(rse_factory, did_factory, root_account):
+    """
+    Test that the poller updates the state of all the terminated requests of its bulk query with a few statements
+    """
+    fts_host = 'https://fts:8446'
+    src_rse, src_rse_id = rse_factory.make_rse(scheme='mock', protocol_impl='rucio.rse.protocols.posix.Default')
+    dst_rse, dst_rse_id = rse_factory.make_rse(scheme='mock', protocol_impl='rucio.rse.protocols.posix.Default')
+    for rse_id in (src_rse_id, dst_rse_id):
+        rse_core.add_rse_attribute(rse_id, RseAttr.FTS, fts_host)
+    distance_core.add_distance(src_rse_id, dst_rse_id, distance=10)
+    dids = [did_factory.random_file_did() for _ in range(6)]
+    for did in dids:
+        replica_core.add_replica(rse_id=src_rse_id, bytes_=1, account=root_account, adler32=None, md5=None, **did)
+    rule_core.add_rule(dids=dids, account=root_account, copies=1, rse_expression=dst_rse, grouping='ALL', weight=None,
+                       lifetime=None, locked=False, subscription_id=None)
+    failed_names = {did['name'] for did in dids[:2]}
+
+    class _FTSWrapper(FTS3Transfertool):
+        def submit(self, transfers, job_params, timeout=None):
+            return generate_uuid()
+
+        def bulk_query(self, requests_by_eid, timeout=None):
+            resps = {}
+            for transfer_id, requests in requests_by_eid.items():
+                resps[transfer_id] = {}
+                for request_id, request in requests.items():
+                    failed = request['name'] in failed_names
+                    job_response = {'job_id': transfer_id, 'job_state': 'FAILED' if failed else 'FINISHED', 'job_metadata': {'multi_sources': False}}
+                    file_response = {'file_state': 'FAILED' if failed else 'FINISHED', 'reason': 'Transfer failed' if failed else None,
+                                     'start_time': None, 'finish_time': None, 'staging_start': None, 'staging_finished': None,
+                                     'file_metadata': {'request_id': request_id, 'scope': request['scope'].external, 'name': request['name'],
+                                                       'src_rse': src_rse, 'src_rse_id': src_rse_id, 'dst_rse': dst_rse}}
+                    resps[transfer_id][request_id] = FTS3ApiTransferStatusReport(self.external_host, request_id=request_id, request=request,
+                                                                                 job_response=job_response, file_response=file_response)
+            return resps
+
+    request_updates = []
+
+    def _record_request_updates(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('UPDATE REQUESTS '):
+            request_updates.append(statement)
+
+    with patch('rucio.core.transfer.TRANSFERTOOL_CLASSES_BY_NAME', new={'fts3': _FTSWrapper}):
+        submitter(once=True, rses=[{'id': rse_id} for rse_id in (src_rse_id, dst_rse_id)], partition_wait_time=0, transfertype='single', filter_transfertool=None)
+        event.listen(get_engine(), 'before_cursor_execute', _record_request_updates)
+        try:
+            poller(once=True, older_than=0, partition_wait_time=0)
+        finally:
+            event.remove(get_engine(), 'before_cursor_execute', _record_request_updates)
+
+    for did in dids:
+        request = request_core.get_request_by_did(rse_id=dst_rse_id, **did)
+        assert request['state'] == (RequestState.FAILED if did['name'] in failed_names else RequestState.DONE)
+    # One update for the done requests, one for the failed ones, and the touch of the polled jobs
+    assert len(request_updates) <= 3
+
+
+@pytest.mark.parametrize("failure", ['monitor_message', 'database'])
+def test_poller_bulk_state_update_isolates_failures(failure, rse_factory, did_factory, root_account):
+    """
+    Test that a request which fails to be handled doesn't prevent the poller from updating the other requests of its bulk query
+    """
+    fts_host = 'https://fts:8446'
+    src_rse, src_rse_id = rse_factory.make_rse(scheme='mock', protocol_impl='rucio.rse.protocols.posix.Default')
+    dst_rse, dst_rse_id = rse_factory.make_rse(scheme='mock', protocol_impl='rucio.rse.protocols.posix.Default')
+    for rse_id in (src_rse_id, dst_rse_id):
+        rse_core.add_rse_attribute(rse_id, RseAttr.FTS, fts_host)
+    distance_core.add_distance(src_rse_id, dst_rse_id, distance=10)
+    dids = [did_factory.random_file_did() for _ in range(4)]
+    for did in dids:
+        replica_core.add_replica(rse_id=src_rse_id, bytes_=1, account=root_account, adler32=None, md5=None, **did)
+    rule_core.add_rule(dids=dids, account=root_account, copies=1, rse_expression=dst_rse, grouping='ALL', weight=None,
+                       lifetime=None, locked=False, subscription_id=None)
+    broken_name = dids[0]['name']
+
+    class _FTSWrapper(FTS3Transfertool):
+        def submit(self, transfers, job_params, timeout=None):
+            return generate_uuid()
+
+        def bulk_query(self, requests_by_eid, timeout=None):
+            resps = {}
+            for transfer_id, requests in requests_by_eid.items():
+                resps[transfer_id] = {}
+                for request_id, request in requests.items():
+                    job_response = {'job_id': transfer_id, 'job_state': 'FINISHED', 'job_metadata': {'multi_sources': False}}
+                    file_response = {'file_state': 'FINISHED', 'reason': None,
+                                     'start_time': None, 'finish_time': None, 'staging_start': None, 'staging_finished': None,
+                                     'file_metadata': {'request_id': request_id, 'scope': request['scope'].external, 'name': request['name'],
+                                                       'src_rse': src_rse, 'src_rse_id': src_rse_id, 'dst_rse': dst_rse}}
+                    resps[transfer_id][request_id] = FTS3ApiTransferStatusReport(self.external_host, request_id=request_id, request=request,
+                                                                                 job_response=job_response, file_response=file_response)
+            return resps
+
+    get_monitor_msg_fields = FTS3ApiTransferStatusReport.get_monitor_msg_fields
+
+    def _get_monitor_msg_fields(self, *, session, logger=logging.log):
+        if self._file_metadata['name'] == broken_name:
+            raise ValueError('Broken transfer status report')
+        return get_monitor_msg_fields(self, session=session, logger=logger)
+
+    def _update_requests(*args, **kwargs):
+        raise DatabaseException('Lock wait timeout exceeded')
+
+    if failure == 'monitor_message':
+        failure_patch = patch.object(FTS3ApiTransferStatusReport, 'get_monitor_msg_fields', new=_get_monitor_msg_fields)
+    else:
+        failure_patch = patch('rucio.core.request.update_requests', side_effect=_update_requests)
+
+    with patch('rucio.core.transfer.TRANSFERTOOL_CLASSES_BY_NAME', new={'fts3': _FTSWrapper}):
+        submitter(once=True, rses=[{'id': rse_id} for rse_id in (src_rse_id, dst_rse_id)], partition_wait_time=0, transfertype='single', filter_transfertool=None)
+        with failure_patch:
+            poller(once=True, older_than=0, partition_wait_time=0)
+
+    requests = [request_core.get_request_by_did(rse_id=dst_rse_id, **did) for did in dids]
+    assert all(request['state'] == RequestState.DONE for request in requests)
+    done_request_ids = {msg['payload']['request-id'] for msg in message_core.retrieve_messages(event_type='transfer-done')}
+    # Only the broken request has no hermes message
+    expected_request_ids = {request['id'] for request in requests if failure == 'database' or request['name'] != broken_name}
+    assert {request['id'] for request in requests}.intersection(done_request_ids) == expected_request_ids
+
+
+def test_fts3_session_pool():
+    """
+    Test that the fts3 transfertools keep the connections to the fts servers between queries
+    """
+    connections = []
+
+    class _MockFTSHandler(MockServer.Handler):
+        protocol_version = 'HTTP/1.1'
+
+        def setup(self):
+            super().setup()
+            connections.append(self.client_address)
+
+        def do_GET(self):
+            job_ids = urlparse(self.path).path.split('/')[-1].split(',')
+            message = json.dumps([{'job_id': job_id, 'http_status': '404 Not Found'} for job_id in job_ids])
+            self.send_code_and_message(200, {'Content-Length': str(len(message))}, message)
+
+    with MockServer(_MockFTSHandler) as mock_server:
+        transfertool = FTS3Transfertool(external_host=mock_server.base_url)
+        assert transfertool.bulk_query({'job1': {}, 'job2': {}}, timeout=10) == {'job1': None, 'job2': None}
+        transfertool = FTS3Transfertool(external_host=mock_server.base_url)
+        assert transfertool.bulk_query({'job3': {}}, timeout=10) == {'job3': None}
+        assert len(connections) == 1
+        get_fts3_session_pool().clear()
+
+
+@pytest.mark.noparallel(groups=[NoParallelGroups.SUBMITTER])
+def test_batching_receiver(rse_factory, did_factory, root_account):
+    """
+    Test that the batching receiver applies the completion messages by batches and acknowledges them once applied
+    """
+    fts_host = 'https://fts:8446'
+    src_rse, src_rse_id = rse_factory.make_rse(scheme='mock', protocol_impl='rucio.rse.protocols.posix.Default')
+    dst_rse, dst_rse_id = rse_factory.make_rse(scheme='mock', protocol_impl='rucio.rse.protocols.posix.Default')
+    for rse_id in (src_rse_id, dst_rse_id):
+        rse_core.add_rse_attribute(rse_id, RseAttr.FTS, fts_host)
+    distance_core.add_distance(src_rse_id, dst_rse_id, distance=10)
+    dids = [did_factory.random_file_did() for _ in range(2)]
+    for did in dids:
+        replica_core.add_replica(rse_id=src_rse_id, bytes_=1, account=root_account, adler32=None, md5=None, **did)
+    rule_core.add_rule(dids=dids, account=root_account, copies=1, rse_expression=dst_rse, grouping='ALL', weight=None,
+                       lifetime=None, locked=False, subscription_id=None)
+
+    class _FTSWrapper(FTS3Transfertool):
+        def submit(self, transfers, job_params, timeout=None):
+            return generate_uuid()
+
+    with patch('rucio.core.transfer.TRANSFERTOOL_CLASSES_BY_NAME', new={'fts3': _FTSWrapper}):
+        submitter(once=True, rses=[{'id': rse_id} for rse_id in (src_rse_id, dst_rse_id)], partition_wait_time=0, transfertype='single', filter_transfertool=None)
+    requests = [request_core.get_request_by_did(rse_id=dst_rse_id, **did) for did in dids]
+    assert all(request['state'] == RequestState.SUBMITTED for request in requests)
+
+    def _frame(ack_id, request, issuer='rucio'):
+        msg = {
+            'endpnt': fts_host,
+            'tr_id': 'transfer__%s' % request['external_id'],
+            't_final_transfer_state': 'Ok',
+            'job_state': 'FINISHED',
+            'job_metadata': {'issuer': issuer, 'multi_sources': False},
+            'file_metadata': {'request_id': request['id'], 'scope': request['scope'].external, 'name': request['name'],
+                              'src_rse': src_rse, 'src_rse_id': src_rse_id, 'dst_rse': dst_rse},
+            'tr_timestamp_start': 0,
+            'tr_timestamp_complete': 0,
+        }
+        return Frame(cmd='MESSAGE', headers={'ack': ack_id}, body=json.dumps(msg))
+
+    acked = []
+
+    class _Connection:
+        def ack(self, id_):
+            acked.append(id_)
+
+    batching_receiver = BatchingReceiver(broker=('broker', 61613), id_=0, total_threads=1, transfer_stats_manager=request_core.TransferStatsManager(),
+                                         conn=_Connection(), batch_size=3, batch_wait=0.1, all_vos=True)
+    batching_receiver.on_message(_frame('other', requests[0], issuer='other'))
+    assert acked == ['other']
+    for ack_id, request in (('msg1', requests[0]), ('msg2', requests[1]), ('msg3', requests[1])):
+        batching_receiver.on_message(_frame(ack_id, request))
+    # Nothing is acknowledged before being applied
+    assert acked == ['other']
+    assert request_core.get_request(requests[0]['id'])['state'] == RequestState.SUBMITTED
+
+    batching_receiver._apply_batch(batching_receiver._next_batch())
+    assert acked == ['other', 'msg1', 'msg2', 'msg3']
+    assert all(request_core.get_request(request['id'])['state'] == RequestState.DONE for request in requests)
+    assert batching_receiver._next_batch() == []
+
+
 @skip_rse_tests_with_accounts
 @pytest.mark.noparallel(groups=[NoParallelGroups.SUBMITTER, NoParallelGroups.POLLER, NoParallelGroups.FINISHER])
 @pytest.mark.parametrize("core_config_mock", [
@@ -74,6 +74,45 @@ class TestCoreRSECounter:
             del cnt['updated_at']
             assert cnt == {'files': count, 'bytes': sum_}
 
+    def test_coalesce_counter_deltas(self, rse_factory, db_session):
+        """RSE COUNTER (CORE): The deltas of a transaction are merged into one row, and applied by chunks"""
+        _, rse_id = rse_factory.make_mock_rse(session=db_session)
+        db_session.commit()
+        rse_counter.del_counter(rse_id=rse_id)
+        rse_counter.add_counter(rse_id=rse_id)
+
+        def _updated_counters():
+            stmt = select(models.UpdatedRSECounter.files, models.UpdatedRSECounter.bytes).where(models.UpdatedRSECounter.rse_id == rse_id)
+            return [tuple(row) for row in db_session.execute(stmt)]
+
+        for _ in range(10):
+            rse_counter.increase(rse_id=rse_id, files=1, bytes_=10, session=db_session)
+        rse_counter.decrease(rse_id=rse_id, files=3, bytes_=30, session=db_session)
+        db_session.commit()
+        assert _updated_counters() == [(7, 70)]
+
+        # Deltas of a rolled back transaction are dropped
+        rse_counter.increase(rse_id=rse_id, files=1, bytes_=10, session=db_session)
+        db_session.rollback()
+        assert _updated_counters() == [(7, 70)]
+
+        # Deltas which cancel out are not written
+        rse_counter.increase(rse_id=rse_id, files=1, bytes_=10, session=db_session)
+        rse_counter.decrease(rse_id=rse_id, files=1, bytes_=10, session=db_session)
+        db_session.commit()
+        assert _updated_counters() == [(7, 70)]
+
+        for _ in range(2):
+            rse_counter.increase(rse_id=rse_id, files=1, bytes_=10)
+        assert len(_updated_counters()) == 3
+        assert rse_counter.update_rse_counter(rse_id=rse_id, limit=2) == 2
+        assert rse_counter.update_rse_counter(rse_id=rse_id, limit=2) == 1
+        assert rse_counter.update_rse_counter(rse_id=rse_id, limit=2) == 0
+        assert _updated_counters() == []
+        cnt = rse_counter.get_counter(rse_id=rse_id)
+        del cnt['updated_at']
+        assert cnt == {'files': 9, 'bytes': 90}
+
     def test_fill_counter_history(self, db_session):
         """RSE COUNTER (CORE): Fill the usage history with the current value."""
         stmt = delete(models.RSEUsageHistory)
@@ -12,18 +12,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import threading
+import time
 from unittest import mock
 
 import pytest
 
 import rucio.db.sqla.util
 from rucio.common import exception
+from rucio.core import heartbeat as heartbeat_core
 from rucio.daemons.abacus import account, collection_replica, rse
 from rucio.daemons.atropos import atropos
 from rucio.daemons.automatix import automatix
 from rucio.daemons.badreplicas import minos, minos_temporary_expiration, necromancer
 from rucio.daemons.c3po import c3po
 from rucio.daemons.cache import consumer
+from rucio.daemons.common import AdaptiveBatchSize, HeartbeatHandler, ProducerConsumerDaemon, run_daemon
 from rucio.daemons.conveyor import finisher, poller, preparer, receiver, stager, submitter, throttler
 from rucio.daemons.follower import follower
 from rucio.daemons.hermes import hermes
@@ -82,3 +86,106 @@ def test_fail_on_old_database(mock_is_old_db, daemon):
         daemon.run()
 
     assert mock_is_old_db.call_count > 1
+
+
+def test_producer_consumer_backpressure():
+    """ DAEMON: Test that the producer-consumer queue is bounded and fully drained on exit """
+    nb_products = 20
+    max_queue_depth = 0
+    consumed = []
+    consumed_lock = threading.Lock()
+    batch_size = AdaptiveBatchSize(initial=10, minimum=1, maximum=100, target_duration=1)
+
+    daemon = None
+
+    def _producer():
+        nonlocal max_queue_depth
+        for i in range(nb_products):
+            max_queue_depth = max(max_queue_depth, daemon.queue.qsize())
+            yield [i] * 10
+
+    def _consumer(product):
+        time.sleep(0.01)
+        with consumed_lock:
+            consumed.append(product[0])
+
+    daemon = ProducerConsumerDaemon(
+        producers=[_producer],
+        consumers=[_consumer, _consumer],
+        graceful_stop=threading.Event(),
+        batch_size=batch_size,
+    )
+    daemon.run()
+
+    assert sorted(consumed) == list(range(nb_products))
+    assert max_queue_depth <= 2
+    assert daemon.queue.unfinished_tasks == 0
+    # Batches of 10 items consumed in ~10ms: the batch size grows towards the maximum
+    assert batch_size.value > 10
+
+
+def test_adaptive_batch_size():
+    """ DAEMON: Test that the batch size follows the slowest of fetching and consuming """
+    batch_size = AdaptiveBatchSize(initial=100, target_duration=10, size_fnc=lambda n: n)
+    assert (batch_size.minimum, batch_size.maximum) == (10, 400)
+
+    # Consuming takes 1s per item: converges to 10 items per batch, at most halving per step
+    batch_size.record_consume(100, duration=100)
+    assert batch_size.value == 50
+    for _ in range(5):
+        batch_size.record_consume(batch_size.value, duration=batch_size.value)
+    assert batch_size.value == 10
+
+    # Partial batches don't influence the fetch time estimation
+    batch_size.record_fetch(1, duration=100)
+    assert batch_size.value == 10
+
+    fixed = AdaptiveBatchSize(initial=100, adaptive=False, size_fnc=lambda n: n)
+    fixed.record_consume(100, duration=1000)
+    assert fixed.value == 100
+
+
+@pytest.mark.noparallel(reason='uses a fixed executable name')
+@pytest.mark.parametrize("core_config_mock", [{"table_content": [
+    ('heartbeat', 'partition_buckets', 4),
+]}], indirect=True)
+@pytest.mark.parametrize("caches_mock", [{"caches_to_mock": [
+    'rucio.core.config.REGION',
+]}], indirect=True)
+def test_run_daemon_partition_buckets(core_config_mock, caches_mock):
+    """ DAEMON: Test that work stealing daemons run once per leased bucket """
+    calls = []
+
+    def _run_once(heartbeat_handler, **_kwargs):
+        worker_number, total_workers, _ = heartbeat_handler.live()
+        calls.append((worker_number, total_workers))
+        return True
+
+    run_daemon(once=True, graceful_stop=threading.Event(), executable='test_run_daemon_partition_buckets',
+               partition_wait_time=0, sleep_time=60, run_once_fnc=_run_once, work_stealing=True)
+    assert sorted(calls) == [(0, 4), (1, 4), (2, 4), (3, 4)]
+
+    calls.clear()
+    run_daemon(once=True, graceful_stop=threading.Event(), executable='test_run_daemon_partition_buckets',
+               partition_wait_time=0, sleep_time=60, run_once_fnc=_run_once)
+    assert calls == [(0, 1)]
+
+
+@pytest.mark.noparallel(reason='uses a fixed executable name')
+def test_partition_buckets_released_between_cycles():
+    """ DAEMON: Test that the partition buckets are not released while they are worked on """
+    executable = 'test_partition_buckets_released_between_cycles'
+    with HeartbeatHandler(executable=executable, renewal_interval=60, partition_buckets=4) as heartbeat_handler:
+        buckets = heartbeat_handler.cycle_buckets()
+        assert buckets == [0, 1, 2, 3]
+        try:
+            # Another worker joins while the first bucket is worked on
+            heartbeat_core.live(executable, 'other-host', 1, threading.current_thread())
+            heartbeat_handler.current_bucket = buckets[0]
+            heartbeat_handler.live(force_renew=True)
+            assert heartbeat_handler.buckets == [0, 1, 2, 3]
+            heartbeat_handler.current_bucket = None
+
+            assert heartbeat_handler.cycle_buckets() == [0, 1]
+        finally:
+            heartbeat_core.die(executable, 'other-host', 1, threading.current_thread())
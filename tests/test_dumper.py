@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import bz2
+import gzip
 import json
 import os
 import tempfile
@@ -90,6 +91,15 @@ def test_smart_open_for_bz2_file():
     os.unlink(path)
 
 
+def test_smart_open_for_gzip_file():
+    fd, path = tempfile.mkstemp()
+    with os.fdopen(fd, 'wb') as f:
+        f.write(gzip.compress(b'abc\ndef\n'))
+    with dumper.smart_open(path) as f:
+        assert f.readlines() == ['abc\n', 'def\n']
+    os.unlink(path)
+
+
 def test_temp_file_with_final_name_creates_a_tmp_file_and_then_removes_it():
     final_name = tempfile.mktemp()
     with dumper.temp_file('/tmp', final_name) as (_, tmp_path):
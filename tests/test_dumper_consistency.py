@@ -12,12 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import gzip
 import json
 import os
 from datetime import datetime
 from unittest import mock
 
-from rucio.common.dumper.consistency import Consistency, _try_to_advance, compare3, gnu_sort, min_value, parse_and_filter_file
+from rucio.common.dumper.consistency import Consistency, _try_to_advance, compare3, external_sort, gnu_sort, min_value, parse_and_filter_file
 from rucio.tests.common import make_temp_file
 
 RSEPROTOCOL = {
@@ -405,3 +406,42 @@ class TestConsistency:
 
         os.unlink(path)
         os.unlink(sorted_file)
+
+    def test_external_sort_sorts_using_byte_value_across_runs(self, tmp_path):
+        ''' DUMPER '''
+        unsorted_data_list = ['z', 'a', '\xc3\xb1', 'b,a', 'b', 'a\tz', 'y', 'a']
+        path = os.path.join(tmp_path, 'dump.gz')
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            f.write(''.join(line + '\n' for line in unsorted_data_list))
+
+        for chunk_size in (3, 100):
+            for max_workers in (1, 2):
+                sorted_lines = external_sort(path, chunk_size=chunk_size, max_workers=max_workers, cache_dir=tmp_path)
+                assert list(sorted_lines) == sorted(unsorted_data_list)
+        assert os.listdir(tmp_path) == ['dump.gz']
+
+    def test_external_sort_parser_and_filter_functions(self, tmp_path):
+        ''' DUMPER '''
+        path = make_temp_file(tmp_path, '3/c\n1/a\n2/b\n4/d\n')
+
+        sorted_lines = external_sort(path, parser=lambda s: s.strip().split('/')[1], filter_=lambda s: not s.startswith('4'),
+                                     chunk_size=1, cache_dir=tmp_path)
+        assert list(sorted_lines) == ['a', 'b', 'c']
+
+    def test_external_sort_merges_runs_by_groups(self, tmp_path):
+        ''' DUMPER '''
+        unsorted_data_list = [str(i) for i in range(100, 0, -1)]
+        path = make_temp_file(tmp_path, '\n'.join(unsorted_data_list) + '\n')
+
+        sorted_lines = external_sort(path, chunk_size=3, max_open_runs=4, cache_dir=tmp_path)
+        assert list(sorted_lines) == sorted(unsorted_data_list)
+
+    def test_external_sort_removes_the_runs_when_closed(self, tmp_path):
+        ''' DUMPER '''
+        path = make_temp_file(tmp_path, 'c\nb\na\n')
+
+        sorted_lines = external_sort(path, chunk_size=1, cache_dir=tmp_path)
+        assert next(sorted_lines) == 'a'
+        assert len(os.listdir(tmp_path)) == 2
+        sorted_lines.close()
+        assert os.listdir(tmp_path) == [os.path.basename(path)]
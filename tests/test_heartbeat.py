@@ -19,7 +19,7 @@ from datetime import datetime, timedelta
 import pytest
 from sqlalchemy import delete, update
 
-from rucio.core.heartbeat import cardiac_arrest, die, list_heartbeats, list_payload_counts, live, sanity_check
+from rucio.core.heartbeat import PARTITION_LEASE_HOSTNAME, calc_hash, cardiac_arrest, die, list_heartbeats, list_payload_counts, live, release_partition_leases, renew_partition_leases, sanity_check
 from rucio.db.sqla.models import Heartbeat
 from rucio.db.sqla.session import transactional_session
 
@@ -117,6 +117,57 @@ class TestHeartbeat:
         assert live(executable, 'host1', pids[1]) == {'assign_thread': 1, 'nr_threads': 2}
         assert live(executable, 'host0', pids[0]) == {'assign_thread': 0, 'nr_threads': 2}
 
+    def test_partition_leases(self, thread_factory, executable_factory, db_session):
+        """ HEARTBEAT (CORE): Virtual partition buckets are balanced between workers """
+
+        pids = [self._pid() for _ in range(3)]
+        threads = [thread_factory() for _ in range(3)]
+        executable = executable_factory()
+
+        def _renew(i, nr_workers, lease_duration=600):
+            return renew_partition_leases(executable, f'host{i}', pids[i], threads[i], nr_buckets=12, nr_workers=nr_workers, lease_duration=lease_duration)
+
+        try:
+            assert _renew(0, nr_workers=1) == list(range(12))
+
+            # A new worker joins: the buckets are re-balanced within one renewal of each worker
+            assert _renew(1, nr_workers=2) == []
+            # While a worker is working on its buckets, the surplus is renewed instead of released
+            assert renew_partition_leases(executable, 'host0', pids[0], threads[0], nr_buckets=12, nr_workers=2, lease_duration=600, release_surplus=False) == list(range(12))
+            assert _renew(1, nr_workers=2) == []
+            buckets0 = _renew(0, nr_workers=2)
+            assert len(buckets0) == 6
+            buckets1 = _renew(1, nr_workers=2)
+            assert sorted(buckets0 + buckets1) == list(range(12))
+
+            # A worker exits gracefully: its buckets are immediately taken over
+            release_partition_leases(executable, 'host0', pids[0], threads[0])
+            assert _renew(1, nr_workers=1) == list(range(12))
+
+            # A worker stops renewing its leases: they are stolen once expired
+            assert _renew(2, nr_workers=2, lease_duration=600) == []
+            db_session.execute(
+                update(
+                    Heartbeat
+                ).where(
+                    Heartbeat.executable == calc_hash(executable + '--partition-buckets')
+                ).values({
+                    Heartbeat.updated_at: datetime.utcnow() - timedelta(seconds=60)
+                })
+            )
+            db_session.commit()
+            assert len(_renew(2, nr_workers=2, lease_duration=30)) == 6
+        finally:
+            db_session.execute(
+                delete(
+                    Heartbeat
+                ).where(
+                    Heartbeat.executable == calc_hash(executable + '--partition-buckets'),
+                    Heartbeat.hostname == PARTITION_LEASE_HOSTNAME
+                )
+            )
+            db_session.commit()
+
     def test_heartbeat_payload(self, thread_factory, executable_factory):
         """ HEARTBEAT (CORE): Test heartbeat with payload"""
 
@@ -16,13 +16,17 @@
 Hermes Test
 """
 
+import gzip
+import logging
 import time
 from datetime import datetime
 from json import loads
+from unittest import mock
 
 import pytest
 import requests
 import stomp
+from stomp.utils import Frame
 
 from rucio.common.config import config_get, config_get_int
 from rucio.core.message import add_message, retrieve_messages, truncate_messages
@@ -276,3 +280,85 @@ def test_hermes(core_config_mock, caches_mock):
 
     # Checking email
     assert service_dict["email"] == 0
+
+
+def test_deliver_to_activemq_batches():
+    """HERMES (DAEMON): Messages are sent to ActiveMQ in transactions, and only acknowledged batches are deleted."""
+    listener = hermes.HermesListener(("localhost", 61613))
+    conn = mock.MagicMock()
+    conn.is_connected.return_value = True
+    conn.get_listener.return_value = listener
+    conn.begin.side_effect = ["tx1", "tx2", "tx3"]
+
+    def commit(transaction, headers):
+        # The broker never acknowledges the second transaction
+        if transaction != "tx2":
+            listener.on_receipt(Frame(cmd="RECEIPT", headers={"receipt-id": headers["receipt"]}))
+    conn.commit.side_effect = commit
+
+    messages = [
+        {
+            "id": i,
+            "event_type": "deletion-done",
+            "payload": {"scope": "mock", "name": "file_%i" % i},
+            "created_at": datetime.utcnow(),
+        }
+        for i in range(5)
+    ]
+    delivered_batches = []
+    messages_sent = hermes.deliver_to_activemq(
+        messages=messages,
+        conns=[conn],
+        destination="/queue/events",
+        username=None,
+        password=None,
+        use_ssl=True,
+        logger=logging.log,
+        batch_size=2,
+        receipt_timeout=0.1,
+        on_batch_delivered=lambda batch: delivered_batches.append([message["id"] for message in batch]),
+    )
+    assert messages_sent == [0, 1, 4]
+    assert delivered_batches == [[0, 1], [4]]
+    assert conn.connect.call_count == 0
+    assert conn.send.call_count == 5
+    assert [call.kwargs["transaction"] for call in conn.send.call_args_list] == ["tx1", "tx1", "tx2", "tx2", "tx3"]
+
+
+def test_aggregate_to_influx():
+    """HERMES (DAEMON): Transfer and deletion messages are aggregated per series and sent gzipped to InfluxDB."""
+    created_at = datetime(2024, 5, 1, 12, 0, 30)
+    messages = [
+        {"event_type": "transfer-done", "created_at": created_at, "payload": {"transferred_at": "2024-05-01 12:00:30", "activity": "User Subscriptions", "src-rse": "SRC", "dst-rse": "DST", "bytes": 10}},
+        {"event_type": "transfer-done", "created_at": created_at, "payload": {"transferred_at": "2024-05-01 12:00:30", "activity": "User Subscriptions", "src-rse": "SRC", "dst-rse": "DST", "bytes": 20}},
+        {"event_type": "transfer-failed", "created_at": created_at, "payload": {"transferred_at": "2024-05-01 12:00:30", "activity": "User Subscriptions", "src-rse": "SRC", "dst-rse": "DST", "bytes": 5}},
+        {"event_type": "transfer-failed", "created_at": created_at, "payload": {"transferred_at": None, "reason": "no transfer", "activity": "T0", "src-rse": "SRC", "dst-rse": "DST", "bytes": 5}},
+        {"event_type": "deletion-done", "created_at": created_at, "payload": {"rse": "DST", "bytes": 7}},
+        {"event_type": "deletion-done", "created_at": created_at.replace(second=50), "payload": {"rse": "DST", "bytes": 3}},
+        {"event_type": "deletion-failed", "created_at": created_at, "payload": {"rse": "SRC", "bytes": 1}},
+        {"event_type": "blahblah", "created_at": created_at, "payload": {}},
+    ]
+    series = hermes.aggregate_influx_series(messages, bin_size="1m", logger=logging.log, microsecond=0)
+    assert series == {
+        ("transfer", 1714564830000000000, "User Subscriptions", "SRC", "DST"): [2, 30, 1, 5],
+        ("deletion", 1714564800000000000, "DST"): [2, 10, 0, 0],
+        ("deletion", 1714564800000000000, "SRC"): [0, 0, 1, 1],
+    }
+
+    sent = []
+
+    def post(endpoint, headers, data):
+        sent.append((headers, b"".join(data)))
+        return mock.Mock(status_code=204, text="")
+
+    http_session = mock.MagicMock()
+    http_session.post.side_effect = post
+    assert hermes.aggregate_to_influx(messages, bin_size="1m", endpoint="http://influx", logger=logging.log, http_session=http_session) == 204
+    headers, body = sent[0]
+    assert headers["Content-Encoding"] == "gzip"
+    lines = sorted(line.rsplit(" ", 1)[0] for line in gzip.decompress(body).decode().splitlines())
+    assert lines == [
+        "deletion,rse=DST nb_deletion_done=2,bytes_deletion_done=10,nb_deletion_failed=0,bytes_deletion_failed=0",
+        "deletion,rse=SRC nb_deletion_done=0,bytes_deletion_done=0,nb_deletion_failed=1,bytes_deletion_failed=1",
+        "transfer,activity=User\\ Subscriptions,src_rse=SRC,dst_rse=DST nb_transfer_done=2,bytes_transfer_done=30,nb_transfer_failed=1,bytes_transfer_failed=5",
+    ]
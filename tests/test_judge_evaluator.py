@@ -13,9 +13,10 @@
 # limitations under the License.
 
 from typing import TYPE_CHECKING
+from unittest import mock
 
 import pytest
-from sqlalchemy import delete
+from sqlalchemy import delete, select
 
 from rucio.common.config import config_get_bool
 from rucio.common.types import InternalAccount, InternalScope
@@ -26,12 +27,12 @@ from rucio.core.did import add_did, attach_dids, detach_dids
 from rucio.core.lock import get_dataset_locks, get_replica_locks, get_replica_locks_for_rule_id
 from rucio.core.replica import add_replica
 from rucio.core.rse import add_rse_attribute
-from rucio.core.rule import add_rule, get_rule
+from rucio.core.rule import add_rule, get_rule, re_evaluate_did
 from rucio.daemons.abacus.account import account_update
 from rucio.daemons.judge.evaluator import re_evaluator
 from rucio.db.sqla.constants import DIDType, LockState
 from rucio.db.sqla.models import UpdatedDID
-from rucio.db.sqla.session import transactional_session
+from rucio.db.sqla.session import read_session, transactional_session
 from rucio.tests.common import RSE_namedtuple
 from rucio.tests.common_server import get_vo
 
@@ -121,6 +122,34 @@ class TestJudgeEvaluator:
         for file in files:
             assert len(get_replica_locks(scope=file['scope'], name=file['name'])) == 2
 
+    @pytest.mark.noparallel(reason="uses mock scope and predefined RSEs; runs judge evaluator")
+    def test_judge_batch_updated_dids(self):
+        """ JUDGE EVALUATOR: Test that the updates of a did are evaluated once and deleted together"""
+        scope = InternalScope('mock', **self.vo)
+        dataset = 'dataset_' + str(uuid())
+        add_did(scope, dataset, DIDType.DATASET, self.jdoe)
+        add_rule(dids=[{'scope': scope, 'name': dataset}], account=self.jdoe, copies=2, rse_expression=self.T1, grouping='DATASET', weight=None, lifetime=None, locked=False, subscription_id=None)
+
+        files = []
+        for _ in range(3):
+            new_files = create_files(2, scope, self.rse1_id)
+            attach_dids(scope, dataset, new_files, self.jdoe)
+            files.extend(new_files)
+
+        @read_session
+        def __count_updated_dids(*, session=None):
+            stmt = select(UpdatedDID.id).where(UpdatedDID.scope == scope, UpdatedDID.name == dataset)
+            return len(session.execute(stmt).all())
+
+        assert __count_updated_dids() == 3
+        with mock.patch('rucio.daemons.judge.evaluator.re_evaluate_did', side_effect=re_evaluate_did) as mock_re_evaluate:
+            re_evaluator(once=True, did_limit=None)
+        assert [call.kwargs['name'] for call in mock_re_evaluate.call_args_list].count(dataset) == 1
+        assert __count_updated_dids() == 0
+
+        for file in files:
+            assert len(get_replica_locks(scope=file['scope'], name=file['name'])) == 2
+
     @pytest.mark.noparallel(reason="uses mock scope and predefined RSEs; runs judge evaluator")
     def test_judge_add_dataset_to_container(self):
         """ JUDGE EVALUATOR: Test the judge when adding dataset to container"""
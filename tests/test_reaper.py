@@ -12,21 +12,26 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import itertools
+import threading
 from datetime import datetime, timedelta
+from unittest import mock
 
 import pytest
 from sqlalchemy import and_, func, or_, select
 
-from rucio.common.exception import DataIdentifierNotFound, ReplicaNotFound
+from rucio.common.exception import DataIdentifierNotFound, ReplicaNotFound, ServiceUnavailable
 from rucio.common.types import InternalAccount, InternalScope
 from rucio.common.utils import generate_uuid
 from rucio.core import did as did_core
+from rucio.core import heartbeat as heartbeat_core
 from rucio.core import message as message_core
 from rucio.core import replica as replica_core
 from rucio.core import rse as rse_core
 from rucio.core import rule as rule_core
+from rucio.core.rse_usage_projection import get_rse_usage_projection
 from rucio.daemons.reaper.dark_reaper import reaper as dark_reaper
-from rucio.daemons.reaper.reaper import reaper
+from rucio.daemons.reaper.reaper import DeletionRateLimiter, _PrefetchingIterator, delete_from_storage, get_deletion_rate_limiter, reaper
 from rucio.daemons.reaper.reaper import run as run_reaper
 from rucio.db.sqla import models
 from rucio.db.sqla.constants import OBSOLETE
@@ -137,6 +142,247 @@ def test_reaper_bulk_delete(vo, caches_mock):
     assert len(list(replica_core.list_replicas(dids, rse_expression=rse_name))) == 200
 
 
+@pytest.mark.parametrize("core_config_mock", [{"table_content": [
+    ('reaper', 'max_deletion_threads_per_worker', 3), ('reaper', 'bulk_delete_size', 7)
+]}], indirect=True)
+@pytest.mark.parametrize("caches_mock", [{"caches_to_mock": [
+    'rucio.daemons.reaper.reaper.REGION',
+    'rucio.core.config.REGION',
+]}], indirect=True)
+def test_reaper_concurrent_bulk_delete(vo, core_config_mock, caches_mock, message_mock):
+    """ REAPER (DAEMON): Delete replicas in bulk from several threads."""
+    scope = InternalScope('data13_hip', vo=vo)
+
+    nb_files = 60
+    file_size = 200
+    rse_name, rse_id, dids = __add_test_rse_and_replicas(vo=vo, scope=scope, rse_name=rse_name_generator(),
+                                                         names=['lfn' + generate_uuid() for _ in range(nb_files)], file_size=file_size)
+    rse_core.set_rse_limits(rse_id=rse_id, name='MinFreeSpace', value=50 * file_size)
+    rse_core.set_rse_usage(rse_id=rse_id, source='storage', used=nb_files * file_size, free=1)
+
+    reaper(once=True, rses=[], include_rses=rse_name, exclude_rses=None, chunk_size=1000, scheme='MOCK')
+    assert len(list(replica_core.list_replicas(dids, rse_expression=rse_name))) == 10
+
+    msgs = message_core.retrieve_messages()
+    assert len(msgs) == 50
+    assert all(msg['event_type'] == 'deletion-done' for msg in msgs)
+    assert len({msg['payload']['url'] for msg in msgs}) == 50
+
+
+@pytest.mark.parametrize("core_config_mock", [{"table_content": [
+    ('reaper', 'use_rse_snapshot', True)
+]}], indirect=True)
+@pytest.mark.parametrize("caches_mock", [{"caches_to_mock": [
+    'rucio.daemons.reaper.reaper.REGION',
+    'rucio.core.config.REGION',
+]}], indirect=True)
+def test_reaper_with_rse_snapshot(vo, core_config_mock, caches_mock):
+    """ REAPER (DAEMON): Use the RSEs of the process-wide snapshot without modifying them."""
+    scope = InternalScope('data13_hip', vo=vo)
+
+    nb_files = 20
+    file_size = 200
+    rse_name, rse_id, dids = __add_test_rse_and_replicas(vo=vo, scope=scope, rse_name=rse_name_generator(),
+                                                         names=['lfn' + generate_uuid() for _ in range(nb_files)], file_size=file_size)
+    rse_core.set_rse_limits(rse_id=rse_id, name='MinFreeSpace', value=5 * file_size)
+    rse_core.set_rse_usage(rse_id=rse_id, source='storage', used=nb_files * file_size, free=1)
+
+    rse_core.subscribe_rse_snapshot()
+    try:
+        snapshot_rse_data = rse_core.get_rse_snapshot().get(rse_id)
+        snapshot_attributes = snapshot_rse_data.attributes
+        reaper(once=True, rses=[], include_rses=rse_name, exclude_rses=None, chunk_size=1000, scheme='MOCK')
+        assert len(list(replica_core.list_replicas(dids, rse_expression=rse_name))) == 15
+        assert snapshot_rse_data.attributes is snapshot_attributes
+    finally:
+        rse_core.unsubscribe_rse_snapshot()
+
+
+@pytest.mark.parametrize("core_config_mock", [{"table_content": [
+    ('reaper', 'adaptive_rate_control', True), ('reaper', 'bulk_delete_size', 7)
+]}], indirect=True)
+@pytest.mark.parametrize("caches_mock", [{"caches_to_mock": [
+    'rucio.daemons.reaper.reaper.REGION',
+    'rucio.core.config.REGION',
+]}], indirect=True)
+def test_reaper_adaptive_rate_control(vo, core_config_mock, caches_mock, message_mock):
+    """ REAPER (DAEMON): Delete replicas through the per-host deletion rate limiter."""
+    scope = InternalScope('data13_hip', vo=vo)
+
+    nb_files = 60
+    file_size = 200
+    rse_name, rse_id, dids = __add_test_rse_and_replicas(vo=vo, scope=scope, rse_name=rse_name_generator(),
+                                                         names=['lfn' + generate_uuid() for _ in range(nb_files)], file_size=file_size)
+    rse_core.set_rse_limits(rse_id=rse_id, name='MinFreeSpace', value=50 * file_size)
+    rse_core.set_rse_usage(rse_id=rse_id, source='storage', used=nb_files * file_size, free=1)
+
+    reaper(once=True, rses=[], include_rses=rse_name, exclude_rses=None, chunk_size=1000, scheme='MOCK')
+    assert len(list(replica_core.list_replicas(dids, rse_expression=rse_name))) == 10
+    assert get_deletion_rate_limiter('localhost').rate > 10
+
+
+@pytest.mark.parametrize("core_config_mock", [{"table_content": [
+    ('reaper', 'max_concurrent_rses', 2), ('reaper', 'nb_workers_by_hostname', 1)
+]}], indirect=True)
+@pytest.mark.parametrize("caches_mock", [{"caches_to_mock": [
+    'rucio.daemons.reaper.reaper.REGION',
+    'rucio.core.config.REGION',
+]}], indirect=True)
+def test_reaper_concurrent_rses_reserve_worker_slots(vo, core_config_mock, caches_mock):
+    """ REAPER (DAEMON): Reserve the per-hostname worker slots when processing RSEs in parallel."""
+    scope = InternalScope('data13_hip', vo=vo)
+
+    nb_files = 20
+    file_size = 200
+    rse_name, rse_id, dids = __add_test_rse_and_replicas(vo=vo, scope=scope, rse_name=rse_name_generator(),
+                                                         names=['lfn' + generate_uuid() for _ in range(nb_files)], file_size=file_size)
+    rse_core.set_rse_limits(rse_id=rse_id, name='MinFreeSpace', value=5 * file_size)
+    rse_core.set_rse_usage(rse_id=rse_id, source='storage', used=nb_files * file_size, free=1)
+
+    # Another reaper worker already uses all the slots of the host for this RSE
+    thread = threading.current_thread()
+    heartbeat_core.live('reaper', 'other-host', 1, thread, payload='%s,localhost' % rse_id)
+    try:
+        reaper(once=True, rses=[], include_rses=rse_name, exclude_rses=None, chunk_size=1000, scheme='MOCK')
+    finally:
+        heartbeat_core.die('reaper', 'other-host', 1, thread)
+    assert len(list(replica_core.list_replicas(dids, rse_expression=rse_name))) == nb_files
+
+    reaper(once=True, rses=[], include_rses=rse_name, exclude_rses=None, chunk_size=1000, scheme='MOCK')
+    assert len(list(replica_core.list_replicas(dids, rse_expression=rse_name))) == 15
+
+
+@pytest.mark.parametrize("core_config_mock", [{"table_content": [
+    ('reaper', 'max_concurrent_rses', 2)
+]}], indirect=True)
+@pytest.mark.parametrize("caches_mock", [{"caches_to_mock": [
+    'rucio.daemons.reaper.reaper.REGION',
+    'rucio.core.config.REGION',
+]}], indirect=True)
+def test_reaper_concurrent_rses_hold_slots_while_deleting(vo, core_config_mock, caches_mock):
+    """ REAPER (DAEMON): Only hold the worker slots of the RSEs being processed in parallel."""
+    scope = InternalScope('data13_hip', vo=vo)
+
+    nb_files = 5
+    file_size = 200
+    rse_names = []
+    for _ in range(4):
+        rse_name, rse_id, _ = __add_test_rse_and_replicas(vo=vo, scope=scope, rse_name=rse_name_generator(),
+                                                          names=['lfn' + generate_uuid() for _ in range(nb_files)], file_size=file_size)
+        rse_core.set_rse_limits(rse_id=rse_id, name='MinFreeSpace', value=5 * file_size)
+        rse_core.set_rse_usage(rse_id=rse_id, source='storage', used=nb_files * file_size, free=1)
+        rse_names.append(rse_name)
+
+    with mock.patch('rucio.daemons.common.heartbeat_core.live', wraps=heartbeat_core.live) as live:
+        reaper(once=True, rses=[], include_rses='|'.join(rse_names), exclude_rses=None, chunk_size=1000, scheme='MOCK')
+    payloads = [call.kwargs.get('payload') for call in live.call_args_list]
+    assert any(payloads)
+    assert max(len(payload.split(';')) for payload in payloads if payload) <= 2
+    assert payloads[-1] is None
+
+
+@pytest.mark.parametrize("core_config_mock", [{"table_content": [
+    ('reaper', 'use_usage_projection', True)
+]}], indirect=True)
+@pytest.mark.parametrize("caches_mock", [{"caches_to_mock": [
+    'rucio.daemons.reaper.reaper.REGION',
+    'rucio.core.config.REGION',
+]}], indirect=True)
+def test_reaper_usage_projection(vo, core_config_mock, caches_mock):
+    """ REAPER (DAEMON): Take the needed free space from the RSE usage projection."""
+    scope = InternalScope('data13_hip', vo=vo)
+
+    nb_files = 250
+    file_size = 200
+    rse_name, rse_id, dids = __add_test_rse_and_replicas(vo=vo, scope=scope, rse_name=rse_name_generator(),
+                                                         names=['lfn' + generate_uuid() for _ in range(nb_files)], file_size=file_size)
+    rse_core.set_rse_limits(rse_id=rse_id, name='MinFreeSpace', value=50 * file_size)
+    rse_core.set_rse_usage(rse_id=rse_id, source='storage', used=nb_files * file_size, free=1)
+
+    projection = get_rse_usage_projection()
+    projection.refresh(force=True)
+    reaper(once=True, rses=[], include_rses=rse_name, exclude_rses=None)
+    assert len(list(replica_core.list_replicas(dids, rse_expression=rse_name))) == 200
+    assert projection.needed_free_space(rse_id) == (0, True)
+
+
+def test_prefetching_iterator():
+    """ REAPER (DAEMON): Produce the next batch of replicas in a helper thread."""
+    assert list(_PrefetchingIterator(iter(range(5)))) == [0, 1, 2, 3, 4]
+
+    def _failing():
+        yield 1
+        raise DataIdentifierNotFound()
+
+    batches = _PrefetchingIterator(_failing())
+    assert next(batches) == 1
+    with pytest.raises(DataIdentifierNotFound):
+        next(batches)
+    assert next(batches, None) is None
+
+    batches = _PrefetchingIterator(itertools.count())
+    assert next(batches) == 0
+    batches.close()
+    assert next(batches, None) is None
+
+
+@pytest.mark.parametrize("caches_mock", [{"caches_to_mock": [
+    'rucio.daemons.reaper.reaper.REGION'
+]}], indirect=True)
+def test_delete_from_storage_stops_when_excluded(vo, caches_mock):
+    """ REAPER (DAEMON): Stop deleting on an RSE as soon as it is temporarily excluded."""
+    [cache_region] = caches_mock
+    scope = InternalScope('data13_hip', vo=vo)
+    rse_info = {'rse': rse_name_generator(), 'id': generate_uuid(), 'sign_url': None}
+    replicas = [{'scope': scope, 'name': 'lfn' + generate_uuid(), 'bytes': 1, 'datatype': None, 'pfn': 'mock://localhost/%d' % i} for i in range(6)]
+    heartbeat_handler = mock.MagicMock()
+    heartbeat_handler.live.return_value = (0, 1, lambda *args, **kwargs: None)
+    prot = mock.MagicMock()
+    prot.attributes = {'scheme': 'MOCK'}
+    prot.bulk_delete.side_effect = lambda pfns: {pfn: ServiceUnavailable() for pfn in pfns}
+
+    # The threshold is reached during the first batch
+    deleted = delete_from_storage(heartbeat_handler, None, replicas, prot, rse_info, is_staging=False, auto_exclude_threshold=2, bulk_size=3)
+    assert deleted == []
+    assert prot.bulk_delete.call_count == 1
+    assert cache_region.get('temporary_exclude_%s' % rse_info['id']) is True
+
+    # The RSE was excluded by another worker
+    prot.bulk_delete.reset_mock()
+    delete_from_storage(heartbeat_handler, None, replicas, prot, rse_info, is_staging=False, auto_exclude_threshold=100, bulk_size=3)
+    assert prot.bulk_delete.call_count == 1
+
+
+def test_deletion_rate_limiter():
+    """ REAPER (DAEMON): Adapt the deletion rate to the latency and the errors of the storage."""
+    limiter = DeletionRateLimiter('localhost', initial_rate=10, min_rate=1, max_rate=20, increase=5, decrease_factor=0.5, target_latency=2, max_in_flight=5)
+
+    # Additive increase, up to the maximal rate
+    for _ in range(3):
+        started_at = limiter.acquire(1)
+        limiter.release(started_at, nb_files=1, duration=0.1, nb_unavailable=0)
+    assert limiter.rate == 20
+
+    # Concurrent batches hitting the same congestion only cut the rate once
+    started = [limiter.acquire(1) for _ in range(3)]
+    for started_at in started:
+        limiter.release(started_at, nb_files=1, duration=0.1, nb_unavailable=1)
+    assert limiter.rate == 10
+    started_at = limiter.acquire(1)
+    limiter.release(started_at, nb_files=1, duration=5, nb_unavailable=0)
+    assert limiter.rate == 5
+
+    # The concurrency can be changed while the limiter is in use
+    limiter.set_max_in_flight(1)
+    assert limiter.max_in_flight == 1
+
+    # An unreachable host is backed off
+    assert not limiter.is_blocked()
+    limiter.mark_unreachable(max_backoff=600)
+    assert limiter.is_blocked()
+    assert limiter.rate == 1
+
+
 @pytest.mark.parametrize("caches_mock", [{"caches_to_mock": [
     'rucio.daemons.reaper.reaper.REGION'
 ]}], indirect=True)
@@ -25,6 +25,7 @@ import pytest
 import xmltodict
 from werkzeug.datastructures import Headers, MultiDict
 
+import rucio.core.replica as replica_core
 from rucio.client.ruleclient import RuleClient
 from rucio.common.constants import RseAttr
 from rucio.common.exception import AccessDenied, DatabaseException, DataIdentifierNotFound, InputValidationError, ReplicaIsLocked, ReplicaNotFound, RucioException, ScopeNotFound
@@ -235,6 +236,26 @@ class TestReplicaCore:
         else:
             assert '&#multirange=false&nconnections' not in pfn
 
+    def test_list_replicas_yield_per(self, rse_factory, mock_scope, root_account):
+        """ REPLICA (CORE): Fetch replicas in batches and compute the pfn settings once per rse """
+        _, rse1_id = rse_factory.make_mock_rse()
+        _, rse2_id = rse_factory.make_mock_rse()
+        dsn = did_name_generator('dataset')
+        add_did(scope=mock_scope, name=dsn, did_type='DATASET', account=root_account)
+        files = [{'scope': mock_scope, 'name': did_name_generator('file'), 'bytes': 1, 'adler32': '0cc737eb'} for _ in range(7)]
+        add_replicas(rse_id=rse1_id, files=files, account=root_account)
+        add_replicas(rse_id=rse2_id, files=files[:3], account=root_account)
+        attach_dids(scope=mock_scope, name=dsn, dids=files, account=root_account)
+
+        dids = [{'scope': mock_scope, 'name': dsn}]
+        buffered = list(list_replicas(dids=dids, yield_per=0))
+        with mock.patch('rucio.core.replica._get_list_replicas_pfn_settings', wraps=replica_core._get_list_replicas_pfn_settings) as get_settings:
+            streamed = list(list_replicas(dids=dids, yield_per=2))
+        assert streamed == buffered
+        assert len(streamed) == 7
+        assert sorted(len(file['rses']) for file in streamed) == [1, 1, 1, 1, 2, 2, 2]
+        assert get_settings.call_count == 2
+
     def test_delete_replicas(self, rse_factory, mock_scope, root_account):
         """ REPLICA (CORE): Delete replicas """
         _, rse1_id = rse_factory.make_mock_rse()
@@ -513,6 +534,25 @@ class TestReplicaCore:
 
         add_replicas(rse_id=rse_id, files=files, account=root_account)
 
+    def test_iter_and_mark_unlocked_replicas(self, rse_factory, mock_scope, root_account):
+        """ REPLICA (CORE): List and mark unlocked replicas by batches """
+        _, rse_id = rse_factory.make_mock_rse()
+        names = [did_name_generator('file') for _ in range(10)]
+        for name in names:
+            add_replica(rse_id, mock_scope, name, 10, root_account, tombstone=datetime.utcnow() - timedelta(days=1))
+
+        # The replicas marked by a batch are not selected again, even without delay
+        batches = list(replica_core.iter_and_mark_unlocked_replicas(limit=7, batch_size=3, rse_id=rse_id, delay_seconds=0))
+        assert [len(batch) for batch in batches] == [3, 3, 1]
+        marked = [replica['name'] for batch in batches for replica in batch]
+        assert len(set(marked)) == 7
+        assert all(get_replica(rse_id, mock_scope, name)['state'] == ReplicaState.BEING_DELETED for name in marked)
+
+        # Stop once enough bytes are selected
+        batches = list(replica_core.iter_and_mark_unlocked_replicas(limit=10, batch_size=1, bytes_=15, rse_id=rse_id, delay_seconds=3600))
+        assert [len(batch) for batch in batches] == [1, 1]
+        assert not {replica['name'] for batch in batches for replica in batch}.intersection(marked)
+
     def test_set_tombstone(self, rse_factory, mock_scope, root_account):
         """ REPLICA (CORE): set tombstone on replica """
         # Set tombstone on one replica
@@ -13,7 +13,8 @@
 # limitations under the License.
 
 import json
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
 from typing import Union
 
 import pytest
@@ -290,6 +291,46 @@ def test_api_list(
     check_error_api(params, 'NotFound', 'Could not resolve site name unknown to RSE', 404)
 
 
+def test_transfer_stats_sharded_observations(rse_factory):
+    """ REQUEST (CORE): Merge the transfer statistics observed by multiple threads and aggregate them by interval """
+    _, src_rse_id = rse_factory.make_mock_rse()
+    _, dst_rse_id = rse_factory.make_mock_rse()
+
+    stats_manager = TransferStatsManager()
+
+    def _observe():
+        for _ in range(50):
+            stats_manager.observe(src_rse_id=src_rse_id, dst_rse_id=dst_rse_id, activity='test', state=RequestState.DONE, file_size=2)
+        for _ in range(10):
+            stats_manager.observe(src_rse_id=src_rse_id, dst_rse_id=dst_rse_id, activity='test', state=RequestState.FAILED, file_size=2)
+
+    threads = [threading.Thread(target=_observe) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats_manager.force_save()
+
+    totals = list(stats_manager.load_totals(older_t=datetime.utcnow() - timedelta(hours=1), dest_rse_id=dst_rse_id, src_rse_id=src_rse_id))
+    assert sum(total['files_done'] for total in totals) == 400
+    assert sum(total['bytes_done'] for total in totals) == 800
+    assert sum(total['files_failed'] for total in totals) == 80
+
+    # Raw samples of two hours are aggregated by hour with one query
+    intervals = list(TransferStatsManager.slice_time(timedelta(hours=1), start_time=datetime.utcnow() - timedelta(days=2), end_time=datetime.utcnow() - timedelta(days=2, hours=2)))
+    record = TransferStatsManager._StatsRecord(files_failed=1, files_done=2, bytes_done=3)
+    stats_manager._save_samples(samples_by_interval={
+        older_t + offset: {(dst_rse_id, src_rse_id, 'test'): record}
+        for _, older_t in intervals
+        for offset in (timedelta(), timedelta(minutes=5), timedelta(minutes=55))
+    })
+    totals = [total for total in stats_manager._load_totals_by_interval(resolution=stats_manager.raw_resolution, intervals=intervals)
+              if total['dest_rse_id'] == dst_rse_id]
+    assert sorted((total['timestamp'], total['files_failed'], total['files_done'], total['bytes_done']) for total in totals) == sorted(
+        (older_t, 3, 6, 9) for _, older_t in intervals
+    )
+
+
 @pytest.mark.parametrize("file_config_mock", [{"overrides": [
     ('transfers', 'stats_enabled', 'True'),
 ]}], indirect=True)
@@ -25,6 +25,7 @@ from rucio.core.account_limit import get_rse_account_usage, set_local_account_li
 from rucio.core.did import add_did, attach_dids
 from rucio.core.request import delete_transfer_limit, set_transfer_limit
 from rucio.core.rse import (
+    RseCollection,
     add_rse,
     add_rse_attribute,
     del_rse,
@@ -33,6 +34,7 @@ from rucio.core.rse import (
     get_rse_attribute,
     get_rse_id,
     get_rse_protocols,
+    get_rse_snapshot,
     get_rse_supported_checksums_from_attributes,
     get_rse_transfer_limits,
     list_rse_attributes,
@@ -41,6 +43,8 @@ from rucio.core.rse import (
     restore_rse,
     rse_exists,
     rse_is_empty,
+    subscribe_rse_snapshot,
+    unsubscribe_rse_snapshot,
     update_rse,
 )
 from rucio.core.rule import add_rule
@@ -1595,3 +1599,33 @@ def test_get_rse_attribute(use_cache, rse_factory):
 
     del_rse_attribute(rse_id, "test")
     assert get_rse_attribute(rse_id, "test", use_cache=use_cache) is None
+
+
+def test_rse_snapshot(rse_factory):
+    rse_name, rse_id = rse_factory.make_mock_rse()
+    add_rse_attribute(rse_id, "test", "test")
+
+    assert get_rse_snapshot() is None
+    subscribe_rse_snapshot()
+    subscribe_rse_snapshot()
+    try:
+        snapshot = get_rse_snapshot()
+        rse_data = snapshot.get(rse_id)
+        assert rse_data.name == rse_name
+        assert rse_data.attributes["test"] == "test"
+        assert rse_data.info["rse"] == rse_name
+        assert rse_data.columns["availability_delete"] is True
+        assert rse_data.usage is not None
+        assert rse_data.limits is not None
+
+        # Collections re-use the data from the snapshot instead of loading it again
+        rse_collection = RseCollection(use_rse_snapshot=True)
+        rse_collection.ensure_loaded([rse_id], load_attributes=True, load_info=True)
+        assert rse_collection[rse_id].attributes is rse_data.attributes
+        assert rse_collection[rse_id].info is rse_data.info
+
+        unsubscribe_rse_snapshot()
+        assert get_rse_snapshot() is snapshot
+    finally:
+        unsubscribe_rse_snapshot()
+    assert get_rse_snapshot() is None
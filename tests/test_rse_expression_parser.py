@@ -214,6 +214,53 @@ class TestRSEExpressionParserCore:
         expected = sorted([self.rse4_id, self.rse5_id])
         assert value == expected
 
+    def test_compiled_expression_invalidation(self, rse_factory):
+        """ RSE_EXPRESSION_PARSER (CORE) Test that attribute changes invalidate the compiled expressions """
+        _, rse_id = rse_factory.make_mock_rse()
+        attribute = attribute_name_generator()
+        rse.add_rse_attribute(rse_id, attribute, "de")
+
+        version = rse.get_rse_topology_version()
+        value = [t_rse['id'] for t_rse in rse_expression_parser.parse_expression("%s=de" % attribute, **self.filter)]
+        assert value == [rse_id]
+        # Served from the compiled expression cache
+        value = [t_rse['id'] for t_rse in rse_expression_parser.parse_expression("%s=de" % attribute, **self.filter)]
+        assert value == [rse_id]
+        stale = rse_expression_parser.COMPILED_CACHE.get("%s=de" % attribute)
+
+        rse.del_rse_attribute(rse_id, attribute)
+        assert rse.get_rse_topology_version() != version
+        pytest.raises(InvalidRSEExpression, rse_expression_parser.parse_expression, "%s=de" % attribute, **self.filter)
+        # The reload replaced the cached expression instead of modifying it under the threads still evaluating it
+        assert rse_expression_parser.COMPILED_CACHE.get("%s=de" % attribute) is not stale
+        assert [t_rse['id'] for t_rse in stale.evaluate(self.filter.get('filter_'))] == [rse_id]
+
+        rse.add_rse_attribute(rse_id, attribute, "de")
+        value = [t_rse['id'] for t_rse in rse_expression_parser.parse_expression("%s=de" % attribute, **self.filter)]
+        assert value == [rse_id]
+
+    def test_topology_version_bumped_after_commit(self, rse_factory, db_session):
+        """ RSE_EXPRESSION_PARSER (CORE) Test that the RSE topology version changes once the attribute change is committed """
+        _, rse_id = rse_factory.make_mock_rse()
+        version = rse.get_rse_topology_version()
+        rse.add_rse_attribute(rse_id, attribute_name_generator(), "de", session=db_session)
+        assert rse.get_rse_topology_version() == version
+        db_session.commit()
+        assert rse.get_rse_topology_version() != version
+
+    def test_compiled_expression_expiration(self, rse_factory):
+        """ RSE_EXPRESSION_PARSER (CORE) Test that the compiled expressions expire like the cached ones """
+        _, rse_id = rse_factory.make_mock_rse()
+        attribute = attribute_name_generator()
+        rse.add_rse_attribute(rse_id, attribute, "de")
+        expression = "%s=de" % attribute
+
+        rse_expression_parser.parse_expression(expression, **self.filter)
+        compiled = rse_expression_parser.COMPILED_CACHE.get(expression)
+        assert compiled.is_valid(rse.get_rse_topology_version())
+        compiled.loaded_at -= rse_expression_parser.EXPRESSION_CACHE_EXPIRATION
+        assert not compiled.is_valid(rse.get_rse_topology_version())
+
 
 @pytest.mark.noparallel(reason='uses pre-defined RSE')
 class TestRSEExpressionParserClient:
@@ -0,0 +1,67 @@
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from rucio.common.constants import RseAttr
+from rucio.core import rse_counter
+from rucio.core.rse import add_rse_attribute, set_rse_limits, set_rse_usage
+from rucio.core.rse_usage_projection import RseUsageProjection
+
+
+def test_needed_free_space_follows_deletions(rse_factory):
+    """ RSE USAGE PROJECTION (CORE): Project the needed free space with the local deletions """
+    _, rse_id = rse_factory.make_mock_rse()
+    set_rse_usage(rse_id=rse_id, source='storage', used=900, free=100)
+    set_rse_limits(rse_id=rse_id, name='MinFreeSpace', value=300)
+
+    projection = RseUsageProjection(refresh_interval=3600)
+    assert projection.needed_free_space(rse_id) == (200, False)
+    assert projection.free_space(rse_id) == 100
+    assert projection.needed_free_space(rse_id, greedy=True) == (1000000000000, False)
+
+    projection.record_deletion(rse_id, 150)
+    assert projection.needed_free_space(rse_id) == (50, False)
+    projection.record_deletion(rse_id, 100)
+    assert projection.needed_free_space(rse_id) == (0, True)
+    assert projection.used_space(rse_id) == 650
+
+    # The deletions recorded before the storage usage was updated are accounted for by the new usage
+    set_rse_usage(rse_id=rse_id, source='storage', used=750, free=250)
+    projection.refresh(force=True)
+    assert projection.needed_free_space(rse_id) == (50, False)
+
+
+def test_needed_free_space_with_counter_deltas(rse_factory):
+    """ RSE USAGE PROJECTION (CORE): Project the rucio used space with the counter deltas not yet applied """
+    _, rse_id = rse_factory.make_mock_rse()
+    add_rse_attribute(rse_id, RseAttr.SOURCE_FOR_USED_SPACE, 'rucio')
+    set_rse_usage(rse_id=rse_id, source='storage', used=500, free=500)
+    set_rse_usage(rse_id=rse_id, source='rucio', used=600, free=0)
+    set_rse_limits(rse_id=rse_id, name='MinFreeSpace', value=400)
+    rse_counter.increase(rse_id=rse_id, files=1, bytes_=50)
+
+    projection = RseUsageProjection(refresh_interval=3600)
+    assert projection.used_space(rse_id) == 650
+    assert projection.needed_free_space(rse_id) == (50, False)
+
+    # The deletions recorded before a reload are part of the counter deltas loaded with it
+    projection.record_deletion(rse_id, 50)
+    assert projection.used_space(rse_id) == 600
+    rse_counter.decrease(rse_id=rse_id, files=1, bytes_=50)
+    projection.refresh(force=True)
+    assert projection.used_space(rse_id) == 600
+
+    # Without any usage from the requested source, only the obsolete replicas can be deleted
+    add_rse_attribute(rse_id, RseAttr.SOURCE_FOR_USED_SPACE, 'unknown')
+    projection.refresh(force=True)
+    assert projection.needed_free_space(rse_id) == (0, True)
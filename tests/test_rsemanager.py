@@ -0,0 +1,69 @@
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from rucio.common.exception import RSEProtocolNotSupported
+from rucio.rse import rsemanager as rsemgr
+
+
+def _rse_settings(*protocols):
+    return {
+        'rse': 'RSE',
+        'protocols': [
+            {'scheme': scheme, 'hostname': host, 'domains': {'wan': {'third_party_copy_read': priority, 'third_party_copy_write': priority}}}
+            for scheme, host, priority in protocols
+        ]
+    }
+
+
+def _find_matching_scheme(src, dst, scheme=None):
+    return rsemgr.find_matching_scheme(rse_settings_dest=dst, rse_settings_src=src, operation_src='third_party_copy_read',
+                                       operation_dest='third_party_copy_write', domain='wan', scheme=scheme)
+
+
+def test_find_matching_scheme_cache():
+    """ RSEMANAGER: find_matching_scheme results are memoized by protocol configuration """
+    rsemgr.MATCHING_SCHEME_CACHE.clear()
+    src = _rse_settings(('davs', 'src1', 1), ('root', 'src2', 2))
+    dst = _rse_settings(('root', 'dst1', 1), ('davs', 'dst2', 2))
+
+    stats = rsemgr.MATCHING_SCHEME_CACHE.stats()
+    assert _find_matching_scheme(src, dst) == ('root', 'root', 1, 2)
+    assert _find_matching_scheme(src, dst) == ('root', 'root', 1, 2)
+    new_stats = rsemgr.MATCHING_SCHEME_CACHE.stats()
+    assert new_stats['hits'] == stats['hits'] + 1
+    assert new_stats['misses'] == stats['misses'] + 1
+
+    # A change of protocol priorities results in a new cache entry
+    dst = _rse_settings(('root', 'dst1', 2), ('davs', 'dst2', 1))
+    assert _find_matching_scheme(src, dst) == ('davs', 'davs', 1, 1)
+
+    # Scheme filters are taken into account
+    assert _find_matching_scheme(src, dst, scheme=['root']) == ('root', 'root', 2, 2)
+    assert _find_matching_scheme(src, dst, scheme='root') == ('root', 'root', 2, 2)
+
+    # Negative results are cached too
+    for _ in range(2):
+        with pytest.raises(RSEProtocolNotSupported):
+            _find_matching_scheme(src, _rse_settings(('mock', 'dst3', 1)))
+
+
+def test_find_matching_scheme_load_balancing():
+    """ RSEMANAGER: find_matching_scheme picks randomly between protocols of equal priority """
+    src = _rse_settings(('davs', 'src1', 1), ('root', 'src2', 1))
+    dst = _rse_settings(('davs', 'dst1', 1), ('root', 'dst2', 1), ('srm', 'dst3', 2))
+
+    results = {_find_matching_scheme(src, dst) for _ in range(200)}
+    assert results == {('davs', 'davs', 1, 1), ('root', 'root', 1, 1)}
@@ -13,7 +13,9 @@
 # limitations under the License.
 
 import datetime
+import threading
 from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
 
 import pytest
 
@@ -22,14 +24,15 @@ from rucio.common.utils import generate_uuid
 from rucio.core import request as request_core
 from rucio.core import rse as rse_core
 from rucio.core import rule as rule_core
-from rucio.core.distance import add_distance
+from rucio.core import topology as topology_core
+from rucio.core.distance import add_distance, delete_distances, update_distances
 from rucio.core.replica import add_replicas
-from rucio.core.request import list_and_mark_transfer_requests_and_source_replicas
-from rucio.core.topology import Topology, get_hops
-from rucio.core.transfer import ProtocolFactory, build_transfer_paths
+from rucio.core.request import RequestSource, RequestWithSources, list_and_mark_transfer_requests_and_source_replicas
+from rucio.core.topology import ExpiringObjectCache, RoutingTableWorkers, Topology, get_hops
+from rucio.core.transfer import PreferDiskOverTape, ProtocolFactory, RestrictTapeSources, _rank_sources, build_transfer_paths
 from rucio.daemons.conveyor.common import assign_paths_to_transfertool_and_create_hops, pick_and_prepare_submission_path
 from rucio.db.sqla import models
-from rucio.db.sqla.constants import RequestState, RSEType
+from rucio.db.sqla.constants import RequestState, RequestType, RSEType
 from rucio.db.sqla.session import get_session
 
 
@@ -150,6 +153,127 @@ def test_get_hops(rse_factory):
     assert hop4['dest_rse'].id == rse6_id
 
 
+def test_routing_table(rse_factory):
+    # +------+  10   +------+  10   +------+
+    # | RSE0 +------>+ RSE1 +------>+ RSE2 |
+    # +--+---+       +------+       +--+---+
+    #    |                             ^
+    #    +-------------- 50 -----------+
+    _, rse0_id = rse_factory.make_mock_rse()
+    _, rse1_id = rse_factory.make_mock_rse()
+    _, rse2_id = rse_factory.make_mock_rse()
+    all_rses = [rse0_id, rse1_id, rse2_id]
+
+    add_distance(rse0_id, rse1_id, distance=10)
+    add_distance(rse1_id, rse2_id, distance=10)
+    add_distance(rse0_id, rse2_id, distance=50)
+
+    kwargs = {'operation_src': 'third_party_copy_read', 'operation_dest': 'third_party_copy_write', 'domain': 'wan', 'limit_dest_schemes': []}
+    # The shortest path trees of several destinations are also computed in worker processes
+    for multihop_rse_ids, nb_routing_table_workers in ((set(), 1), ({rse1_id}, 1), ({rse1_id}, 2)):
+        topology = Topology(rse_ids=all_rses).configure_multihop(multihop_rse_ids=multihop_rse_ids)
+        routing_table_workers = RoutingTableWorkers(nb_routing_table_workers) if nb_routing_table_workers > 1 else None
+        table_topology = Topology(rse_ids=all_rses, use_routing_table=True, routing_table_workers=routing_table_workers).configure_multihop(multihop_rse_ids=multihop_rse_ids)
+        table_topology.precompute_routing_table(**kwargs)
+        if routing_table_workers:
+            routing_table_workers.close()
+
+        for dst_rse_id in all_rses:
+            src_nodes = [topology[rse_id] for rse_id in all_rses if rse_id != dst_rse_id]
+            expected = topology.search_shortest_paths(src_nodes=src_nodes, dst_node=topology[dst_rse_id], **kwargs)
+
+            src_nodes = [table_topology[rse_id] for rse_id in all_rses if rse_id != dst_rse_id]
+            paths = table_topology.search_shortest_paths(src_nodes=src_nodes, dst_node=table_topology[dst_rse_id], **kwargs)
+
+            assert {node.id: [(hop['source_rse'].id, hop['dest_rse'].id, hop['cumulated_distance']) for hop in path] for node, path in paths.items()} == \
+                {node.id: [(hop['source_rse'].id, hop['dest_rse'].id, hop['cumulated_distance']) for hop in path] for node, path in expected.items()}
+
+    # The multihop path is only found if RSE1 can be used for multihop
+    [hop1, hop2] = table_topology.search_shortest_paths(src_nodes=[table_topology[rse0_id]], dst_node=table_topology[rse2_id], **kwargs)[table_topology[rse0_id]]
+    assert hop1['dest_rse'].id == rse1_id
+    assert hop2['dest_rse'].id == rse2_id
+
+    # Changing the multihop configuration invalidates the precomputed paths
+    table_topology.configure_multihop(multihop_rse_ids=set())
+    [hop] = table_topology.search_shortest_paths(src_nodes=[table_topology[rse0_id]], dst_node=table_topology[rse2_id], **kwargs)[table_topology[rse0_id]]
+    assert hop['dest_rse'].id == rse2_id
+
+
+def test_incremental_topology_refresh(rse_factory):
+    _, rse0_id = rse_factory.make_mock_rse()
+    _, rse1_id = rse_factory.make_mock_rse()
+    _, rse2_id = rse_factory.make_mock_rse()
+    all_rses = [rse0_id, rse1_id, rse2_id]
+
+    add_distance(rse0_id, rse1_id, distance=10)
+    add_distance(rse1_id, rse2_id, distance=10)
+
+    cached_topology = ExpiringObjectCache(ttl=0, new_obj_fnc=lambda: Topology(rse_ids=all_rses), refresh_fnc=Topology.refresh)
+    topology = cached_topology.get()
+    topology.ensure_loaded(load_columns=True, load_attributes=True, load_info=True)
+    topology.ensure_edges_loaded()
+    rse0, rse1, rse2 = topology[rse0_id], topology[rse1_id], topology[rse2_id]
+    assert topology.edge(rse0, rse1).cost == 10
+    assert 'incremental_refresh' not in rse0.attributes
+
+    update_distances(rse0_id, rse1_id, distance=20)
+    add_distance(rse0_id, rse2_id, distance=5)
+    rse_core.add_rse_attribute(rse0_id, 'incremental_refresh', 'yes')
+
+    # The topology object is patched in place
+    assert cached_topology.get() is topology
+    assert topology.edge(rse0, rse1).cost == 20
+    assert topology.edge(rse0, rse2).cost == 5
+    assert rse0.attributes['incremental_refresh'] == 'yes'
+    assert rse1.columns and rse1.info
+
+    # Deletions are detected too
+    rse_core.del_rse_attribute(rse0_id, 'incremental_refresh')
+    delete_distances(rse1_id, rse2_id)
+    assert cached_topology.get() is topology
+    assert 'incremental_refresh' not in rse0.attributes
+    topology.ensure_edges_loaded()
+    assert topology.edge(rse1, rse2) is None
+    assert len(topology.edges) == 2
+
+    # Deleting an RSE requires a full rebuild
+    rse_core.del_rse(rse2_id)
+    assert cached_topology.get() is not topology
+
+
+def test_topology_refresh_during_path_searches(rse_factory):
+    _, rse0_id = rse_factory.make_mock_rse()
+    _, rse1_id = rse_factory.make_mock_rse()
+    add_distance(rse0_id, rse1_id, distance=10)
+
+    topology = Topology(rse_ids=[rse0_id, rse1_id])
+    topology.ensure_loaded(load_columns=True, load_attributes=True, load_info=True)
+    topology.ensure_edges_loaded()
+    topology.refresh()
+    since = datetime.datetime.utcnow()
+    rse0, rse1 = topology[rse0_id], topology[rse1_id]
+    update_distances(rse0_id, rse1_id, distance=20)
+
+    # A search walking the graph doesn't block the refresh
+    refreshed = []
+    node_hop_penalty = topology_core._node_hop_penalty
+
+    def _refresh_during_search(node, default):
+        if not refreshed:
+            refresh = threading.Thread(target=topology.refresh, args=(since, ))
+            refresh.start()
+            refresh.join(timeout=5)
+            refreshed.append(not refresh.is_alive())
+        return node_hop_penalty(node, default)
+
+    with patch('rucio.core.topology._node_hop_penalty', side_effect=_refresh_during_search):
+        topology.search_shortest_paths(src_nodes=[rse0], dst_node=rse1, operation_src='third_party_copy_read', operation_dest='third_party_copy_write',
+                                       domain='wan', limit_dest_schemes=[])
+    assert refreshed == [True]
+    assert topology.edge(rse0, rse1).cost == 20
+    assert [(node, distance) for node, distance, *_ in topology.dijkstra_spf(dst_node=rse1)] == [(rse0, 20)]
+
+
 def test_disk_vs_tape_priority(rse_factory, root_account, mock_scope, file_config_mock):
     tape1_rse_name, tape1_rse_id = rse_factory.make_posix_rse(rse_type=RSEType.TAPE)
     tape2_rse_name, tape2_rse_id = rse_factory.make_posix_rse(rse_type=RSEType.TAPE)
@@ -217,6 +341,34 @@ def test_disk_vs_tape_priority(rse_factory, root_account, mock_scope, file_confi
     assert transfer[0].sources[0].rse.name == tape1_rse_name
 
 
+def test_listed_requests_share_values(rse_factory, root_account, mock_scope):
+    src1_rse_name, src1_rse_id = rse_factory.make_posix_rse()
+    src2_rse_name, src2_rse_id = rse_factory.make_posix_rse()
+    dst_rse_name, dst_rse_id = rse_factory.make_posix_rse()
+    all_rses = [src1_rse_id, src2_rse_id, dst_rse_id]
+    add_distance(src1_rse_id, dst_rse_id, distance=300)
+    add_distance(src2_rse_id, dst_rse_id, distance=300)
+
+    files = [{'scope': mock_scope, 'name': 'lfn.' + generate_uuid(), 'type': 'FILE', 'bytes': 1, 'adler32': 'beefdead'} for _ in range(2)]
+    for rse_id in (src1_rse_id, src2_rse_id):
+        add_replicas(rse_id=rse_id, files=files, account=root_account)
+    rule_core.add_rule(dids=[{'scope': f['scope'], 'name': f['name']} for f in files], account=root_account, copies=1, rse_expression=dst_rse_name,
+                       grouping='ALL', weight=None, lifetime=None, locked=False, subscription_id=None)
+
+    topology = Topology()
+    requests = list_and_mark_transfer_requests_and_source_replicas(rse_collection=topology, rses=all_rses)
+    assert len(requests) == 2
+    rws1, rws2 = requests.values()
+    assert rws1.scope is rws2.scope
+    assert rws1.account is rws2.account
+    assert rws1.activity is rws2.activity
+    assert len({id(source.distance) for rws in (rws1, rws2) for source in rws.sources}) == 1
+    assert {source.rse for source in rws1.sources} == {source.rse for source in rws2.sources} == {topology[src1_rse_id], topology[src2_rse_id]}
+    # No per-instance dictionary
+    assert not hasattr(rws1, '__dict__')
+    assert not hasattr(rws1.sources[0], '__dict__')
+
+
 @pytest.mark.parametrize("file_config_mock", [
     {"overrides": [('transfers', 'source_ranking_strategies', 'PathDistance')]},
     {"overrides": [('transfers', 'source_ranking_strategies', 'PreferDiskOverTape,PathDistance')]}
@@ -327,6 +479,40 @@ def test_failure_rate_with_custom_strategy(rse_factory, root_account, mock_scope
         assert transfer[0].src.rse.name == high_failure_rse_name
 
 
+def test_rank_sources_shares_per_rse_verdicts(root_account, mock_scope):
+    """
+    Verdicts of per-RSE strategies are computed once per RSE for the whole batch of requests.
+    """
+    disk_rse = rse_core.RseData(generate_uuid(), name='DISK', attributes={}, info={'rse_type': RSEType.DISK})
+    tape_rse = rse_core.RseData(generate_uuid(), name='TAPE', attributes={}, info={'rse_type': RSEType.TAPE})
+
+    requests = []
+    for attributes in (None, {'allow_tape_source': False}):
+        rws = RequestWithSources(id_=generate_uuid(), request_type=RequestType.TRANSFER, rule_id=None, scope=mock_scope, name=generate_uuid(),
+                                 md5=None, adler32=None, byte_count=1, activity='default', attributes=attributes, previous_attempt_id=None,
+                                 dest_rse=disk_rse, account=root_account, retry_count=0, priority=3, transfertool=None)
+        rws.sources = [RequestSource(rse=tape_rse), RequestSource(rse=disk_rse)]
+        requests.append(rws)
+
+    calls = []
+
+    class _CountingPreferDiskOverTape(PreferDiskOverTape):
+        def apply(self, ctx, source):
+            calls.append(source.rse)
+            return super().apply(ctx, source)
+
+    strategies = [RestrictTapeSources(), _CountingPreferDiskOverTape()]
+    cost_vectors, rejected_sources = _rank_sources(requests[0], strategies, session=None)
+    assert {source.rse: costs for source, costs in cost_vectors.items()} == {tape_rse: [1], disk_rse: [0]}
+    assert not rejected_sources
+
+    cost_vectors, rejected_sources = _rank_sources(requests[1], strategies, session=None)
+    assert {source.rse: costs for source, costs in cost_vectors.items()} == {disk_rse: [0]}
+    assert [source.rse for source in rejected_sources['RestrictTapeSources']] == [tape_rse]
+
+    assert sorted(calls, key=str) == [disk_rse, tape_rse]
+
+
 @pytest.mark.parametrize("caches_mock", [{"caches_to_mock": [
     'rucio.core.rse_expression_parser.REGION',  # The list of multihop RSEs is retrieved by an expression
 ]}], indirect=True)
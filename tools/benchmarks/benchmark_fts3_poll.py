@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measure the time needed by the poller to bulk query a set of mock FTS servers:
+with a new connection per query (one TLS handshake each), with the pooled
+keep-alive sessions, and with the pooled sessions queried concurrently.
+The mock servers run locally over HTTPS, with a self-signed certificate, and add
+a configurable delay to each new connection and to each query. A rucio
+configuration is needed to import the modules, but the database is not used.
+"""
+
+import os.path
+import sys
+
+base_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(base_path, 'lib'))
+
+import argparse  # noqa: E402
+import datetime  # noqa: E402
+import json  # noqa: E402
+import logging  # noqa: E402
+import multiprocessing  # noqa: E402
+import ssl  # noqa: E402
+import tempfile  # noqa: E402
+import threading  # noqa: E402
+import time  # noqa: E402
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # noqa: E402
+
+from cryptography import x509  # noqa: E402
+from cryptography.hazmat.primitives import hashes, serialization  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import rsa  # noqa: E402
+from cryptography.x509.oid import NameOID  # noqa: E402
+
+from rucio.daemons.conveyor.poller import _query_transfers, _query_transfers_concurrently  # noqa: E402
+from rucio.transfertool.fts3 import FTS3Transfertool, get_fts3_session_pool  # noqa: E402
+
+
+def write_self_signed_cert(directory):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'localhost')])
+    now = datetime.datetime.utcnow()
+    cert = x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key()).serial_number(
+        x509.random_serial_number()).not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1)).sign(key, hashes.SHA256())
+    cert_file, key_file = os.path.join(directory, 'cert.pem'), os.path.join(directory, 'key.pem')
+    with open(cert_file, 'wb') as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_file, 'wb') as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL, serialization.NoEncryption()))
+    return cert_file, key_file
+
+
+class MockFTSHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        # New connection: TCP and TLS round trips
+        time.sleep(self.server.connect_delay)
+
+    def do_GET(self):
+        time.sleep(self.server.query_delay)
+        job_ids = self.path.split('?')[0].split('/jobs/', 1)[1].split(',')
+        body = json.dumps([{'job_id': job_id, 'http_status': '200 Ok', 'job_state': 'ACTIVE', 'job_metadata': {'multi_sources': True}, 'files': []}
+                           for job_id in job_ids]).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockFTSServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, ssl_context, connect_delay, query_delay):
+        super().__init__(('127.0.0.1', 0), MockFTSHandler)
+        self.ssl_context = ssl_context
+        self.connect_delay = connect_delay
+        self.query_delay = query_delay
+
+    def get_request(self):
+        sock, address = super().get_request()
+        # Do the handshake in the handler thread, not in the accepting one
+        return self.ssl_context.wrap_socket(sock, server_side=True, do_handshake_on_connect=False), address
+
+
+def start_servers(nb_servers, connect_delay, query_delay):
+    directory = tempfile.mkdtemp()
+    ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    ssl_context.load_cert_chain(*write_self_signed_cert(directory))
+    servers = [MockFTSServer(ssl_context, connect_delay, query_delay) for _ in range(nb_servers)]
+    # Serve from another process, so that the servers do not compete with the poller for the GIL
+    multiprocessing.get_context('fork').Process(target=_serve, args=(servers,), daemon=True).start()
+    return servers
+
+
+def _serve(servers):
+    threads = [threading.Thread(target=server.serve_forever, daemon=True) for server in servers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def build_polls(servers, nb_queries, fts_bulk):
+    polls = []
+    for server in servers:
+        transfertool = FTS3Transfertool(external_host='https://127.0.0.1:%d' % server.server_address[1])
+        # The mock servers do not check client certificates
+        transfertool.cert = None
+        for i in range(nb_queries):
+            transfers_by_eid = {'job-%d-%d' % (i, j): {} for j in range(fts_bulk)}
+            polls.append((transfertool, transfers_by_eid))
+    return polls
+
+
+def run_sequential(polls, keep_alive):
+    start = time.perf_counter()
+    for transfertool, transfers_by_eid in polls:
+        if not keep_alive:
+            get_fts3_session_pool().clear()
+            transfertool.session = get_fts3_session_pool().session(transfertool.external_host)
+        resps = _query_transfers(transfertool, transfers_by_eid)
+        assert len(resps) == len(transfers_by_eid)
+    return time.perf_counter() - start
+
+
+def run_concurrent(polls, max_workers):
+    start = time.perf_counter()
+    for _, transfers_by_eid, future in _query_transfers_concurrently(polls, max_workers=max_workers):
+        assert len(future.result()) == len(transfers_by_eid)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--servers', type=int, default=8, help='Number of mock FTS servers')
+    parser.add_argument('--queries', type=int, default=5, help='Number of bulk queries per server')
+    parser.add_argument('--fts-bulk', type=int, default=100, help='Number of jobs per bulk query')
+    parser.add_argument('--connect-delay', type=float, default=0.05, help='Seconds added to each new connection')
+    parser.add_argument('--query-delay', type=float, default=0.05, help='Seconds added to each query')
+    parser.add_argument('--workers', type=int, default=8, help='Number of concurrent queries')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    servers = start_servers(args.servers, args.connect_delay, args.query_delay)
+    polls = build_polls(servers, args.queries, args.fts_bulk)
+
+    new_connections = run_sequential(polls, keep_alive=False)
+    get_fts3_session_pool().clear()
+    polls = build_polls(servers, args.queries, args.fts_bulk)
+    keep_alive = run_sequential(polls, keep_alive=True)
+    concurrent = run_concurrent(polls, args.workers)
+
+    print('%d bulk queries of %d jobs on %d mock FTS servers' % (len(polls), args.fts_bulk, args.servers))
+    print('new connection per query:   %.3fs' % new_connections)
+    print('keep-alive sessions:        %.3fs' % keep_alive)
+    print('keep-alive, %2d concurrent:  %.3fs' % (args.workers, concurrent))
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measure the time hermes spends aggregating a batch of synthetic transfer and
+deletion messages into InfluxDB line protocol, compared to the former
+per-message implementation. The payload is gzipped but not sent anywhere. A
+rucio configuration is needed to import the modules, but the database is not
+used.
+"""
+
+import os.path
+import sys
+
+base_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(base_path, 'lib'))
+
+import argparse  # noqa: E402
+import calendar  # noqa: E402
+import datetime  # noqa: E402
+import gzip  # noqa: E402
+import logging  # noqa: E402
+import random  # noqa: E402
+import time  # noqa: E402
+
+from rucio.daemons.hermes.hermes import _gzip_stream, aggregate_influx_series, influx_line_protocol  # noqa: E402
+
+
+def build_messages(nb_messages, nb_rses, nb_activities, nb_seconds, seed):
+    rnd = random.Random(seed)  # noqa: S311
+    rses = ['RSE%04d' % i for i in range(nb_rses)]
+    activities = ['Activity %d' % i for i in range(nb_activities)]
+    start = datetime.datetime(2024, 5, 1, 12, 0, 0)
+    timestamps = [start + datetime.timedelta(seconds=i) for i in range(nb_seconds)]
+    messages = []
+    for _ in range(nb_messages):
+        created_at = rnd.choice(timestamps)
+        if rnd.random() < 0.5:
+            messages.append({
+                'event_type': 'transfer-done' if rnd.random() < 0.9 else 'transfer-failed',
+                'created_at': created_at,
+                'payload': {
+                    'transferred_at': created_at.strftime('%Y-%m-%d %H:%M:%S'),
+                    'activity': rnd.choice(activities),
+                    'src-rse': rnd.choice(rses),
+                    'dst-rse': rnd.choice(rses),
+                    'bytes': rnd.randint(1, 10**10),
+                },
+            })
+        else:
+            messages.append({
+                'event_type': 'deletion-done' if rnd.random() < 0.9 else 'deletion-failed',
+                'created_at': created_at,
+                'payload': {'rse': rnd.choice(rses), 'bytes': rnd.randint(1, 10**10)},
+            })
+    return messages
+
+
+def legacy_points(messages, microsecond):
+    # Per-message parsing and string keys, as done before the columnar aggregation
+    bins = {}
+    for message in messages:
+        event_type = message['event_type']
+        payload = message['payload']
+        if event_type in ['transfer-failed', 'transfer-done']:
+            timestamp = int(calendar.timegm(time.strptime(payload['transferred_at'], '%Y-%m-%d %H:%M:%S'))) * 1000000000 + microsecond
+            key = 'transfer,activity=%s,src_rse=%s,dst_rse=%s' % (payload['activity'].replace(' ', '\\ '), payload['src-rse'], payload['dst-rse'])
+            offset = 0 if event_type == 'transfer-done' else 2
+        else:
+            created_at = message['created_at'].replace(second=0, microsecond=0, tzinfo=datetime.UTC).timestamp()
+            timestamp = int(created_at) * 1000000000 + microsecond
+            key = 'deletion,rse=%s' % payload['rse']
+            offset = 0 if event_type == 'deletion-done' else 2
+        metrics = bins.setdefault(timestamp, {}).setdefault(key, [0, 0, 0, 0])
+        metrics[offset] += 1
+        metrics[offset + 1] += payload['bytes']
+    points = ''
+    for timestamp in bins:
+        for entry in bins[timestamp]:
+            metrics = bins[timestamp][entry]
+            event_type = entry.split(',')[0]
+            points += '%s nb_%s_done=%s,bytes_%s_done=%s,nb_%s_failed=%s,bytes_%s_failed=%s %s' % (
+                entry, event_type, metrics[0], event_type, metrics[1], event_type, metrics[2], event_type, metrics[3], timestamp)
+            points += '\n'
+    return points
+
+
+def run_legacy(messages):
+    start = time.perf_counter()
+    points = legacy_points(messages, microsecond=0)
+    return time.perf_counter() - start, points
+
+
+def run_columnar(messages):
+    start = time.perf_counter()
+    series = aggregate_influx_series(messages, bin_size='1m', logger=logging.log, microsecond=0)
+    aggregated = time.perf_counter()
+    payload = b''.join(_gzip_stream(influx_line_protocol(series)))
+    return aggregated - start, time.perf_counter() - aggregated, series, payload
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=1000000, help='Number of messages in the batch')
+    parser.add_argument('--rses', type=int, default=50, help='Number of distinct RSEs')
+    parser.add_argument('--activities', type=int, default=5, help='Number of distinct activities')
+    parser.add_argument('--seconds', type=int, default=60, help='Number of distinct timestamps (in seconds) of the events')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    args = parser.parse_args()
+
+    messages = build_messages(args.messages, args.rses, args.activities, args.seconds, args.seed)
+
+    elapsed_legacy, points = run_legacy(messages)
+    elapsed_aggregation, elapsed_rendering, series, payload = run_columnar(messages)
+    assert sorted(points.splitlines()) == sorted(gzip.decompress(payload).decode().splitlines())
+
+    print('Aggregating %d messages into %d series' % (args.messages, len(series)))
+    print('per-message aggregation:       %.3fs (%d bytes)' % (elapsed_legacy, len(points)))
+    print('columnar aggregation:          %.3fs' % elapsed_aggregation)
+    print('line protocol and gzip:        %.3fs (%d bytes)' % (elapsed_rendering, len(payload)))
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measure the memory and time used by list_and_mark_transfer_requests_and_source_replicas
+to load a batch of queued requests with their source replicas. The benchmark writes
+RSEs, replicas and requests to the configured database: only run it against a test
+database. The accounts and scopes of the test bootstrap (root, mock) must exist.
+"""
+
+import os.path
+import sys
+
+base_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(base_path, 'lib'))
+
+import argparse  # noqa: E402
+import gc  # noqa: E402
+import random  # noqa: E402
+import time  # noqa: E402
+import tracemalloc  # noqa: E402
+
+from rucio.common.types import InternalAccount, InternalScope  # noqa: E402
+from rucio.common.utils import chunks, generate_uuid  # noqa: E402
+from rucio.core.distance import add_distance  # noqa: E402
+from rucio.core.replica import add_replicas  # noqa: E402
+from rucio.core.request import list_and_mark_transfer_requests_and_source_replicas, queue_requests  # noqa: E402
+from rucio.core.rse import RseCollection, add_rse  # noqa: E402
+from rucio.db.sqla.constants import RequestState, RequestType  # noqa: E402
+from rucio.db.sqla.session import get_session  # noqa: E402
+
+
+def populate(nb_requests, nb_sources, nb_source_rses, nb_dest_rses, seed):
+    rnd = random.Random(seed)  # noqa: S311
+    tag = generate_uuid()[:8].upper()
+    account = InternalAccount('root')
+    scope = InternalScope('mock')
+    source_rse_ids = [add_rse('BENCH_%s_SRC%04d' % (tag, i)) for i in range(nb_source_rses)]
+    dest_rse_ids = [add_rse('BENCH_%s_DST%04d' % (tag, i)) for i in range(nb_dest_rses)]
+    for dest_rse_id in dest_rse_ids:
+        for source_rse_id in source_rse_ids:
+            add_distance(source_rse_id, dest_rse_id, distance=rnd.randint(1, 10))
+
+    files = [{'scope': scope, 'name': 'bench_%s_%07d' % (tag, i), 'bytes': 1, 'adler32': 'deadbeef'} for i in range(nb_requests)]
+    files_by_rse = {rse_id: [] for rse_id in source_rse_ids}
+    for file in files:
+        for rse_id in rnd.sample(source_rse_ids, k=nb_sources):
+            files_by_rse[rse_id].append(file)
+    for rse_id, rse_files in files_by_rse.items():
+        for chunk in chunks(rse_files, 200):
+            add_replicas(rse_id, chunk, account)
+
+    requests = [{
+        'dest_rse_id': rnd.choice(dest_rse_ids),
+        'request_type': RequestType.TRANSFER,
+        'request_id': generate_uuid(),
+        'name': file['name'],
+        'scope': scope,
+        'rule_id': generate_uuid(),
+        'retry_count': 1,
+        'account': account,
+        'state': RequestState.QUEUED,
+        'attributes': {'activity': 'User Subscriptions', 'bytes': 1, 'md5': '', 'adler32': 'deadbeef'},
+    } for file in files]
+    # Small chunks keep the lookups of add_replicas and queue_requests within the limits of sqlite
+    for chunk in chunks(requests, 200):
+        queue_requests(chunk)
+    return dest_rse_ids
+
+
+def list_requests(dest_rse_ids):
+    session = get_session()
+    try:
+        return list_and_mark_transfer_requests_and_source_replicas(rse_collection=RseCollection(), rses=dest_rse_ids, session=session)
+    finally:
+        session.rollback()
+        session.close()
+
+
+def measure(dest_rse_ids):
+    gc.collect()
+    collections = sum(stats['collections'] for stats in gc.get_stats())
+    start = time.perf_counter()
+    requests_with_sources = list_requests(dest_rse_ids)
+    elapsed = time.perf_counter() - start
+    collections = sum(stats['collections'] for stats in gc.get_stats()) - collections
+    nb_sources = sum(len(rws.sources) for rws in requests_with_sources.values())
+    del requests_with_sources
+
+    # The memory is traced on a second listing, as tracing slows down the first one
+    gc.collect()
+    tracemalloc.start()
+    requests_with_sources = list_requests(dest_rse_ids)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(requests_with_sources), nb_sources, elapsed, retained, peak, collections
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=10000, help='Number of queued requests')
+    parser.add_argument('--sources', type=int, default=10, help='Number of source replicas per request')
+    parser.add_argument('--source-rses', type=int, default=50, help='Number of source RSEs')
+    parser.add_argument('--dest-rses', type=int, default=10, help='Number of destination RSEs')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    args = parser.parse_args()
+
+    dest_rse_ids = populate(args.requests, args.sources, args.source_rses, args.dest_rses, args.seed)
+    nb_requests, nb_sources, elapsed, retained, peak, collections = measure(dest_rse_ids)
+
+    print('Listed %d requests with %d sources in %.3fs' % (nb_requests, nb_sources, elapsed))
+    print('memory retained by the result: %.1f MiB' % (retained / 2 ** 20))
+    print('peak memory during the query:  %.1f MiB' % (peak / 2 ** 20))
+    print('garbage collections:           %d' % collections)
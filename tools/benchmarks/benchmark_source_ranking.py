@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measure the time spent ranking the sources of a batch of requests, with and
+without sharing the per-RSE verdicts of the source ranking strategies between
+requests. The requests are built in memory: a rucio configuration is needed to
+import the modules, but the database is not used. Path-based strategies are
+not included, as they need a topology.
+"""
+
+import os.path
+import sys
+
+base_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(base_path, 'lib'))
+
+import argparse  # noqa: E402
+import random  # noqa: E402
+import time  # noqa: E402
+
+from rucio.common.types import InternalAccount, InternalScope  # noqa: E402
+from rucio.core.request import RequestSource, RequestWithSources  # noqa: E402
+from rucio.core.rse import RseData  # noqa: E402
+from rucio.core.transfer import (  # noqa: E402
+    EnforceSourceRSEExpression,
+    EnforceStagingBuffer,
+    FailureRate,
+    HighestAdjustedRankingFirst,
+    PreferDiskOverTape,
+    RestrictTapeSources,
+    SkipBlocklistedRSEs,
+    SkipRestrictedRSEs,
+    _rank_sources,
+)
+from rucio.db.sqla.constants import RequestType, RSEType  # noqa: E402
+
+
+class _Topology:
+    ignore_availability = False
+
+
+class _StatsManager:
+    def __init__(self, rses, rnd):
+        self.stats = [{'src_rse_id': rse.id, 'files_done': rnd.randint(0, 1000), 'files_failed': rnd.randint(0, 100)} for rse in rses]
+
+    def load_totals(self, *args, **kwargs):
+        return self.stats
+
+
+def build_requests(nb_rses, nb_requests, nb_sources, seed):
+    rnd = random.Random(seed)  # noqa: S311
+    rses = []
+    for i in range(nb_rses):
+        rse = RseData('rse%04d' % i, name='RSE%04d' % i)
+        rse._columns = {'availability_read': rnd.random() > 0.05, 'availability_write': True}
+        rse._attributes = {'restricted_read': rnd.random() < 0.05}
+        rse._info = {'rse_type': RSEType.TAPE if rnd.random() < 0.2 else RSEType.DISK}
+        rses.append(rse)
+
+    account = InternalAccount('root', from_external=False)
+    scope = InternalScope('mock', from_external=False)
+    requests = []
+    for i in range(nb_requests):
+        rws = RequestWithSources(id_='req%06d' % i, request_type=RequestType.TRANSFER, rule_id=None, scope=scope, name='file%06d' % i,
+                                 md5=None, adler32=None, byte_count=1, activity='default', attributes=None, previous_attempt_id=None,
+                                 dest_rse=rnd.choice(rses), account=account, retry_count=0, priority=3, transfertool='fts3')
+        rws.sources = [RequestSource(rse=rse, ranking=rnd.randint(-2, 2)) for rse in rnd.sample(rses, k=nb_sources)]
+        requests.append(rws)
+    return rses, requests
+
+
+def build_strategies(rses, seed, per_rse):
+    strategies = [
+        EnforceSourceRSEExpression(),
+        SkipBlocklistedRSEs(topology=_Topology()),
+        SkipRestrictedRSEs(),
+        EnforceStagingBuffer(),
+        RestrictTapeSources(),
+        HighestAdjustedRankingFirst(),
+        PreferDiskOverTape(),
+        FailureRate(stats_manager=_StatsManager(rses, random.Random(seed))),  # noqa: S311
+    ]
+    if not per_rse:
+        for strategy in strategies:
+            strategy.per_rse = False
+    return strategies
+
+
+def run(requests, strategies):
+    start = time.perf_counter()
+    results = [_rank_sources(rws, strategies, session=None) for rws in requests]
+    return time.perf_counter() - start, results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rses', type=int, default=1000, help='Number of distinct source RSEs')
+    parser.add_argument('--requests', type=int, default=10000, help='Number of requests in the batch')
+    parser.add_argument('--sources', type=int, default=20, help='Number of sources per request')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    args = parser.parse_args()
+
+    rses, requests = build_requests(args.rses, args.requests, args.sources, args.seed)
+
+    elapsed_per_source, results_per_source = run(requests, build_strategies(rses, args.seed, per_rse=False))
+    elapsed_per_rse, results_per_rse = run(requests, build_strategies(rses, args.seed, per_rse=True))
+    assert [costs for costs, _ in results_per_source] == [costs for costs, _ in results_per_rse]
+
+    print('Ranking %d requests with %d sources each among %d RSEs' % (args.requests, args.sources, args.rses))
+    print('verdicts computed per source: %.3fs' % elapsed_per_source)
+    print('verdicts shared per RSE:      %.3fs' % elapsed_per_rse)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compare per-request Dijkstra with the precomputed routing table of Topology
+on a synthetic mesh. The routing table can be built by several worker processes. The mesh is built in memory: a rucio configuration is
+needed to import the modules, but the database is not used.
+"""
+
+import os.path
+import sys
+
+base_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(base_path, 'lib'))
+
+import argparse  # noqa: E402
+import random  # noqa: E402
+import time  # noqa: E402
+
+from rucio.core.topology import RoutingTableWorkers, Topology  # noqa: E402
+
+KWARGS = {'operation_src': 'third_party_copy_read', 'operation_dest': 'third_party_copy_write', 'domain': 'wan', 'limit_dest_schemes': []}
+
+
+def _protocol(scheme, priority):
+    return {'scheme': scheme, 'hostname': 'host', 'port': 443, 'prefix': '/', 'impl': 'rucio.rse.protocols.gfal.Default',
+            'domains': {'wan': {'read': priority, 'write': priority, 'delete': priority,
+                                'third_party_copy_read': priority, 'third_party_copy_write': priority}}}
+
+
+def build_mesh(nb_rses, degree, multihop_fraction, seed):
+    rnd = random.Random(seed)  # noqa: S311
+    rse_ids = ['rse%04d' % i for i in range(nb_rses)]
+    topology = Topology(rse_ids=rse_ids)
+    for rse_id in rse_ids:
+        node = topology[rse_id]
+        schemes = rnd.sample(['davs', 'root', 'srm', 'gsiftp'], k=rnd.randint(1, 3))
+        node._name = rse_id
+        node._attributes = {}
+        node._info = {'id': rse_id, 'rse': rse_id, 'protocols': [_protocol(scheme, i + 1) for i, scheme in enumerate(schemes)]}
+        node._columns = {'availability_read': True, 'availability_write': True}
+    for rse_id in rse_ids:
+        for dst_rse_id in rnd.sample(rse_ids, k=degree):
+            if dst_rse_id != rse_id:
+                topology.get_or_create_edge(topology[rse_id], topology[dst_rse_id]).cost = rnd.randint(1, 100)
+    for rse_id in rnd.sample(rse_ids, k=int(nb_rses * multihop_fraction)):
+        node = topology[rse_id]
+        node.used_for_multihop = True
+        topology._multihop_nodes.add(node)
+    topology._edges_loaded = True
+    return topology
+
+
+def run(topology, requests):
+    start = time.perf_counter()
+    for src_nodes, dst_node in requests:
+        topology.search_shortest_paths(src_nodes=src_nodes, dst_node=dst_node, session=None, **KWARGS)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rses', type=int, default=1000, help='Number of RSEs in the mesh')
+    parser.add_argument('--degree', type=int, default=30, help='Number of outgoing links per RSE')
+    parser.add_argument('--multihop-fraction', type=float, default=0.1, help='Fraction of RSEs usable for multihop')
+    parser.add_argument('--requests', type=int, default=2000, help='Number of requests to route')
+    parser.add_argument('--destinations', type=int, default=100, help='Number of distinct destinations among the requests')
+    parser.add_argument('--sources', type=int, default=5, help='Number of sources per request')
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes building the routing table')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)  # noqa: S311
+    dijkstra_topology = build_mesh(args.rses, args.degree, args.multihop_fraction, args.seed)
+    table_topology = build_mesh(args.rses, args.degree, args.multihop_fraction, args.seed)
+    table_topology.use_routing_table = True
+    table_topology.routing_table_workers = RoutingTableWorkers(args.workers) if args.workers > 1 else None
+
+    rse_ids = list(dijkstra_topology.rse_id_to_data_map)
+    destinations = rnd.sample(rse_ids, k=args.destinations)
+    requests = [(rnd.sample(rse_ids, k=args.sources), rnd.choice(destinations)) for _ in range(args.requests)]
+
+    dijkstra_time = run(dijkstra_topology, [([dijkstra_topology[s] for s in srcs], dijkstra_topology[dst]) for srcs, dst in requests])
+
+    start = time.perf_counter()
+    table_topology.precompute_routing_table(dst_nodes=[table_topology[dst] for dst in destinations], session=None, **KWARGS)
+    build_time = time.perf_counter() - start
+    if table_topology.routing_table_workers:
+        table_topology.routing_table_workers.close()
+    table_time = run(table_topology, [([table_topology[s] for s in srcs], table_topology[dst]) for srcs, dst in requests])
+
+    print(f'{args.rses} RSEs, {args.rses * args.degree} links, {args.requests} requests towards {args.destinations} destinations')
+    print(f'per-request dijkstra: {dijkstra_time:.3f}s ({1e6 * dijkstra_time / args.requests:.1f}us/request)')
+    print(f'routing table build:  {build_time:.3f}s ({1e3 * build_time / args.destinations:.1f}ms/destination, {args.workers} worker(s))')
+    print(f'routing table lookup: {table_time:.3f}s ({1e6 * table_time / args.requests:.1f}us/request)')
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measure the contention on TransferStatsManager.observe: the same number of
+transfer observations is recorded by one thread, then spread over many threads
+which all start at the same time. The samples are then saved to the configured
+database: only run it against a test database.
+"""
+
+import os.path
+import sys
+
+base_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(base_path, 'lib'))
+
+import argparse  # noqa: E402
+import random  # noqa: E402
+import threading  # noqa: E402
+import time  # noqa: E402
+
+from rucio.common.utils import generate_uuid  # noqa: E402
+from rucio.core.request import TransferStatsManager  # noqa: E402
+from rucio.core.rse import add_rse  # noqa: E402
+from rucio.db.sqla.constants import RequestState  # noqa: E402
+
+
+def make_links(nb_rses, seed):
+    rnd = random.Random(seed)  # noqa: S311
+    tag = generate_uuid()[:8].upper()
+    rse_ids = [add_rse('BENCH_%s_%04d' % (tag, i)) for i in range(nb_rses)]
+    return [tuple(rnd.sample(rse_ids, k=2)) for _ in range(nb_rses * 4)]
+
+
+def observe(stats_manager, links, nb_observations, barrier, seed):
+    rnd = random.Random(seed)  # noqa: S311
+    observations = [(rnd.choice(links), rnd.choice((RequestState.DONE, RequestState.DONE, RequestState.FAILED))) for _ in range(nb_observations)]
+    barrier.wait()
+    for (src_rse_id, dst_rse_id), state in observations:
+        stats_manager.observe(src_rse_id=src_rse_id, dst_rse_id=dst_rse_id, activity='benchmark', state=state, file_size=1000)
+
+
+def run(links, nb_threads, nb_observations, seed):
+    stats_manager = TransferStatsManager()
+    barrier = threading.Barrier(nb_threads + 1)
+    threads = [threading.Thread(target=observe, args=(stats_manager, links, nb_observations // nb_threads, barrier, seed + i))
+               for i in range(nb_threads)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    stats_manager.force_save()
+    return elapsed, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=32, help='Number of threads calling observe')
+    parser.add_argument('--observations', type=int, default=320000, help='Total number of observations')
+    parser.add_argument('--rses', type=int, default=50, help='Number of RSEs')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    args = parser.parse_args()
+
+    links = make_links(args.rses, args.seed)
+    for nb_threads in (1, args.threads):
+        elapsed, save_time = run(links, nb_threads, args.observations, args.seed)
+        print('%2d threads: %d observations in %.3fs (%.0f/s), saved in %.3fs' % (
+            nb_threads, args.observations, elapsed, args.observations / elapsed, save_time))